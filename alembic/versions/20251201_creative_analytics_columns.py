@@ -0,0 +1,92 @@
+"""Add consistency/retry columns and tenant indexes for creative analytics.
+
+retry_count and improved_panel_count are backfilled from each project's
+storyboard_json. The project-level consistency level and score were never
+persisted before this revision, so existing rows keep "medium" and NULL
+(counted as unscored) until the project is saved again.
+
+Revision ID: 20251201_creative_analytics
+Revises: 20251121_normalize_creative
+Create Date: 2025-12-01
+"""
+
+import json
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect, text
+
+
+# revision identifiers, used by Alembic.
+revision = "20251201_creative_analytics"
+down_revision = "20251121_normalize_creative"
+branch_labels = None
+depends_on = None
+
+# 与 creative.metrics.retry_counts 相同的判定：重试后一致性分数超过该值的分镜计为改善
+IMPROVED_SCORE_THRESHOLD = 0.7
+
+
+def _retry_counts(storyboard):
+    retries = improved = 0
+    for panel in storyboard or []:
+        if not isinstance(panel, dict):
+            continue
+        retry_count = panel.get("retry_count") or 0
+        retries += retry_count
+        if retry_count > 0 and (panel.get("consistency_score") or 0) > IMPROVED_SCORE_THRESHOLD:
+            improved += 1
+    return retries, improved
+
+
+def upgrade():
+    conn = op.get_bind()
+    insp = inspect(conn)
+    cols = {c["name"] for c in insp.get_columns("creative_projects")}
+    indexes = {i["name"] for i in insp.get_indexes("creative_projects")}
+
+    with op.batch_alter_table("creative_projects") as batch:
+        if "consistency_level" not in cols:
+            batch.add_column(
+                sa.Column("consistency_level", sa.String(length=10), nullable=False, server_default="medium")
+            )
+        if "consistency_score" not in cols:
+            batch.add_column(sa.Column("consistency_score", sa.Float(), nullable=True))
+        if "retry_count" not in cols:
+            batch.add_column(sa.Column("retry_count", sa.Integer(), nullable=False, server_default="0"))
+        if "improved_panel_count" not in cols:
+            batch.add_column(sa.Column("improved_panel_count", sa.Integer(), nullable=False, server_default="0"))
+
+    # 从已有分镜数据补录重试统计
+    if "retry_count" not in cols or "improved_panel_count" not in cols:
+        rows = conn.execute(
+            text("SELECT id, storyboard_json FROM creative_projects WHERE storyboard_json IS NOT NULL")
+        ).fetchall()
+        update_sql = text(
+            "UPDATE creative_projects SET retry_count = :retries, improved_panel_count = :improved WHERE id = :row_id"
+        )
+        for row in rows:
+            storyboard = row.storyboard_json
+            if isinstance(storyboard, str):
+                storyboard = json.loads(storyboard)
+            retries, improved = _retry_counts(storyboard)
+            if retries or improved:
+                conn.execute(update_sql, {"row_id": row.id, "retries": retries, "improved": improved})
+
+    if "ix_creative_projects_consistency_score" not in indexes:
+        op.create_index("ix_creative_projects_consistency_score", "creative_projects", ["consistency_score"])
+    if "ix_creative_projects_user_status" not in indexes:
+        op.create_index("ix_creative_projects_user_status", "creative_projects", ["user_id", "status"])
+    if "ix_creative_projects_user_created" not in indexes:
+        op.create_index("ix_creative_projects_user_created", "creative_projects", ["user_id", "created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_creative_projects_user_created", table_name="creative_projects")
+    op.drop_index("ix_creative_projects_user_status", table_name="creative_projects")
+    op.drop_index("ix_creative_projects_consistency_score", table_name="creative_projects")
+    with op.batch_alter_table("creative_projects") as batch:
+        batch.drop_column("improved_panel_count")
+        batch.drop_column("retry_count")
+        batch.drop_column("consistency_score")
+        batch.drop_column("consistency_level")
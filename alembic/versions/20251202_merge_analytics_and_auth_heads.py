@@ -0,0 +1,21 @@
+"""Merge the creative analytics and user auth migration heads.
+
+Revision ID: 20251202_merge_heads
+Revises: 20251201_creative_analytics, 20251125_add_user_auth_fields
+Create Date: 2025-12-02
+"""
+
+
+# revision identifiers, used by Alembic.
+revision = "20251202_merge_heads"
+down_revision = ("20251201_creative_analytics", "20251125_add_user_auth_fields")
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    pass
+
+
+def downgrade():
+    pass
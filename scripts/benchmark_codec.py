@@ -0,0 +1,89 @@
+"""缓存/任务载荷编码基准测试。
+
+构造一个包含大量分镜的 Creative 项目载荷，比较 pickle、标准库 json 与
+各种 Codec 配置（JSON/msgpack × 不压缩/zlib/zstd）的编码体积和编解码耗时。
+未安装的可选依赖对应的配置会被跳过。
+
+用法:
+    python scripts/benchmark_codec.py
+    python scripts/benchmark_codec.py --shots 50 500 --rounds 200
+"""
+
+import argparse
+import json
+import pickle
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+# Add src to path
+ROOT = Path(__file__).resolve().parent.parent
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from lewis_ai_system import codec as codec_module
+from lewis_ai_system.codec import Codec
+
+
+def project_payload(shots: int) -> dict[str, Any]:
+    return {
+        "project_id": "proj-benchmark",
+        "script": "A lighthouse keeper discovers a message in a bottle. " * 40,
+        "storyboard": [
+            {
+                "shot": i,
+                "duration_seconds": 4.5,
+                "description": f"Shot {i}: slow dolly in on the lighthouse at dusk, waves crashing below",
+                "camera": {"angle": "low", "movement": "dolly_in", "lens_mm": 35},
+                "characters": ["keeper", "gull"],
+                "image_url": f"https://cdn.example.com/projects/proj-benchmark/frames/{i:04d}.png",
+                "approved": i % 3 == 0,
+            }
+            for i in range(shots)
+        ],
+    }
+
+
+def measure(dumps: Callable[[Any], bytes], loads: Callable[[bytes], Any], payload: Any, rounds: int):
+    encoded = dumps(payload)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        dumps(payload)
+    encode_us = (time.perf_counter() - start) / rounds * 1e6
+    start = time.perf_counter()
+    for _ in range(rounds):
+        loads(encoded)
+    decode_us = (time.perf_counter() - start) / rounds * 1e6
+    return len(encoded), encode_us, decode_us
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shots", type=int, nargs="+", default=[20, 200, 2000])
+    parser.add_argument("--rounds", type=int, default=100)
+    parser.add_argument("--threshold", type=int, default=4096)
+    args = parser.parse_args()
+
+    candidates: list[tuple[str, Callable, Callable]] = [
+        ("pickle", pickle.dumps, pickle.loads),
+        ("stdlib json", lambda v: json.dumps(v).encode(), json.loads),
+    ]
+    formats = ["json"] + (["msgpack"] if codec_module.MSGPACK_AVAILABLE else [])
+    compressions = ["none", "zlib"] + (["zstd"] if codec_module.ZSTD_AVAILABLE else [])
+    for fmt in formats:
+        for compression in compressions:
+            codec = Codec(fmt, compression=compression, compress_threshold=args.threshold)
+            candidates.append((f"codec {fmt}+{compression}", codec.dumps, codec.loads))
+
+    for shots in args.shots:
+        payload = project_payload(shots)
+        print(f"storyboard with {shots} shots")
+        for name, dumps, loads in candidates:
+            size, encode_us, decode_us = measure(dumps, loads, payload, args.rounds)
+            print(f"  {name:<22} {size / 1024:9.1f}KB | encode {encode_us:9.1f}us | decode {decode_us:9.1f}us")
+
+
+if __name__ == "__main__":
+    main()
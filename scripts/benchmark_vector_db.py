@@ -0,0 +1,108 @@
+"""InMemoryVectorDB 检索基准测试。
+
+用随机向量填充集合，测量插入耗时、无过滤/带过滤的 top-k 查询延迟，
+并在较小规模下与旧的逐向量 Python 余弦计算对比。
+
+用法:
+    python scripts/benchmark_vector_db.py
+    python scripts/benchmark_vector_db.py --sizes 10000 100000 --dim 384
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+# Add src to path
+ROOT = Path(__file__).resolve().parent.parent
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from lewis_ai_system.vector_db import EmbeddingVector, InMemoryVectorDB
+
+TENANTS = 100
+
+
+def naive_search(vectors: list[EmbeddingVector], query: list[float], limit: int) -> list[str]:
+    """旧实现：逐个向量计算余弦相似度后全量排序。"""
+    mag_q = sum(x * x for x in query) ** 0.5
+    scored = []
+    for vec in vectors:
+        dot = sum(x * y for x, y in zip(query, vec.vector))
+        mag_v = sum(x * x for x in vec.vector) ** 0.5
+        scored.append((vec.id, dot / (mag_q * mag_v) if mag_q and mag_v else 0.0))
+    scored.sort(key=lambda item: item[1], reverse=True)
+    return [vid for vid, _ in scored[:limit]]
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def run(size: int, dim: int, queries: int, limit: int, baseline_max: int) -> None:
+    rng = np.random.default_rng(size)
+    data = rng.normal(size=(size, dim)).astype(np.float32)
+    now = datetime.now(timezone.utc)
+    vectors = [
+        EmbeddingVector(
+            id=f"v{i}",
+            vector=data[i],  # 行视图，避免为百万级向量构造 Python 列表
+            metadata={"user_id": f"u{i % TENANTS}"},
+            text="",
+            created_at=now,
+        )
+        for i in range(size)
+    ]
+
+    db = InMemoryVectorDB()
+    start = time.perf_counter()
+    await db.insert("bench", vectors)
+    insert_s = time.perf_counter() - start
+
+    probes = rng.normal(size=(queries, dim)).astype(np.float32)
+    plain, filtered = [], []
+    for query in probes:
+        start = time.perf_counter()
+        await db.search("bench", query, limit=limit)
+        plain.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        await db.search("bench", query, limit=limit, filters={"user_id": "u7"})
+        filtered.append((time.perf_counter() - start) * 1000)
+
+    print(
+        f"{size:>9,} x {dim:<4} insert {insert_s:7.2f}s | "
+        f"search p50 {statistics.median(plain):8.2f}ms p95 {percentile(plain, 0.95):8.2f}ms | "
+        f"filtered p50 {statistics.median(filtered):7.2f}ms"
+    )
+
+    if size <= baseline_max:
+        sample = [EmbeddingVector(v.id, v.vector.tolist(), v.metadata, v.text, v.created_at) for v in vectors]
+        start = time.perf_counter()
+        expected = naive_search(sample, probes[0].tolist(), limit)
+        naive_ms = (time.perf_counter() - start) * 1000
+        got = [vec.id for vec, _ in await db.search("bench", probes[0], limit=limit)]
+        print(f"{'':>16} python baseline {naive_ms:10.2f}ms | same top-{limit}: {got == expected}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--baseline-max", type=int, default=100_000, help="只在不超过该规模时运行旧实现对比")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        asyncio.run(run(size, args.dim, args.queries, args.limit, args.baseline_max))
+
+
+if __name__ == "__main__":
+    main()
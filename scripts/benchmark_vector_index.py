@@ -0,0 +1,91 @@
+"""IVF 近似检索的召回率-延迟基准测试。
+
+先用精确检索得到真实 top-k，再对不同 nprobe 测量 recall@k 与查询延迟。
+默认使用带聚类结构的合成数据（更接近真实嵌入）；--uniform 使用纯随机向量，
+这是 IVF 的最差情况。
+
+用法:
+    python scripts/benchmark_vector_index.py
+    python scripts/benchmark_vector_index.py --size 1000000 --nprobe 4 16 64
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+# Add src to path
+ROOT = Path(__file__).resolve().parent.parent
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from lewis_ai_system.vector_db import EmbeddingVector, InMemoryVectorDB
+
+
+def make_data(rng: np.random.Generator, size: int, dim: int, uniform: bool) -> np.ndarray:
+    if uniform:
+        return rng.normal(size=(size, dim)).astype(np.float32)
+    centers = rng.normal(size=(max(size // 1000, 16), dim))
+    labels = rng.integers(len(centers), size=size)
+    return (centers[labels] + 0.35 * rng.normal(size=(size, dim))).astype(np.float32)
+
+
+async def timed_search(db: InMemoryVectorDB, queries: np.ndarray, limit: int) -> tuple[list[set[str]], list[float]]:
+    hits, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results = await db.search("bench", query, limit=limit)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits.append({vec.id for vec, _ in results})
+    return hits, latencies
+
+
+async def run(args: argparse.Namespace) -> None:
+    rng = np.random.default_rng(0)
+    data = make_data(rng, args.size, args.dim, args.uniform)
+    queries = data[rng.choice(args.size, args.queries, replace=False)] + 0.05 * rng.normal(
+        size=(args.queries, args.dim)
+    ).astype(np.float32)
+    now = datetime.now(timezone.utc)
+    vectors = [EmbeddingVector(f"v{i}", data[i], {}, "", now) for i in range(args.size)]
+
+    exact = InMemoryVectorDB(index_type="flat")
+    await exact.insert("bench", vectors)
+    truth, flat_ms = await timed_search(exact, queries, args.limit)
+    del exact
+
+    db = InMemoryVectorDB(index_type="ivf", index_options={"nlist": args.nlist, "min_train_size": 1})
+    await db.insert("bench", vectors)
+    start = time.perf_counter()
+    await db.wait_for_maintenance()
+    index = db.collections["bench"].index
+    print(f"{args.size:,} x {args.dim}, IVF nlist={index.cells}, trained in {time.perf_counter() - start:.2f}s")
+    print(f"{'flat':>10}  recall@{args.limit} 1.000  p50 {statistics.median(flat_ms):8.2f}ms")
+
+    for nprobe in args.nprobe:
+        index.nprobe = nprobe
+        found, latencies = await timed_search(db, queries, args.limit)
+        recall = statistics.mean(len(f & t) / len(t) for f, t in zip(found, truth))
+        print(f"{'nprobe=' + str(nprobe):>10}  recall@{args.limit} {recall:.3f}  p50 {statistics.median(latencies):8.2f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0, help="0 表示 sqrt(size)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--uniform", action="store_true", help="使用无聚类结构的随机向量")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""int8 向量量化的内存与召回率基准测试。
+
+对聚类分布的随机向量分别构建 float32 精确检索和 int8 量化检索，
+比较常驻向量字节数、查询延迟以及不同重排倍数下相对精确检索的 recall@k。
+
+用法:
+    python scripts/benchmark_vector_quantization.py
+    python scripts/benchmark_vector_quantization.py --sizes 100000 --dim 384 --rerank 1 2 4 8
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+# Add src to path
+ROOT = Path(__file__).resolve().parent.parent
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from lewis_ai_system.vector_db import EmbeddingVector, InMemoryVectorDB
+
+
+def clustered(rng: np.random.Generator, rows: int, dim: int, clusters: int = 64) -> np.ndarray:
+    centers = rng.normal(size=(clusters, dim))
+    return (centers[rng.integers(clusters, size=rows)] + 0.3 * rng.normal(size=(rows, dim))).astype(np.float32)
+
+
+async def search_all(db: InMemoryVectorDB, probes: np.ndarray, limit: int) -> tuple[list[set[str]], list[float]]:
+    results, latencies = [], []
+    for query in probes:
+        start = time.perf_counter()
+        hits = await db.search("bench", query, limit=limit)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append({vec.id for vec, _ in hits})
+    return results, latencies
+
+
+async def run(size: int, dim: int, queries: int, limit: int, rerank_factors: list[int]) -> None:
+    rng = np.random.default_rng(size)
+    data = clustered(rng, size, dim)
+    now = datetime.now(timezone.utc)
+    vectors = [EmbeddingVector(id=f"v{i}", vector=data[i], metadata={}, text="", created_at=now) for i in range(size)]
+    probes = data[rng.choice(size, queries, replace=False)] + 0.1 * rng.normal(size=(queries, dim)).astype(np.float32)
+
+    exact = InMemoryVectorDB(index_type="flat", quantization="none")
+    await exact.insert("bench", vectors)
+    expected, exact_ms = await search_all(exact, probes, limit)
+    float_mb = exact.collections["bench"].matrix_view().nbytes / 1024 / 1024
+    print(f"{size:>9,} x {dim:<4} float32 {float_mb:8.1f}MB | search p50 {statistics.median(exact_ms):7.2f}ms")
+
+    for factor in rerank_factors:
+        db = InMemoryVectorDB(
+            index_type="flat",
+            quantization="int8",
+            quantization_options={"min_train_size": 0, "rerank_factor": factor},
+        )
+        await db.insert("bench", vectors)
+        await db.wait_for_maintenance()
+        got, latencies = await search_all(db, probes, limit)
+        recall = sum(len(a & b) for a, b in zip(got, expected)) / (limit * queries)
+        codes_mb = db.collections["bench"].quantizer.nbytes / 1024 / 1024
+        print(
+            f"{'':>16} int8 rerank x{factor:<2} codes {codes_mb:8.1f}MB | "
+            f"search p50 {statistics.median(latencies):7.2f}ms | recall@{limit} {recall:.3f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--rerank", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        asyncio.run(run(size, args.dim, args.queries, args.limit, args.rerank))
+
+
+if __name__ == "__main__":
+    main()
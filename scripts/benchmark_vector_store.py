@@ -0,0 +1,115 @@
+"""PersistentVectorDB 启动时间与常驻内存基准测试。
+
+为每个规模写入一个持久化集合，然后在新的子进程中重新打开它，
+测量打开耗时、首次查询延迟以及打开前后的常驻内存 (RSS)。
+打开耗时和 RSS 增量应当基本不随集合规模增长。
+
+用法:
+    python scripts/benchmark_vector_store.py
+    python scripts/benchmark_vector_store.py --sizes 10000 100000 --dim 384
+"""
+
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+# Add src to path
+ROOT = Path(__file__).resolve().parent.parent
+SRC = ROOT / "src"
+if str(SRC) not in sys.path:
+    sys.path.insert(0, str(SRC))
+
+from lewis_ai_system.local_vector_store import PersistentVectorDB
+from lewis_ai_system.vector_db import EmbeddingVector
+
+TENANTS = 100
+BATCH = 10_000
+
+
+def rss_mb() -> float:
+    """当前进程的常驻内存（Linux 读取 /proc，其他平台返回 0）。"""
+    try:
+        pages = int(Path("/proc/self/statm").read_text().split()[1])
+    except OSError:
+        return 0.0
+    return pages * 4096 / 1024 / 1024
+
+
+async def populate(path: Path, size: int, dim: int) -> float:
+    rng = np.random.default_rng(size)
+    now = datetime.now(timezone.utc)
+    db = PersistentVectorDB(path, index_type="flat", sync_writes=False)
+    start = time.perf_counter()
+    for offset in range(0, size, BATCH):
+        data = rng.normal(size=(min(BATCH, size - offset), dim)).astype(np.float32)
+        await db.insert(
+            "bench",
+            [
+                EmbeddingVector(
+                    id=f"v{offset + i}",
+                    vector=row,
+                    metadata={"user_id": f"u{(offset + i) % TENANTS}"},
+                    text="",
+                    created_at=now,
+                )
+                for i, row in enumerate(data)
+            ],
+        )
+    elapsed = time.perf_counter() - start
+    await db.close()
+    return elapsed
+
+
+async def probe(path: Path, dim: int) -> dict:
+    """在子进程中执行：打开已有存储并做一次查询。"""
+    before = rss_mb()
+    start = time.perf_counter()
+    db = PersistentVectorDB(path, index_type="flat")
+    open_ms = (time.perf_counter() - start) * 1000
+    opened = rss_mb()
+    query = np.random.default_rng(0).normal(size=dim).astype(np.float32)
+    start = time.perf_counter()
+    await db.search("bench", query, limit=10, filters={"user_id": "u7"})
+    query_ms = (time.perf_counter() - start) * 1000
+    await db.close()
+    return {"open_ms": open_ms, "query_ms": query_ms, "rss_delta_mb": opened - before}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--probe", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        print(json.dumps(asyncio.run(probe(args.probe, args.dim))))
+        return
+
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            insert_s = asyncio.run(populate(Path(tmp), size, args.dim))
+            output = subprocess.run(
+                [sys.executable, __file__, "--probe", tmp, "--dim", str(args.dim)],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(
+                f"{size:>9,} x {args.dim:<4} insert {insert_s:7.2f}s | "
+                f"open {result['open_ms']:7.2f}ms | rss +{result['rss_delta_mb']:6.1f}MB | "
+                f"filtered query {result['query_ms']:7.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
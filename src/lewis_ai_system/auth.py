@@ -13,6 +13,7 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 
 from .config import settings
+from .rate_limit import rate_limiter
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -142,69 +143,17 @@ async def get_current_user_optional(
     return await get_current_user(credentials)
 
 
-class RateLimiter:
-    """Simple in-memory rate limiter."""
-    
-    def __init__(self, requests_per_minute: int = 60):
-        self.requests_per_minute = requests_per_minute
-        self._requests: dict[str, list[datetime]] = {}
-    
-    def check_rate_limit(self, user_id: str) -> bool:
-        """Check if user is within rate limit.
-        
-        Returns:
-            bool: True if within limit, False if exceeded
-        """
-        now = datetime.utcnow()
-        cutoff = now - timedelta(minutes=1)
-        
-        # Get user's recent requests
-        if user_id not in self._requests:
-            self._requests[user_id] = []
-        
-        # Remove old requests
-        self._requests[user_id] = [
-            req_time for req_time in self._requests[user_id]
-            if req_time > cutoff
-        ]
-        
-        # Check limit
-        if len(self._requests[user_id]) >= self.requests_per_minute:
-            return False
-        
-        # Record this request
-        self._requests[user_id].append(now)
-        return True
-    
-    def cleanup_old_entries(self):
-        """Remove entries older than 1 minute."""
-        now = datetime.utcnow()
-        cutoff = now - timedelta(minutes=1)
-        
-        for user_id in list(self._requests.keys()):
-            self._requests[user_id] = [
-                req_time for req_time in self._requests[user_id]
-                if req_time > cutoff
-            ]
-            
-            if not self._requests[user_id]:
-                del self._requests[user_id]
-
-
-# Global rate limiter instance
-rate_limiter = RateLimiter(requests_per_minute=settings.rate_limit_per_minute)
-
-
 async def check_rate_limit(user: dict = Security(get_current_user)):
-    """FastAPI dependency for rate limiting."""
+    """FastAPI dependency for per-user rate limiting (shared across replicas via Redis)."""
     if not settings.rate_limit_enabled:
         return user
     
-    user_id = user["user_id"]
-    if not rate_limiter.check_rate_limit(user_id):
+    result = await rate_limiter.hit(f"user:{user['user_id']}", settings.rate_limit_per_minute, 60)
+    if not result.allowed:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="Rate limit exceeded. Please try again later.",
+            headers=result.headers(),
         )
     
     return user
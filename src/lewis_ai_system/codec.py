@@ -0,0 +1,174 @@
+"""Redis 缓存值、会话状态与 ARQ 任务载荷的二进制编码。
+
+编码结果以两字节头开始：版本字节 ``0x01`` 加一个标志字节（低 4 位为序列化格式，
+高 4 位为压缩算法），之后是正文::
+
+    0x01 | compression << 4 | format | body
+
+- 格式：``json``（安装了 orjson 时用 orjson，否则标准库 json）或 ``msgpack``。
+- 压缩：正文不小于 ``compress_threshold`` 字节时用 ``zlib`` 或 ``zstd``
+  压缩，压缩后没变小则保留原文。
+- 旧数据：不以版本字节开头的值交给 ``legacy_loads``（缓存为 JSON 文本，
+  任务队列为 pickle），所以新版本可以直接读取升级前写入的值。
+  ``format="legacy"`` 时按旧格式写入，供滚动升级的第一阶段使用。
+
+msgpack、zstandard、orjson 都是可选依赖，缺失时回退到可用的实现并记录警告。
+"""
+
+from __future__ import annotations
+
+import json
+import zlib
+from datetime import date, datetime
+from typing import Any, Callable
+from uuid import UUID
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    orjson = None
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+    msgpack = None
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+    zstandard = None
+
+from .config import settings
+from .instrumentation import get_logger
+
+logger = get_logger()
+
+CODEC_VERSION = 0x01
+
+_FORMATS = {"json": 0x0, "msgpack": 0x1}
+_COMPRESSIONS = {"none": 0x0, "zlib": 0x1, "zstd": 0x2}
+_FORMAT_NAMES = {v: k for k, v in _FORMATS.items()}
+_COMPRESSION_NAMES = {v: k for k, v in _COMPRESSIONS.items()}
+
+
+class CodecError(ValueError):
+    """Raised when a payload cannot be decoded."""
+
+
+def _default(obj: Any) -> Any:
+    # orjson 原生支持 datetime/UUID；标准库 json 与 msgpack 需要手动转换
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+def _json_dumps(value: Any) -> bytes:
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=_default, separators=(",", ":")).encode()
+
+
+def _json_loads(body: bytes | str) -> Any:
+    return orjson.loads(body) if ORJSON_AVAILABLE else json.loads(body)
+
+
+def _legacy_json_dumps(value: Any) -> bytes:
+    return json.dumps(value).encode()
+
+
+class Codec:
+    """Versioned serializer with optional compression above a size threshold."""
+
+    def __init__(
+        self,
+        format: str = "json",
+        *,
+        compression: str = "none",
+        compress_threshold: int = 4096,
+        legacy_dumps: Callable[[Any], bytes] = _legacy_json_dumps,
+        legacy_loads: Callable[[bytes], Any] = _json_loads,
+    ):
+        if format not in _FORMATS and format != "legacy":
+            raise ValueError(f"Unknown payload codec: {format}")
+        if compression not in _COMPRESSIONS:
+            raise ValueError(f"Unknown payload compression: {compression}")
+        if format == "msgpack" and not MSGPACK_AVAILABLE:
+            logger.warning("msgpack not installed, falling back to JSON payloads")
+            format = "json"
+        if compression == "zstd" and not ZSTD_AVAILABLE:
+            logger.warning("zstandard not installed, falling back to zlib compression")
+            compression = "zlib"
+        self.format = format
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self.legacy_dumps = legacy_dumps
+        self.legacy_loads = legacy_loads
+        self._zstd_compressor = zstandard.ZstdCompressor() if compression == "zstd" else None
+
+    def dumps(self, value: Any) -> bytes:
+        if self.format == "legacy":
+            return self.legacy_dumps(value)
+        if self.format == "msgpack":
+            body = msgpack.packb(value, default=_default, use_bin_type=True)
+        else:
+            body = _json_dumps(value)
+
+        compression = "none"
+        if self.compression != "none" and len(body) >= self.compress_threshold:
+            if self.compression == "zstd":
+                packed = self._zstd_compressor.compress(body)
+            else:
+                packed = zlib.compress(body)
+            if len(packed) < len(body):
+                body, compression = packed, self.compression
+
+        flags = _COMPRESSIONS[compression] << 4 | _FORMATS[self.format]
+        return bytes((CODEC_VERSION, flags)) + body
+
+    def loads(self, data: bytes | str) -> Any:
+        if isinstance(data, str):
+            return self.legacy_loads(data.encode())
+        if not data or data[0] != CODEC_VERSION:
+            return self.legacy_loads(data)
+        if len(data) < 2:
+            raise CodecError("Truncated payload header")
+
+        format = _FORMAT_NAMES.get(data[1] & 0x0F)
+        compression = _COMPRESSION_NAMES.get(data[1] >> 4)
+        if format is None or compression is None:
+            raise CodecError(f"Unknown payload flags: {data[1]:#04x}")
+
+        body = memoryview(data)[2:]
+        if compression == "zlib":
+            body = zlib.decompress(body)
+        elif compression == "zstd":
+            if not ZSTD_AVAILABLE:
+                raise CodecError("Payload is zstd-compressed but zstandard is not installed")
+            body = zstandard.ZstdDecompressor().decompress(body)
+
+        if format == "msgpack":
+            if not MSGPACK_AVAILABLE:
+                raise CodecError("Payload is msgpack-encoded but msgpack is not installed")
+            return msgpack.unpackb(body, raw=False, strict_map_key=False)
+        return _json_loads(bytes(body))
+
+
+def build_codec(**kwargs: Any) -> Codec:
+    """Create the configured codec; ``kwargs`` override settings (e.g. ``legacy_loads``)."""
+    options = {
+        "format": settings.payload_codec,
+        "compression": settings.payload_compression,
+        "compress_threshold": settings.payload_compression_threshold,
+    }
+    options.update(kwargs)
+    return Codec(options.pop("format"), **options)
@@ -42,6 +42,18 @@ class SandboxSettings(BaseModel):
     max_memory_mb: int = 512
     max_cpu_seconds: int = 60
     max_file_size_mb: int = 10
+    # 预热沙箱池配置
+    # auto: 配置了 E2B_API_KEY 时使用 e2b；本地进程池不是强隔离环境，
+    # 必须显式设置 SANDBOX_BACKEND=local 才会启用
+    backend: Literal["auto", "e2b", "local"] = "auto"
+    pool_min_size: int = 1
+    pool_max_size: int = 8
+    pool_max_executions_per_instance: int = 50
+    pool_health_check_interval_seconds: int = 30
+    # 绑定到通用会话的有状态沙箱内核
+    session_idle_ttl_seconds: int = 600
+    session_memory_cap_mb: int = 256
+    max_session_kernels: int = 32
 
 
 class TenantSandboxPolicy(BaseModel):
@@ -77,6 +89,8 @@ class Settings(BaseSettings):
     api_version: str = "0.2.0"
     budget: BudgetSettings = BudgetSettings()
     sandbox: SandboxSettings = SandboxSettings()
+    # 覆盖 sandbox.backend（auto / e2b / local）
+    sandbox_backend: Literal["auto", "e2b", "local"] | None = Field(default=None, alias="SANDBOX_BACKEND")
     creative_preview_cost_ratio: float = 0.3
     
     # 数据库配置
@@ -85,7 +99,39 @@ class Settings(BaseSettings):
     # Redis 缓存配置
     redis_url: str | None = Field(default=None, alias="REDIS_URL")
     redis_enabled: bool = Field(default=True, alias="REDIS_ENABLED")
-    
+    # Redis 前的进程内 L1 缓存，跨副本失效通过 Redis pub/sub 广播
+    near_cache_enabled: bool = Field(default=True, alias="NEAR_CACHE_ENABLED")
+    near_cache_max_entries: int = Field(default=10_000, alias="NEAR_CACHE_MAX_ENTRIES")
+    near_cache_ttl_seconds: float = Field(default=30.0, alias="NEAR_CACHE_TTL_SECONDS")
+    near_cache_channel: str = Field(default="cache:invalidate", alias="NEAR_CACHE_CHANNEL")
+    # 计数器、限流窗口和锁只在 Redis 上读写，这些前缀的 key 不进 L1，写入时也不广播失效
+    near_cache_bypass_prefixes: list[str] | str = Field(
+        default_factory=lambda: ["ratelimit:", "lock:", "metrics:"],
+        alias="NEAR_CACHE_BYPASS_PREFIXES",
+    )
+    # 缓存值、会话状态与 ARQ 任务载荷的编码；滚动升级期间先用 legacy（旧格式）部署，
+    # 所有副本都能读带版本字节的新格式后再切换
+    payload_codec: Literal["legacy", "json", "msgpack"] = Field(default="json", alias="PAYLOAD_CODEC")
+    payload_compression: Literal["none", "zlib", "zstd"] = Field(default="none", alias="PAYLOAD_COMPRESSION")
+    payload_compression_threshold: int = Field(default=4096, alias="PAYLOAD_COMPRESSION_THRESHOLD")
+
+    # ARQ 任务队列：命名队列按权重分配 worker 并发，队列内按租户加权公平调度
+    task_queue_weights: dict[str, int] = Field(
+        default_factory=lambda: {"interactive": 4, "preview": 3, "final": 2, "batch": 1},
+        alias="TASK_QUEUE_WEIGHTS",
+    )
+    task_queue_max_jobs: int = Field(default=10, alias="TASK_QUEUE_MAX_JOBS")
+    task_queue_tenant_weights: dict[str, float] = Field(default_factory=dict, alias="TASK_QUEUE_TENANT_WEIGHTS")
+    task_queue_job_expires_seconds: int = Field(default=86_400, alias="TASK_QUEUE_JOB_EXPIRES_SECONDS")
+    # 创作阶段（简报/脚本/分镜/逐镜头渲染/QC/分发）交给 worker 执行，API 立即返回；
+    # 任务队列未配置时仍在请求内执行
+    creative_stage_workers_enabled: bool = Field(default=True, alias="CREATIVE_STAGE_WORKERS_ENABLED")
+    # 批量提交：单批项目数上限与每批同时在生成的项目数
+    creative_batch_max_size: int = Field(default=500, alias="CREATIVE_BATCH_MAX_SIZE")
+    creative_batch_concurrency: int = Field(default=5, alias="CREATIVE_BATCH_CONCURRENCY")
+    # 一致性批量操作流式接口允许客户端指定的最大并发数
+    batch_processing_max_concurrency: int = Field(default=20, alias="BATCH_PROCESSING_MAX_CONCURRENCY")
+
     # 对象存储 (S3 兼容)
     s3_endpoint_url: str | None = Field(default=None, alias="S3_ENDPOINT_URL")
     s3_access_key: str | None = Field(default=None, alias="S3_ACCESS_KEY")
@@ -94,9 +140,32 @@ class Settings(BaseSettings):
     s3_region: str = Field(default="us-east-1", alias="S3_REGION")
     
     # 向量数据库
-    vector_db_type: Literal["weaviate", "qdrant", "pinecone", "none"] = Field(default="none", alias="VECTOR_DB_TYPE")
+    vector_db_type: Literal["weaviate", "qdrant", "pinecone", "local", "none"] = Field(default="none", alias="VECTOR_DB_TYPE")
     vector_db_url: str | None = Field(default=None, alias="VECTOR_DB_URL")
     vector_db_api_key: str | None = Field(default=None, alias="VECTOR_DB_API_KEY")
+    # VECTOR_DB_TYPE=local 时向量以内存映射文件加 SQLite 元数据持久化在此目录
+    vector_store_path: Path = Field(default=Path("data/vectors"), alias="VECTOR_STORE_PATH")
+    # 后台清理过期向量的间隔，0 表示不启动清理任务
+    vector_expiry_sweep_interval_seconds: int = Field(default=300, alias="VECTOR_EXPIRY_SWEEP_INTERVAL_SECONDS")
+    # 本地向量检索索引：flat 为精确检索，ivf 在行数达到训练阈值后启用近似检索
+    vector_index_type: Literal["flat", "ivf"] = Field(default="ivf", alias="VECTOR_INDEX_TYPE")
+    vector_index_nlist: int = Field(default=0, alias="VECTOR_INDEX_NLIST")  # 0 表示 sqrt(行数)
+    vector_index_nprobe: int = Field(default=8, alias="VECTOR_INDEX_NPROBE")
+    vector_index_min_train_size: int = Field(default=100_000, alias="VECTOR_INDEX_MIN_TRAIN_SIZE")
+    # int8 标量量化：查询先扫描量化码，再对前 limit*rerank_factor 个候选重排（内存库用 float16 行，本地持久库用磁盘上的 float32 行）
+    vector_quantization: Literal["none", "int8"] = Field(default="none", alias="VECTOR_QUANTIZATION")
+    vector_quantization_min_rows: int = Field(default=10_000, alias="VECTOR_QUANTIZATION_MIN_ROWS")
+    vector_quantization_rerank_factor: int = Field(default=4, alias="VECTOR_QUANTIZATION_RERANK_FACTOR")
+
+    # 文本嵌入：hashing 为本地哈希词频向量，openai 调用兼容 OpenAI 的 /embeddings 接口
+    embedding_provider: Literal["hashing", "openai"] = Field(default="hashing", alias="EMBEDDING_PROVIDER")
+    embedding_model: str = Field(default="text-embedding-3-small", alias="EMBEDDING_MODEL")
+    embedding_dimension: int = Field(default=384, alias="EMBEDDING_DIMENSION")
+    embedding_api_base_url: str = Field(default="https://api.openai.com/v1", alias="EMBEDDING_API_BASE_URL")
+    embedding_batch_size: int = Field(default=64, alias="EMBEDDING_BATCH_SIZE")
+    embedding_cache_size: int = Field(default=10_000, alias="EMBEDDING_CACHE_SIZE")
+    # 通用模式记忆检索（含查询嵌入）的超时；未设置时按嵌入提供方取默认值
+    memory_retrieval_timeout_seconds: float | None = Field(default=None, alias="MEMORY_RETRIEVAL_TIMEOUT_SECONDS")
     
     # 安全性
     secret_key: str = Field(default="dev-secret-key-change-in-production", alias="SECRET_KEY")
@@ -117,6 +186,10 @@ class Settings(BaseSettings):
     # 速率限制
     rate_limit_enabled: bool = Field(default=True, alias="RATE_LIMIT_ENABLED")
     rate_limit_per_minute: int = Field(default=60, alias="RATE_LIMIT_PER_MINUTE")
+    rate_limit_algorithm: Literal["gcra", "sliding_window"] = Field(default="gcra", alias="RATE_LIMIT_ALGORITHM")
+    # 按客户端（API Key 或 IP）限流的 HTTP 中间件，0 表示关闭
+    rate_limit_middleware_per_minute: int = Field(default=0, alias="RATE_LIMIT_MIDDLEWARE_PER_MINUTE")
+    rate_limit_local_max_keys: int = Field(default=100_000, alias="RATE_LIMIT_LOCAL_MAX_KEYS")
     service_api_keys: list[str] | str = Field(default_factory=list, alias="SERVICE_API_KEYS")
 
     openrouter_api_key: str | None = Field(default=None, alias="OPENROUTER_API_KEY")
@@ -184,6 +257,8 @@ class Settings(BaseSettings):
                 provider.api_key = self.runway_api_key
             if provider.name == "pika" and self.pika_api_key:
                 provider.api_key = self.pika_api_key
+        if self.sandbox_backend:
+            self.sandbox.backend = self.sandbox_backend
 
     @model_validator(mode="after")
     def normalize_lists(self) -> "Settings":
@@ -196,6 +271,9 @@ class Settings(BaseSettings):
         if isinstance(self.service_api_keys, str):
             values = [item.strip() for item in self.service_api_keys.split(",") if item.strip()]
             self.service_api_keys = values
+        if isinstance(self.near_cache_bypass_prefixes, str):
+            values = [item.strip() for item in self.near_cache_bypass_prefixes.split(",") if item.strip()]
+            self.near_cache_bypass_prefixes = values
         return self
 
     @model_validator(mode="after")
@@ -3,25 +3,170 @@
 from __future__ import annotations
 
 import asyncio
+import functools
 import logging
-from typing import Any
+from typing import Any, AsyncIterator, Awaitable, Callable, Sequence
 
 from ..config import settings
 from ..instrumentation import get_logger
 from .consistency_manager import consistency_manager
+from .models import CreativeProject
 from .repository import creative_repository
 
 logger = get_logger()
 
 
+class ProjectBatchLoader:
+    """按块读取批量操作涉及的项目，并把修改合并写回。
+
+    第一次访问某个块里的项目时用一次 ``get_many`` 读取整块；``save`` 只登记
+    修改，``flush`` 用一次 ``upsert_many`` 写回。只保留最近两个块，内存不随
+    ID 列表增长。
+    """
+
+    def __init__(self, project_ids: Sequence[str], chunk_size: int) -> None:
+        self.project_ids = project_ids
+        self.chunk_size = max(1, chunk_size)
+        self._chunks: dict[int, asyncio.Future[dict[str, CreativeProject]]] = {}
+        self._dirty: dict[str, CreativeProject] = {}
+
+    async def get(self, project_id: str, index: int) -> CreativeProject:
+        chunk = index // self.chunk_size
+        if chunk not in self._chunks:
+            start = chunk * self.chunk_size
+            self._chunks[chunk] = asyncio.ensure_future(
+                creative_repository.get_many(self.project_ids[start : start + self.chunk_size])
+            )
+            self._chunks.pop(chunk - 2, None)
+        # shield：一个等待者被取消不应取消整块的读取
+        projects = await asyncio.shield(self._chunks[chunk])
+        if project_id not in projects:
+            raise KeyError(f"Project {project_id} not found")
+        return projects[project_id]
+
+    def save(self, project: CreativeProject) -> None:
+        self._dirty[project.id] = project
+
+    @property
+    def dirty_ids(self) -> set[str]:
+        return set(self._dirty)
+
+    async def flush(self) -> set[str]:
+        """Write pending changes in one ``upsert_many``; returns the ids written."""
+        if not self._dirty:
+            return set()
+        projects, self._dirty = list(self._dirty.values()), {}
+        await creative_repository.upsert_many(projects)
+        return {project.id for project in projects}
+
+    def close(self) -> None:
+        for future in self._chunks.values():
+            future.cancel()
+
+
 class BatchProcessingService:
-    """批量处理服务，支持一致性控制的批量操作。"""
+    """批量处理服务，支持一致性控制的批量操作。
+
+    每种操作都有两种入口：``iter_*`` 异步生成器在每个项目完成时立即产出结果，
+    ``batch_*`` 收集全部结果后返回汇总（基于同一个生成器实现）。
+    """
 
     def __init__(self) -> None:
         """初始化批量处理服务。"""
-        self.max_concurrent_tasks = 5  # 最大并发任务数
+        self.max_concurrent_tasks = 5  # 默认并发数
+        self.chunk_size = 100  # 每次 get_many 读取的项目数
         self.batch_timeout = 300  # 批量操作超时时间（秒）
 
+    async def stream_results(
+        self,
+        handler: Callable[[str, int, ProjectBatchLoader], Awaitable[dict[str, Any]]],
+        project_ids: Sequence[str],
+        *,
+        concurrency: int | None = None,
+        cursor: int = 0,
+        chunk_size: int | None = None,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Run ``handler`` over ``project_ids[cursor:]`` and yield each result as it completes.
+
+        At most ``concurrency`` projects are in flight; ids are pulled into that
+        window one at a time, so memory does not grow with the list length.
+        Handlers read projects through a :class:`ProjectBatchLoader` (one
+        ``get_many`` per chunk); projects they ``save`` are written with one
+        ``upsert_many`` per round of completions, before those results are
+        yielded.
+
+        Each result carries its ``index`` and the resumable ``cursor``: every
+        project before it has finished and been saved, so a client that
+        disconnects can pass the last cursor it saw and only redo projects from
+        there. Closing the generator cancels the projects still in flight.
+        """
+        max_concurrent = concurrency or self.max_concurrent_tasks
+        loader = ProjectBatchLoader(project_ids, chunk_size or self.chunk_size)
+        in_flight: dict[asyncio.Task, int] = {}
+        finished: set[int] = set()
+        next_index = low_watermark = max(0, cursor)
+        try:
+            while next_index < len(project_ids) or in_flight:
+                while next_index < len(project_ids) and len(in_flight) < max_concurrent:
+                    task = asyncio.ensure_future(handler(project_ids[next_index], next_index, loader))
+                    in_flight[task] = next_index
+                    next_index += 1
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+
+                round_results: list[tuple[int, dict[str, Any]]] = []
+                for task in sorted(done, key=in_flight.__getitem__):
+                    index = in_flight.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        result = {"status": "error", "error": f"任务执行异常: {str(e)}"}
+                    round_results.append((index, {"project_id": project_ids[index], **result}))
+                await self._flush_round(loader, round_results)
+
+                for index, result in round_results:
+                    finished.add(index)
+                    while low_watermark in finished:
+                        finished.discard(low_watermark)
+                        low_watermark += 1
+                    yield {**result, "index": index, "cursor": low_watermark}
+        finally:
+            for task in in_flight:
+                task.cancel()
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+            loader.close()
+
+    async def _flush_round(
+        self, loader: ProjectBatchLoader, round_results: list[tuple[int, dict[str, Any]]]
+    ) -> None:
+        """写回本轮完成的项目；写入失败时把这些项目的结果标为错误。"""
+        pending = loader.dirty_ids
+        try:
+            await loader.flush()
+        except Exception as e:
+            logger.error(f"批量保存 {len(pending)} 个项目失败: {e}")
+            for _, result in round_results:
+                if result["project_id"] in pending:
+                    result.update(status="error", error=f"保存失败: {str(e)}")
+
+    async def _collect(self, results: AsyncIterator[dict[str, Any]], project_ids: Sequence[str]) -> dict[str, Any]:
+        """按输入顺序收集 :meth:`stream_results` 的结果（去掉 index/cursor）。"""
+        collected: dict[str, dict[str, Any]] = {}
+        async for result in results:
+            result = {k: v for k, v in result.items() if k not in ("index", "cursor")}
+            collected[result["project_id"]] = result
+        return {pid: collected[pid] for pid in project_ids if pid in collected}
+
+    # ==================== 一致性评估 ====================
+    def iter_evaluate_consistency(
+        self,
+        project_ids: Sequence[str],
+        concurrency: int | None = None,
+        cursor: int = 0,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """逐个产出项目的一致性评估结果。"""
+        return self.stream_results(self._evaluate_project, project_ids, concurrency=concurrency, cursor=cursor)
+
     async def batch_evaluate_consistency(
         self,
         project_ids: list[str],
@@ -37,87 +182,75 @@ class BatchProcessingService:
             批量评估结果
         """
         logger.info(f"开始批量评估 {len(project_ids)} 个项目的一致性")
-
-        max_concurrent = concurrency or self.max_concurrent_tasks
-        semaphore = asyncio.Semaphore(max_concurrent)
-
-        async def evaluate_single_project(project_id: str) -> dict[str, Any]:
-            async with semaphore:
-                try:
-                    project = await creative_repository.get(project_id)
-
-                    # 收集分镜图片
-                    panel_images = [
-                        p.visual_reference_path
-                        for p in project.storyboard
-                        if p.visual_reference_path
-                    ]
-
-                    if len(panel_images) < 2:
-                        return {
-                            "project_id": project_id,
-                            "status": "skipped",
-                            "reason": "分镜图片不足，至少需要2张图片"
-                        }
-
-                    # 评估一致性
-                    consistency_result = await consistency_manager.evaluate_consistency(panel_images)
-
-                    # 更新项目一致性分数
-                    project.overall_consistency_score = consistency_result["overall_score"]
-                    await creative_repository.upsert(project)
-
-                    return {
-                        "project_id": project_id,
-                        "status": "success",
-                        "consistency_score": consistency_result["overall_score"],
-                        "character_consistency": consistency_result.get("character_consistency", 0),
-                        "scene_consistency": consistency_result.get("scene_consistency", 0),
-                        "style_consistency": consistency_result.get("style_consistency", 0),
-                        "recommendations": consistency_result.get("recommendations", [])
-                    }
-
-                except Exception as e:
-                    logger.error(f"评估项目 {project_id} 失败: {e}")
-                    return {
-                        "project_id": project_id,
-                        "status": "error",
-                        "error": str(e)
-                    }
-
-        # 执行批量评估
-        tasks = [evaluate_single_project(pid) for pid in project_ids]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # 处理结果
-        processed_results = {}
-        successful_evaluations = 0
-        total_processed = 0
-
-        for i, result in enumerate(results):
-            project_id = project_ids[i]
-            if isinstance(result, Exception):
-                processed_results[project_id] = {
-                    "status": "error",
-                    "error": f"任务执行异常: {str(result)}"
-                }
-            else:
-                processed_results[project_id] = result
-                total_processed += 1
-                if result["status"] == "success":
-                    successful_evaluations += 1
+        processed_results = await self._collect(self.iter_evaluate_consistency(project_ids, concurrency), project_ids)
+        successful_evaluations = sum(1 for r in processed_results.values() if r["status"] == "success")
 
         batch_result = {
             "total_projects": len(project_ids),
-            "total_processed": total_processed,
+            "total_processed": len(processed_results),
             "successful_evaluations": successful_evaluations,
             "results": processed_results,
             "batch_stats": self._calculate_batch_stats(processed_results)
         }
 
-        logger.info(f"批量评估完成: {successful_evaluations}/{total_processed} 成功")
+        logger.info(f"批量评估完成: {successful_evaluations}/{len(processed_results)} 成功")
         return batch_result
 
+    async def _evaluate_project(self, project_id: str, index: int, projects: ProjectBatchLoader) -> dict[str, Any]:
+        try:
+            project = await projects.get(project_id, index)
+
+            # 收集分镜图片
+            panel_images = [
+                p.visual_reference_path
+                for p in project.storyboard
+                if p.visual_reference_path
+            ]
+
+            if len(panel_images) < 2:
+                return {
+                    "project_id": project_id,
+                    "status": "skipped",
+                    "reason": "分镜图片不足，至少需要2张图片"
+                }
+
+            # 评估一致性
+            consistency_result = await consistency_manager.evaluate_consistency(panel_images)
+
+            # 更新项目一致性分数
+            project.overall_consistency_score = consistency_result["overall_score"]
+            projects.save(project)
+
+            return {
+                "project_id": project_id,
+                "status": "success",
+                "consistency_score": consistency_result["overall_score"],
+                "character_consistency": consistency_result.get("character_consistency", 0),
+                "scene_consistency": consistency_result.get("scene_consistency", 0),
+                "style_consistency": consistency_result.get("style_consistency", 0),
+                "recommendations": consistency_result.get("recommendations", [])
+            }
+
+        except Exception as e:
+            logger.error(f"评估项目 {project_id} 失败: {e}")
+            return {
+                "project_id": project_id,
+                "status": "error",
+                "error": str(e)
+            }
+
+    # ==================== 一致性自动重试 ====================
+    def iter_auto_retry_consistency(
+        self,
+        project_ids: Sequence[str],
+        max_retries: int = 2,
+        concurrency: int | None = None,
+        cursor: int = 0,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """逐个产出项目的一致性重试结果。"""
+        handler = functools.partial(self._retry_project, max_retries=max_retries)
+        return self.stream_results(handler, project_ids, concurrency=concurrency, cursor=cursor)
+
     async def batch_auto_retry_consistency(
         self,
         project_ids: list[str],
@@ -135,72 +268,64 @@ class BatchProcessingService:
             批量重试结果
         """
         logger.info(f"开始批量重试 {len(project_ids)} 个项目的一致性")
-
-        max_concurrent = concurrency or self.max_concurrent_tasks
-        semaphore = asyncio.Semaphore(max_concurrent)
-
-        async def retry_single_project(project_id: str) -> dict[str, Any]:
-            async with semaphore:
-                try:
-                    project = await creative_repository.get(project_id)
-
-                    # 执行验证和重试
-                    validation_result = await consistency_manager.validate_and_retry_project(
-                        project, max_retries=max_retries
-                    )
-
-                    # 保存更新
-                    await creative_repository.upsert(project)
-
-                    return {
-                        "project_id": project_id,
-                        "status": "success",
-                        "validation_result": validation_result,
-                        "improvement": validation_result.get("overall_improvement", 0),
-                        "final_score": project.overall_consistency_score
-                    }
-
-                except Exception as e:
-                    logger.error(f"重试项目 {project_id} 失败: {e}")
-                    return {
-                        "project_id": project_id,
-                        "status": "error",
-                        "error": str(e)
-                    }
-
-        # 执行批量重试
-        tasks = [retry_single_project(pid) for pid in project_ids]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # 处理结果
-        processed_results = {}
-        projects_improved = 0
-        total_processed = 0
-
-        for i, result in enumerate(results):
-            project_id = project_ids[i]
-            if isinstance(result, Exception):
-                processed_results[project_id] = {
-                    "status": "error",
-                    "error": f"任务执行异常: {str(result)}"
-                }
-            else:
-                processed_results[project_id] = result
-                total_processed += 1
-                if result.get("improvement", 0) > 0:
-                    projects_improved += 1
+        processed_results = await self._collect(
+            self.iter_auto_retry_consistency(project_ids, max_retries, concurrency), project_ids
+        )
+        projects_improved = sum(1 for r in processed_results.values() if r.get("improvement", 0) > 0)
 
         batch_result = {
             "total_projects": len(project_ids),
-            "total_processed": total_processed,
+            "total_processed": len(processed_results),
             "projects_improved": projects_improved,
             "results": processed_results,
             "batch_stats": self._calculate_retry_batch_stats(processed_results)
         }
 
-        logger.info(f"批量重试完成: {projects_improved}/{total_processed} 项目得到改善")
+        logger.info(f"批量重试完成: {projects_improved}/{len(processed_results)} 项目得到改善")
         return batch_result
 
+    async def _retry_project(
+        self, project_id: str, index: int, projects: ProjectBatchLoader, max_retries: int
+    ) -> dict[str, Any]:
+        try:
+            project = await projects.get(project_id, index)
+
+            # 执行验证和重试
+            validation_result = await consistency_manager.validate_and_retry_project(
+                project, max_retries=max_retries
+            )
+
+            # 保存更新
+            projects.save(project)
+
+            return {
+                "project_id": project_id,
+                "status": "success",
+                "validation_result": validation_result,
+                "improvement": validation_result.get("overall_improvement", 0),
+                "final_score": project.overall_consistency_score
+            }
+
+        except Exception as e:
+            logger.error(f"重试项目 {project_id} 失败: {e}")
+            return {
+                "project_id": project_id,
+                "status": "error",
+                "error": str(e)
+            }
+
+    # ==================== 重新生成 ====================
+    def iter_regenerate_consistency(
+        self,
+        project_ids: Sequence[str],
+        consistency_level: str = "medium",
+        concurrency: int | None = None,
+        cursor: int = 0,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """逐个产出项目的重新生成结果。"""
+        handler = functools.partial(self._regenerate_project, consistency_level=consistency_level)
+        return self.stream_results(handler, project_ids, concurrency=concurrency, cursor=cursor)
+
     async def batch_regenerate_consistency(
         self,
         project_ids: list[str],
@@ -218,88 +343,81 @@ class BatchProcessingService:
             批量重新生成结果
         """
         logger.info(f"开始批量重新生成 {len(project_ids)} 个项目，使用一致性级别: {consistency_level}")
-
-        max_concurrent = concurrency or self.max_concurrent_tasks
-        semaphore = asyncio.Semaphore(max_concurrent)
-
-        async def regenerate_single_project(project_id: str) -> dict[str, Any]:
-            async with semaphore:
-                try:
-                    from .workflow import creative_orchestrator
-
-                    project = await creative_repository.get(project_id)
-
-                    # 更新一致性级别
-                    project.consistency_level = consistency_level
-
-                    # 重新生成一致性种子
-                    project.consistency_seed = consistency_manager.generate_consistency_seed(project_id)
-
-                    # 清除旧的参考图片和特征
-                    project.reference_images = []
-                    for panel in project.storyboard:
-                        panel.consistency_score = None
-                        panel.character_features = None
-
-                    project.overall_consistency_score = None
-
-                    # 重新开始工作流
-                    project.mark_state("storyboard_pending")
-
-                    await creative_repository.upsert(project)
-
-                    # 触发重新生成
-                    updated_project = await creative_orchestrator.advance(project_id)
-
-                    return {
-                        "project_id": project_id,
-                        "status": "success",
-                        "new_consistency_level": consistency_level,
-                        "new_seed": project.consistency_seed,
-                        "new_state": updated_project.state
-                    }
-
-                except Exception as e:
-                    logger.error(f"重新生成项目 {project_id} 失败: {e}")
-                    return {
-                        "project_id": project_id,
-                        "status": "error",
-                        "error": str(e)
-                    }
-
-        # 执行批量重新生成
-        tasks = [regenerate_single_project(pid) for pid in project_ids]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # 处理结果
-        processed_results = {}
-        successful_regenerations = 0
-        total_processed = 0
-
-        for i, result in enumerate(results):
-            project_id = project_ids[i]
-            if isinstance(result, Exception):
-                processed_results[project_id] = {
-                    "status": "error",
-                    "error": f"任务执行异常: {str(result)}"
-                }
-            else:
-                processed_results[project_id] = result
-                total_processed += 1
-                if result["status"] == "success":
-                    successful_regenerations += 1
+        processed_results = await self._collect(
+            self.iter_regenerate_consistency(project_ids, consistency_level, concurrency), project_ids
+        )
+        successful_regenerations = sum(1 for r in processed_results.values() if r["status"] == "success")
 
         batch_result = {
             "total_projects": len(project_ids),
-            "total_processed": total_processed,
+            "total_processed": len(processed_results),
             "successful_regenerations": successful_regenerations,
             "consistency_level": consistency_level,
             "results": processed_results
         }
 
-        logger.info(f"批量重新生成完成: {successful_regenerations}/{total_processed} 成功")
+        logger.info(f"批量重新生成完成: {successful_regenerations}/{len(processed_results)} 成功")
         return batch_result
 
+    async def _regenerate_project(
+        self, project_id: str, index: int, projects: ProjectBatchLoader, consistency_level: str
+    ) -> dict[str, Any]:
+        try:
+            from .workflow import creative_orchestrator
+
+            project = await projects.get(project_id, index)
+
+            # 更新一致性级别
+            project.consistency_level = consistency_level
+
+            # 重新生成一致性种子
+            project.consistency_seed = consistency_manager.generate_consistency_seed(project_id)
+
+            # 清除旧的参考图片和特征
+            project.reference_images = []
+            for panel in project.storyboard:
+                panel.consistency_score = None
+                panel.character_features = None
+
+            project.overall_consistency_score = None
+
+            # 重新开始工作流
+            project.mark_state("storyboard_pending")
+
+            # advance 会从存储库重新读取项目，必须先单独写入
+            await creative_repository.upsert(project)
+
+            # 触发重新生成
+            updated_project = await creative_orchestrator.advance(project_id)
+
+            return {
+                "project_id": project_id,
+                "status": "success",
+                "new_consistency_level": consistency_level,
+                "new_seed": project.consistency_seed,
+                "new_state": updated_project.state
+            }
+
+        except Exception as e:
+            logger.error(f"重新生成项目 {project_id} 失败: {e}")
+            return {
+                "project_id": project_id,
+                "status": "error",
+                "error": str(e)
+            }
+
+    # ==================== 配置更新 ====================
+    def iter_update_consistency_config(
+        self,
+        project_ids: Sequence[str],
+        config_updates: dict[str, Any],
+        concurrency: int | None = None,
+        cursor: int = 0,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """逐个产出项目的配置更新结果。"""
+        handler = functools.partial(self._update_project, config_updates=config_updates)
+        return self.stream_results(handler, project_ids, concurrency=concurrency, cursor=cursor)
+
     async def batch_update_consistency_config(
         self,
         project_ids: list[str],
@@ -317,73 +435,53 @@ class BatchProcessingService:
             批量更新结果
         """
         logger.info(f"开始批量更新 {len(project_ids)} 个项目的一致性配置")
-
-        max_concurrent = concurrency or self.max_concurrent_tasks
-        semaphore = asyncio.Semaphore(max_concurrent)
-
-        async def update_single_project(project_id: str) -> dict[str, Any]:
-            async with semaphore:
-                try:
-                    project = await creative_repository.get(project_id)
-
-                    # 应用配置更新
-                    for key, value in config_updates.items():
-                        if hasattr(project, key):
-                            setattr(project, key, value)
-
-                    # 如果更新了参考信息，重新生成种子
-                    if any(key in config_updates for key in ["character_reference", "scene_reference"]):
-                        project.consistency_seed = consistency_manager.generate_consistency_seed(project_id)
-
-                    await creative_repository.upsert(project)
-
-                    return {
-                        "project_id": project_id,
-                        "status": "success",
-                        "config_updates": config_updates
-                    }
-
-                except Exception as e:
-                    logger.error(f"更新项目 {project_id} 配置失败: {e}")
-                    return {
-                        "project_id": project_id,
-                        "status": "error",
-                        "error": str(e)
-                    }
-
-        # 执行批量更新
-        tasks = [update_single_project(pid) for pid in project_ids]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # 处理结果
-        processed_results = {}
-        successful_updates = 0
-        total_processed = 0
-
-        for i, result in enumerate(results):
-            project_id = project_ids[i]
-            if isinstance(result, Exception):
-                processed_results[project_id] = {
-                    "status": "error",
-                    "error": f"任务执行异常: {str(result)}"
-                }
-            else:
-                processed_results[project_id] = result
-                total_processed += 1
-                if result["status"] == "success":
-                    successful_updates += 1
+        processed_results = await self._collect(
+            self.iter_update_consistency_config(project_ids, config_updates, concurrency), project_ids
+        )
+        successful_updates = sum(1 for r in processed_results.values() if r["status"] == "success")
 
         batch_result = {
             "total_projects": len(project_ids),
-            "total_processed": total_processed,
+            "total_processed": len(processed_results),
             "successful_updates": successful_updates,
             "config_updates": config_updates,
             "results": processed_results
         }
 
-        logger.info(f"批量配置更新完成: {successful_updates}/{total_processed} 成功")
+        logger.info(f"批量配置更新完成: {successful_updates}/{len(processed_results)} 成功")
         return batch_result
 
+    async def _update_project(
+        self, project_id: str, index: int, projects: ProjectBatchLoader, config_updates: dict[str, Any]
+    ) -> dict[str, Any]:
+        try:
+            project = await projects.get(project_id, index)
+
+            # 应用配置更新
+            for key, value in config_updates.items():
+                if hasattr(project, key):
+                    setattr(project, key, value)
+
+            # 如果更新了参考信息，重新生成种子
+            if any(key in config_updates for key in ["character_reference", "scene_reference"]):
+                project.consistency_seed = consistency_manager.generate_consistency_seed(project_id)
+
+            projects.save(project)
+
+            return {
+                "project_id": project_id,
+                "status": "success",
+                "config_updates": config_updates
+            }
+
+        except Exception as e:
+            logger.error(f"更新项目 {project_id} 配置失败: {e}")
+            return {
+                "project_id": project_id,
+                "status": "error",
+                "error": str(e)
+            }
+
     def _calculate_batch_stats(self, results: dict[str, Any]) -> dict[str, Any]:
         """计算批量评估统计信息。"""
         successful_results = [
@@ -0,0 +1,424 @@
+"""创作阶段的 ARQ 任务：API 只做校验和入队，阶段在 worker 中执行并写回项目。
+
+- ``creative_stage_task`` 依次执行若干自动阶段，每个阶段等价于一次
+  :meth:`CreativeOrchestrator.advance`。执行前核对项目仍处于该阶段，重复或
+  过期的任务直接跳过。
+- ``STORYBOARD_READY`` 不在一个任务里渲染全部镜头：每个分镜提交一个
+  ``creative_shot_task``，分散到 ``preview`` 队列的各个 worker。镜头结果写入
+  Redis hash ``creative:shots:<project_id>:<revision>``，最后完成的镜头任务负责汇总
+  （:meth:`CreativeOrchestrator.complete_shots`）并推进到 ``RENDER_PENDING``。
+
+任务 ID 包含项目的 ``updated_at``：同一状态下重复点击“推进”复用同一个任务，
+状态变化后再提交则是新任务。任务队列未配置时，:func:`create_project` 等入口
+退回请求内同步执行。
+
+批量提交（:func:`submit_batch`）在一个事务里创建全部项目，然后按窗口调度：
+先提交 ``max_concurrency`` 个 ``creative_batch_item_task``，每完成一个再从
+``creative:batch:<id>:pending`` 取出下一个，所以每批同时在生成的项目数有界。
+批次 ID 同时是进度通道的 ID，每个项目完成时写入一条事件，可通过
+``/tasks/<batch_id>/events`` 实时获取结果。记录结果、计数和取出下一个项目由
+一个 Lua 脚本原子完成；任务在提交下一个项目前崩溃时，重跑的任务会按脚本记下的
+交接关系补交。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import uuid
+from typing import Any
+
+from ..config import settings
+from ..instrumentation import TelemetryEvent, emit_event, get_logger
+from ..task_progress import TaskStage, add_progress, bind_progress, publish_progress, report_progress
+from ..task_queue import WorkerSettings, task_queue
+from .models import (
+    CreativeBatchCreateRequest,
+    CreativeBatchResponse,
+    CreativeProject,
+    CreativeProjectCreateRequest,
+    CreativeProjectState,
+    GeneratedShotAsset,
+)
+from . import workflow
+from .workflow import CreativeOrchestrator
+
+logger = get_logger()
+
+STAGE_QUEUE = "interactive"
+SHOT_QUEUE = "preview"
+BATCH_QUEUE = "batch"
+SHOTS_KEY_PREFIX = "creative:shots:"
+BATCH_KEY_PREFIX = "creative:batch:"
+# 批量项目在 worker 中执行的阶段，与 create_project 相同
+_BATCH_STAGES = [CreativeProjectState.BRIEF_PENDING, CreativeProjectState.SCRIPT_PENDING]
+# 在 ARQ 的 job_timeout 之前自行超时：ARQ 超时以取消方式终止任务且不会重试，
+# 批量项目需要在此之前记下失败结果并提交下一个
+_BATCH_ITEM_TIMEOUT_SECONDS = max(WorkerSettings.job_timeout - 60, 1)
+
+# KEYS = 批次 hash, results, pending, handoff；ARGV = project_id, 结果 JSON, 计数字段, TTL
+# 首次记录结果时计数并取出下一个待提交项目，同时记下交接关系；重复记录只返回记下的下一个项目。
+# 返回 {completed, failed, total, tenant_id, next_project 或 nil, 是否首次记录}
+FINISH_BATCH_ITEM_SCRIPT = """
+local first = redis.call('HSETNX', KEYS[2], ARGV[1], ARGV[2])
+local next_project
+if first == 1 then
+  redis.call('HINCRBY', KEYS[1], ARGV[3], 1)
+  next_project = redis.call('LPOP', KEYS[3])
+  if next_project then
+    redis.call('HSET', KEYS[4], ARGV[1], next_project)
+  end
+  redis.call('EXPIRE', KEYS[2], ARGV[4])
+  redis.call('EXPIRE', KEYS[4], ARGV[4])
+else
+  next_project = redis.call('HGET', KEYS[4], ARGV[1])
+end
+local meta = redis.call('HMGET', KEYS[1], 'completed', 'failed', 'total', 'tenant_id')
+return {meta[1], meta[2], meta[3], meta[4], next_project, first}
+"""
+
+# advance() 不会自动推进的状态：等待人工审核、暂停或已结束
+_WAITING_STATES = frozenset(
+    {
+        CreativeProjectState.SCRIPT_REVIEW,
+        CreativeProjectState.PREVIEW_READY,
+        CreativeProjectState.PAUSED,
+        CreativeProjectState.COMPLETED,
+        CreativeProjectState.FAILED,
+    }
+)
+
+
+def _orchestrator() -> CreativeOrchestrator:
+    """调用时解析编排器：worker 启动钩子会把它切换到数据库存储库。"""
+    return workflow.creative_orchestrator
+
+
+def stage_workers_enabled() -> bool:
+    return settings.creative_stage_workers_enabled and settings.redis_enabled and bool(settings.redis_url)
+
+
+def shots_key(project_id: str, revision: str | None = None) -> str:
+    # 按修订区分：阶段任务重跑（同一修订）保留已完成的镜头，新修订自然从空 hash 开始
+    key = SHOTS_KEY_PREFIX + project_id
+    return f"{key}:{revision}" if revision else key
+
+
+def batch_key(batch_id: str) -> str:
+    return BATCH_KEY_PREFIX + batch_id
+
+
+def _text(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+async def submit_stages(project: CreativeProject, stages: list[CreativeProjectState]) -> str:
+    """Enqueue ``stages`` of ``project`` to run back to back in one worker job."""
+    return await task_queue.enqueue(
+        "creative_stage_task",
+        project.id,
+        [stage.value for stage in stages],
+        project.updated_at.isoformat(),
+        queue=STAGE_QUEUE,
+        tenant_id=project.tenant_id,
+    )
+
+
+# ==================== API 入口 ====================
+async def create_project(
+    payload: CreativeProjectCreateRequest,
+    orchestrator: CreativeOrchestrator | None = None,
+) -> tuple[CreativeProject, str | None]:
+    """Create a project; brief expansion and script writing run in a worker."""
+    orchestrator = orchestrator or _orchestrator()
+    if not stage_workers_enabled():
+        return await orchestrator.create_project(payload), None
+    project = await orchestrator.repository.create(payload)
+    return project, await submit_stages(project, _BATCH_STAGES)
+
+
+async def approve_script(
+    project_id: str,
+    orchestrator: CreativeOrchestrator | None = None,
+) -> tuple[CreativeProject, str | None]:
+    """Approve the script; storyboard generation runs in a worker."""
+    orchestrator = orchestrator or _orchestrator()
+    if not stage_workers_enabled():
+        return await orchestrator.approve_script(project_id), None
+    repository = orchestrator.repository
+    project = await repository.get(project_id)
+    if project.state != CreativeProjectState.SCRIPT_REVIEW:
+        raise ValueError("Script can only be approved while in review")
+    project.mark_state(CreativeProjectState.STORYBOARD_PENDING)
+    await repository.upsert(project)
+    return project, await submit_stages(project, [CreativeProjectState.STORYBOARD_PENDING])
+
+
+async def advance(
+    project_id: str,
+    orchestrator: CreativeOrchestrator | None = None,
+) -> tuple[CreativeProject, str | None]:
+    """Submit the project's next automatic stage; no task when it is waiting on a person."""
+    orchestrator = orchestrator or _orchestrator()
+    if not stage_workers_enabled():
+        return await orchestrator.advance(project_id), None
+    project = await orchestrator.repository.get(project_id)
+    if project.state in _WAITING_STATES:
+        return project, None
+    return project, await submit_stages(project, [project.state])
+
+
+async def submit_batch(
+    request: CreativeBatchCreateRequest,
+    orchestrator: CreativeOrchestrator | None = None,
+) -> CreativeBatchResponse:
+    """Create all projects in one transaction and schedule their generation in a bounded window."""
+    orchestrator = orchestrator or _orchestrator()
+    if len(request.projects) > settings.creative_batch_max_size:
+        raise ValueError(f"A batch holds at most {settings.creative_batch_max_size} projects")
+
+    payloads = [payload.model_copy(update={"tenant_id": request.tenant_id}) for payload in request.projects]
+    project_ids = [project.id for project in await orchestrator.repository.create_many(payloads)]
+    concurrency = min(len(project_ids), request.max_concurrency or settings.creative_batch_concurrency)
+    batch_id = f"batch-{uuid.uuid4().hex}"
+    key = batch_key(batch_id)
+    ttl = settings.task_queue_job_expires_seconds
+
+    await task_queue.connect()
+    pipe = task_queue.pool.pipeline(transaction=True)
+    pipe.hset(key, mapping={"tenant_id": request.tenant_id, "total": len(project_ids), "completed": 0, "failed": 0})
+    pipe.rpush(f"{key}:projects", *project_ids)
+    if project_ids[concurrency:]:
+        pipe.rpush(f"{key}:pending", *project_ids[concurrency:])
+    for suffix in ("", ":projects", ":pending"):
+        pipe.expire(key + suffix, ttl)
+    add_progress(pipe, batch_id, TaskStage.SUBMITTED, total=len(project_ids))
+    await pipe.execute()
+
+    for project_id in project_ids[:concurrency]:
+        await _submit_batch_item(batch_id, project_id, request.tenant_id)
+    logger.info(f"Submitted batch {batch_id}: {len(project_ids)} projects, concurrency {concurrency}")
+    return await batch_status(batch_id)
+
+
+async def batch_status(batch_id: str) -> CreativeBatchResponse:
+    """Aggregate progress and per-project results of a batch."""
+    await task_queue.connect()
+    key = batch_key(batch_id)
+    pipe = task_queue.pool.pipeline(transaction=False)
+    pipe.hgetall(key)
+    pipe.lrange(f"{key}:projects", 0, -1)
+    pipe.llen(f"{key}:pending")
+    pipe.hgetall(f"{key}:results")
+    meta, project_ids, pending, results = await pipe.execute()
+    if not meta:
+        raise KeyError(f"Batch {batch_id} not found")
+
+    meta = {_text(field): _text(value) for field, value in meta.items()}
+    total, completed, failed = int(meta["total"]), int(meta["completed"]), int(meta["failed"])
+    return CreativeBatchResponse(
+        batch_id=batch_id,
+        tenant_id=meta["tenant_id"],
+        total=total,
+        completed=completed,
+        failed=failed,
+        running=total - completed - failed - int(pending),
+        pending=int(pending),
+        progress=(completed + failed) / total if total else 1.0,
+        project_ids=[_text(project_id) for project_id in project_ids],
+        results={_text(project_id): json.loads(raw) for project_id, raw in results.items()},
+    )
+
+
+async def _submit_batch_item(batch_id: str, project_id: str, tenant_id: str) -> str:
+    return await task_queue.enqueue(
+        "creative_batch_item_task",
+        batch_id,
+        project_id,
+        queue=BATCH_QUEUE,
+        tenant_id=tenant_id,
+    )
+
+
+# ==================== Worker 任务函数 ====================
+async def creative_stage_task(
+    ctx: dict[str, Any],
+    project_id: str,
+    stages: list[str],
+    revision: str | None = None,
+) -> dict[str, Any]:
+    """执行项目的自动阶段；``revision`` 只用于区分任务 ID。"""
+    with bind_progress(ctx.get("redis"), ctx.get("job_id")):
+        await report_progress(TaskStage.STARTED, project_id=project_id)
+        try:
+            result = await _run_stages(ctx, project_id, stages)
+        except Exception as e:
+            logger.error(f"Creative stage failed (project={project_id}, stages={stages}): {e}", exc_info=True)
+            await report_progress(TaskStage.FAILED, message=str(e))
+            await _record_stage_failure(project_id, e)
+            raise
+        await report_progress(TaskStage.COMPLETED, **result)
+        return result
+
+
+async def _run_stages(ctx: dict[str, Any], project_id: str, stages: list[str]) -> dict[str, Any]:
+    orchestrator = _orchestrator()
+    project = await orchestrator.repository.get(project_id)
+    for stage in stages:
+        if project.state.value != stage:
+            logger.info(f"Skipping stage {stage} of {project_id}: project is {project.state.value}")
+            break
+        if project.state == CreativeProjectState.STORYBOARD_READY:
+            shot_jobs = await _fan_out_shots(ctx["redis"], project)
+            return {"project_id": project_id, "state": project.state.value, "shot_jobs": shot_jobs}
+        await report_progress(TaskStage.RENDERING, message=f"Running {stage}")
+        project = await orchestrator.advance(project_id)
+    return {"project_id": project_id, "state": project.state.value}
+
+
+async def _fan_out_shots(redis: Any, project: CreativeProject) -> list[str]:
+    if not project.storyboard:
+        raise ValueError("Storyboard must exist before generating shots")
+
+    emit_event(TelemetryEvent(name="creative_shots_start", attributes={"project_id": project.id}))
+    # 不清空已有结果：镜头任务 ID 由（项目、分镜、修订）决定，已成功的镜头在重跑时会被
+    # 去重而不再执行，它们的结果必须留在本修订的 hash 里
+    revision = project.updated_at.isoformat()
+    return [
+        await task_queue.enqueue(
+            "creative_shot_task",
+            project.id,
+            panel.scene_number,
+            revision,
+            queue=SHOT_QUEUE,
+            tenant_id=project.tenant_id,
+        )
+        for panel in project.storyboard
+    ]
+
+
+async def creative_shot_task(
+    ctx: dict[str, Any],
+    project_id: str,
+    scene_number: int,
+    revision: str | None = None,
+) -> dict[str, Any]:
+    """渲染一个分镜；最后完成的镜头任务把全部镜头写回项目。"""
+    with bind_progress(ctx.get("redis"), ctx.get("job_id")):
+        await report_progress(TaskStage.STARTED, project_id=project_id, scene_number=scene_number)
+        orchestrator = _orchestrator()
+        project = await orchestrator.repository.get(project_id)
+        try:
+            shot = await orchestrator.render_shot(project, scene_number)
+        except Exception as e:
+            # 记为失败镜头而不是让任务失败，否则汇总永远等不到这个镜头
+            logger.error(f"Shot {scene_number} of {project_id} failed: {e}", exc_info=True)
+            shot = GeneratedShotAsset(
+                scene_number=scene_number,
+                prompt="",
+                provider=project.video_provider,
+                status="failed",
+                error_message=str(e),
+            )
+        joined = await _collect_shot(ctx["redis"], project, shot, revision)
+        result = {"project_id": project_id, "scene_number": scene_number, "status": shot.status, "joined": joined}
+        await report_progress(TaskStage.COMPLETED, video_url=shot.video_url, **result)
+        return result
+
+
+async def _collect_shot(
+    redis: Any, project: CreativeProject, shot: GeneratedShotAsset, revision: str | None = None
+) -> bool:
+    """Store ``shot``; if it was the last one outstanding, attach all shots to the project."""
+    key = shots_key(project.id, revision)
+    pipe = redis.pipeline(transaction=True)
+    pipe.hset(key, str(shot.scene_number), shot.model_dump_json())
+    pipe.expire(key, settings.task_queue_job_expires_seconds)
+    pipe.hlen(key)
+    collected = (await pipe.execute())[-1]
+    if int(collected) < len(project.storyboard):
+        return False
+    # 重试的镜头任务可能再次看到“已齐”，只允许汇总一次
+    if not await redis.set(f"{key}:joined", 1, nx=True, ex=settings.task_queue_job_expires_seconds):
+        return False
+
+    shots = [GeneratedShotAsset.model_validate_json(raw) for raw in (await redis.hgetall(key)).values()]
+    orchestrator = _orchestrator()
+    repository = orchestrator.repository
+    project = await repository.get(project.id)
+    if project.state != CreativeProjectState.STORYBOARD_READY:
+        logger.info(f"Discarding shots of {project.id}: project is {project.state.value}")
+        return False
+    orchestrator.complete_shots(project, shots)
+    await repository.upsert(project)
+    await redis.delete(key)
+    return True
+
+
+async def creative_batch_item_task(ctx: dict[str, Any], batch_id: str, project_id: str) -> dict[str, Any]:
+    """生成批量中的一个项目（简报与脚本），记录结果并提交批次中的下一个项目。"""
+    with bind_progress(ctx.get("redis"), ctx.get("job_id")):
+        await report_progress(TaskStage.STARTED, project_id=project_id, batch_id=batch_id)
+        try:
+            async with asyncio.timeout(_BATCH_ITEM_TIMEOUT_SECONDS):
+                result = await _run_stages(ctx, project_id, [stage.value for stage in _BATCH_STAGES])
+            outcome = {"status": "completed", "state": result["state"]}
+        except Exception as e:
+            # 单个项目失败（包括超时）不影响批次，记录后继续调度下一个
+            logger.error(f"Batch {batch_id} project {project_id} failed: {e}", exc_info=True)
+            await _record_stage_failure(project_id, e)
+            outcome = {"status": "failed", "error": str(e) or type(e).__name__}
+        except asyncio.CancelledError:
+            # worker 关闭时 ARQ 取消任务并在之后重跑；最后一次尝试不会再重跑，
+            # 必须在这里记下结果，否则批次永远等不到这个项目
+            if ctx.get("job_try", 1) >= WorkerSettings.max_tries:
+                outcome = {"status": "failed", "error": "Cancelled on the final attempt"}
+                await asyncio.shield(_finish_batch_item(ctx["redis"], batch_id, project_id, outcome))
+            raise
+        await _finish_batch_item(ctx["redis"], batch_id, project_id, outcome)
+        stage = TaskStage.COMPLETED if outcome["status"] == "completed" else TaskStage.FAILED
+        await report_progress(stage, **outcome)
+        return {"batch_id": batch_id, "project_id": project_id, **outcome}
+
+
+async def _finish_batch_item(redis: Any, batch_id: str, project_id: str, outcome: dict[str, Any]) -> None:
+    key = batch_key(batch_id)
+    counter = "completed" if outcome["status"] == "completed" else "failed"
+    completed, failed, total, tenant_id, next_project, first = await redis.register_script(
+        FINISH_BATCH_ITEM_SCRIPT
+    )(
+        keys=[key, f"{key}:results", f"{key}:pending", f"{key}:handoff"],
+        args=[project_id, json.dumps(outcome), counter, settings.task_queue_job_expires_seconds],
+    )
+
+    # 重试的任务不会重复计数或多取一个待提交项目，只补交上次可能没交出去的下一个项目
+    if int(first):
+        finished, total = int(completed) + int(failed), int(total)
+        await publish_progress(
+            redis,
+            batch_id,
+            TaskStage.COMPLETED if finished >= total else TaskStage.RENDERING,
+            finished / total,
+            f"{finished}/{total} projects finished",
+            project_id=project_id,
+            completed=int(completed),
+            failed=int(failed),
+            total=total,
+            **outcome,
+        )
+    if next_project is not None:
+        # 任务 ID 由参数决定，补交已入队或已完成的项目不会重复执行
+        await _submit_batch_item(batch_id, _text(next_project), _text(tenant_id))
+
+
+async def _record_stage_failure(project_id: str, e: Exception) -> None:
+    try:
+        repository = _orchestrator().repository
+        project = await repository.get(project_id)
+        project.error_message = str(e)
+        await repository.upsert(project)
+    except Exception as record_error:
+        logger.warning(f"Could not record failure on project {project_id}: {record_error}")
+
+
+CREATIVE_JOB_FUNCTIONS = [creative_stage_task, creative_shot_task, creative_batch_item_task]
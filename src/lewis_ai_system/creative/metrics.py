@@ -0,0 +1,329 @@
+"""按租户增量维护的创意项目指标汇总。
+
+每个项目对租户汇总的“贡献”（计数、分数和、成本、重试次数等）单独保存。
+项目写入存储库时由 :func:`record_projects` 计算新贡献，用新旧贡献之差更新
+汇总，同一项目重复写入不会重复计数。仪表盘读取汇总只需常数次操作，按天的
+趋势数据按日期读取，开销与天数成正比，与项目数量无关。
+
+Redis 可用时汇总存放在哈希里：
+
+- ``metrics:creative:<tenant>``：租户汇总计数；
+- ``metrics:creative:<tenant>:daily``：``<date>:<field>`` 形式的按天计数；
+- ``metrics:creative:<tenant>:projects``：每个项目当前的贡献（JSON）。
+
+读取旧贡献、更新计数和保存新贡献在一个 Lua 脚本里完成，多个副本并发写入
+同一项目也不会重复计数；一次写入多个项目时脚本调用通过管道一次发送。
+Redis 不可用时退回进程内实现，进程内保存的贡献数量有上限，超出时整租户
+淘汰，下次读取时重新补录。
+
+已有数据在第一次读取某个租户时由调用方补录（:meth:`TenantMetrics.backfill`），
+补录与事件更新都是幂等的，两者交错也不会重复计数。
+"""
+
+from __future__ import annotations
+
+import json
+from collections import Counter, OrderedDict
+from datetime import date, datetime, timezone
+from typing import Any, Iterable
+
+from ..instrumentation import get_logger
+
+logger = get_logger()
+
+# 汇总哈希里标记“该租户已补录”的字段
+TRACKED_FIELD = "_tracked"
+DAILY_FIELDS = ("count", "score_sum", "scored", "retries", "improved")
+LONG_RUNNING_SECONDS = 3600
+
+Contribution = dict[str, dict[str, float]]
+
+# KEYS = totals, daily, projects; ARGV = project_id, contribution JSON
+APPLY_SCRIPT = """
+local new = ARGV[2]
+local old = redis.call('HGET', KEYS[3], ARGV[1])
+if old == new then
+  return 0
+end
+local function apply(contribution, sign)
+  for field, value in pairs(contribution.totals) do
+    redis.call('HINCRBYFLOAT', KEYS[1], field, sign * value)
+  end
+  for field, value in pairs(contribution.daily) do
+    redis.call('HINCRBYFLOAT', KEYS[2], field, sign * value)
+  end
+end
+if old then
+  apply(cjson.decode(old), -1)
+end
+apply(cjson.decode(new), 1)
+redis.call('HSET', KEYS[3], ARGV[1], new)
+return 1
+"""
+
+
+def _score_range(score: float) -> str:
+    if score >= 0.9:
+        return "excellent"
+    if score >= 0.7:
+        return "good"
+    if score >= 0.5:
+        return "fair"
+    return "poor"
+
+
+def _quality(score: float) -> str:
+    if score >= 0.8:
+        return "high"
+    if score >= 0.6:
+        return "medium"
+    return "low"
+
+
+def _as_utc(value: Any) -> datetime | None:
+    """数据库列是 naive UTC，mark_state 写入的是 aware 时间；统一成 aware UTC 再比较。"""
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def retry_counts(storyboard: Iterable[Any] | None) -> tuple[int, int]:
+    """``(total retries, panels that reached consistency after retrying)``."""
+    retries = improved = 0
+    for panel in storyboard or []:
+        retry_count = getattr(panel, "retry_count", 0) or 0
+        retries += retry_count
+        if retry_count > 0 and (getattr(panel, "consistency_score", 0) or 0) > 0.7:
+            improved += 1
+    return retries, improved
+
+
+def project_contribution(project: Any) -> Contribution:
+    """One project's share of its tenant's totals; zero fields are left out."""
+    totals: Counter[str] = Counter(projects=1)
+    daily: Counter[str] = Counter()
+
+    totals[f"level:{getattr(project, 'consistency_level', 'medium')}"] += 1
+
+    score = getattr(project, "overall_consistency_score", None)
+    if score is not None:
+        totals["scored"] += 1
+        totals["score_sum"] += score
+        totals[f"range:{_score_range(score)}"] += 1
+        if score < 0.6:
+            totals["low_quality"] += 1
+    totals[f"quality:{_quality(score or 0)}"] += 1
+
+    retries, improved = retry_counts(getattr(project, "storyboard", None))
+    totals["retries"] += retries
+    totals["successful_retries"] += improved
+
+    state = getattr(project, "state", None)
+    if state == "completed":
+        totals["completed"] += 1
+    elif state == "failed":
+        totals["failed"] += 1
+    totals["cost_usd"] += float(getattr(project, "cost_usd", 0) or 0)
+
+    created_at = _as_utc(getattr(project, "created_at", None))
+    updated_at = _as_utc(getattr(project, "updated_at", None))
+    if created_at is not None and updated_at is not None:
+        duration = (updated_at - created_at).total_seconds()
+        totals["processing_seconds"] += duration
+        if duration > LONG_RUNNING_SECONDS:
+            totals["long_running"] += 1
+    if created_at is not None:
+        day = created_at.date().isoformat()
+        daily[f"{day}:count"] += 1
+        if score is not None:
+            daily[f"{day}:score_sum"] += score
+            daily[f"{day}:scored"] += 1
+        daily[f"{day}:retries"] += retries
+        daily[f"{day}:improved"] += improved
+
+    return {
+        "totals": {field: value for field, value in totals.items() if value},
+        "daily": {field: value for field, value in daily.items() if value},
+    }
+
+
+class LocalTenantMetrics:
+    """In-process aggregates with the same delta semantics as the Redis script.
+
+    Stored contributions are bounded by ``max_projects``. Dropping a single
+    project's contribution would make its next write count twice, so whole
+    tenants are evicted instead (least recently used first): their totals go
+    with them and the next read backfills the tenant again.
+    """
+
+    def __init__(self, *, max_projects: int = 100_000) -> None:
+        self.max_projects = max_projects
+        self._contributions: OrderedDict[str, dict[str, str]] = OrderedDict()
+        self._size = 0
+        self._totals: dict[str, Counter[str]] = {}
+        self._daily: dict[str, Counter[str]] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def apply(self, tenant_id: str, project_id: str, contribution: str) -> None:
+        projects = self._contributions.setdefault(tenant_id, {})
+        self._contributions.move_to_end(tenant_id)
+        old = projects.get(project_id)
+        if old == contribution:
+            return
+        totals = self._totals.setdefault(tenant_id, Counter())
+        daily = self._daily.setdefault(tenant_id, Counter())
+        for encoded, sign in ((old, -1), (contribution, 1)):
+            if encoded is None:
+                continue
+            decoded = json.loads(encoded)
+            for field, value in decoded["totals"].items():
+                totals[field] += sign * value
+            for field, value in decoded["daily"].items():
+                daily[field] += sign * value
+        if old is None:
+            self._size += 1
+        projects[project_id] = contribution
+        self._evict(keep=tenant_id)
+
+    def _evict(self, keep: str) -> None:
+        while self._size > self.max_projects and len(self._contributions) > 1:
+            tenant_id = next(iter(self._contributions))
+            if tenant_id == keep:
+                self._contributions.move_to_end(tenant_id)
+                continue
+            self._size -= len(self._contributions.pop(tenant_id))
+            self._totals.pop(tenant_id, None)
+            self._daily.pop(tenant_id, None)
+
+    def mark_tracked(self, tenant_id: str) -> None:
+        self._totals.setdefault(tenant_id, Counter())[TRACKED_FIELD] = 1
+
+    def totals(self, tenant_id: str) -> dict[str, float]:
+        if tenant_id in self._contributions:
+            self._contributions.move_to_end(tenant_id)
+        return dict(self._totals.get(tenant_id, {}))
+
+    def daily(self, tenant_id: str, fields: list[str]) -> list[float]:
+        daily = self._daily.get(tenant_id, {})
+        return [daily.get(field, 0.0) for field in fields]
+
+
+def _decode(value: Any) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+class TenantMetrics:
+    """Per-tenant creative project aggregates, shared through Redis when available.
+
+    Redis is taken from :data:`~lewis_ai_system.redis_cache.cache_manager`;
+    without it, or when a call fails, the in-process :class:`LocalTenantMetrics`
+    is used instead (per replica).
+    """
+
+    def __init__(self, *, local: LocalTenantMetrics | None = None, key_prefix: str = "metrics:creative:"):
+        self.local = local or LocalTenantMetrics()
+        self.key_prefix = key_prefix
+        self._client: Any = None
+        self._script: Any = None
+
+    async def _redis_client(self) -> Any:
+        from ..redis_cache import cache_manager
+
+        cache = await cache_manager.get_cache()
+        return getattr(cache, "client", None)
+
+    async def is_shared(self) -> bool:
+        """Whether aggregates live in Redis (shared by every replica) rather than in-process."""
+        return await self._redis_client() is not None
+
+    def _keys(self, tenant_id: str) -> list[str]:
+        base = f"{self.key_prefix}{tenant_id}"
+        return [base, f"{base}:daily", f"{base}:projects"]
+
+    async def record(self, projects: Iterable[Any], tenant_id: str | None = None) -> None:
+        """Update aggregates for saved projects; ``tenant_id`` overrides ``project.tenant_id``."""
+        updates = [
+            (tenant_id or project.tenant_id, project.id, json.dumps(project_contribution(project), sort_keys=True))
+            for project in projects
+        ]
+        if not updates:
+            return
+        client = await self._redis_client()
+        if client is not None:
+            try:
+                if client is not self._client:
+                    self._client, self._script = client, client.register_script(APPLY_SCRIPT)
+                # 所有项目的脚本调用放进一个管道，一次往返发送
+                pipe = client.pipeline(transaction=False)
+                for tenant, project_id, contribution in updates:
+                    await self._script(keys=self._keys(tenant), args=[project_id, contribution], client=pipe)
+                await pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"Redis tenant metrics update failed, using local aggregates: {e}")
+        for tenant, project_id, contribution in updates:
+            self.local.apply(tenant, project_id, contribution)
+
+    async def backfill(self, tenant_id: str, projects: Iterable[Any]) -> None:
+        """Record a tenant's existing projects and mark the tenant as tracked."""
+        await self.record(projects, tenant_id=tenant_id)
+        client = await self._redis_client()
+        if client is not None:
+            try:
+                await client.hset(self._keys(tenant_id)[0], TRACKED_FIELD, 1)
+                return
+            except Exception as e:
+                logger.warning(f"Redis tenant metrics backfill failed, using local aggregates: {e}")
+        self.local.mark_tracked(tenant_id)
+
+    async def totals(self, tenant_id: str) -> dict[str, float] | None:
+        """Tenant totals, or ``None`` if the tenant has not been backfilled yet."""
+        client = await self._redis_client()
+        totals: dict[str, float] | None = None
+        if client is not None:
+            try:
+                raw = await client.hgetall(self._keys(tenant_id)[0])
+                totals = {_decode(field): float(value) for field, value in raw.items()}
+            except Exception as e:
+                logger.warning(f"Redis tenant metrics read failed, using local aggregates: {e}")
+        if totals is None:
+            totals = self.local.totals(tenant_id)
+        if not totals.pop(TRACKED_FIELD, 0):
+            return None
+        return totals
+
+    async def daily(self, tenant_id: str, days: Iterable[date]) -> dict[str, dict[str, float]]:
+        """``{iso_date: {field: value}}`` for the given days, with :data:`DAILY_FIELDS`."""
+        dates = [day.isoformat() for day in days]
+        fields = [f"{day}:{field}" for day in dates for field in DAILY_FIELDS]
+        values: list[float] | None = None
+        client = await self._redis_client()
+        if client is not None and fields:
+            try:
+                raw = await client.hmget(self._keys(tenant_id)[1], fields)
+                values = [float(value) if value is not None else 0.0 for value in raw]
+            except Exception as e:
+                logger.warning(f"Redis tenant metrics read failed, using local aggregates: {e}")
+        if values is None:
+            values = self.local.daily(tenant_id, fields)
+        width = len(DAILY_FIELDS)
+        return {
+            day: dict(zip(DAILY_FIELDS, values[i * width : (i + 1) * width]))
+            for i, day in enumerate(dates)
+        }
+
+
+async def record_projects(projects: Iterable[Any]) -> None:
+    """存储库写入后调用：更新租户汇总，失败只记录日志，不影响写入本身。"""
+    try:
+        await tenant_metrics.record(projects)
+    except Exception as e:
+        logger.warning(f"Failed to update tenant metrics: {e}")
+
+
+# 全局租户指标汇总实例
+tenant_metrics = TenantMetrics()
@@ -175,7 +175,39 @@ class CreativeProjectCreateRequest(BaseModel):
 
 class CreativeProjectResponse(BaseModel):
     project: CreativeProject
+    # 阶段交给 worker 执行时的任务 ID，可通过 /tasks/{task_id} 查询进度
+    task_id: str | None = None
 
 
 class CreativeProjectListResponse(BaseModel):
     projects: list[CreativeProject]
+
+
+class CreativeBatchCreateRequest(BaseModel):
+    tenant_id: str = "demo"
+    projects: list[CreativeProjectCreateRequest] = Field(min_length=1)
+    # 同时在生成的项目数，默认 CREATIVE_BATCH_CONCURRENCY
+    max_concurrency: int | None = Field(default=None, ge=1)
+
+
+class CreativeBatchResponse(BaseModel):
+    batch_id: str
+    tenant_id: str
+    total: int
+    completed: int = 0
+    failed: int = 0
+    running: int = 0
+    pending: int = 0
+    progress: float = 0.0
+    project_ids: list[str] = Field(default_factory=list)
+    results: dict[str, dict[str, Any]] = Field(default_factory=dict)
+
+
+class ConsistencyBatchRequest(BaseModel):
+    project_ids: list[str] = Field(min_length=1)
+    concurrency: int | None = Field(default=None, ge=1)
+    # 从第几个项目继续（上次流中最后收到的 cursor）
+    cursor: int = Field(default=0, ge=0)
+    max_retries: int = 2
+    consistency_level: Literal["low", "medium", "high"] = "medium"
+    config_updates: dict[str, Any] = Field(default_factory=dict)
@@ -2,26 +2,48 @@
 
 from __future__ import annotations
 
-import asyncio
-import json
-from collections import defaultdict
 from datetime import datetime, timedelta, timezone
 from typing import Any
 
-from ..config import settings
 from ..instrumentation import get_logger
-from .repository import creative_repository
+from .metrics import TenantMetrics, tenant_metrics
+from .repository import DatabaseCreativeProjectRepository, creative_repository
 
 logger = get_logger()
 
 
+def _count(totals: dict[str, float], field: str) -> int:
+    """汇总里的计数字段（以浮点数累加，取整读取）。"""
+    return int(round(totals.get(field, 0)))
+
+
 class MonitoringAnalyticsService:
-    """监控和分析服务，提供一致性控制的监控和分析功能。"""
+    """监控和分析服务，提供一致性控制的监控和分析功能。
+
+    统计数据来自 :mod:`.metrics` 中按租户增量维护的汇总，读取开销与项目数量
+    无关；某个租户第一次被查询时从存储库补录一次。
+
+    进程内汇总只包含本副本的写入，所以在汇总不在 Redis 中、而存储库是数据库
+    时，改为由存储库执行 SQL 分组查询（数据库为各副本共享）。
+    """
 
-    def __init__(self) -> None:
+    def __init__(self, metrics: TenantMetrics | None = None) -> None:
         """初始化监控和分析服务。"""
-        self.metrics_cache = {}
-        self.cache_ttl = 300  # 缓存5分钟
+        self.metrics = metrics or tenant_metrics
+
+    async def _aggregate_in_database(self) -> bool:
+        return isinstance(creative_repository, DatabaseCreativeProjectRepository) and not await self.metrics.is_shared()
+
+    async def _tenant_totals(self, tenant_id: str) -> dict[str, float]:
+        """租户汇总；尚未建立时先从存储库补录。"""
+        if await self._aggregate_in_database():
+            return await creative_repository.summarize_tenant(tenant_id)
+        totals = await self.metrics.totals(tenant_id)
+        if totals is None:
+            projects = await creative_repository.list_for_tenant(tenant_id)
+            await self.metrics.backfill(tenant_id, projects)
+            totals = await self.metrics.totals(tenant_id) or {}
+        return totals
 
     async def get_consistency_stats(self, tenant_id: str = "demo") -> dict[str, Any]:
         """获取一致性统计数据。
@@ -32,79 +54,28 @@ class MonitoringAnalyticsService:
         Returns:
             一致性统计数据
         """
-        cache_key = f"consistency_stats_{tenant_id}"
-        if self._is_cache_valid(cache_key):
-            return self.metrics_cache[cache_key]
-
         try:
-            projects = await creative_repository.list_for_tenant(tenant_id)
-
+            totals = await self._tenant_totals(tenant_id)
+            scored_projects = _count(totals, "scored")
+            successful_retries = _count(totals, "successful_retries")
             stats = {
-                "total_projects": len(projects),
-                "projects_with_consistency_score": 0,
-                "average_consistency_score": 0.0,
+                "total_projects": _count(totals, "projects"),
+                "projects_with_consistency_score": scored_projects,
+                "average_consistency_score": totals.get("score_sum", 0) / scored_projects if scored_projects else 0.0,
                 "consistency_level_distribution": {
-                    "low": 0,
-                    "medium": 0,
-                    "high": 0
+                    level: _count(totals, f"level:{level}") for level in ("low", "medium", "high")
                 },
                 "score_ranges": {
-                    "excellent": 0,  # 0.9-1.0
-                    "good": 0,       # 0.7-0.9
-                    "fair": 0,       # 0.5-0.7
-                    "poor": 0        # 0.0-0.5
+                    # excellent 0.9-1.0, good 0.7-0.9, fair 0.5-0.7, poor 0.0-0.5
+                    name: _count(totals, f"range:{name}") for name in ("excellent", "good", "fair", "poor")
                 },
                 "retry_stats": {
-                    "total_retries": 0,
-                    "successful_retries": 0,
-                    "average_retry_improvement": 0.0
-                }
+                    "total_retries": _count(totals, "retries"),
+                    "successful_retries": successful_retries,
+                    # 简化计算：假设每次成功重试改善0.1分
+                    "average_retry_improvement": 0.1 if successful_retries else 0.0,
+                },
             }
-
-            total_score = 0.0
-            scored_projects = 0
-            retry_improvements = []
-
-            for project in projects:
-                # 一致性级别分布
-                level = getattr(project, 'consistency_level', 'medium')
-                stats["consistency_level_distribution"][level] += 1
-
-                # 一致性分数统计
-                score = getattr(project, 'overall_consistency_score', None)
-                if score is not None:
-                    scored_projects += 1
-                    total_score += score
-
-                    # 分数范围统计
-                    if score >= 0.9:
-                        stats["score_ranges"]["excellent"] += 1
-                    elif score >= 0.7:
-                        stats["score_ranges"]["good"] += 1
-                    elif score >= 0.5:
-                        stats["score_ranges"]["fair"] += 1
-                    else:
-                        stats["score_ranges"]["poor"] += 1
-
-                # 重试统计（从分镜数据中提取）
-                for panel in project.storyboard:
-                    retry_count = getattr(panel, 'retry_count', 0)
-                    stats["retry_stats"]["total_retries"] += retry_count
-
-                    # 如果有重试且分数改善，算作成功重试
-                    if retry_count > 0 and getattr(panel, 'consistency_score', 0) > 0.7:
-                        stats["retry_stats"]["successful_retries"] += 1
-
-            stats["projects_with_consistency_score"] = scored_projects
-            if scored_projects > 0:
-                stats["average_consistency_score"] = total_score / scored_projects
-
-            # 计算平均重试改善
-            if stats["retry_stats"]["successful_retries"] > 0:
-                # 简化计算：假设每次成功重试改善0.1分
-                stats["retry_stats"]["average_retry_improvement"] = 0.1
-
-            self.metrics_cache[cache_key] = stats
             return stats
 
         except Exception as exc:
@@ -121,6 +92,8 @@ class MonitoringAnalyticsService:
     ) -> dict[str, Any]:
         """获取一致性趋势数据。
 
+        按项目创建日期汇总，包含从 ``days`` 天前那一天到今天的数据。
+
         Args:
             tenant_id: 租户ID
             days: 分析天数
@@ -128,70 +101,39 @@ class MonitoringAnalyticsService:
         Returns:
             一致性趋势数据
         """
-        cache_key = f"consistency_trends_{tenant_id}_{days}"
-        if self._is_cache_valid(cache_key):
-            return self.metrics_cache[cache_key]
-
         try:
-            projects = await creative_repository.list_for_tenant(tenant_id)
-
-            # 按日期分组统计
-            daily_stats = defaultdict(lambda: {
-                "count": 0,
-                "total_score": 0.0,
-                "scored_projects": 0,
-                "retry_count": 0,
-                "improved_projects": 0
-            })
-
-            cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
-
-            for project in projects:
-                if project.created_at < cutoff_date:
-                    continue
-
-                created_date = project.created_at.date().isoformat()
-                daily_stats[created_date]["count"] += 1
-
-                score = getattr(project, 'overall_consistency_score', None)
-                if score is not None:
-                    daily_stats[created_date]["total_score"] += score
-                    daily_stats[created_date]["scored_projects"] += 1
-
-                # 统计重试情况
-                for panel in project.storyboard:
-                    retry_count = getattr(panel, 'retry_count', 0)
-                    daily_stats[created_date]["retry_count"] += retry_count
-
-                    if retry_count > 0 and getattr(panel, 'consistency_score', 0) > 0.7:
-                        daily_stats[created_date]["improved_projects"] += 1
+            today = datetime.now(timezone.utc).date()
+            window = [today - timedelta(days=offset) for offset in range(days, -1, -1)]
+            if await self._aggregate_in_database():
+                daily_stats = await creative_repository.summarize_daily(tenant_id, window[0])
+            else:
+                await self._tenant_totals(tenant_id)
+                daily_stats = await self.metrics.daily(tenant_id, window)
 
-            # 计算每日平均分
             trends = []
-            for date, stats in sorted(daily_stats.items()):
-                avg_score = None
-                if stats["scored_projects"] > 0:
-                    avg_score = stats["total_score"] / stats["scored_projects"]
-
+            for day in window:
+                date = day.isoformat()
+                stats = daily_stats.get(date, {})
+                count = _count(stats, "count")
+                if count <= 0:
+                    continue
+                scored = _count(stats, "scored")
                 trends.append({
                     "date": date,
-                    "total_projects": stats["count"],
-                    "scored_projects": stats["scored_projects"],
-                    "average_consistency_score": avg_score,
-                    "total_retries": stats["retry_count"],
-                    "improved_projects": stats["improved_projects"]
+                    "total_projects": count,
+                    "scored_projects": scored,
+                    "average_consistency_score": stats.get("score_sum", 0.0) / scored if scored else None,
+                    "total_retries": _count(stats, "retries"),
+                    "improved_projects": _count(stats, "improved")
                 })
 
-            result = {
+            return {
                 "trends": trends,
                 "period_days": days,
                 "total_data_points": len(trends),
                 "summary": self._calculate_trend_summary(trends)
             }
 
-            self.metrics_cache[cache_key] = result
-            return result
-
         except Exception as exc:
             logger.error(f"Error getting consistency trends for tenant {tenant_id}: {exc}")
             return {
@@ -208,74 +150,28 @@ class MonitoringAnalyticsService:
         Returns:
             性能指标数据
         """
-        cache_key = f"performance_metrics_{tenant_id}"
-        if self._is_cache_valid(cache_key):
-            return self.metrics_cache[cache_key]
-
         try:
-            projects = await creative_repository.list_for_tenant(tenant_id)
-
-            metrics = {
-                "total_projects": len(projects),
-                "completion_rate": 0.0,
-                "average_processing_time": 0.0,
-                "cost_efficiency": 0.0,
-                "quality_distribution": {},
-                "bottlenecks": []
-            }
-
-            completed_projects = 0
-            total_cost = 0.0
-            total_time = 0.0
-
-            for project in projects:
-                if project.state == "completed":
-                    completed_projects += 1
-
-                # 计算处理时间（简化）
-                if project.created_at and project.updated_at:
-                    processing_time = (project.updated_at - project.created_at).total_seconds()
-                    total_time += processing_time
-
-                # 累加成本
-                total_cost += getattr(project, 'cost_usd', 0)
-
-            # 计算完成率
-            if projects:
-                metrics["completion_rate"] = completed_projects / len(projects)
+            totals = await self._tenant_totals(tenant_id)
+            total_projects = _count(totals, "projects")
+            completed_projects = _count(totals, "completed")
+            total_cost = totals.get("cost_usd", 0.0)
 
-            # 计算平均处理时间
-            if completed_projects > 0:
-                metrics["average_processing_time"] = total_time / completed_projects
-
-            # 计算成本效率（每美元的完成率）
-            if total_cost > 0:
-                metrics["cost_efficiency"] = completed_projects / total_cost
-
-            # 质量分布
-            quality_ranges = {
-                "high_quality": 0,
-                "medium_quality": 0,
-                "low_quality": 0
+            return {
+                "total_projects": total_projects,
+                # 完成率
+                "completion_rate": completed_projects / total_projects if total_projects else 0.0,
+                # 平均处理时间（简化：全部项目的处理时间除以完成数）
+                "average_processing_time": (
+                    totals.get("processing_seconds", 0.0) / completed_projects if completed_projects else 0.0
+                ),
+                # 成本效率（每美元的完成数）
+                "cost_efficiency": completed_projects / total_cost if total_cost > 0 else 0.0,
+                "quality_distribution": {
+                    f"{name}_quality": _count(totals, f"quality:{name}") for name in ("high", "medium", "low")
+                },
+                "bottlenecks": self._identify_bottlenecks(totals),
             }
 
-            for project in projects:
-                score = getattr(project, 'overall_consistency_score', 0)
-                if score >= 0.8:
-                    quality_ranges["high_quality"] += 1
-                elif score >= 0.6:
-                    quality_ranges["medium_quality"] += 1
-                else:
-                    quality_ranges["low_quality"] += 1
-
-            metrics["quality_distribution"] = quality_ranges
-
-            # 识别瓶颈
-            metrics["bottlenecks"] = self._identify_bottlenecks(projects)
-
-            self.metrics_cache[cache_key] = metrics
-            return metrics
-
         except Exception as exc:
             logger.error(f"Error getting performance metrics for tenant {tenant_id}: {exc}")
             return {
@@ -429,18 +325,6 @@ class MonitoringAnalyticsService:
                 "generated_at": datetime.now(timezone.utc).isoformat()
             }
 
-    def _is_cache_valid(self, cache_key: str) -> bool:
-        """检查缓存是否有效。"""
-        if cache_key not in self.metrics_cache:
-            return False
-
-        cached_data = self.metrics_cache[cache_key]
-        if not isinstance(cached_data, dict) or "cached_at" not in cached_data:
-            return False
-
-        cached_time = datetime.fromisoformat(cached_data["cached_at"])
-        return (datetime.now(timezone.utc) - cached_time).seconds < self.cache_ttl
-
     def _calculate_trend_summary(self, trends: list[dict[str, Any]]) -> dict[str, Any]:
         """计算趋势摘要。"""
         if not trends:
@@ -474,30 +358,25 @@ class MonitoringAnalyticsService:
             "overall_average": sum(scores) / len(scores)
         }
 
-    def _identify_bottlenecks(self, projects: list) -> list[str]:
+    def _identify_bottlenecks(self, totals: dict[str, float]) -> list[str]:
         """识别性能瓶颈。"""
         bottlenecks = []
+        total_projects = _count(totals, "projects")
 
-        # 检查是否有长时间运行的项目
-        long_running = []
-        for project in projects:
-            if project.created_at and project.updated_at:
-                duration = (project.updated_at - project.created_at).total_seconds()
-                if duration > 3600:  # 超过1小时
-                    long_running.append(project.id)
-
+        # 检查是否有长时间运行的项目（超过1小时）
+        long_running = _count(totals, "long_running")
         if long_running:
-            bottlenecks.append(f"发现{len(long_running)}个长时间运行的项目")
+            bottlenecks.append(f"发现{long_running}个长时间运行的项目")
 
         # 检查失败率
-        failed_projects = [p for p in projects if p.state == "failed"]
-        if len(failed_projects) > len(projects) * 0.1:  # 失败率超过10%
-            bottlenecks.append(f"失败率较高: {len(failed_projects)}/{len(projects)}")
+        failed_projects = _count(totals, "failed")
+        if failed_projects > total_projects * 0.1:  # 失败率超过10%
+            bottlenecks.append(f"失败率较高: {failed_projects}/{total_projects}")
 
         # 检查一致性分数低的趋势
-        low_quality = [p for p in projects if getattr(p, 'overall_consistency_score', 1) < 0.6]
-        if len(low_quality) > len(projects) * 0.2:  # 低质量项目超过20%
-            bottlenecks.append(f"质量问题突出: {len(low_quality)}个项目一致性分数偏低")
+        low_quality = _count(totals, "low_quality")
+        if low_quality > total_projects * 0.2:  # 低质量项目超过20%
+            bottlenecks.append(f"质量问题突出: {low_quality}个项目一致性分数偏低")
 
         return bottlenecks
 
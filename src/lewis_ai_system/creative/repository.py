@@ -4,20 +4,25 @@ from __future__ import annotations
 
 import uuid
 from abc import ABC, abstractmethod
-from datetime import datetime, timezone
+from collections import Counter
+from datetime import date, datetime, time, timezone
 from threading import Lock
-from typing import Iterable
+from typing import Any, Iterable
 
-from sqlalchemy import select
+from sqlalchemy import and_, case, func, or_, select
 
 from ..database import CreativeProject as CreativeProjectRecord
 from ..database import db_manager
 from ..instrumentation import get_logger
 from ..config import settings
+from .metrics import DAILY_FIELDS, LONG_RUNNING_SECONDS, project_contribution, record_projects, retry_counts
 from .models import CreativeProject, CreativeProjectCreateRequest
 
 logger = get_logger()
 
+# 单条 IN 查询的最大参数个数，低于各数据库的绑定参数上限
+_IN_CLAUSE_LIMIT = 500
+
 
 class BaseCreativeProjectRepository(ABC):
     """Abstract repository contract for creative projects."""
@@ -38,6 +43,47 @@ class BaseCreativeProjectRepository(ABC):
     async def list_for_tenant(self, tenant_id: str) -> Iterable[CreativeProject]:  # pragma: no cover - interface
         raise NotImplementedError
 
+    async def create_many(self, payloads: Iterable[CreativeProjectCreateRequest]) -> list[CreativeProject]:
+        """Create several projects; backends override this to persist them atomically."""
+        return [await self.create(payload) for payload in payloads]
+
+    async def get_many(self, project_ids: Iterable[str]) -> dict[str, CreativeProject]:
+        """Fetch several projects keyed by id; unknown ids are left out."""
+        found: dict[str, CreativeProject] = {}
+        for project_id in dict.fromkeys(project_ids):
+            try:
+                found[project_id] = await self.get(project_id)
+            except KeyError:
+                continue
+        return found
+
+    async def upsert_many(self, projects: Iterable[CreativeProject]) -> list[CreativeProject]:
+        """Save several projects; backends override this to write them in one transaction."""
+        return [await self.upsert(project) for project in projects]
+
+    async def summarize_tenant(self, tenant_id: str) -> dict[str, float]:
+        """Tenant totals in the field layout of :func:`~.metrics.project_contribution`.
+
+        The default sums contributions in Python; SQL backends push this down
+        into a single grouped query.
+        """
+        totals: Counter[str] = Counter()
+        for project in await self.list_for_tenant(tenant_id):
+            totals.update(project_contribution(project)["totals"])
+        return dict(totals)
+
+    async def summarize_daily(self, tenant_id: str, since: date) -> dict[str, dict[str, float]]:
+        """``{iso_date: {field: value}}`` for projects created on or after ``since``."""
+        daily: Counter[str] = Counter()
+        for project in await self.list_for_tenant(tenant_id):
+            if project.created_at.date() >= since:
+                daily.update(project_contribution(project)["daily"])
+        days: dict[str, dict[str, float]] = {}
+        for key, value in daily.items():
+            day, field = key.split(":", 1)
+            days.setdefault(day, dict.fromkeys(DAILY_FIELDS, 0.0))[field] = value
+        return days
+
 
 class InMemoryCreativeProjectRepository(BaseCreativeProjectRepository):
     """Thread-safe in-memory repository used for tests and local development."""
@@ -47,7 +93,18 @@ class InMemoryCreativeProjectRepository(BaseCreativeProjectRepository):
         self._lock = Lock()
 
     async def create(self, payload: CreativeProjectCreateRequest) -> CreativeProject:
-        project = CreativeProject(
+        return await self.upsert(self._new_project(payload))
+
+    async def create_many(self, payloads: Iterable[CreativeProjectCreateRequest]) -> list[CreativeProject]:
+        projects = [self._new_project(payload) for payload in payloads]
+        with self._lock:
+            self._items.update((project.id, project) for project in projects)
+        await record_projects(projects)
+        return projects
+
+    @staticmethod
+    def _new_project(payload: CreativeProjectCreateRequest) -> CreativeProject:
+        return CreativeProject(
             id=str(uuid.uuid4()),
             tenant_id=payload.tenant_id,
             title=payload.title,
@@ -61,7 +118,6 @@ class InMemoryCreativeProjectRepository(BaseCreativeProjectRepository):
             scene_reference=payload.scene_reference,
             video_provider=payload.video_provider,
         )
-        return await self.upsert(project)
 
     async def get(self, project_id: str) -> CreativeProject:
         project = self._items.get(project_id)
@@ -72,8 +128,19 @@ class InMemoryCreativeProjectRepository(BaseCreativeProjectRepository):
     async def upsert(self, project: CreativeProject) -> CreativeProject:
         with self._lock:
             self._items[project.id] = project
+        await record_projects([project])
         return project
 
+    async def get_many(self, project_ids: Iterable[str]) -> dict[str, CreativeProject]:
+        return {pid: self._items[pid] for pid in project_ids if pid in self._items}
+
+    async def upsert_many(self, projects: Iterable[CreativeProject]) -> list[CreativeProject]:
+        projects = list(projects)
+        with self._lock:
+            self._items.update((project.id, project) for project in projects)
+        await record_projects(projects)
+        return projects
+
     async def list_for_tenant(self, tenant_id: str) -> Iterable[CreativeProject]:
         return [p for p in self._items.values() if p.tenant_id == tenant_id]
 
@@ -93,7 +160,22 @@ class DatabaseCreativeProjectRepository(BaseCreativeProjectRepository):
             raise RuntimeError("DATABASE_URL must be configured for DatabaseCreativeProjectRepository")
 
     async def create(self, payload: CreativeProjectCreateRequest) -> CreativeProject:
-        project = CreativeProject(
+        project = self._new_project(payload)
+        await self.upsert(project)
+        return project
+
+    async def create_many(self, payloads: Iterable[CreativeProjectCreateRequest]) -> list[CreativeProject]:
+        """Insert all projects in a single transaction."""
+        projects = [self._new_project(payload) for payload in payloads]
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        async with db_manager.get_session() as db:
+            db.add_all([self._new_record_from_model(project, now) for project in projects])
+        await record_projects(projects)
+        return projects
+
+    @staticmethod
+    def _new_project(payload: CreativeProjectCreateRequest) -> CreativeProject:
+        return CreativeProject(
             id=str(uuid.uuid4()),
             tenant_id=payload.tenant_id,
             title=payload.title,
@@ -102,9 +184,8 @@ class DatabaseCreativeProjectRepository(BaseCreativeProjectRepository):
             style=payload.style,
             budget_limit_usd=payload.budget_limit_usd,
             auto_pause_enabled=payload.auto_pause_enabled,
+            consistency_level=payload.consistency_level,
         )
-        await self.upsert(project)
-        return project
 
     async def get(self, project_id: str) -> CreativeProject:
         record = await self._fetch_record(project_id)
@@ -114,14 +195,117 @@ class DatabaseCreativeProjectRepository(BaseCreativeProjectRepository):
 
     async def upsert(self, project: CreativeProject) -> CreativeProject:
         await self._persist(project)
+        await record_projects([project])
         return project
 
+    async def get_many(self, project_ids: Iterable[str]) -> dict[str, CreativeProject]:
+        """One ``IN`` query per :data:`_IN_CLAUSE_LIMIT` ids."""
+        ids = list(dict.fromkeys(project_ids))
+        found: dict[str, CreativeProject] = {}
+        async with db_manager.get_session() as db:
+            for start in range(0, len(ids), _IN_CLAUSE_LIMIT):
+                stmt = select(CreativeProjectRecord).where(
+                    CreativeProjectRecord.external_id.in_(ids[start : start + _IN_CLAUSE_LIMIT])
+                )
+                for record in (await db.scalars(stmt)).all():
+                    found[record.external_id] = self._record_to_model(record)
+        return found
+
+    async def upsert_many(self, projects: Iterable[CreativeProject]) -> list[CreativeProject]:
+        """Update existing rows and insert new ones in a single transaction."""
+        by_id = {project.id: project for project in projects}
+        ids = list(by_id)
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        async with db_manager.get_session() as db:
+            existing: set[str] = set()
+            for start in range(0, len(ids), _IN_CLAUSE_LIMIT):
+                stmt = select(CreativeProjectRecord).where(
+                    CreativeProjectRecord.external_id.in_(ids[start : start + _IN_CLAUSE_LIMIT])
+                )
+                for record in (await db.scalars(stmt)).all():
+                    self._update_record_from_model(record, by_id[record.external_id], now)
+                    existing.add(record.external_id)
+            db.add_all(
+                [self._new_record_from_model(project, now) for pid, project in by_id.items() if pid not in existing]
+            )
+        await record_projects(by_id.values())
+        return list(by_id.values())
+
     async def list_for_tenant(self, tenant_id: str) -> Iterable[CreativeProject]:
         async with db_manager.get_session() as db:
             stmt = select(CreativeProjectRecord).where(CreativeProjectRecord.user_id == tenant_id)
             results = (await db.scalars(stmt)).all()
             return [self._record_to_model(rec) for rec in results]
 
+    async def summarize_tenant(self, tenant_id: str) -> dict[str, float]:
+        """One grouped query with conditional counts over the indexed columns."""
+        record = CreativeProjectRecord
+        score = record.consistency_score
+
+        def count_if(condition: Any) -> Any:
+            return func.sum(case((condition, 1), else_=0))
+
+        async with db_manager.get_session() as db:
+            duration = self._seconds_between(db.bind.dialect.name, record.created_at, record.last_active_at)
+            columns = {
+                "projects": func.count(),
+                "scored": func.count(score),
+                "score_sum": func.sum(score),
+                "range:excellent": count_if(score >= 0.9),
+                "range:good": count_if(and_(score >= 0.7, score < 0.9)),
+                "range:fair": count_if(and_(score >= 0.5, score < 0.7)),
+                "range:poor": count_if(score < 0.5),
+                "low_quality": count_if(score < 0.6),
+                "quality:high": count_if(score >= 0.8),
+                "quality:medium": count_if(and_(score >= 0.6, score < 0.8)),
+                "quality:low": count_if(or_(score.is_(None), score < 0.6)),
+                "level:low": count_if(record.consistency_level == "low"),
+                "level:medium": count_if(record.consistency_level == "medium"),
+                "level:high": count_if(record.consistency_level == "high"),
+                "retries": func.sum(record.retry_count),
+                "successful_retries": func.sum(record.improved_panel_count),
+                "completed": count_if(record.status == "completed"),
+                "failed": count_if(record.status == "failed"),
+                "cost_usd": func.sum(record.cost_usd),
+                "processing_seconds": func.sum(duration),
+                "long_running": count_if(duration > LONG_RUNNING_SECONDS),
+            }
+            stmt = select(*columns.values()).where(record.user_id == tenant_id)
+            row = (await db.execute(stmt)).one()
+        return {field: float(value) for field, value in zip(columns, row) if value}
+
+    async def summarize_daily(self, tenant_id: str, since: date) -> dict[str, dict[str, float]]:
+        """Per-day counts from a query grouped on ``date(created_at)``."""
+        record = CreativeProjectRecord
+        day = func.date(record.created_at)
+        stmt = (
+            select(
+                day,
+                func.count(),
+                func.sum(record.consistency_score),
+                func.count(record.consistency_score),
+                func.sum(record.retry_count),
+                func.sum(record.improved_panel_count),
+            )
+            .where(record.user_id == tenant_id, record.created_at >= datetime.combine(since, time.min))
+            .group_by(day)
+        )
+        async with db_manager.get_session() as db:
+            rows = (await db.execute(stmt)).all()
+        return {
+            # PostgreSQL 返回 date，SQLite 返回字符串
+            (row[0].isoformat() if isinstance(row[0], date) else str(row[0])): dict(
+                zip(DAILY_FIELDS, (float(value or 0) for value in row[1:]))
+            )
+            for row in rows
+        }
+
+    @staticmethod
+    def _seconds_between(dialect: str, start: Any, end: Any) -> Any:
+        if dialect == "postgresql":
+            return func.extract("epoch", end - start)
+        return (func.julianday(end) - func.julianday(start)) * 86400
+
     async def _persist(self, project: CreativeProject) -> None:
         async with db_manager.get_session() as db:
             stmt = select(CreativeProjectRecord).where(CreativeProjectRecord.external_id == project.id)
@@ -177,6 +361,8 @@ class DatabaseCreativeProjectRepository(BaseCreativeProjectRepository):
             pause_reason=record.pause_reason,
             paused_at=record.paused_at,
             auto_pause_enabled=record.auto_pause_enabled if record.auto_pause_enabled is not None else True,
+            consistency_level=record.consistency_level or "medium",
+            overall_consistency_score=record.consistency_score,
             created_at=record.created_at or datetime.now(timezone.utc),
             updated_at=record.last_active_at or datetime.now(timezone.utc),
             error_message=record.error_message,
@@ -205,6 +391,9 @@ class DatabaseCreativeProjectRepository(BaseCreativeProjectRepository):
         record.paused_at = project.paused_at
         record.auto_pause_enabled = project.auto_pause_enabled
         record.error_message = project.error_message
+        record.consistency_level = project.consistency_level
+        record.consistency_score = project.overall_consistency_score
+        record.retry_count, record.improved_panel_count = retry_counts(project.storyboard)
         record.last_active_at = now
 
     def _new_record_from_model(self, project: CreativeProject, now: datetime) -> CreativeProjectRecord:
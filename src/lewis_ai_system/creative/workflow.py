@@ -284,11 +284,25 @@ class CreativeOrchestrator:
             raise ValueError("Storyboard must exist before generating shots")
 
         emit_event(TelemetryEvent(name="creative_shots_start", attributes={"project_id": project.id}))
+        provider = self._shot_provider(project)
+        tasks = [self._generate_single_shot_asset(provider, project, panel) for panel in project.storyboard]
+        return self.complete_shots(project, await asyncio.gather(*tasks))
+
+    def _shot_provider(self, project: CreativeProject):
         # 使用项目指定的视频提供商，而不是默认提供商
         provider_name = getattr(project, 'video_provider', self.video_provider_name)
-        provider = self._video_provider_factory(provider_name)
-        tasks = [self._generate_single_shot_asset(provider, project, panel) for panel in project.storyboard]
-        project.shots = await asyncio.gather(*tasks)
+        return self._video_provider_factory(provider_name)
+
+    async def render_shot(self, project: CreativeProject, scene_number: int) -> GeneratedShotAsset:
+        """Render one storyboard panel; used by per-shot worker jobs."""
+        panel = next((p for p in project.storyboard if p.scene_number == scene_number), None)
+        if panel is None:
+            raise ValueError(f"Scene {scene_number} not found in storyboard of {project.id}")
+        return await self._generate_single_shot_asset(self._shot_provider(project), project, panel)
+
+    def complete_shots(self, project: CreativeProject, shots: list[GeneratedShotAsset]) -> bool:
+        """Attach rendered shots in scene order and move to RENDER_PENDING. Returns False if paused."""
+        project.shots = sorted(shots, key=lambda shot: shot.scene_number)
         self.storage.save_json(
             f"{project.id}/shots.json",
             [shot.model_dump(mode="json") for shot in project.shots],
@@ -725,5 +739,23 @@ class CreativeOrchestrator:
 
 creative_orchestrator = CreativeOrchestrator()
 
+
+def use_repository(repository: BaseCreativeProjectRepository) -> CreativeOrchestrator:
+    """把模块级存储库与编排器切换到 ``repository``（API 与 worker 启动时共用）。
+
+    按名字导入 ``creative_orchestrator`` 的模块不会看到新实例，需要在调用时
+    通过本模块读取，或由调用方另行重新绑定。
+    """
+    from . import repository as repository_module
+
+    global creative_orchestrator
+    repository_module.creative_repository = repository
+    creative_orchestrator = CreativeOrchestrator(
+        repository=repository,
+        storage=creative_orchestrator.storage,
+        video_provider_name=creative_orchestrator.video_provider_name,
+    )
+    return creative_orchestrator
+
 # Provide legacy class name for older imports/tests.
 CreativeWorkflow = CreativeOrchestrator
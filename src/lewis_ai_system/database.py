@@ -5,7 +5,7 @@ from __future__ import annotations
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, JSON, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, JSON, Boolean, ForeignKey, Index
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime, timezone
@@ -57,10 +57,21 @@ class CreativeProject(Base):
     cost_usd = Column(Float, default=0.0, nullable=False)
     auto_pause_enabled = Column(Boolean, default=True)
     
+    # ========== 一致性（监控统计直接在 SQL 中聚合） ==========
+    consistency_level = Column(String(10), nullable=False, default="medium")
+    consistency_score = Column(Float, nullable=True, index=True)
+    retry_count = Column(Integer, nullable=False, default=0)  # 所有分镜的重试次数之和
+    improved_panel_count = Column(Integer, nullable=False, default=0)  # 重试后一致性达标的分镜数
+    
     # ========== 时间戳 ==========
     created_at = Column(DateTime, default=lambda: datetime.utcnow(), nullable=False, index=True)
     last_active_at = Column(DateTime, default=lambda: datetime.utcnow(), onupdate=lambda: datetime.utcnow(), nullable=False)
     
+    __table_args__ = (
+        Index("ix_creative_projects_user_status", "user_id", "status"),
+        Index("ix_creative_projects_user_created", "user_id", "created_at"),
+    )
+    
     # Relationships
     scripts = relationship("Script", back_populates="project", cascade="all, delete-orphan")
     storyboards = relationship("Storyboard", back_populates="project", cascade="all, delete-orphan")
@@ -289,7 +300,7 @@ class VectorIndexMaintenance(Base):
     __tablename__ = "vector_index_maintenance_log"
     
     id = Column(Integer, primary_key=True)
-    operation = Column(String(50), nullable=False)  # rebuild, quantize, cleanup
+    operation = Column(String(50), nullable=False)  # rebuild, quantize, compact, expire
     collection = Column(String(100), nullable=False)
     records_affected = Column(Integer, default=0)
     duration_seconds = Column(Float)
@@ -0,0 +1,388 @@
+"""Text embedding providers, caching and background encoding.
+
+Conversation memory used to be embedded by spreading a SHA-256 digest over 32
+floats, which made similarity search return arbitrary neighbours. This module
+provides real embeddings behind a small :class:`EmbeddingProvider` protocol:
+
+* :class:`HashingEmbeddingProvider` – local, dependency-free hashing-trick
+  term-frequency vectors (word tokens plus CJK character bigrams).
+* :class:`OpenAIEmbeddingProvider` – any OpenAI-compatible ``/embeddings``
+  endpoint.
+
+:class:`EmbeddingService` adds an LRU cache keyed on the text hash and splits
+work into provider-sized batches. :class:`EmbeddingQueue` encodes in the
+background, coalescing submissions from concurrent sessions into batches, so
+callers on the request path never wait for the encoder.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import math
+import re
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Protocol
+
+import httpx
+import numpy as np
+
+from .config import settings
+from .instrumentation import TelemetryEvent, emit_event, get_logger
+
+logger = get_logger()
+
+EmbeddingCallback = Callable[[list[float]], Awaitable[None]]
+
+# 未声明 query_timeout_seconds 的提供方在请求路径上按本地编码的耗时估计
+DEFAULT_QUERY_TIMEOUT_SECONDS = 0.3
+
+
+class EmbeddingError(RuntimeError):
+    """Raised when a provider cannot encode a batch."""
+
+
+class EmbeddingProvider(Protocol):
+    """Encodes batches of texts into fixed-size vectors."""
+
+    name: str
+    dimension: int
+    max_batch_size: int
+    # 请求路径上嵌入一条查询（加上检索）可接受的等待时间
+    query_timeout_seconds: float
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        """Return one vector per input text, in order."""
+        ...
+
+
+# 英文/数字按词切分，中日韩文字按单字切分后再组合成双字词
+_TOKEN_RE = re.compile(r"[a-z0-9_]+|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+
+
+def _tokenize(text: str) -> list[str]:
+    tokens: list[str] = []
+    previous_cjk: str | None = None
+    for token in _TOKEN_RE.findall(text.lower()):
+        if len(token) == 1 and not token.isascii():
+            tokens.append(token)
+            if previous_cjk is not None:
+                tokens.append(previous_cjk + token)
+            previous_cjk = token
+        else:
+            tokens.append(token)
+            previous_cjk = None
+    return tokens
+
+
+@lru_cache(maxsize=65536)
+def _bucket(token: str, dimension: int) -> tuple[int, float]:
+    value = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+    return value % dimension, 1.0 if value >> 63 else -1.0
+
+
+class HashingEmbeddingProvider:
+    """Local hashing-trick embeddings; no model download or network access.
+
+    Each token is hashed to a signed bucket and weighted by ``1 + log(tf)``;
+    rows are L2-normalised. Texts that share vocabulary land close together,
+    which is what memory recall needs, at microseconds per text.
+    """
+
+    max_batch_size = 1024
+    query_timeout_seconds = DEFAULT_QUERY_TIMEOUT_SECONDS
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+        self.name = f"hashing-{dimension}"
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        return self.encode(texts).tolist()
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token, count in Counter(_tokenize(text)).items():
+                bucket, sign = _bucket(token, self.dimension)
+                matrix[row, bucket] += sign * (1.0 + math.log(count))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+@dataclass
+class OpenAIEmbeddingProvider:
+    """Embeddings from an OpenAI-compatible ``/embeddings`` endpoint.
+
+    One ``httpx.AsyncClient`` is kept per event loop so batches reuse pooled
+    connections; :meth:`aclose` releases it.
+    """
+
+    api_key: str
+    model: str = "text-embedding-3-small"
+    dimension: int = 384
+    base_url: str = "https://api.openai.com/v1"
+    max_batch_size: int = 64
+    timeout_seconds: float = 30.0
+    # 一次 HTTP 往返通常需要数百毫秒
+    query_timeout_seconds: float = 2.0
+    _client: httpx.AsyncClient | None = field(default=None, init=False, repr=False, compare=False)
+    _client_loop: asyncio.AbstractEventLoop | None = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def name(self) -> str:
+        return f"openai:{self.model}:{self.dimension}"
+
+    def _http_client(self) -> httpx.AsyncClient:
+        # 连接池绑定在事件循环上，换了循环（如同步工具里的 asyncio.run）就新建一个
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            client_kwargs: dict[str, object] = {
+                "timeout": self.timeout_seconds,
+                "headers": {"Authorization": f"Bearer {self.api_key}"},
+            }
+            if settings.httpx_proxies:
+                client_kwargs["proxy"] = settings.httpx_proxies
+            self._client = httpx.AsyncClient(**client_kwargs)
+            self._client_loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        client, self._client = self._client, None
+        if client is not None and self._client_loop is asyncio.get_running_loop():
+            await client.aclose()
+
+    async def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        payload = {"model": self.model, "input": texts, "dimensions": self.dimension}
+        try:
+            response = await self._http_client().post(f"{self.base_url.rstrip('/')}/embeddings", json=payload)
+            response.raise_for_status()
+        except httpx.HTTPError as exc:
+            raise EmbeddingError(f"Embedding request failed: {exc}") from exc
+
+        try:
+            items = sorted(response.json()["data"], key=lambda item: item["index"])
+            vectors = [item["embedding"] for item in items]
+        except (KeyError, TypeError, ValueError) as exc:
+            raise EmbeddingError("Malformed embedding response") from exc
+        if len(vectors) != len(texts):
+            raise EmbeddingError(f"Expected {len(texts)} embeddings, got {len(vectors)}")
+        return vectors
+
+
+def build_embedding_provider() -> EmbeddingProvider:
+    """Create the provider selected by ``EMBEDDING_PROVIDER``."""
+    if settings.embedding_provider == "openai":
+        if settings.openai_api_key:
+            return OpenAIEmbeddingProvider(
+                api_key=settings.openai_api_key,
+                model=settings.embedding_model,
+                dimension=settings.embedding_dimension,
+                base_url=settings.embedding_api_base_url,
+                max_batch_size=settings.embedding_batch_size,
+            )
+        logger.warning("EMBEDDING_PROVIDER=openai but OPENAI_API_KEY is not set; using hashing embeddings")
+    return HashingEmbeddingProvider(settings.embedding_dimension)
+
+
+class EmbeddingService:
+    """Batched, cached access to an :class:`EmbeddingProvider`."""
+
+    def __init__(self, provider: EmbeddingProvider, *, cache_size: int | None = None):
+        self.provider = provider
+        self.cache_size = cache_size if cache_size is not None else settings.embedding_cache_size
+        self._cache: OrderedDict[str, list[float]] = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "batches": 0}
+
+    @property
+    def dimension(self) -> int:
+        return self.provider.dimension
+
+    @property
+    def query_timeout_seconds(self) -> float:
+        """How long request-path callers should wait for one query embedding."""
+        return getattr(self.provider, "query_timeout_seconds", DEFAULT_QUERY_TIMEOUT_SECONDS)
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.provider.name}\x00{text}".encode("utf-8")).hexdigest()
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        """Embed texts, encoding only cache misses, at most one batch per provider limit."""
+        keys = [self._key(text) for text in texts]
+        results: list[list[float] | None] = [None] * len(texts)
+        missing: dict[str, list[int]] = {}
+        for i, key in enumerate(keys):
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                results[i] = cached
+                self._stats["hits"] += 1
+            else:
+                missing.setdefault(key, []).append(i)
+                self._stats["misses"] += 1
+
+        pending = list(missing.items())
+        batch_size = max(self.provider.max_batch_size, 1)
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            vectors = await self.provider.embed_batch([texts[positions[0]] for _, positions in chunk])
+            self._stats["batches"] += 1
+            for (key, positions), vector in zip(chunk, vectors):
+                self._remember(key, vector)
+                for i in positions:
+                    results[i] = vector
+        return results  # type: ignore[return-value]
+
+    async def embed_one(self, text: str) -> list[float]:
+        return (await self.embed([text]))[0]
+
+    def _remember(self, key: str, vector: list[float]) -> None:
+        if self.cache_size <= 0:
+            return
+        self._cache[key] = vector
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def stats(self) -> dict[str, Any]:
+        return {"provider": self.provider.name, "cached": len(self._cache), **self._stats}
+
+
+class EmbeddingQueue:
+    """Background encoder that batches texts submitted from any session.
+
+    :meth:`submit` never waits: it enqueues the text and returns. A worker
+    task collects up to ``batch_size`` items (waiting at most
+    ``flush_interval_seconds`` for stragglers), embeds them in one call and
+    hands each vector to its callback.
+    """
+
+    def __init__(
+        self,
+        service: EmbeddingService,
+        *,
+        batch_size: int | None = None,
+        flush_interval_seconds: float = 0.05,
+        max_pending: int = 10_000,
+    ):
+        self.service = service
+        self.batch_size = max(batch_size or settings.embedding_batch_size, 1)
+        self.flush_interval_seconds = flush_interval_seconds
+        self._queue: asyncio.Queue[tuple[str, EmbeddingCallback]] = asyncio.Queue(maxsize=max_pending)
+        self._loop = asyncio.get_running_loop()
+        self._worker: asyncio.Task[None] | None = None
+        self._stats = {"submitted": 0, "dropped": 0, "failed": 0}
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    def start(self) -> None:
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    def submit(self, text: str, callback: EmbeddingCallback) -> bool:
+        """Queue ``text``; ``callback`` receives its vector. False if the queue is full."""
+        try:
+            self._queue.put_nowait((text, callback))
+        except asyncio.QueueFull:
+            self._stats["dropped"] += 1
+            return False
+        self._stats["submitted"] += 1
+        self.start()
+        return True
+
+    async def drain(self) -> None:
+        """Wait until everything submitted so far has been processed."""
+        await self._queue.join()
+
+    async def _next_batch(self) -> list[tuple[str, EmbeddingCallback]]:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.flush_interval_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._process(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _process(self, batch: list[tuple[str, EmbeddingCallback]]) -> None:
+        try:
+            vectors = await self.service.embed([text for text, _ in batch])
+        except Exception as exc:
+            self._stats["failed"] += len(batch)
+            logger.error(f"Embedding batch of {len(batch)} failed: {exc}")
+            emit_event(TelemetryEvent(name="embedding_error", attributes={"error": str(exc), "batch": len(batch)}))
+            return
+        for (_, callback), vector in zip(batch, vectors):
+            try:
+                await callback(vector)
+            except Exception as exc:  # pragma: no cover - callbacks report their own errors
+                logger.error(f"Embedding callback failed: {exc}")
+
+    def stats(self) -> dict[str, Any]:
+        return {"pending": self._queue.qsize(), **self._stats, **self.service.stats()}
+
+    async def close(self) -> None:
+        """Process what is queued, then stop the worker."""
+        if self._worker is None:
+            return
+        await self.drain()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+
+# ============================================================================
+# Global instances
+# ============================================================================
+
+_embedding_service: EmbeddingService | None = None
+_embedding_queue: EmbeddingQueue | None = None
+
+
+def get_embedding_service() -> EmbeddingService:
+    """Return the process-wide embedding service."""
+    global _embedding_service
+    if _embedding_service is None:
+        _embedding_service = EmbeddingService(build_embedding_provider())
+    return _embedding_service
+
+
+async def get_embedding_queue() -> EmbeddingQueue:
+    """Return the background encoder for the running event loop."""
+    global _embedding_queue
+    if _embedding_queue is None or _embedding_queue.loop is not asyncio.get_running_loop():
+        _embedding_queue = EmbeddingQueue(get_embedding_service())
+    return _embedding_queue
+
+
+async def shutdown_embedding_queue() -> None:
+    """Flush pending encodings and close the provider's HTTP client at application shutdown."""
+    global _embedding_queue
+    if _embedding_queue is not None:
+        queue = _embedding_queue
+        _embedding_queue = None
+        if queue.loop is asyncio.get_running_loop():
+            await queue.close()
+    if _embedding_service is not None:
+        aclose = getattr(_embedding_service.provider, "aclose", None)
+        if aclose is not None:
+            await aclose()
@@ -57,6 +57,8 @@ class GeneralSession(BaseModel):
     messages: list[str] = Field(default_factory=list)
     tool_calls: list[ToolCallRecord] = Field(default_factory=list)
     uploads: list[UploadedFileMeta] = Field(default_factory=list)
+    # 每次持久化递增，用于后台写入（历史压缩）的乐观并发控制
+    version: int = 0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
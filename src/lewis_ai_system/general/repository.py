@@ -18,6 +18,10 @@ from .models import GeneralSession, GeneralSessionCreateRequest
 logger = get_logger()
 
 
+class SessionVersionConflict(RuntimeError):
+    """Raised by ``upsert`` when the stored session moved past the caller's version."""
+
+
 class BaseGeneralSessionRepository(ABC):
     @abstractmethod
     async def create(self, payload: GeneralSessionCreateRequest) -> GeneralSession:  # pragma: no cover - interface
@@ -25,6 +29,11 @@ class BaseGeneralSessionRepository(ABC):
 
     @abstractmethod
     async def upsert(self, session: GeneralSession) -> GeneralSession:  # pragma: no cover - interface
+        """Persist ``session`` and bump its version.
+
+        Raises :class:`SessionVersionConflict` if the stored version is no
+        longer ``session.version`` (e.g. history compression saved meanwhile).
+        """
         raise NotImplementedError
 
     @abstractmethod
@@ -35,6 +44,41 @@ class BaseGeneralSessionRepository(ABC):
     async def list_for_tenant(self, tenant_id: str, limit: int = 50) -> list[GeneralSession]:  # pragma: no cover - interface
         raise NotImplementedError
 
+    async def compare_and_set(self, session: GeneralSession, expected_version: int) -> bool:
+        """Persist ``session`` only if the stored version is still ``expected_version``.
+
+        Subclasses should make the check and write atomic; this fallback is not.
+        """
+        try:
+            current = await self.get(session.id)
+        except KeyError:
+            return False
+        if current.version != expected_version:
+            return False
+        await self.upsert(session)
+        return True
+
+    async def upsert_appended(self, session: GeneralSession, base_length: int, attempts: int = 3) -> GeneralSession:
+        """Upsert a session whose messages past ``base_length`` were appended since it was loaded.
+
+        On a version conflict the appended messages are moved onto the stored
+        session's messages and the write is retried; other fields keep this
+        session's values.
+        """
+        for attempt in range(attempts):
+            try:
+                return await self.upsert(session)
+            except SessionVersionConflict:
+                if attempt == attempts - 1:
+                    raise
+            current = await self.get(session.id)
+            appended = session.messages[base_length:]
+            base_length = len(current.messages)
+            session = session.model_copy(
+                update={"messages": [*current.messages, *appended], "version": current.version}
+            )
+        return session
+
 
 class InMemoryGeneralSessionRepository(BaseGeneralSessionRepository):
     def __init__(self) -> None:
@@ -54,18 +98,34 @@ class InMemoryGeneralSessionRepository(BaseGeneralSessionRepository):
 
     async def upsert(self, session: GeneralSession) -> GeneralSession:
         with self._lock:
-            self._sessions[session.id] = session
+            current = self._sessions.get(session.id)
+            if current is not None and current.version != session.version:
+                raise SessionVersionConflict(
+                    f"Session {session.id} is at version {current.version}, not {session.version}"
+                )
+            session.version += 1
+            self._sessions[session.id] = session.model_copy(deep=True)
         return session
 
+    async def compare_and_set(self, session: GeneralSession, expected_version: int) -> bool:
+        with self._lock:
+            current = self._sessions.get(session.id)
+            if current is None or current.version != expected_version:
+                return False
+            session.version = expected_version + 1
+            self._sessions[session.id] = session.model_copy(deep=True)
+        return True
+
     async def get(self, session_id: str) -> GeneralSession:
         session = self._sessions.get(session_id)
         if not session:
             raise KeyError(f"Session {session_id} not found")
-        return session
+        # 与数据库实现一致：调用方拿到的是副本，未保存的修改不会泄漏到存储里
+        return session.model_copy(deep=True)
 
     async def list_for_tenant(self, tenant_id: str, limit: int = 50) -> list[GeneralSession]:
         return [
-            session for session in self._sessions.values()
+            session.model_copy(deep=True) for session in self._sessions.values()
             if session.tenant_id == tenant_id
         ][:limit]
 
@@ -87,20 +147,34 @@ class DatabaseGeneralSessionRepository(BaseGeneralSessionRepository):
         await self.upsert(session)
         return session
 
+    @staticmethod
+    def _apply(record: ConversationRecord, session: GeneralSession, now: datetime) -> None:
+        record.config_json = session.model_dump(mode="json")
+        record.status = session.state.value
+        record.iteration_count = session.iteration
+        record.cost_usd = session.spent_usd
+        record.max_iterations = session.max_iterations
+        record.budget_limit_usd = session.budget_limit_usd
+        record.last_active_at = now
+
     async def upsert(self, session: GeneralSession) -> GeneralSession:
         async with db_manager.get_session() as db:
-            stmt = select(ConversationRecord).where(ConversationRecord.external_id == session.id)
+            stmt = (
+                select(ConversationRecord)
+                .where(ConversationRecord.external_id == session.id)
+                .with_for_update()
+            )
             record = await db.scalar(stmt)
+            stored_version = (record.config_json or {}).get("version", 0) if record else None
+            if stored_version is not None and stored_version != session.version:
+                raise SessionVersionConflict(
+                    f"Session {session.id} is at version {stored_version}, not {session.version}"
+                )
+            session.version += 1
             payload = session.model_dump(mode="json")
             now = datetime.now(timezone.utc).replace(tzinfo=None)
             if record:
-                record.config_json = payload
-                record.status = session.state.value
-                record.iteration_count = session.iteration
-                record.cost_usd = session.spent_usd
-                record.max_iterations = session.max_iterations
-                record.budget_limit_usd = session.budget_limit_usd
-                record.last_active_at = now
+                self._apply(record, session, now)
             else:
                 record = ConversationRecord(
                     external_id=session.id,
@@ -118,6 +192,20 @@ class DatabaseGeneralSessionRepository(BaseGeneralSessionRepository):
                 db.add(record)
         return session
 
+    async def compare_and_set(self, session: GeneralSession, expected_version: int) -> bool:
+        async with db_manager.get_session() as db:
+            stmt = (
+                select(ConversationRecord)
+                .where(ConversationRecord.external_id == session.id)
+                .with_for_update()
+            )
+            record = await db.scalar(stmt)
+            if not record or not record.config_json or record.config_json.get("version", 0) != expected_version:
+                return False
+            session.version = expected_version + 1
+            self._apply(record, session, datetime.now(timezone.utc).replace(tzinfo=None))
+        return True
+
     async def get(self, session_id: str) -> GeneralSession:
         async with db_manager.get_session() as db:
             stmt = select(ConversationRecord).where(ConversationRecord.external_id == session_id)
@@ -6,20 +6,34 @@
 
 from __future__ import annotations
 
+import asyncio
 import hashlib
+import re
 from typing import Any
 
 from ..agents import agent_pool
+from ..config import settings
 from ..costs import cost_tracker
+from ..embeddings import get_embedding_service
 from ..instrumentation import TelemetryEvent, emit_event
-from ..tooling import ToolRequest, ToolRuntime, default_tool_runtime
+from ..sandbox_sessions import release_session_kernel
+from ..tooling import ToolRequest, ToolRuntime, default_tool_runtime, tool_context
 from ..vector_db import vector_db
 from .models import GuardrailTriggered, GeneralSession, GeneralSessionCreateRequest, GeneralSessionState, ToolCallRecord
 from .repository import BaseGeneralSessionRepository, general_repository
+from .write_behind import SessionWriteBehind
 
 # Maintain compatibility with older imports that expected SessionState here.
 SessionState = GeneralSessionState
 
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+
+
+def _estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中日韩字符按 1 个，其余按 4 个字符 1 个。"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
 
 class GeneralModeOrchestrator:
     """通用模式编排器，管理 ReAct 循环的执行和会话状态。
@@ -33,6 +47,11 @@ class GeneralModeOrchestrator:
         tool_runtime: ToolRuntime | None = None,
         memory_window: int = 5,
         compression_threshold: int = 25,
+        history_messages: int = 6,
+        memory_top_k: int = 4,
+        memory_token_budget: int = 600,
+        memory_min_score: float = 0.2,
+        memory_timeout_seconds: float | None = None,
     ) -> None:
         """初始化通用模式编排器。
         
@@ -41,11 +60,24 @@ class GeneralModeOrchestrator:
             tool_runtime: 工具运行时，如果为 None 则使用默认运行时
             memory_window: 内存窗口大小（保留的最近消息数），默认 5
             compression_threshold: 压缩阈值（超过此数量的消息将被压缩），默认 25
+            history_messages: 构建提示时保留的最近消息数，默认 6
+            memory_top_k: 注入提示的相关记忆条数上限，默认 4
+            memory_token_budget: 注入记忆的 token 预算，默认 600
+            memory_min_score: 记忆的最低相似度，默认 0.2
+            memory_timeout_seconds: 记忆检索（含嵌入）的硬超时，超时则跳过检索；为 None 时
+                取 MEMORY_RETRIEVAL_TIMEOUT_SECONDS，未配置则按嵌入提供方取默认值
+                （本地哈希 0.3 秒，OpenAI 2 秒）
         """
         self.repository = repository or general_repository
         self.tool_runtime = tool_runtime or default_tool_runtime
         self.memory_window = max(memory_window, 1)
         self.compression_threshold = max(compression_threshold, self.memory_window + 1)
+        self.history_messages = max(history_messages, 1)
+        self.memory_top_k = max(memory_top_k, 0)
+        self.memory_token_budget = memory_token_budget
+        self.memory_min_score = memory_min_score
+        self.memory_timeout_seconds = memory_timeout_seconds
+        self._write_behind: SessionWriteBehind | None = None
 
     async def create_session(self, payload: GeneralSessionCreateRequest) -> GeneralSession:
         """创建新的通用会话。
@@ -95,8 +127,9 @@ class GeneralModeOrchestrator:
         if session.state != GeneralSessionState.ACTIVE:
             raise ValueError(f"Session is not active (current state: {session.state})")
 
+        base_length = len(session.messages)
         if not self._can_continue(session):
-            return await self._persist_guardrail_pause(session)
+            return await self._persist_guardrail_pause(session, base_length)
 
         # 处理新的用户输入
         if prompt_text:
@@ -111,7 +144,7 @@ class GeneralModeOrchestrator:
 
         try:
             # 构建包含历史上下文的查询
-            context_query = self._build_context_query(session)
+            context_query = await self._build_context_query(session)
             
             # Delegate the entire loop to the GeneralAgent
             final_answer = await agent_pool.general.react_loop(context_query, recording_runtime, max_steps=remaining_steps)
@@ -134,41 +167,116 @@ class GeneralModeOrchestrator:
             session.summary = f"处理出错: {str(e)}"
             emit_event(TelemetryEvent(name="general_session_error", attributes={"session_id": session.id, "error": str(e)}))
 
+        await self._maybe_release_sandbox_kernel(session)
+
         try:
-            await self._maybe_store_memory(session)
-            await self._maybe_compress_history(session)
-            return await self.repository.upsert(session)
+            # 期间后台压缩可能已写入新版本，本轮新增的消息接到新版本之后
+            session = await self.repository.upsert_appended(session, base_length)
         except Exception as e:
             logger.error(f"Error persisting session {session_id}: {e}", exc_info=True)
             # Return session even if persistence fails, so user can see the result
             return session
 
-    def _build_context_query(self, session: GeneralSession) -> str:
-        """构建包含历史上下文的查询。
+        # 记忆写入和历史压缩在后台完成，不占用响应时间
+        await self._maybe_store_memory(session)
+        await self._maybe_compress_history(session)
+        return session
+
+    async def _build_context_query(self, session: GeneralSession) -> str:
+        """构建包含历史上下文和相关记忆的查询。
         
-        保留最近的对话历史，让 AI 能理解上下文。
+        保留最近的对话历史，并从向量库检索该租户的相关记忆，让 AI 能理解上下文。
         """
-        # 提取最近的对话历史（最多保留5轮）
+        # 提取最近的对话历史
         recent_messages = []
-        for msg in session.messages[-10:]:  # 最多10条消息
+        for msg in session.messages[-self.history_messages:]:
             if msg.startswith("User:") or msg.startswith("Assistant:"):
                 recent_messages.append(msg)
-        
-        if len(recent_messages) <= 1:
+
+        memories = await self._retrieve_memories(session, set(session.messages[-self.history_messages:]))
+
+        if len(recent_messages) <= 1 and not memories:
             # 只有当前问题，直接使用
             return session.goal
-        
-        # 构建带上下文的查询
-        context = "\n".join(recent_messages[:-1])  # 排除最后一条（当前问题）
+
+        sections = []
+        if memories:
+            sections.append("Relevant memories from earlier conversations:\n" + "\n".join(f"- {m}" for m in memories))
+        if len(recent_messages) > 1:
+            # 排除最后一条（当前问题）
+            sections.append("Based on our conversation history:\n" + "\n".join(recent_messages[:-1]))
+        context = "\n\n".join(sections)
         current_question = session.goal
-        
-        return f"""Based on our conversation history:
-{context}
+
+        return f"""{context}
 
 Current question: {current_question}
 
 Please answer the current question considering the context above."""
 
+    def _memory_timeout(self) -> float:
+        if self.memory_timeout_seconds is not None:
+            return self.memory_timeout_seconds
+        if settings.memory_retrieval_timeout_seconds is not None:
+            return settings.memory_retrieval_timeout_seconds
+        return get_embedding_service().query_timeout_seconds
+
+    async def _retrieve_memories(self, session: GeneralSession, seen_lines: set[str]) -> list[str]:
+        """检索租户的相关记忆，去重后按 token 预算截断；向量库过慢时直接跳过。"""
+        if not self.memory_top_k or self.memory_token_budget <= 0:
+            return []
+
+        async def search() -> list[tuple[str, float, dict]]:
+            embedding = await get_embedding_service().embed_one(session.goal)
+            return await vector_db.search_memories(
+                embedding,
+                tenant_id=session.tenant_id,
+                limit=self.memory_top_k * 2,
+            )
+
+        try:
+            results = await asyncio.wait_for(search(), self._memory_timeout())
+        except asyncio.TimeoutError:
+            emit_event(
+                TelemetryEvent(
+                    name="general_memory_retrieval_skipped",
+                    attributes={"session_id": session.id, "reason": "timeout"},
+                )
+            )
+            return []
+        except Exception as exc:
+            emit_event(
+                TelemetryEvent(
+                    name="general_memory_retrieval_skipped",
+                    attributes={"session_id": session.id, "reason": "error", "error": str(exc)},
+                )
+            )
+            return []
+
+        memories: list[str] = []
+        seen_digests: set[str] = set()
+        seen = set(seen_lines)
+        budget = self.memory_token_budget
+        for text, score, _metadata in results:
+            if score < self.memory_min_score or len(memories) >= self.memory_top_k:
+                break
+            # 记忆是多条消息的拼接，去掉已在最近历史或更高分记忆中出现的行
+            lines = [line for line in text.splitlines() if line.strip() and line not in seen]
+            if not lines:
+                continue
+            content = " / ".join(lines)
+            digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+            if digest in seen_digests:
+                continue
+            cost = _estimate_tokens(content)
+            if cost > budget:
+                continue
+            budget -= cost
+            seen_digests.add(digest)
+            seen.update(lines)
+            memories.append(content)
+        return memories
+
     def _can_continue(self, session: GeneralSession) -> bool:
         """Early guard check before entering the loop."""
         if not session.auto_pause_enabled:
@@ -200,18 +308,47 @@ Please answer the current question considering the context above."""
 
         return True
 
-    async def _persist_guardrail_pause(self, session: GeneralSession) -> GeneralSession:
+    async def _persist_guardrail_pause(self, session: GeneralSession, base_length: int) -> GeneralSession:
+        await self._maybe_release_sandbox_kernel(session)
         try:
-            return await self.repository.upsert(session)
+            return await self.repository.upsert_appended(session, base_length)
         except Exception:
             return session
 
+    async def _maybe_release_sandbox_kernel(self, session: GeneralSession) -> None:
+        """会话暂停或结束后释放其绑定的沙箱内核。"""
+        if session.state == GeneralSessionState.ACTIVE:
+            return
+        try:
+            await release_session_kernel(session.id)
+        except Exception as exc:  # pragma: no cover - cleanup must not break the response path
+            emit_event(
+                TelemetryEvent(
+                    name="sandbox_kernel_release_error",
+                    attributes={"session_id": session.id, "error": str(exc)},
+                )
+            )
+
+    def _get_write_behind(self) -> SessionWriteBehind:
+        loop = asyncio.get_running_loop()
+        if self._write_behind is None or self._write_behind.loop is not loop:
+            self._write_behind = SessionWriteBehind(
+                self.repository,
+                lambda text: agent_pool.formatter.summarize(text),
+                memory_window=self.memory_window,
+            )
+        return self._write_behind
+
+    async def flush_background_writes(self) -> None:
+        """等待排队中的记忆写入和历史压缩完成（测试和关闭时使用）。"""
+        if self._write_behind is not None and self._write_behind.loop is asyncio.get_running_loop():
+            await self._write_behind.drain()
+
     async def _maybe_store_memory(self, session: GeneralSession) -> None:
         if not session.messages:
             return
 
         snippet = "\n".join(session.messages[-self.memory_window :])
-        embedding = self._embed_text(snippet)
         metadata = {
             "tenant_id": session.tenant_id,
             "goal": session.goal,
@@ -219,48 +356,18 @@ Please answer the current question considering the context above."""
             "state": session.state.value,
         }
 
-        try:
-            await vector_db.store_conversation_memory(
-                session.id,
-                snippet,
-                embedding,
-                metadata,
-            )
-        except Exception as exc:  # pragma: no cover - telemetry for unexpected provider failures
+        if not await self._get_write_behind().submit_memory(session.id, snippet, metadata):
             emit_event(
                 TelemetryEvent(
-                    name="general_memory_error",
-                    attributes={"session_id": session.id, "error": str(exc)},
+                    name="general_memory_dropped",
+                    attributes={"session_id": session.id, "reason": "embedding_queue_full"},
                 )
             )
 
     async def _maybe_compress_history(self, session: GeneralSession) -> None:
         if len(session.messages) <= self.compression_threshold:
             return
-
-        preserved = session.messages[-self.memory_window :]
-        history_to_summarize = "\n".join(session.messages[:-self.memory_window])
-
-        try:
-            summary = await agent_pool.formatter.summarize(history_to_summarize)
-        except Exception as exc:  # pragma: no cover - avoid blocking flows on summarizer issues
-            emit_event(
-                TelemetryEvent(
-                    name="general_compression_error",
-                    attributes={"session_id": session.id, "error": str(exc)},
-                )
-            )
-            return
-
-        session.messages = [f"[历史摘要]\n{summary.strip()}"] + preserved
-
-    def _embed_text(self, text: str, dims: int = 32) -> list[float]:
-        digest = hashlib.sha256(text.encode("utf-8")).digest()
-        values = list(digest)
-        while len(values) < dims:
-            values.extend(values)
-        normalized = [(value / 255.0) for value in values[:dims]]
-        return normalized
+        self._get_write_behind().schedule_compression(session)
 
 
 class SessionRecordingToolRuntime:
@@ -332,7 +439,8 @@ class SessionRecordingToolRuntime:
         )
         
         try:
-            result = await self._runtime.execute_async(request)
+            with tool_context(self._session.tenant_id, self._session.id):
+                result = await self._runtime.execute_async(request)
             output = result.output
             cost = result.cost_usd
         except GuardrailTriggered:
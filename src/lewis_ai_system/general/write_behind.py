@@ -0,0 +1,184 @@
+"""Write-behind pipeline for General Mode memory and history compression.
+
+``run_iteration`` used to embed and store a memory snippet and, past the
+compression threshold, wait for an LLM summary before answering. Both now
+happen here, after the response has been returned:
+
+* Memory snippets go through the shared :class:`~lewis_ai_system.embeddings.EmbeddingQueue`.
+  Vectors that finish encoding together, from any number of sessions, are
+  written with one ``provider.insert`` call.
+* Compression runs as a background task per session. The summary is applied
+  with a compare-and-set on ``GeneralSession.version``; if the session moved
+  on meanwhile, the summary is rebased onto the newer messages as long as the
+  summarised prefix is unchanged, otherwise it is dropped and retried on a
+  later iteration.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from ..embeddings import get_embedding_queue
+from ..instrumentation import TelemetryEvent, emit_event, get_logger
+from ..vector_db import vector_db
+from .models import GeneralSession
+from .repository import BaseGeneralSessionRepository
+
+logger = get_logger()
+
+Summarizer = Callable[[str], Awaitable[str]]
+MemoryRecord = tuple[str, str, list[float], dict[str, Any]]
+
+
+class SessionWriteBehind:
+    """Defers memory writes and history compression off the response path."""
+
+    def __init__(
+        self,
+        repository: BaseGeneralSessionRepository,
+        summarize: Summarizer,
+        *,
+        memory_window: int,
+        insert_batch_size: int = 128,
+        max_compression_attempts: int = 3,
+    ) -> None:
+        self.repository = repository
+        self.summarize = summarize
+        self.memory_window = memory_window
+        self.insert_batch_size = max(insert_batch_size, 1)
+        self.max_compression_attempts = max(max_compression_attempts, 1)
+        self._loop = asyncio.get_running_loop()
+        self._pending: list[MemoryRecord] = []
+        self._flusher: asyncio.Task[None] | None = None
+        self._compressions: dict[str, asyncio.Task[bool]] = {}
+        self._stats = {
+            "memories_written": 0,
+            "insert_batches": 0,
+            "insert_failures": 0,
+            "compressions": 0,
+            "compression_rebases": 0,
+            "compression_conflicts": 0,
+        }
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    # ------------------------------------------------------------------
+    # Memory writes
+    # ------------------------------------------------------------------
+
+    async def submit_memory(self, session_id: str, text: str, metadata: dict[str, Any]) -> bool:
+        """Queue a memory snippet for embedding and a batched insert."""
+
+        async def buffer(embedding: list[float]) -> None:
+            self._pending.append((session_id, text, embedding, metadata))
+            if self._flusher is None or self._flusher.done():
+                self._flusher = asyncio.create_task(self._flush())
+
+        queue = await get_embedding_queue()
+        return queue.submit(text, buffer)
+
+    async def _flush(self) -> None:
+        # 同一批嵌入的回调依次执行且不让出事件循环，因此第一次取出时已是整批
+        while self._pending:
+            batch = self._pending[: self.insert_batch_size]
+            del self._pending[: self.insert_batch_size]
+            try:
+                stored = await vector_db.store_conversation_memories(batch)
+            except Exception as exc:
+                stored = False
+                logger.error(f"Memory insert of {len(batch)} records failed: {exc}")
+            if stored:
+                self._stats["memories_written"] += len(batch)
+                self._stats["insert_batches"] += 1
+            else:
+                self._stats["insert_failures"] += 1
+                emit_event(
+                    TelemetryEvent(
+                        name="general_memory_error",
+                        attributes={"sessions": sorted({record[0] for record in batch}), "records": len(batch)},
+                    )
+                )
+
+    # ------------------------------------------------------------------
+    # History compression
+    # ------------------------------------------------------------------
+
+    def schedule_compression(self, session: GeneralSession) -> bool:
+        """Summarise the session's older messages in the background.
+
+        ``session`` must be the version that was just persisted. Returns False
+        if a compression for the session is already running.
+        """
+        running = self._compressions.get(session.id)
+        if running is not None and not running.done():
+            return False
+        prefix = list(session.messages[: -self.memory_window])
+        task = asyncio.create_task(self._compress(session.id, prefix, session.version))
+        self._compressions[session.id] = task
+        task.add_done_callback(lambda done: self._forget(session.id, done))
+        return True
+
+    def _forget(self, session_id: str, task: asyncio.Task[bool]) -> None:
+        if self._compressions.get(session_id) is task:
+            del self._compressions[session_id]
+
+    async def _compress(self, session_id: str, prefix: list[str], version: int) -> bool:
+        try:
+            summary = await self.summarize("\n".join(prefix))
+        except Exception as exc:
+            emit_event(
+                TelemetryEvent(
+                    name="general_compression_error",
+                    attributes={"session_id": session_id, "error": str(exc)},
+                )
+            )
+            return False
+
+        summary_message = f"[历史摘要]\n{summary.strip()}"
+        for _ in range(self.max_compression_attempts):
+            try:
+                current = await self.repository.get(session_id)
+            except KeyError:
+                return False
+            if current.messages[: len(prefix)] != prefix:
+                # 被摘要的前缀已经变化（例如被其他压缩替换），放弃本次结果
+                break
+            if current.version != version:
+                # 摘要期间会话又前进了，把摘要接到新消息前面
+                self._stats["compression_rebases"] += 1
+            updated = current.model_copy(
+                update={"messages": [summary_message] + current.messages[len(prefix):]}
+            )
+            if await self.repository.compare_and_set(updated, current.version):
+                self._stats["compressions"] += 1
+                emit_event(
+                    TelemetryEvent(
+                        name="general_history_compressed",
+                        attributes={"session_id": session_id, "messages_summarized": len(prefix)},
+                    )
+                )
+                return True
+            self._stats["compression_conflicts"] += 1
+        emit_event(
+            TelemetryEvent(
+                name="general_compression_error",
+                attributes={"session_id": session_id, "error": "session changed during compression"},
+            )
+        )
+        return False
+
+    # ------------------------------------------------------------------
+
+    async def drain(self) -> None:
+        """Wait for queued memories and running compressions to finish."""
+        await (await get_embedding_queue()).drain()
+        if self._flusher is not None:
+            await self._flusher
+        if self._compressions:
+            await asyncio.gather(*self._compressions.values(), return_exceptions=True)
+
+    def stats(self) -> dict[str, Any]:
+        return {"pending_memories": len(self._pending), "compressing": len(self._compressions), **self._stats}
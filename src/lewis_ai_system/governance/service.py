@@ -40,11 +40,59 @@ class GovernanceAnalyticsService:
         stored_type = snapshot.get("entity_type") or entity_type.value
         entity_enum = GovernanceEntityType(stored_type)
         budget_limit = snapshot.get("budget_limit") or await self._resolve_budget(entity_id, entity_enum)
-        remaining_budget = (budget_limit - snapshot["current_cost"]) if budget_limit is not None else None
+        return self._build_cost_summary(entity_id, entity_enum, snapshot, budget_limit)
+
+    async def list_cost_summaries(
+        self,
+        entity_type: GovernanceEntityType | None = None,
+    ) -> list[GovernanceCostSummary]:
+        """Cost summaries for every tracked entity.
+
+        Budgets missing from the cost monitor are looked up for all projects at
+        once with ``get_many`` (one ``IN`` query on the database backend)
+        instead of one repository read per entity.
+        """
+        snapshots: dict[str, tuple[GovernanceEntityType, dict]] = {}
+        for entity_id, entity_snapshots in self.cost_monitor.snapshots.items():
+            if not entity_snapshots:
+                continue
+            snapshot_type = GovernanceEntityType(entity_snapshots[-1].entity_type)
+            if entity_type and snapshot_type != entity_type:
+                continue
+            snapshots[entity_id] = (snapshot_type, self.cost_monitor.get_cost_summary(entity_id))
+
+        missing_projects = [
+            entity_id
+            for entity_id, (snapshot_type, snapshot) in snapshots.items()
+            if not snapshot.get("budget_limit") and snapshot_type == GovernanceEntityType.PROJECT
+        ]
+        project_budgets: dict[str, float] = {}
+        if missing_projects:
+            projects = await self.creative_repo.get_many(missing_projects)
+            project_budgets = {project_id: project.budget_limit_usd for project_id, project in projects.items()}
+
+        summaries: list[GovernanceCostSummary] = []
+        for entity_id, (snapshot_type, snapshot) in snapshots.items():
+            budget_limit = snapshot.get("budget_limit")
+            if not budget_limit:
+                if snapshot_type == GovernanceEntityType.PROJECT:
+                    budget_limit = project_budgets.get(entity_id)
+                else:
+                    budget_limit = await self._resolve_budget(entity_id, snapshot_type)
+            summaries.append(self._build_cost_summary(entity_id, snapshot_type, snapshot, budget_limit))
+        return summaries
 
+    @staticmethod
+    def _build_cost_summary(
+        entity_id: str,
+        entity_type: GovernanceEntityType,
+        snapshot: dict,
+        budget_limit: float | None,
+    ) -> GovernanceCostSummary:
+        remaining_budget = (budget_limit - snapshot["current_cost"]) if budget_limit is not None else None
         return GovernanceCostSummary(
             entity_id=entity_id,
-            entity_type=entity_enum,
+            entity_type=entity_type,
             current_cost=snapshot["current_cost"],
             current_rate=snapshot["current_rate"],
             historical_rate=snapshot["historical_rate"],
@@ -55,24 +103,6 @@ class GovernanceAnalyticsService:
             remaining_budget=remaining_budget,
         )
 
-    async def list_cost_summaries(
-        self,
-        entity_type: GovernanceEntityType | None = None,
-    ) -> list[GovernanceCostSummary]:
-        summaries: list[GovernanceCostSummary] = []
-        for entity_id, snapshots in self.cost_monitor.snapshots.items():
-            if not snapshots:
-                continue
-            snapshot_type = GovernanceEntityType(snapshots[-1].entity_type)
-            if entity_type and snapshot_type != entity_type:
-                continue
-            try:
-                summary = await self.get_cost_summary(entity_id, snapshot_type)
-            except KeyError:
-                continue
-            summaries.append(summary)
-        return summaries
-
     async def get_recent_audit_events(self, *, limit: int = 50, name: str | None = None) -> list[GovernanceAuditEvent]:
         events = self.telemetry_store.list_events(limit=limit, name=name)
         events = list(reversed(events))
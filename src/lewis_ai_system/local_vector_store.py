@@ -0,0 +1,579 @@
+"""Persistent local vector store backed by memory-mapped files and SQLite.
+
+:class:`~lewis_ai_system.vector_db.InMemoryVectorDB` loses everything on
+restart. :class:`PersistentVectorDB` keeps the same search path (normalised
+float32 rows, matrix product, optional IVF index) but stores each collection
+on disk:
+
+* ``<collection>.<generation>.f32`` – append-only log of normalised rows,
+  opened read-only with ``np.memmap``. Rows are never rewritten in place.
+* ``<collection>.<generation>.deleted`` – append-only log of tombstoned row
+  numbers (``int64``).
+* ``metadata.sqlite`` – ids, texts, timestamps and metadata per row, plus a
+  ``vector_tags`` table that serves equality filters from an index.
+
+Opening a collection maps the vector file and replays the delete log, so
+startup time and resident memory do not depend on the number of vectors
+(one byte per row for the liveness mask). Compaction writes the live rows to
+the next generation's file and renumbers the SQLite rows in one transaction.
+
+Write order keeps the files and SQLite consistent after a crash: vectors are
+appended before the transaction that references them commits, and deletes
+are logged after it commits. On open, rows past ``next_row`` are truncated
+and a liveness mask that disagrees with ``live_rows`` is rebuilt from SQLite.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+
+import numpy as np
+
+from .config import settings
+from .instrumentation import get_logger
+from .vector_db import EmbeddingVector, InMemoryVectorDB, VectorCollection
+from .vector_index import ScalarQuantizer, VectorIndex, build_vector_index, build_vector_quantizer
+
+logger = get_logger()
+
+# SQLite 单条语句的参数个数有上限，IN 查询按此分块
+_SQL_CHUNK = 500
+# 压缩时分块拷贝存活行，避免一次性把整个矩阵读进内存
+_COPY_CHUNK_ROWS = 65536
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS collections (
+    name TEXT PRIMARY KEY,
+    dimension INTEGER,
+    generation INTEGER NOT NULL DEFAULT 0,
+    next_row INTEGER NOT NULL DEFAULT 0,
+    live_rows INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS vectors (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (collection, id)
+);
+CREATE INDEX IF NOT EXISTS ix_vectors_row ON vectors (collection, row);
+CREATE INDEX IF NOT EXISTS ix_vectors_expires ON vectors (collection, expires_at);
+CREATE TABLE IF NOT EXISTS vector_tags (
+    collection TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_vector_tags_value ON vector_tags (collection, key, value);
+CREATE INDEX IF NOT EXISTS ix_vector_tags_row ON vector_tags (collection, row);
+"""
+
+
+def _tag_value(value: Any) -> str | None:
+    """JSON form of a metadata value served from ``vector_tags``; None if not indexed."""
+    if isinstance(value, (str, bool, int, float)):
+        return json.dumps(value)
+    return None
+
+
+def _timestamp(value: datetime | None) -> float | None:
+    return value.timestamp() if value is not None else None
+
+
+def _chunks(items: list[Any], size: int = _SQL_CHUNK) -> Iterator[list[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class MmapVectorCollection(VectorCollection):
+    """A :class:`VectorCollection` whose rows live in a memory-mapped file.
+
+    Only the liveness mask is held in memory; ids and metadata are looked up
+    in SQLite for the rows a query actually returns. Returned vectors are the
+    stored (normalised) rows. With an int8 ``quantizer`` only the codes are
+    resident; the mapped float32 rows are read for re-ranking candidates.
+    """
+
+    # 行在磁盘上，重排直接读映射的 float32，不在内存里另存半精度副本
+    rerank_dtype = np.float32
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        directory: Path,
+        name: str,
+        dimension: int | None = None,
+        *,
+        compaction_ratio: float = 0.25,
+        compaction_min_rows: int = 256,
+        index: VectorIndex | None = None,
+        quantizer: ScalarQuantizer | None = None,
+        sync_writes: bool = True,
+    ):
+        super().__init__(
+            dimension,
+            compaction_ratio=compaction_ratio,
+            compaction_min_rows=compaction_min_rows,
+            index=index,
+            quantizer=quantizer,
+        )
+        self.name = name
+        self.directory = directory
+        self.sync_writes = sync_writes
+        self._conn = conn
+        safe = re.sub(r"[^A-Za-z0-9_-]", "_", name)[:64]
+        self._stem = f"{safe}-{hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]}"
+        self._live = 0
+        self._open()
+
+    # ------------------------------------------------------------------
+    # Recovery
+    # ------------------------------------------------------------------
+
+    def _vector_path(self, generation: int | None = None) -> Path:
+        return self.directory / f"{self._stem}.{self.generation if generation is None else generation}.f32"
+
+    def _deleted_path(self, generation: int | None = None) -> Path:
+        return self.directory / f"{self._stem}.{self.generation if generation is None else generation}.deleted"
+
+    def _open(self) -> None:
+        record = self._conn.execute(
+            "SELECT dimension, generation, next_row, live_rows FROM collections WHERE name = ?", (self.name,)
+        ).fetchone()
+        if record is None:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO collections (name, dimension) VALUES (?, ?)", (self.name, self.dimension)
+                )
+            record = (self.dimension, 0, 0, 0)
+        dimension, self.generation, next_row, live_rows = record
+        self.dimension = dimension if dimension is not None else self.dimension
+        self._remove_stale_files()
+
+        path = self._vector_path()
+        row_bytes = 4 * (self.dimension or 0)
+        on_disk = path.stat().st_size // row_bytes if row_bytes and path.exists() else 0
+        if on_disk > next_row:
+            # 上次写文件后未提交事务就退出了：丢弃没有元数据的尾部行
+            with path.open("r+b") as fh:
+                fh.truncate(next_row * row_bytes)
+        elif on_disk < next_row:
+            logger.warning(f"Vector file for {self.name} is missing rows {on_disk}..{next_row}; dropping them")
+            with self._conn:
+                self._conn.execute("DELETE FROM vectors WHERE collection = ? AND row >= ?", (self.name, on_disk))
+                self._conn.execute("DELETE FROM vector_tags WHERE collection = ? AND row >= ?", (self.name, on_disk))
+                live_rows = self._conn.execute(
+                    "SELECT COUNT(*) FROM vectors WHERE collection = ?", (self.name,)
+                ).fetchone()[0]
+                self._conn.execute(
+                    "UPDATE collections SET next_row = ?, live_rows = ? WHERE name = ?",
+                    (on_disk, live_rows, self.name),
+                )
+            next_row = on_disk
+
+        self._size = next_row
+        self._alive = np.ones(next_row, dtype=bool)
+        deleted_path = self._deleted_path()
+        if deleted_path.exists():
+            deleted = np.fromfile(deleted_path, dtype=np.int64)
+            self._alive[deleted[deleted < next_row]] = False
+        if int(self._alive.sum()) != live_rows:
+            # 事务已提交但删除日志没写完：以 SQLite 为准重建存活掩码和删除日志
+            self._rebuild_alive()
+        self._live = live_rows
+        self._tombstones = next_row - live_rows
+        self._remap()
+
+    def _rebuild_alive(self) -> None:
+        alive = np.zeros(self._size, dtype=bool)
+        rows = np.fromiter(
+            (row for (row,) in self._conn.execute("SELECT row FROM vectors WHERE collection = ?", (self.name,))),
+            dtype=np.intp,
+        )
+        alive[rows] = True
+        self._alive = alive
+        np.flatnonzero(~alive).astype(np.int64).tofile(self._deleted_path())
+
+    def _remove_stale_files(self) -> None:
+        current = {self._vector_path().name, self._deleted_path().name}
+        for path in self.directory.glob(f"{self._stem}.*"):
+            if path.name not in current:
+                path.unlink(missing_ok=True)
+
+    def _remap(self) -> None:
+        if not self._size or not self.dimension:
+            self._matrix = np.empty((0, self.dimension or 0), dtype=np.float32)
+            return
+        self._matrix = np.memmap(self._vector_path(), dtype=np.float32, mode="r", shape=(self._size, self.dimension))
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return self._live
+
+    def __contains__(self, vector_id: str) -> bool:
+        return self.get(vector_id) is not None
+
+    def get(self, vector_id: str) -> EmbeddingVector | None:
+        record = self._conn.execute(
+            "SELECT row, id, text, metadata, created_at, expires_at FROM vectors WHERE collection = ? AND id = ?",
+            (self.name, vector_id),
+        ).fetchone()
+        return self._to_vector(record) if record is not None else None
+
+    def vectors(self) -> list[EmbeddingVector]:
+        """Live vectors in row order; reads the whole collection."""
+        cursor = self._conn.execute(
+            "SELECT row, id, text, metadata, created_at, expires_at FROM vectors "
+            "WHERE collection = ? ORDER BY row",
+            (self.name,),
+        )
+        return [self._to_vector(record) for record in cursor]
+
+    def expired_ids(self, now: datetime) -> list[str]:
+        """Ids whose ``expires_at`` is at or before ``now``, via the expiry index."""
+        cursor = self._conn.execute(
+            "SELECT id FROM vectors WHERE collection = ? AND expires_at <= ?",
+            (self.name, now.timestamp()),
+        )
+        return [vector_id for (vector_id,) in cursor]
+
+    def expire(self, now: datetime) -> int:
+        return self.remove(self.expired_ids(now))
+
+    def _to_vector(self, record: tuple) -> EmbeddingVector:
+        row, vector_id, text, metadata, created_at, expires_at = record
+        return EmbeddingVector(
+            id=vector_id,
+            vector=np.asarray(self._matrix[row]).tolist(),
+            metadata=json.loads(metadata),
+            text=text,
+            created_at=datetime.fromtimestamp(created_at, timezone.utc),
+            expires_at=datetime.fromtimestamp(expires_at, timezone.utc) if expires_at is not None else None,
+        )
+
+    def _records(self, rows: Iterable[int]) -> dict[int, tuple]:
+        records: dict[int, tuple] = {}
+        for chunk in _chunks(list(rows)):
+            cursor = self._conn.execute(
+                "SELECT row, id, text, metadata, created_at, expires_at FROM vectors "
+                f"WHERE collection = ? AND row IN ({','.join('?' * len(chunk))})",
+                (self.name, *chunk),
+            )
+            records.update((record[0], record) for record in cursor)
+        return records
+
+    def _rows_for(self, vector_ids: list[str]) -> dict[str, int]:
+        rows: dict[str, int] = {}
+        for chunk in _chunks(vector_ids):
+            cursor = self._conn.execute(
+                f"SELECT id, row FROM vectors WHERE collection = ? AND id IN ({','.join('?' * len(chunk))})",
+                (self.name, *chunk),
+            )
+            rows.update(cursor)
+        return rows
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def add(self, vectors: list[EmbeddingVector]) -> None:
+        """Append vectors, replacing any existing rows with the same id."""
+        if not vectors:
+            return
+        # 同一批里重复的 id 只保留最后一次写入
+        vectors = list({vec.id: vec for vec in vectors}.values())
+        block = self._prepare_block(vectors)
+        start = self._size
+        end = start + len(vectors)
+        previous = self._rows_for([vec.id for vec in vectors])
+
+        with self._vector_path().open("ab") as fh:
+            fh.write(block.tobytes())
+            self._sync(fh)
+        replaced = sorted(previous.values())
+        with self._conn:
+            self._delete_tags(replaced)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vectors (collection, id, row, text, metadata, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        self.name,
+                        vec.id,
+                        row,
+                        vec.text,
+                        json.dumps(vec.metadata, default=str),
+                        vec.created_at.timestamp(),
+                        _timestamp(vec.expires_at),
+                    )
+                    for row, vec in enumerate(vectors, start)
+                ],
+            )
+            self._conn.executemany(
+                "INSERT INTO vector_tags (collection, row, key, value) VALUES (?, ?, ?, ?)",
+                [
+                    (self.name, row, key, tag)
+                    for row, vec in enumerate(vectors, start)
+                    for key, value in vec.metadata.items()
+                    if (tag := _tag_value(value)) is not None
+                ],
+            )
+            self._conn.execute(
+                "UPDATE collections SET dimension = ?, next_row = ?, live_rows = ? WHERE name = ?",
+                (self.dimension, end, self._live + len(vectors) - len(replaced), self.name),
+            )
+        self._log_deleted(replaced)
+
+        self._reserve(end)
+        self._alive[start:end] = True
+        self._alive[replaced] = False
+        self._tombstones += len(replaced)
+        self._live += len(vectors) - len(replaced)
+        self._size = end
+        self._remap()
+        if self.index is not None:
+            self.index.add(start, block)
+        if self.quantizer is not None:
+            self.quantizer.add(start, block)
+
+    def remove(self, vector_ids: list[str]) -> int:
+        """Tombstone vectors by id. Returns how many were live."""
+        rows = sorted(self._rows_for(list(dict.fromkeys(vector_ids))).values())
+        if not rows:
+            return 0
+        with self._conn:
+            for chunk in _chunks(rows):
+                self._conn.execute(
+                    f"DELETE FROM vectors WHERE collection = ? AND row IN ({','.join('?' * len(chunk))})",
+                    (self.name, *chunk),
+                )
+            self._delete_tags(rows)
+            self._conn.execute(
+                "UPDATE collections SET live_rows = ? WHERE name = ?", (self._live - len(rows), self.name)
+            )
+        self._log_deleted(rows)
+        self._alive[rows] = False
+        self._tombstones += len(rows)
+        self._live -= len(rows)
+        return len(rows)
+
+    def compact(self) -> int:
+        """Write live rows to the next generation's file and renumber them in SQLite."""
+        if not self._tombstones:
+            return 0
+        reclaimed = self._tombstones
+        keep = np.flatnonzero(self._alive[:self._size])
+        generation = self.generation + 1
+        with self._vector_path(generation).open("wb") as fh:
+            for start in range(0, len(keep), _COPY_CHUNK_ROWS):
+                fh.write(np.ascontiguousarray(self._matrix[keep[start:start + _COPY_CHUNK_ROWS]]).tobytes())
+            self._sync(fh)
+
+        with self._conn:
+            self._conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS row_remap (old INTEGER PRIMARY KEY, new INTEGER NOT NULL)"
+            )
+            self._conn.execute("DELETE FROM row_remap")
+            self._conn.executemany(
+                "INSERT INTO row_remap (old, new) VALUES (?, ?)",
+                ((old, new) for new, old in enumerate(keep.tolist())),
+            )
+            for table in ("vectors", "vector_tags"):
+                self._conn.execute(
+                    f"UPDATE {table} SET row = (SELECT new FROM row_remap WHERE old = {table}.row) "
+                    "WHERE collection = ?",
+                    (self.name,),
+                )
+            self._conn.execute(
+                "UPDATE collections SET generation = ?, next_row = ?, live_rows = ? WHERE name = ?",
+                (generation, len(keep), len(keep), self.name),
+            )
+            self._conn.execute("DELETE FROM row_remap")
+
+        # 旧文件在新一代提交后才删除；正在后台训练的线程持有的映射在 POSIX 上仍然有效
+        self.generation = generation
+        self._remove_stale_files()
+        self._size = len(keep)
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._tombstones = 0
+        self._live = len(keep)
+        self._remap()
+        if self.index is not None:
+            self.index.compact(keep)
+        if self.quantizer is not None:
+            self.quantizer.compact(keep)
+        return reclaimed
+
+    def _reserve(self, rows: int) -> None:
+        capacity = len(self._alive)
+        if rows <= capacity:
+            return
+        alive = np.zeros(max(rows, 2 * capacity, self._initial_capacity), dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._alive = alive
+
+    def _delete_tags(self, rows: list[int]) -> None:
+        for chunk in _chunks(rows):
+            self._conn.execute(
+                f"DELETE FROM vector_tags WHERE collection = ? AND row IN ({','.join('?' * len(chunk))})",
+                (self.name, *chunk),
+            )
+
+    def _log_deleted(self, rows: list[int]) -> None:
+        if not rows:
+            return
+        with self._deleted_path().open("ab") as fh:
+            fh.write(np.asarray(rows, dtype=np.int64).tobytes())
+            self._sync(fh)
+
+    def _sync(self, fh) -> None:
+        fh.flush()
+        if self.sync_writes:
+            os.fsync(fh.fileno())
+
+    # ------------------------------------------------------------------
+    # Search hooks
+    # ------------------------------------------------------------------
+
+    def _filter_rows(self, filters: dict[str, Any]) -> np.ndarray:
+        """Rows matching every filter; scalar values come from ``vector_tags``."""
+        rows: np.ndarray | None = None
+        residual: dict[str, Any] = {}
+        for key, value in filters.items():
+            tag = _tag_value(value)
+            if tag is None:
+                residual[key] = value
+                continue
+            cursor = self._conn.execute(
+                "SELECT row FROM vector_tags WHERE collection = ? AND key = ? AND value = ?",
+                (self.name, key, tag),
+            )
+            found = np.fromiter((row for (row,) in cursor), dtype=np.intp)
+            rows = np.sort(found) if rows is None else np.intersect1d(rows, found, assume_unique=True)
+            if rows.size == 0:
+                return rows
+        if rows is None:
+            rows = np.flatnonzero(self._alive[:self._size])
+        else:
+            rows = rows[self._alive[rows]]
+        if residual and rows.size:
+            # None 和列表、字典等值不进标签表，退回比较元数据
+            records = self._records(rows.tolist())
+            rows = np.asarray(
+                [
+                    row for row in rows.tolist()
+                    if row in records
+                    and all(json.loads(records[row][3]).get(key) == value for key, value in residual.items())
+                ],
+                dtype=np.intp,
+            )
+        return rows
+
+    def _materialize(self, rows: list[int], scores: list[float]) -> list[tuple[EmbeddingVector, float]]:
+        records = self._records(rows)
+        return [(self._to_vector(records[row]), score) for row, score in zip(rows, scores) if row in records]
+
+
+class PersistentVectorDB(InMemoryVectorDB):
+    """:class:`InMemoryVectorDB` whose collections persist under ``path``.
+
+    All collections found in ``metadata.sqlite`` are reopened at construction.
+    ANN indexes and quantization codes are not persisted; they are retrained
+    in the background on the first query or write after a restart, exactly as when a collection first
+    crosses the training threshold.
+
+    Collection operations (SQLite writes, fsync, remapping, searches) run in a
+    worker thread one at a time, so they neither block the event loop nor
+    interleave on the shared SQLite connection.
+    """
+
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        *,
+        index_type: str | None = None,
+        index_options: dict[str, Any] | None = None,
+        quantization: str | None = None,
+        quantization_options: dict[str, Any] | None = None,
+        compaction_ratio: float = 0.25,
+        compaction_min_rows: int = 256,
+        sync_writes: bool = True,
+    ):
+        super().__init__(
+            index_type=index_type,
+            index_options=index_options,
+            quantization=quantization,
+            quantization_options=quantization_options,
+            compaction_ratio=compaction_ratio,
+            compaction_min_rows=compaction_min_rows,
+        )
+        self.path = Path(path if path is not None else settings.vector_store_path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.sync_writes = sync_writes
+        # 连接只在持有 _io_lock 时由一个线程使用
+        self._conn = sqlite3.connect(self.path / "metadata.sqlite", check_same_thread=False)
+        self._io_lock = asyncio.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        for (name,) in self._conn.execute("SELECT name FROM collections").fetchall():
+            self._collection(name)
+
+    def _collection(self, collection: str, dimension: int | None = None) -> MmapVectorCollection:
+        if collection not in self.collections:
+            self.collections[collection] = MmapVectorCollection(
+                self._conn,
+                self.path,
+                collection,
+                dimension,
+                compaction_ratio=self.compaction_ratio,
+                compaction_min_rows=self.compaction_min_rows,
+                index=build_vector_index(self.index_type, **self.index_options),
+                quantizer=build_vector_quantizer(self.quantization, **self.quantization_options),
+                sync_writes=self.sync_writes,
+            )
+        return self.collections[collection]
+
+    async def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        async with self._io_lock:
+            return await asyncio.to_thread(fn, *args)
+
+    async def insert(self, collection: str, vectors: list[EmbeddingVector]) -> bool:
+        try:
+            return await super().insert(collection, vectors)
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Failed to persist vectors into {collection}: {e}")
+            return False
+
+    async def search(
+        self,
+        collection: str,
+        query_vector: list[float],
+        limit: int = 10,
+        filters: dict[str, Any] | None = None,
+    ) -> list[tuple[EmbeddingVector, float]]:
+        if collection in self.collections:
+            # 重启后索引为空，首次查询时在后台重新训练
+            self._maybe_schedule_rebuild(collection)
+        return await super().search(collection, query_vector, limit, filters)
+
+    async def close(self):
+        """Cancel background rebuilds and close the metadata database."""
+        await super().close()
+        async with self._io_lock:
+            self.collections.clear()
+            self._conn.close()
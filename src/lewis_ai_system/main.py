@@ -10,6 +10,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 
 from .config import settings
+from .rate_limit import rate_limit_middleware
 from .versioning import version_middleware
 from .routers.versioned import (
     v1_router,
@@ -35,14 +36,17 @@ async def lifespan(app: FastAPI):
             logger.info("数据库初始化成功")
             # 将创意存储库重新绑定到基于数据库的实现
             from .creative import repository as creative_repo_module
-            creative_repo_module.creative_repository = creative_repo_module.DatabaseCreativeProjectRepository()
             from .creative import workflow as creative_workflow_module
-            creative_workflow_module.creative_orchestrator = creative_workflow_module.CreativeOrchestrator(
-                repository=creative_repo_module.creative_repository
-            )
+            creative_workflow_module.use_repository(creative_repo_module.DatabaseCreativeProjectRepository())
             from .routers import creative as creative_router_module
             creative_router_module.creative_repository = creative_repo_module.creative_repository
             creative_router_module.creative_orchestrator = creative_workflow_module.creative_orchestrator
+            from .creative import batch_processing as creative_batch_module
+            from .creative import monitoring as creative_monitoring_module
+            from .governance.service import governance_service
+            creative_batch_module.creative_repository = creative_repo_module.creative_repository
+            creative_monitoring_module.creative_repository = creative_repo_module.creative_repository
+            governance_service.creative_repo = creative_repo_module.creative_repository
             logger.info("创意存储库已切换到数据库后端")
         except Exception as e:
             logger.error(f"Database initialization failed: {e}", exc_info=True)
@@ -63,10 +67,15 @@ async def lifespan(app: FastAPI):
     try:
         from .vector_db import vector_db
         vector_db.initialize()
+        vector_db.start_expiry_sweeper()
         logger.info("向量数据库已初始化")
     except Exception as e:
         logger.warning(f"向量数据库初始化失败: {e}")
     
+    # 预热代码沙箱池
+    from .sandbox_pool import init_sandbox_pool
+    await init_sandbox_pool()
+    
     # 初始化 S3 存储
     from .s3_storage import s3_storage
     if s3_storage.is_available():
@@ -87,9 +96,21 @@ async def lifespan(app: FastAPI):
         from .redis_cache import cache_manager
         await cache_manager.close()
     
+    # 写完后台排队的记忆和历史压缩，再关闭向量数据库
+    from .embeddings import shutdown_embedding_queue
+    from .general.session import general_orchestrator
+    await general_orchestrator.flush_background_writes()
+    await shutdown_embedding_queue()
+
     # 关闭向量数据库
     from .vector_db import vector_db
     await vector_db.close()
+    
+    # 关闭沙箱池
+    from .sandbox_pool import shutdown_sandbox_pool
+    from .sandbox_sessions import shutdown_sandbox_sessions
+    await shutdown_sandbox_sessions()
+    await shutdown_sandbox_pool()
 
 
 app = FastAPI(
@@ -101,6 +122,9 @@ app = FastAPI(
 # API 版本中间件
 app.middleware("http")(version_middleware)
 
+# 按客户端限流中间件（RATE_LIMIT_MIDDLEWARE_PER_MINUTE > 0 时生效）
+app.middleware("http")(rate_limit_middleware)
+
 # CORS 中间件
 app.add_middleware(
     CORSMiddleware,
@@ -11,6 +11,7 @@ from uuid import uuid4
 
 from .config import settings
 from .instrumentation import get_logger
+from .task_progress import TaskStage, rendering_progress, report_progress
 
 logger = get_logger()
 
@@ -702,7 +703,7 @@ class RunwareVideoProvider:
                 raise RuntimeError(f"Runware task submission failed: {errors}")
 
             poll_payload = [{"taskType": "getResponse", "taskUUID": task_uuid}]
-            for _ in range(self.max_poll_attempts):
+            for attempt in range(self.max_poll_attempts):
                 await asyncio.sleep(self.poll_interval_seconds)
                 poll_response = await client.post(self.base_url, json=poll_payload, headers=headers)
                 poll_response.raise_for_status()
@@ -720,6 +721,8 @@ class RunwareVideoProvider:
                         "provider": self.name,
                     }
                 if entry.get("status") == "processing":
+                    # Runware 不返回百分比，按已轮询次数估算
+                    await report_progress(TaskStage.RENDERING, rendering_progress(attempt / self.max_poll_attempts))
                     continue
             raise RuntimeError("Runware video generation timed out before completion")
 
@@ -917,6 +920,12 @@ class DoubaoVideoProvider:
                         raise RuntimeError(f"Doubao video generation failed: {error_msg}")
                     elif status in ["processing", "pending", "running", "in_progress", "queued"]:
                         logger.debug(f"Doubao task {task_id} status: {status}, waiting...")
+                        if status == "queued":
+                            await report_progress(TaskStage.PROVIDER_QUEUED, provider_job_id=task_id)
+                        else:
+                            await report_progress(
+                                TaskStage.RENDERING, rendering_progress(attempt / self.max_poll_attempts)
+                            )
                         continue
                     else:
                         logger.warning(f"Unknown status '{status}' for task {task_id}, continuing to poll...")
@@ -1273,15 +1282,25 @@ class E2BSandboxProvider:
 
 @dataclass(slots=True)
 class LocalSandboxProvider:
-    """Local Python execution (fallback)."""
+    """Local Python execution on the pre-spawned worker process pool.
+    
+    Applies SandboxSettings rlimits and the tenant's TenantSandboxPolicy.
+    """
     
     name: str = "local"
+    tenant_id: str = "default"
     
     async def run_code(self, code: str) -> dict[str, Any]:
-        # Re-using the logic from tooling.py's PythonSandboxTool but decoupled
-        # For now, we'll just return a placeholder as the logic is currently embedded in the tool
-        # Ideally, tooling.py should delegate to this.
-        return {"error": "Local sandbox logic is currently embedded in PythonSandboxTool"}
+        from .sandbox_pool import SandboxPoolError, get_sandbox_pool
+
+        if settings.sandbox.backend != "local":
+            return {"error": "Local sandbox execution is disabled; set SANDBOX_BACKEND=local to enable it"}
+        try:
+            pool = await get_sandbox_pool("local")
+            return await pool.execute(code, tenant_id=self.tenant_id)
+        except SandboxPoolError as e:
+            logger.error(f"Local sandbox execution failed: {e}")
+            return {"error": str(e)}
 
 
 def get_sandbox_provider() -> SandboxProvider:
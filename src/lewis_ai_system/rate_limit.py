@@ -0,0 +1,267 @@
+"""请求限流：Redis 上的原子 Lua 脚本，Redis 不可用时退回进程内实现。
+
+两种算法，每个 key 的状态都是常数大小：
+
+- ``gcra``（Generic Cell Rate Algorithm）：每个 key 只存一个“理论到达时间”
+  (TAT)。每次请求把 TAT 推后 ``period / limit``；若新 TAT 超出当前时间
+  ``period`` 以上则拒绝。允许最多 ``limit`` 个请求的突发，之后按均匀速率放行。
+- ``sliding_window``：滑动窗口计数器，保存当前和上一个固定窗口的计数，
+  按上一窗口剩余的时间比例加权估算最近 ``period`` 内的请求数。
+
+Redis 实现在一个 Lua 脚本里完成读取、判断和写入，使用 Redis 服务器时间，
+所以多个副本共享同一份额度且不受各自时钟偏差影响。进程内实现每次请求只做
+常数次字典操作，过期 key 从 LRU 头部顺带清理，总数受 ``max_keys`` 限制。
+
+:func:`check_rate_limit` 依赖与 :func:`rate_limit_middleware` 都基于全局
+:data:`rate_limiter`。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from .config import settings
+from .instrumentation import get_logger
+
+logger = get_logger()
+
+# 健康检查与指标抓取不计入限流
+EXEMPT_PATHS = frozenset({"/health", "/healthz", "/readyz", "/metrics"})
+# 每次请求顺带清理的过期 key 上限，保证单次操作为常数开销
+_PRUNE_PER_HIT = 2
+
+# KEYS[1] = key; ARGV = period_ms, limit, cost
+# 返回 {allowed, remaining, retry_after_ms, reset_after_ms}
+GCRA_SCRIPT = """
+local period = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = t[1] * 1000 + t[2] / 1000
+local interval = period / limit
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then tat = now end
+local new_tat = tat + interval * cost
+local allow_at = new_tat - period
+if allow_at > now then
+  return {0, 0, math.ceil(allow_at - now), math.ceil(tat - now)}
+end
+redis.call('SET', KEYS[1], string.format('%.3f', new_tat), 'PX', math.ceil(new_tat - now))
+return {1, math.floor((now - allow_at) / interval + 1e-6), 0, math.ceil(new_tat - now)}
+"""
+
+SLIDING_WINDOW_SCRIPT = """
+local period = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = t[1] * 1000 + t[2] / 1000
+local window = math.floor(now / period)
+local state = redis.call('HMGET', KEYS[1], 'w', 'p', 'c')
+local w = tonumber(state[1])
+local prev = tonumber(state[2]) or 0
+local curr = tonumber(state[3]) or 0
+if w == window - 1 then
+  prev, curr = curr, 0
+elseif w ~= window then
+  prev, curr = 0, 0
+end
+local elapsed = now - window * period
+local used = prev * (period - elapsed) / period + curr
+local reset_after = math.ceil(period - elapsed)
+if used + cost > limit then
+  local retry_after = reset_after
+  if curr + cost <= limit and prev > 0 then
+    retry_after = math.ceil((used + cost - limit) * period / prev)
+  end
+  return {0, 0, retry_after, reset_after}
+end
+redis.call('HSET', KEYS[1], 'w', window, 'p', prev, 'c', curr + cost)
+redis.call('PEXPIRE', KEYS[1], period * 2)
+return {1, math.floor(limit - used - cost), 0, reset_after}
+"""
+
+_SCRIPTS = {"gcra": GCRA_SCRIPT, "sliding_window": SLIDING_WINDOW_SCRIPT}
+
+
+@dataclass(slots=True)
+class RateLimitResult:
+    """Outcome of one rate-limited request; times are in seconds."""
+
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float
+    reset_after: float
+
+    def headers(self) -> dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+class LocalRateLimiter:
+    """In-process GCRA / sliding-window limiter with O(1) work per request.
+
+    State is kept in an LRU ``OrderedDict`` of ``key -> (expires_at, state)``.
+    Each hit prunes at most a couple of expired entries from the LRU head and
+    the map never grows beyond ``max_keys``.
+    """
+
+    def __init__(
+        self,
+        algorithm: str = "gcra",
+        *,
+        max_keys: int = 100_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if algorithm not in _SCRIPTS:
+            raise ValueError(f"Unknown rate limit algorithm: {algorithm}")
+        self.algorithm = algorithm
+        self.max_keys = max_keys
+        self.clock = clock
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def hit(self, key: str, limit: int, period: float, cost: int = 1) -> RateLimitResult:
+        now = self.clock()
+        self._prune(now)
+        entry = self._entries.get(key)
+        state = entry[1] if entry is not None and entry[0] > now else None
+        if self.algorithm == "gcra":
+            result, expires_at, state = self._gcra(state, now, limit, period, cost)
+        else:
+            result, expires_at, state = self._sliding_window(state, now, limit, period, cost)
+        if result.allowed:
+            self._entries[key] = (expires_at, state)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+        return result
+
+    def _prune(self, now: float) -> None:
+        for _ in range(_PRUNE_PER_HIT):
+            if not self._entries:
+                return
+            key, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                return
+            del self._entries[key]
+
+    @staticmethod
+    def _gcra(tat: float | None, now: float, limit: int, period: float, cost: int):
+        interval = period / limit
+        tat = max(tat if tat is not None else now, now)
+        new_tat = tat + interval * cost
+        allow_at = new_tat - period
+        if allow_at > now:
+            return RateLimitResult(False, limit, 0, allow_at - now, tat - now), tat, tat
+        remaining = int((now - allow_at) / interval + 1e-9)
+        return RateLimitResult(True, limit, remaining, 0.0, new_tat - now), new_tat, new_tat
+
+    @staticmethod
+    def _sliding_window(state: tuple[int, int, int] | None, now: float, limit: int, period: float, cost: int):
+        window = int(now // period)
+        w, prev, curr = state if state is not None else (window, 0, 0)
+        if w == window - 1:
+            prev, curr = curr, 0
+        elif w != window:
+            prev, curr = 0, 0
+        elapsed = now - window * period
+        used = prev * (period - elapsed) / period + curr
+        reset_after = period - elapsed
+        if used + cost > limit:
+            retry_after = reset_after
+            if curr + cost <= limit and prev > 0:
+                retry_after = (used + cost - limit) * period / prev
+            return RateLimitResult(False, limit, 0, retry_after, reset_after), 0.0, state
+        state = (window, prev, curr + cost)
+        remaining = int(limit - used - cost)
+        return RateLimitResult(True, limit, remaining, 0.0, reset_after), (window + 2) * period, state
+
+
+class RateLimiter:
+    """Shared limiter: atomic Lua scripts on Redis, :class:`LocalRateLimiter` otherwise.
+
+    Redis is taken from :data:`~lewis_ai_system.redis_cache.cache_manager`.
+    If it is not configured, or a script call fails, the request is counted
+    by the in-process limiter instead (per replica, but never fail-open).
+    """
+
+    def __init__(self, algorithm: str | None = None, *, local: LocalRateLimiter | None = None):
+        self.algorithm = algorithm or settings.rate_limit_algorithm
+        self.local = local or LocalRateLimiter(self.algorithm, max_keys=settings.rate_limit_local_max_keys)
+        self._client: Any = None
+        self._script: Any = None
+
+    async def _redis_client(self) -> Any:
+        from .redis_cache import cache_manager
+
+        cache = await cache_manager.get_cache()
+        return getattr(cache, "client", None)
+
+    async def hit(self, key: str, limit: int, period: float, cost: int = 1) -> RateLimitResult:
+        """Count ``cost`` requests against ``limit`` per ``period`` seconds for ``key``."""
+        client = await self._redis_client()
+        if client is not None:
+            try:
+                return await self._redis_hit(client, key, limit, period, cost)
+            except Exception as e:
+                logger.warning(f"Redis rate limit failed, using local limiter: {e}")
+        return self.local.hit(key, limit, period, cost)
+
+    async def _redis_hit(self, client: Any, key: str, limit: int, period: float, cost: int) -> RateLimitResult:
+        if client is not self._client:
+            # register_script 走 EVALSHA，脚本缓存丢失时自动回退 EVAL
+            self._client, self._script = client, client.register_script(_SCRIPTS[self.algorithm])
+        allowed, remaining, retry_ms, reset_ms = await self._script(
+            keys=[f"ratelimit:{self.algorithm}:{key}"],
+            args=[int(period * 1000), limit, cost],
+        )
+        return RateLimitResult(bool(allowed), limit, int(remaining), int(retry_ms) / 1000, int(reset_ms) / 1000)
+
+
+def client_identifier(request: Request) -> str:
+    """Rate limit key for a request: hashed bearer token, else the client IP."""
+    authorization = request.headers.get("Authorization", "")
+    if authorization.lower().startswith("bearer "):
+        token = authorization[7:].strip()
+        return "token:" + hashlib.sha256(token.encode()).hexdigest()[:32]
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+
+async def rate_limit_middleware(request: Request, call_next):
+    """HTTP 中间件：按客户端限流 ``RATE_LIMIT_MIDDLEWARE_PER_MINUTE`` 次/分钟。"""
+    limit = settings.rate_limit_middleware_per_minute
+    if not settings.rate_limit_enabled or limit <= 0 or request.url.path in EXEMPT_PATHS:
+        return await call_next(request)
+
+    result = await rate_limiter.hit(client_identifier(request), limit, 60)
+    if not result.allowed:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Rate limit exceeded. Please try again later."},
+            headers=result.headers(),
+        )
+    response = await call_next(request)
+    response.headers.update(result.headers())
+    return response
+
+
+# Global rate limiter instance
+rate_limiter = RateLimiter()
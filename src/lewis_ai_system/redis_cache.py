@@ -1,9 +1,36 @@
-"""Redis cache integration for session data, rate limiting, and caching."""
+"""Redis cache integration for session data, rate limiting, and caching.
+
+Besides single-key calls, both backends offer ``mget``/``mset``/``delete_many``
+and a :meth:`pipeline` context manager that queues commands and sends them in
+one round trip on exit::
+
+    async with cache.pipeline() as pipe:
+        pipe.get("a")
+        pipe.set("b", {"x": 1}, ttl_seconds=60)
+        pipe.increment("hits")
+    a, stored, hits = pipe.results
+
+With Redis configured, :class:`CacheManager` puts a :class:`NearCache` in
+front of it: an in-process LRU (per-key TTL) that serves hot reads locally
+and is invalidated across replicas over Redis pub/sub. Replicas running
+with ``NEAR_CACHE_ENABLED=false`` use :class:`InvalidatingRedisCache`, which
+still announces its writes, so mixed deployments stay coherent. Writes
+made on the raw ``client`` are not announced; follow them with
+``cache.invalidate(keys)``.
+
+Values are stored with the configured :class:`~lewis_ai_system.codec.Codec`
+(versioned JSON or msgpack, optionally compressed); plain JSON written
+before the codec existed is still readable.
+"""
 
 from __future__ import annotations
 
+import asyncio
 import json
-from typing import Any
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Any, AsyncIterator
 
 try:
     import redis.asyncio as redis
@@ -12,19 +39,199 @@ except ImportError:
     REDIS_AVAILABLE = False
     redis = None
 
+from .codec import Codec, build_codec
 from .config import settings
 from .instrumentation import get_logger
 
 logger = get_logger()
 
+RateLimitCheck = tuple[str, int, int]  # (identifier, max_requests, window_seconds)
+
+# 固定窗口限流：只有放行的请求才计数，被拒绝的重试不会把窗口越推越满。
+# KEYS 为各窗口的 key，ARGV 依次为 max_requests, window_seconds；返回剩余次数，-1 表示拒绝
+RATE_LIMIT_SCRIPT = """
+local results = {}
+for i, key in ipairs(KEYS) do
+  local limit = tonumber(ARGV[2 * i - 1])
+  local count = tonumber(redis.call('GET', key) or '0')
+  if count < limit then
+    count = redis.call('INCR', key)
+    if count == 1 then
+      redis.call('EXPIRE', key, ARGV[2 * i])
+    end
+    results[i] = limit - count
+  else
+    results[i] = -1
+  end
+end
+return results
+"""
+
+
+def near_cacheable(keys: list[str], bypass_prefixes: tuple[str, ...]) -> list[str]:
+    """The keys a near cache may hold, in order and without duplicates."""
+    return [key for key in dict.fromkeys(keys) if not key.startswith(bypass_prefixes)]
+
+
+class CachePipeline:
+    """Commands queued inside ``async with cache.pipeline()``.
+
+    Nothing is sent until the block exits; ``results`` then holds one entry
+    per queued command, in order, with the same meaning as the single-key
+    method's return value.
+    """
+
+    def __init__(self, cache: RedisCache | InMemoryCache):
+        self._cache = cache
+        self.commands: list[tuple[str, tuple[Any, ...]]] = []
+        self.results: list[Any] = []
+
+    def get(self, key: str) -> CachePipeline:
+        self.commands.append(("get", (key,)))
+        return self
+
+    def set(self, key: str, value: Any, ttl_seconds: int | None = None) -> CachePipeline:
+        self.commands.append(("set", (key, value, ttl_seconds)))
+        return self
+
+    def delete(self, key: str) -> CachePipeline:
+        self.commands.append(("delete", (key,)))
+        return self
+
+    def increment(self, key: str, amount: int = 1) -> CachePipeline:
+        self.commands.append(("increment", (key, amount)))
+        return self
+
+    def expire(self, key: str, seconds: int) -> CachePipeline:
+        self.commands.append(("expire", (key, seconds)))
+        return self
+
+    def ttl(self, key: str) -> CachePipeline:
+        """Remaining seconds to live; None if the key is missing or never expires."""
+        self.commands.append(("ttl", (key,)))
+        return self
+
+    async def execute(self) -> list[Any]:
+        commands, self.commands = self.commands, []
+        self.results = await self._cache._execute_pipeline(commands) if commands else []
+        return self.results
+
+    async def __aenter__(self) -> CachePipeline:
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            await self.execute()
+
+
+class CacheHelpers:
+    """Tool-result and session-state helpers shared by both cache backends.
+
+    Built on ``get``/``set``/``mget``/``mset``/``delete_many`` so the batch
+    variants cost one round trip however many keys they touch.
+    """
+
+    @staticmethod
+    def _tool_key(tool_name: str, params_hash: str) -> str:
+        return f"tool:{tool_name}:{params_hash}"
+
+    @staticmethod
+    def _session_key(session_id: str) -> str:
+        return f"session:{session_id}"
+
+    async def cache_tool_result(
+        self, 
+        tool_name: str, 
+        params_hash: str, 
+        result: Any,
+        ttl_seconds: int = 3600
+    ) -> bool:
+        """Cache tool execution result."""
+        return await self.set(self._tool_key(tool_name, params_hash), result, ttl_seconds)
+
+    async def cache_tool_results(
+        self,
+        tool_name: str,
+        results: dict[str, Any],
+        ttl_seconds: int = 3600
+    ) -> bool:
+        """Cache several ``{params_hash: result}`` entries for one tool at once."""
+        return await self.mset(
+            {self._tool_key(tool_name, params_hash): result for params_hash, result in results.items()},
+            ttl_seconds,
+        )
+    
+    async def get_cached_tool_result(
+        self, 
+        tool_name: str, 
+        params_hash: str
+    ) -> Any | None:
+        """Get cached tool result."""
+        return await self.get(self._tool_key(tool_name, params_hash))
+
+    async def get_cached_tool_results(self, tool_name: str, params_hashes: list[str]) -> dict[str, Any]:
+        """Return ``{params_hash: result}`` for the hashes that are cached."""
+        values = await self.mget([self._tool_key(tool_name, params_hash) for params_hash in params_hashes])
+        return {params_hash: value for params_hash, value in zip(params_hashes, values) if value is not None}
+    
+    async def store_session_state(
+        self,
+        session_id: str,
+        state: dict[str, Any],
+        ttl_seconds: int = 86400  # 24 hours
+    ) -> bool:
+        """Store session state."""
+        return await self.set(self._session_key(session_id), state, ttl_seconds)
+
+    async def store_session_states(
+        self,
+        states: dict[str, dict[str, Any]],
+        ttl_seconds: int = 86400
+    ) -> bool:
+        """Store several ``{session_id: state}`` entries in one round trip."""
+        return await self.mset(
+            {self._session_key(session_id): state for session_id, state in states.items()},
+            ttl_seconds,
+        )
+    
+    async def get_session_state(self, session_id: str) -> dict[str, Any] | None:
+        """Retrieve session state."""
+        return await self.get(self._session_key(session_id))
+
+    async def get_session_states(self, session_ids: list[str]) -> dict[str, dict[str, Any]]:
+        """Return ``{session_id: state}`` for the sessions that have stored state."""
+        values = await self.mget([self._session_key(session_id) for session_id in session_ids])
+        return {session_id: value for session_id, value in zip(session_ids, values) if value is not None}
+
+    async def delete_session_states(self, session_ids: list[str]) -> int:
+        """Drop stored state for several sessions. Returns how many existed."""
+        return await self.delete_many([self._session_key(session_id) for session_id in session_ids])
+
+    async def rate_limit_check(
+        self, 
+        identifier: str, 
+        max_requests: int, 
+        window_seconds: int
+    ) -> tuple[bool, int]:
+        """
+        Check a fixed-window rate limit.
+        
+        Returns:
+            (allowed, remaining_requests)
+        """
+        return (await self.rate_limit_check_many([(identifier, max_requests, window_seconds)]))[0]
+
 
-class RedisCache:
+class RedisCache(CacheHelpers):
     """Redis cache manager for distributed caching and rate limiting."""
     
-    def __init__(self, url: str | None = None):
+    def __init__(self, url: str | None = None, codec: Codec | None = None):
         self.url = url or "redis://localhost:6379/0"
+        self.codec = codec or build_codec()
         self.client: Any = None
         self._initialized = False
+        self._script_client: Any = None
+        self._rate_limit_script: Any = None
     
     async def initialize(self):
         """Initialize Redis connection."""
@@ -38,8 +245,7 @@ class RedisCache:
         try:
             self.client = await redis.from_url(
                 self.url,
-                encoding="utf-8",
-                decode_responses=True,
+                decode_responses=False,
                 socket_connect_timeout=5
             )
             await self.client.ping()
@@ -57,7 +263,7 @@ class RedisCache:
         try:
             value = await self.client.get(key)
             if value:
-                return json.loads(value)
+                return self.codec.loads(value)
             return None
         except Exception as e:
             logger.error(f"Redis get failed: {e}")
@@ -69,7 +275,7 @@ class RedisCache:
             return False
         
         try:
-            serialized = json.dumps(value)
+            serialized = self.codec.dumps(value)
             if ttl_seconds:
                 await self.client.setex(key, ttl_seconds, serialized)
             else:
@@ -125,81 +331,123 @@ class RedisCache:
             logger.error(f"Redis exists failed: {e}")
             return False
     
-    async def rate_limit_check(
-        self, 
-        identifier: str, 
-        max_requests: int, 
-        window_seconds: int
-    ) -> tuple[bool, int]:
-        """
-        Check rate limit using sliding window.
+    async def mget(self, keys: list[str]) -> list[Any | None]:
+        """Get many values in one ``MGET``; misses are None."""
+        if not self.client or not keys:
+            return [None] * len(keys)
         
-        Returns:
-            (allowed, remaining_requests)
-        """
+        try:
+            return [self.codec.loads(value) if value else None for value in await self.client.mget(keys)]
+        except Exception as e:
+            logger.error(f"Redis mget failed: {e}")
+            return [None] * len(keys)
+    
+    async def mset(self, mapping: dict[str, Any], ttl_seconds: int | None = None) -> bool:
+        """Set many values in one round trip (``MSET``, or pipelined ``SETEX`` with a TTL)."""
         if not self.client:
-            return True, max_requests  # Allow if Redis unavailable
-        
-        key = f"ratelimit:{identifier}"
+            return False
+        if not mapping:
+            return True
         
         try:
-            # Use Redis pipeline for atomic operations
-            pipe = self.client.pipeline()
-            current = await self.client.get(key)
-            
-            if current is None:
-                # First request in window
-                await self.client.setex(key, window_seconds, "1")
-                return True, max_requests - 1
-            
-            count = int(current)
-            if count >= max_requests:
-                return False, 0
-            
-            # Increment and maintain TTL
-            pipe.incr(key)
-            pipe.expire(key, window_seconds)
-            await pipe.execute()
-            
-            return True, max_requests - count - 1
+            serialized = {key: self.codec.dumps(value) for key, value in mapping.items()}
+            if ttl_seconds:
+                pipe = self.client.pipeline(transaction=False)
+                for key, value in serialized.items():
+                    pipe.setex(key, ttl_seconds, value)
+                await pipe.execute()
+            else:
+                await self.client.mset(serialized)
+            return True
         except Exception as e:
-            logger.error(f"Rate limit check failed: {e}")
-            return True, max_requests  # Fail open
+            logger.error(f"Redis mset failed: {e}")
+            return False
     
-    async def cache_tool_result(
-        self, 
-        tool_name: str, 
-        params_hash: str, 
-        result: Any,
-        ttl_seconds: int = 3600
-    ) -> bool:
-        """Cache tool execution result."""
-        key = f"tool:{tool_name}:{params_hash}"
-        return await self.set(key, result, ttl_seconds)
+    async def delete_many(self, keys: list[str]) -> int:
+        """Delete many keys in one ``DEL``. Returns how many existed."""
+        if not self.client or not keys:
+            return 0
+        
+        try:
+            return int(await self.client.delete(*keys))
+        except Exception as e:
+            logger.error(f"Redis delete_many failed: {e}")
+            return 0
     
-    async def get_cached_tool_result(
-        self, 
-        tool_name: str, 
-        params_hash: str
-    ) -> Any | None:
-        """Get cached tool result."""
-        key = f"tool:{tool_name}:{params_hash}"
-        return await self.get(key)
+    def pipeline(self) -> CachePipeline:
+        """Queue commands and send them in one round trip when the block exits."""
+        return CachePipeline(self)
     
-    async def store_session_state(
-        self,
-        session_id: str,
-        state: dict[str, Any],
-        ttl_seconds: int = 86400  # 24 hours
-    ) -> bool:
-        """Store session state."""
-        key = f"session:{session_id}"
-        return await self.set(key, state, ttl_seconds)
+    async def _execute_pipeline(self, commands: list[tuple[str, tuple[Any, ...]]]) -> list[Any]:
+        if not self.client:
+            return [None if name in {"get", "increment", "ttl"} else False for name, _ in commands]
+        
+        pipe = self.client.pipeline(transaction=False)
+        for name, args in commands:
+            if name == "get":
+                pipe.get(args[0])
+            elif name == "set":
+                key, value, ttl_seconds = args
+                if ttl_seconds:
+                    pipe.setex(key, ttl_seconds, self.codec.dumps(value))
+                else:
+                    pipe.set(key, self.codec.dumps(value))
+            elif name == "delete":
+                pipe.delete(args[0])
+            elif name == "increment":
+                pipe.incrby(*args)
+            elif name == "expire":
+                pipe.expire(*args)
+            elif name == "ttl":
+                pipe.ttl(args[0])
+            elif name == "publish":
+                pipe.publish(*args)
+        try:
+            raw = await pipe.execute(raise_on_error=False)
+        except Exception as e:
+            logger.error(f"Redis pipeline failed: {e}")
+            return [None if name in {"get", "increment", "ttl"} else False for name, _ in commands]
+        
+        results: list[Any] = []
+        for (name, _), value in zip(commands, raw):
+            if isinstance(value, Exception):
+                logger.error(f"Redis pipeline {name} failed: {value}")
+                results.append(None if name in {"get", "increment", "ttl"} else False)
+            elif name == "ttl":
+                results.append(int(value) if value is not None and int(value) >= 0 else None)
+            elif name == "get":
+                results.append(self.codec.loads(value) if value else None)
+            elif name in {"increment", "publish"}:
+                results.append(int(value))
+            else:
+                results.append(True if name == "delete" else bool(value))
+        return results
     
-    async def get_session_state(self, session_id: str) -> dict[str, Any] | None:
-        """Retrieve session state."""
-        key = f"session:{session_id}"
-        return await self.get(key)
+    async def rate_limit_check_many(self, checks: list[RateLimitCheck]) -> list[tuple[bool, int]]:
+        """Count one request against several fixed windows in one atomic script call.
+        
+        :data:`RATE_LIMIT_SCRIPT` only increments a window that is still under
+        its limit, so rejected checks are not counted and a client that keeps
+        retrying gets through once the window expires.
+        """
+        if not self.client:
+            return [(True, max_requests) for _, max_requests, _ in checks]  # Allow if Redis unavailable
+        if not checks:
+            return []
+        
+        try:
+            if self.client is not self._script_client:
+                self._script_client = self.client
+                self._rate_limit_script = self.client.register_script(RATE_LIMIT_SCRIPT)
+            raw = await self._rate_limit_script(
+                keys=[f"ratelimit:{identifier}" for identifier, _, _ in checks],
+                args=[value for _, max_requests, window in checks for value in (max_requests, window)],
+            )
+        except Exception as e:
+            logger.error(f"Rate limit check failed: {e}")
+            return [(True, max_requests) for _, max_requests, _ in checks]  # Fail open
+        
+        return [(int(remaining) >= 0, max(int(remaining), 0)) for remaining in raw]
     
     async def lock_acquire(
         self, 
@@ -229,7 +477,7 @@ class RedisCache:
         try:
             # Only delete if we own the lock
             current_owner = await self.client.get(key)
-            if current_owner == owner:
+            if current_owner is not None and current_owner.decode() == owner:
                 await self.client.delete(key)
                 return True
             return False
@@ -248,6 +496,25 @@ class RedisCache:
             logger.error(f"Redis publish failed: {e}")
             return 0
     
+    async def subscribe(self, channel: str) -> AsyncIterator[str]:
+        """Yield messages published to ``channel`` until the connection drops."""
+        if not self.client:
+            return
+        
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(channel)
+        try:
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    data = message["data"]
+                    yield data.decode() if isinstance(data, bytes) else data
+        finally:
+            try:
+                await pubsub.unsubscribe(channel)
+                await pubsub.aclose()
+            except Exception as e:
+                logger.debug(f"Redis unsubscribe failed: {e}")
+    
     async def close(self):
         """Close Redis connection."""
         if self.client:
@@ -255,7 +522,7 @@ class RedisCache:
             logger.info("Redis connection closed")
 
 
-class InMemoryCache:
+class InMemoryCache(CacheHelpers):
     """Fallback in-memory cache when Redis is unavailable."""
     
     def __init__(self):
@@ -266,10 +533,7 @@ class InMemoryCache:
         """No-op for in-memory."""
         pass
     
-    async def get(self, key: str) -> Any | None:
-        """Get value from memory cache."""
-        import time
-        
+    def _get(self, key: str) -> Any | None:
         if key not in self._store:
             return None
         
@@ -280,57 +544,464 @@ class InMemoryCache:
         
         return value
     
-    async def set(self, key: str, value: Any, ttl_seconds: int | None = None) -> bool:
-        """Set value in memory cache."""
-        import time
-        
+    def _set(self, key: str, value: Any, ttl_seconds: int | None = None) -> bool:
         expiry = time.time() + ttl_seconds if ttl_seconds else None
         self._store[key] = (value, expiry)
         return True
     
+    def _increment(self, key: str, amount: int = 1) -> int:
+        current = self._get(key)
+        expiry = self._store[key][1] if current is not None else None
+        value = int(current or 0) + amount
+        self._store[key] = (value, expiry)
+        return value
+    
+    def _delete(self, key: str) -> bool:
+        self._store.pop(key, None)
+        return True
+    
+    def _ttl(self, key: str) -> int | None:
+        if self._get(key) is None or self._store[key][1] is None:
+            return None
+        return max(int(self._store[key][1] - time.time()), 0)
+    
+    def _expire(self, key: str, seconds: int) -> bool:
+        if self._get(key) is None:
+            return False
+        self._store[key] = (self._store[key][0], time.time() + seconds)
+        return True
+    
+    async def get(self, key: str) -> Any | None:
+        """Get value from memory cache."""
+        return self._get(key)
+    
+    async def set(self, key: str, value: Any, ttl_seconds: int | None = None) -> bool:
+        """Set value in memory cache."""
+        return self._set(key, value, ttl_seconds)
+    
     async def delete(self, key: str) -> bool:
         """Delete key from memory."""
-        self._store.pop(key, None)
+        return self._delete(key)
+    
+    async def increment(self, key: str, amount: int = 1) -> int | None:
+        """Increment a counter, keeping its expiry."""
+        return self._increment(key, amount)
+    
+    async def expire(self, key: str, seconds: int) -> bool:
+        """Set expiration on a key."""
+        return self._expire(key, seconds)
+    
+    async def exists(self, key: str) -> bool:
+        """Check if key exists."""
+        return self._get(key) is not None
+    
+    async def mget(self, keys: list[str]) -> list[Any | None]:
+        """Get many values; misses are None."""
+        return [self._get(key) for key in keys]
+    
+    async def mset(self, mapping: dict[str, Any], ttl_seconds: int | None = None) -> bool:
+        """Set many values with the same optional TTL."""
+        for key, value in mapping.items():
+            self._set(key, value, ttl_seconds)
         return True
     
-    async def rate_limit_check(
-        self, 
-        identifier: str, 
-        max_requests: int, 
-        window_seconds: int
-    ) -> tuple[bool, int]:
-        """Simple in-memory rate limiting."""
-        import time
-        
+    async def delete_many(self, keys: list[str]) -> int:
+        """Delete many keys. Returns how many existed."""
+        return sum(1 for key in keys if self._store.pop(key, None) is not None)
+    
+    def pipeline(self) -> CachePipeline:
+        """Queue commands and apply them together when the block exits."""
+        return CachePipeline(self)
+    
+    async def _execute_pipeline(self, commands: list[tuple[str, tuple[Any, ...]]]) -> list[Any]:
+        handlers = {
+            "get": self._get,
+            "set": self._set,
+            "delete": self._delete,
+            "increment": self._increment,
+            "expire": self._expire,
+            "ttl": self._ttl,
+        }
+        return [handlers[name](*args) for name, args in commands]
+    
+    async def rate_limit_check_many(self, checks: list[RateLimitCheck]) -> list[tuple[bool, int]]:
+        """Simple in-memory fixed-window rate limiting for several identifiers."""
         now = time.time()
-        
-        if identifier in self._rate_limits:
-            count, window_start = self._rate_limits[identifier]
-            
+        results = []
+        for identifier, max_requests, window_seconds in checks:
+            count, window_start = self._rate_limits.get(identifier, (0, now))
             if now - window_start > window_seconds:
                 # Reset window
-                self._rate_limits[identifier] = (1, now)
-                return True, max_requests - 1
+                count, window_start = 0, now
             
             if count >= max_requests:
-                return False, 0
+                results.append((False, 0))
+                continue
             
             self._rate_limits[identifier] = (count + 1, window_start)
-            return True, max_requests - count - 1
-        
-        self._rate_limits[identifier] = (1, now)
-        return True, max_requests - 1
+            results.append((True, max_requests - count - 1))
+        return results
     
     async def close(self):
         """No-op for in-memory."""
         pass
 
 
+class NearCache(CacheHelpers):
+    """Two-tier cache: an in-process LRU (L1) in front of :class:`RedisCache` (L2).
+
+    Reads are served from L1 while an entry is younger than ``ttl_seconds``
+    and the Redis key's own remaining TTL. A miss fetches the value and its
+    TTL from Redis in one pipelined round trip. Values are kept encoded
+    (with the remote codec, uncompressed), so every read returns a fresh
+    object just like Redis does.
+
+    Writes go straight to Redis, drop the local entry and publish the keys
+    on ``channel``. Every replica subscribes to that channel and drops the
+    same keys from its L1. A fill that races with an invalidation of the
+    same key is discarded rather than cached. If the subscription drops,
+    L1 is cleared because invalidations may have been missed. Pipelined
+    reads and other ``RedisCache`` methods bypass L1, as do keys under
+    ``bypass_prefixes`` (counters, locks): they are never cached and writes
+    to them are not announced.
+
+    Keys written through :meth:`pipeline` are invalidated when it runs.
+    Writes that skip this class (``client`` or ``remote`` used directly)
+    are not seen by any L1 until its entry expires, unless the writer
+    calls :meth:`invalidate` afterwards.
+    """
+
+    def __init__(
+        self,
+        remote: RedisCache,
+        *,
+        max_entries: int | None = None,
+        ttl_seconds: float | None = None,
+        channel: str | None = None,
+        bypass_prefixes: list[str] | None = None,
+    ):
+        self.remote = remote
+        self.max_entries = max_entries if max_entries is not None else settings.near_cache_max_entries
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.near_cache_ttl_seconds
+        self.channel = channel or settings.near_cache_channel
+        self.bypass_prefixes = tuple(
+            bypass_prefixes if bypass_prefixes is not None else settings.near_cache_bypass_prefixes
+        )
+        self.node_id = uuid.uuid4().hex
+        self._codec = Codec(
+            remote.codec.format,
+            legacy_dumps=remote.codec.legacy_dumps,
+            legacy_loads=remote.codec.legacy_loads,
+        )
+        self._entries: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        self._listener: asyncio.Task[None] | None = None
+        # 读穿期间若同一 key 被失效，回填结果作废，避免把旧值写回 L1
+        self._epoch = 0
+        self._inflight: Counter[str] = Counter()
+        self._invalidated_at: dict[str, int] = {}
+        self._stats = {
+            "l1_hits": 0,
+            "l1_misses": 0,
+            "l2_hits": 0,
+            "l2_misses": 0,
+            "evictions": 0,
+            "invalidations_sent": 0,
+            "invalidations_received": 0,
+        }
+
+    @property
+    def client(self) -> Any:
+        return self.remote.client
+
+    def __getattr__(self, name: str) -> Any:
+        # lock_acquire、publish 等没有本地缓存语义的方法直接转给 Redis
+        if name == "remote":
+            raise AttributeError(name)
+        return getattr(self.remote, name)
+
+    async def initialize(self):
+        """Connect to Redis and start listening for invalidations."""
+        await self.remote.initialize()
+        self.start_listener()
+
+    def start_listener(self) -> None:
+        if self.remote.client and (self._listener is None or self._listener.done()):
+            self._listener = asyncio.create_task(self._listen())
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def _lookup(self, key: str) -> tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        encoded, expires = entry
+        if time.monotonic() >= expires:
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, self._codec.loads(encoded)
+
+    async def get(self, key: str) -> Any | None:
+        """Get a value from L1, falling back to Redis."""
+        return (await self.mget([key]))[0]
+
+    async def mget(self, keys: list[str]) -> list[Any | None]:
+        """Get many values; only L1 misses go to Redis, in one round trip."""
+        results: list[Any | None] = [None] * len(keys)
+        missing: list[int] = []
+        for i, key in enumerate(keys):
+            found, value = self._lookup(key)
+            if found:
+                self._stats["l1_hits"] += 1
+                results[i] = value
+            else:
+                self._stats["l1_misses"] += 1
+                missing.append(i)
+        if missing:
+            fetched = await self._fill([keys[i] for i in missing])
+            for i, value in zip(missing, fetched):
+                results[i] = value
+        return results
+
+    async def _fill(self, keys: list[str]) -> list[Any | None]:
+        started = self._epoch
+        self._inflight.update(keys)
+        try:
+            async with self.remote.pipeline() as pipe:
+                for key in keys:
+                    pipe.get(key).ttl(key)
+            values, ttls = pipe.results[0::2], pipe.results[1::2]
+            for key, value, ttl in zip(keys, values, ttls):
+                if value is None:
+                    self._stats["l2_misses"] += 1
+                    continue
+                self._stats["l2_hits"] += 1
+                if self._invalidated_at.get(key, -1) < started:
+                    self._remember(key, value, ttl)
+            return values
+        finally:
+            self._inflight.subtract(keys)
+            for key in keys:
+                if self._inflight[key] <= 0:
+                    del self._inflight[key]
+                    self._invalidated_at.pop(key, None)
+
+    def _remember(self, key: str, value: Any, remote_ttl: int | None) -> None:
+        ttl = self.ttl_seconds if remote_ttl is None else min(self.ttl_seconds, remote_ttl)
+        if ttl <= 0 or self.max_entries <= 0 or key.startswith(self.bypass_prefixes):
+            return
+        self._entries[key] = (self._codec.dumps(value), time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    async def set(self, key: str, value: Any, ttl_seconds: int | None = None) -> bool:
+        stored = await self.remote.set(key, value, ttl_seconds)
+        await self.invalidate([key])
+        return stored
+
+    async def mset(self, mapping: dict[str, Any], ttl_seconds: int | None = None) -> bool:
+        stored = await self.remote.mset(mapping, ttl_seconds)
+        await self.invalidate(list(mapping))
+        return stored
+
+    async def delete(self, key: str) -> bool:
+        deleted = await self.remote.delete(key)
+        await self.invalidate([key])
+        return deleted
+
+    async def delete_many(self, keys: list[str]) -> int:
+        deleted = await self.remote.delete_many(keys)
+        await self.invalidate(keys)
+        return deleted
+
+    async def increment(self, key: str, amount: int = 1) -> int | None:
+        value = await self.remote.increment(key, amount)
+        await self.invalidate([key])
+        return value
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        updated = await self.remote.expire(key, seconds)
+        await self.invalidate([key])
+        return updated
+
+    def pipeline(self) -> CachePipeline:
+        """Pipeline against Redis; written keys are invalidated when it runs."""
+        return CachePipeline(self)
+
+    async def _execute_pipeline(self, commands: list[tuple[str, tuple[Any, ...]]]) -> list[Any]:
+        results = await self.remote._execute_pipeline(commands)
+        await self.invalidate([args[0] for name, args in commands if name not in {"get", "ttl"}])
+        return results
+
+    async def rate_limit_check_many(self, checks: list[RateLimitCheck]) -> list[tuple[bool, int]]:
+        return await self.remote.rate_limit_check_many(checks)
+
+    # ------------------------------------------------------------------
+    # Invalidation
+    # ------------------------------------------------------------------
+
+    def _drop(self, keys: list[str]) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+            if key in self._inflight:
+                self._invalidated_at[key] = self._epoch
+        self._epoch += 1
+
+    async def invalidate(self, keys: list[str]) -> None:
+        """Drop keys from this replica's L1 and tell the other replicas to do the same."""
+        keys = near_cacheable(keys, self.bypass_prefixes)
+        if not keys:
+            return
+        self._drop(keys)
+        self._stats["invalidations_sent"] += 1
+        await self.remote.publish(self.channel, json.dumps({"origin": self.node_id, "keys": keys}))
+
+    def handle_invalidation(self, message: str) -> None:
+        """Apply an invalidation message received from another replica."""
+        try:
+            payload = json.loads(message)
+            origin, keys = payload["origin"], payload["keys"]
+        except (TypeError, ValueError, KeyError):
+            logger.warning(f"Ignoring malformed cache invalidation: {message!r}")
+            return
+        if origin == self.node_id:
+            return
+        self._stats["invalidations_received"] += 1
+        self._drop(list(keys))
+
+    def clear(self) -> None:
+        """Drop every L1 entry."""
+        self._drop(list(self._inflight))
+        self._entries.clear()
+
+    async def _listen(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                async for message in self.remote.subscribe(self.channel):
+                    backoff = 1.0
+                    self.handle_invalidation(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Cache invalidation subscription lost: {e}")
+            # 订阅中断期间可能漏掉失效消息，清空 L1 后重连
+            self.clear()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    # ------------------------------------------------------------------
+
+    def stats(self) -> dict[str, Any]:
+        """Per-tier hit counts and ratios."""
+        l1_reads = self._stats["l1_hits"] + self._stats["l1_misses"]
+        l2_reads = self._stats["l2_hits"] + self._stats["l2_misses"]
+        return {
+            "l1_entries": len(self._entries),
+            "l1_hit_ratio": self._stats["l1_hits"] / l1_reads if l1_reads else 0.0,
+            "l2_hit_ratio": self._stats["l2_hits"] / l2_reads if l2_reads else 0.0,
+            **self._stats,
+        }
+
+    async def close(self):
+        """Stop the invalidation listener and close Redis."""
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        self._entries.clear()
+        await self.remote.close()
+
+
+class InvalidatingRedisCache(RedisCache):
+    """:class:`RedisCache` that announces its writes on the near-cache channel.
+
+    Used when this replica keeps no L1 of its own, so replicas that do still
+    drop the keys it writes. Keys under ``bypass_prefixes`` are never near
+    cached and are not announced; for :meth:`pipeline` writes the
+    announcement rides in the same round trip as the commands.
+    """
+
+    def __init__(
+        self,
+        url: str | None = None,
+        codec: Codec | None = None,
+        *,
+        channel: str | None = None,
+        bypass_prefixes: list[str] | None = None,
+    ):
+        super().__init__(url, codec)
+        self.channel = channel or settings.near_cache_channel
+        self.bypass_prefixes = tuple(
+            bypass_prefixes if bypass_prefixes is not None else settings.near_cache_bypass_prefixes
+        )
+        self.node_id = uuid.uuid4().hex
+
+    def _invalidation(self, keys: list[str]) -> str | None:
+        keys = near_cacheable(keys, self.bypass_prefixes)
+        return json.dumps({"origin": self.node_id, "keys": keys}) if keys else None
+
+    async def invalidate(self, keys: list[str]) -> None:
+        """Tell replicas with a near cache to drop ``keys``."""
+        message = self._invalidation(keys)
+        if message is not None:
+            await self.publish(self.channel, message)
+
+    async def set(self, key: str, value: Any, ttl_seconds: int | None = None) -> bool:
+        stored = await super().set(key, value, ttl_seconds)
+        await self.invalidate([key])
+        return stored
+
+    async def mset(self, mapping: dict[str, Any], ttl_seconds: int | None = None) -> bool:
+        stored = await super().mset(mapping, ttl_seconds)
+        await self.invalidate(list(mapping))
+        return stored
+
+    async def delete(self, key: str) -> bool:
+        deleted = await super().delete(key)
+        await self.invalidate([key])
+        return deleted
+
+    async def delete_many(self, keys: list[str]) -> int:
+        deleted = await super().delete_many(keys)
+        await self.invalidate(keys)
+        return deleted
+
+    async def increment(self, key: str, amount: int = 1) -> int | None:
+        value = await super().increment(key, amount)
+        await self.invalidate([key])
+        return value
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        updated = await super().expire(key, seconds)
+        await self.invalidate([key])
+        return updated
+
+    async def _execute_pipeline(self, commands: list[tuple[str, tuple[Any, ...]]]) -> list[Any]:
+        message = self._invalidation([args[0] for name, args in commands if name not in {"get", "ttl"}])
+        if message is None:
+            return await super()._execute_pipeline(commands)
+        # PUBLISH 跟在写命令后面一起发送，不额外占一次往返
+        results = await super()._execute_pipeline([*commands, ("publish", (self.channel, message))])
+        return results[:-1]
+
+
 class CacheManager:
     """Manages cache backend selection and initialization."""
     
     def __init__(self):
-        self.cache: RedisCache | InMemoryCache | None = None
+        self.cache: NearCache | InvalidatingRedisCache | InMemoryCache | None = None
         self._initialized = False
     
     async def initialize(self):
@@ -341,7 +1012,11 @@ class CacheManager:
         redis_url = getattr(settings, 'redis_url', None)
         
         if redis_url and REDIS_AVAILABLE:
-            self.cache = RedisCache(redis_url)
+            if settings.near_cache_enabled:
+                self.cache = NearCache(RedisCache(redis_url))
+            else:
+                # 本副本不缓存，但其他开启近端缓存的副本仍需收到失效通知
+                self.cache = InvalidatingRedisCache(redis_url)
             await self.cache.initialize()
         else:
             logger.info("Using in-memory cache (Redis not available)")
@@ -350,12 +1025,18 @@ class CacheManager:
         
         self._initialized = True
     
-    async def get_cache(self) -> RedisCache | InMemoryCache:
+    async def get_cache(self) -> NearCache | InvalidatingRedisCache | InMemoryCache:
         """Get cache instance, initializing if needed."""
         if not self._initialized:
             await self.initialize()
         return self.cache
     
+    def stats(self) -> dict[str, Any]:
+        """Cache backend name plus near-cache tier metrics when enabled."""
+        if isinstance(self.cache, NearCache):
+            return {"backend": "near", **self.cache.stats()}
+        return {"backend": type(self.cache).__name__ if self.cache else None}
+    
     async def close(self):
         """Close cache connections."""
         if self.cache:
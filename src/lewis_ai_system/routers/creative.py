@@ -2,13 +2,24 @@
 
 from __future__ import annotations
 
-from fastapi import APIRouter, HTTPException
+import json
+from collections import Counter
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Literal
 
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
+
+from ..creative.batch_processing import batch_processing_service
 from ..creative.models import (
+    ConsistencyBatchRequest,
+    CreativeBatchCreateRequest,
+    CreativeBatchResponse,
     CreativeProjectCreateRequest,
     CreativeProjectResponse,
     CreativeProjectListResponse,
 )
+from ..creative import jobs as creative_jobs
 from ..creative.workflow import creative_orchestrator
 from ..creative.repository import creative_repository
 from ..config import settings
@@ -24,15 +35,108 @@ async def get_available_video_providers() -> dict:
 
 @router.post("/projects", response_model=CreativeProjectResponse, status_code=201)
 async def create_project(payload: CreativeProjectCreateRequest) -> CreativeProjectResponse:
-    """创建新的创作项目。"""
+    """创建新的创作项目；简报扩展与脚本生成由 worker 执行时立即返回。"""
     try:
-        project = await creative_orchestrator.create_project(payload)
+        project, task_id = await creative_jobs.create_project(payload, creative_orchestrator)
     except Exception as exc:
         from ..instrumentation import get_logger
         logger = get_logger()
         logger.error(f"Error creating creative project: {exc}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to create project: {str(exc)}") from exc
-    return CreativeProjectResponse(project=project)
+    return CreativeProjectResponse(project=project, task_id=task_id)
+
+
+@router.post("/batches", response_model=CreativeBatchResponse, status_code=202)
+async def create_batch(payload: CreativeBatchCreateRequest) -> CreativeBatchResponse:
+    """批量创建项目并交给 worker 生成；进度与结果通过 /tasks/{batch_id}/events 推送。"""
+    if not creative_jobs.stage_workers_enabled():
+        raise HTTPException(status_code=503, detail="Batch submission requires the task queue")
+    try:
+        return await creative_jobs.submit_batch(payload, creative_orchestrator)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except Exception as exc:
+        from ..instrumentation import get_logger
+        logger = get_logger()
+        logger.error(f"Error submitting creative batch: {exc}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to submit batch: {str(exc)}") from exc
+
+
+@router.get("/batches/{batch_id}", response_model=CreativeBatchResponse)
+async def get_batch(batch_id: str) -> CreativeBatchResponse:
+    """获取批次的整体进度与已完成项目的结果。"""
+    if not creative_jobs.stage_workers_enabled():
+        raise HTTPException(status_code=503, detail="Batch submission requires the task queue")
+    try:
+        return await creative_jobs.batch_status(batch_id)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+
+
+def _consistency_results(
+    operation: str, payload: ConsistencyBatchRequest, cursor: int
+) -> AsyncIterator[dict[str, Any]]:
+    concurrency = min(
+        payload.concurrency or batch_processing_service.max_concurrent_tasks,
+        settings.batch_processing_max_concurrency,
+    )
+    options = {"concurrency": concurrency, "cursor": cursor}
+    service = batch_processing_service
+    if operation == "evaluate":
+        return service.iter_evaluate_consistency(payload.project_ids, **options)
+    if operation == "retry":
+        return service.iter_auto_retry_consistency(payload.project_ids, payload.max_retries, **options)
+    if operation == "regenerate":
+        return service.iter_regenerate_consistency(payload.project_ids, payload.consistency_level, **options)
+    return service.iter_update_consistency_config(payload.project_ids, payload.config_updates, **options)
+
+
+@router.post("/consistency/batch/{operation}/stream")
+async def stream_consistency_batch(
+    operation: Literal["evaluate", "retry", "regenerate", "update-config"],
+    payload: ConsistencyBatchRequest,
+    accept: str = Header(default="application/x-ndjson"),
+    last_event_id: str | None = Header(default=None),
+) -> StreamingResponse:
+    """
+    批量一致性操作，逐个项目返回结果（NDJSON，``Accept: text/event-stream`` 时为 SSE）。
+
+    每条结果带 ``cursor``：它之前的项目都已完成。断线后把最后收到的 cursor
+    作为请求体的 ``cursor``（SSE 为 ``Last-Event-ID``）重新提交即可继续。
+    客户端断开时未完成的项目会被取消。流的最后一行是汇总。
+    """
+    sse = "text/event-stream" in accept
+    cursor = int(last_event_id) if sse and last_event_id and last_event_id.isdigit() else payload.cursor
+
+    def encode(record: dict[str, Any], event: str) -> bytes:
+        data = json.dumps(record, default=str, ensure_ascii=False)
+        if sse:
+            return f"id: {record['cursor']}\nevent: {event}\ndata: {data}\n\n".encode("utf-8")
+        return f"{data}\n".encode("utf-8")
+
+    async def body() -> AsyncIterator[bytes]:
+        statuses: Counter[str] = Counter()
+        last_cursor = cursor
+        async with aclosing(_consistency_results(operation, payload, cursor)) as results:
+            async for result in results:
+                statuses[result.get("status", "unknown")] += 1
+                last_cursor = result["cursor"]
+                yield encode({"type": "result", **result}, "result")
+        summary = {
+            "type": "summary",
+            "operation": operation,
+            "total_projects": len(payload.project_ids),
+            "processed": sum(statuses.values()),
+            "statuses": dict(statuses),
+            "cursor": last_cursor,
+        }
+        yield encode(summary, "summary")
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/projects/{project_id}", response_model=CreativeProjectResponse)
@@ -67,7 +171,7 @@ async def list_projects(tenant_id: str = "demo", limit: int = 50) -> CreativePro
 async def approve_script(project_id: str) -> CreativeProjectResponse:
     """批准脚本并继续到分镜阶段。"""
     try:
-        project = await creative_orchestrator.approve_script(project_id)
+        project, task_id = await creative_jobs.approve_script(project_id, creative_orchestrator)
     except KeyError as exc:
         raise HTTPException(status_code=404, detail=str(exc)) from exc
     except ValueError as exc:
@@ -77,14 +181,14 @@ async def approve_script(project_id: str) -> CreativeProjectResponse:
         logger = get_logger()
         logger.error(f"Error approving script for project {project_id}: {exc}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to approve script: {str(exc)}") from exc
-    return CreativeProjectResponse(project=project)
+    return CreativeProjectResponse(project=project, task_id=task_id)
 
 
 @router.post("/projects/{project_id}/advance", response_model=CreativeProjectResponse)
 async def advance_project(project_id: str) -> CreativeProjectResponse:
     """推进项目到下一个自动阶段。"""
     try:
-        project = await creative_orchestrator.advance(project_id)
+        project, task_id = await creative_jobs.advance(project_id, creative_orchestrator)
     except KeyError as exc:
         raise HTTPException(status_code=404, detail=str(exc)) from exc
     except ValueError as exc:
@@ -94,7 +198,7 @@ async def advance_project(project_id: str) -> CreativeProjectResponse:
         logger = get_logger()
         logger.error(f"Error advancing project {project_id}: {exc}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to advance project: {str(exc)}") from exc
-    return CreativeProjectResponse(project=project)
+    return CreativeProjectResponse(project=project, task_id=task_id)
 
 
 @router.post("/projects/{project_id}/pause", response_model=CreativeProjectResponse)
@@ -115,6 +115,7 @@ async def send_message_with_files(
 
         yield sse({"status": "thinking", "message": "Processing request"})
 
+        base_length = len(session.messages)
         saved_paths: list[str] = []
         if files:
             for f in files:
@@ -143,7 +144,7 @@ async def send_message_with_files(
             session.messages.append(f"User: {prompt}")
 
         try:
-            await general_repository.upsert(session)
+            await general_repository.upsert_appended(session, base_length)
         except Exception as exc:
             logger.error(f"Failed to persist session {session_id}: {exc}", exc_info=True)
             yield sse({"status": "error", "message": "failed to persist session"})
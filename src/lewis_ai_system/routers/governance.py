@@ -62,3 +62,21 @@ async def get_tenant_metrics(tenant_id: str) -> dict:
     """Get tenant sandbox policy metrics."""
     from ..tenant_policy import tenant_policy_manager
     return await tenant_policy_manager.get_tenant_metrics(tenant_id)
+
+
+@router.get("/cache/metrics")
+async def get_cache_metrics() -> dict:
+    """Get cache backend and per-tier hit ratios."""
+    from ..redis_cache import cache_manager
+    return cache_manager.stats()
+
+
+@router.get("/queues/metrics")
+async def get_queue_metrics() -> dict:
+    """Get task queue depth, per-tenant backlog and wait times."""
+    from ..config import settings
+    from ..task_queue import task_queue
+
+    if not (settings.redis_enabled and settings.redis_url):
+        return {"queues": {}}
+    return await task_queue.queue_metrics()
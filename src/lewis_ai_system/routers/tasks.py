@@ -0,0 +1,74 @@
+"""FastAPI router for background task status and progress streaming."""
+
+from __future__ import annotations
+
+import json
+from typing import AsyncGenerator
+
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from ..config import settings
+from ..task_progress import follow_progress
+from ..task_queue import TaskStatus, task_queue
+
+router = APIRouter()
+
+# 空闲检查时遇到这些状态就结束 SSE：任务已有结果，或任务与结果都已不存在
+_FINAL_STATUSES = frozenset({TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED})
+
+
+async def _connected_queue():
+    if not (settings.redis_enabled and settings.redis_url):
+        raise HTTPException(status_code=503, detail="Task queue is not configured")
+    await task_queue.connect()
+    return task_queue
+
+
+@router.get("/{task_id}")
+async def get_task_status(task_id: str) -> dict:
+    """Latest task status and progress; never waits for the task to finish."""
+    queue = await _connected_queue()
+    status = await queue.get_task_status(task_id)
+    if status["status"] == TaskStatus.CANCELLED:
+        raise HTTPException(status_code=404, detail=status["error"])
+    return status
+
+
+@router.get("/{task_id}/events")
+async def stream_task_events(
+    task_id: str,
+    request: Request,
+    last_event_id: str | None = Header(default=None),
+) -> StreamingResponse:
+    """
+    通过 SSE 推送任务进度，直到 completed/failed。
+
+    每个事件的 ``id`` 是 Redis Stream 条目 ID，断线重连时浏览器会带上
+    ``Last-Event-ID``，从下一条事件继续。空闲时发送注释行保持连接，并重新查询
+    任务状态：任务已结束但没有写终态事件（如超时），或任务已过期时，发送一条
+    ``status`` 事件后结束。未知任务直接返回 404。
+    """
+    queue = await _connected_queue()
+    status = await queue.get_task_status(task_id)
+    if status["status"] == TaskStatus.CANCELLED:
+        raise HTTPException(status_code=404, detail=status["error"])
+
+    async def event_stream() -> AsyncGenerator[bytes, None]:
+        async for event in follow_progress(queue.pool, task_id, last_id=last_event_id or "0-0"):
+            if await request.is_disconnected():
+                return
+            if event is None:
+                status = await queue.get_task_status(task_id)
+                if status["status"] in _FINAL_STATUSES:
+                    yield f"event: status\ndata: {json.dumps(status, default=str)}\n\n".encode("utf-8")
+                    return
+                yield b": keep-alive\n\n"
+                continue
+            yield f"id: {event['id']}\nevent: progress\ndata: {json.dumps(event)}\n\n".encode("utf-8")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
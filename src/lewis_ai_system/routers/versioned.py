@@ -13,6 +13,7 @@ from .creative import router as creative_router
 from .general import router as general_router
 from .governance import router as governance_router
 from .auth import router as auth_router
+from .tasks import router as tasks_router
 
 
 def create_v1_router() -> APIRouter:
@@ -28,6 +29,7 @@ def create_v1_router() -> APIRouter:
     router.include_router(general_router, prefix="/general") 
     router.include_router(governance_router, prefix="/governance")
     router.include_router(auth_router, prefix="/auth")
+    router.include_router(tasks_router, prefix="/tasks")
     
     @router.get("/info")
     async def v1_info():
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import re
 from typing import Any
 
 from e2b_code_interpreter import Sandbox as E2BSandbox
@@ -45,69 +46,76 @@ class EnhancedSandbox:
                 execution = sandbox.run_code(code)
             finally:
                 sandbox.kill()
-                
-                # Extract stdout/stderr as strings
-                stdout_str = ""
-                stderr_str = ""
-                if execution.logs.stdout:
-                    stdout_str = "".join(execution.logs.stdout) if isinstance(execution.logs.stdout, list) else str(execution.logs.stdout)
-                if execution.logs.stderr:
-                    stderr_str = "".join(execution.logs.stderr) if isinstance(execution.logs.stderr, list) else str(execution.logs.stderr)
-                
-                # Extract results
-                results_list = []
-                last_result = None
-                if execution.results:
-                    for r in execution.results:
-                        # Try to extract the actual value from result objects
-                        result_value = None
-                        if hasattr(r, 'text'):
-                            result_value = r.text
-                        elif hasattr(r, 'data'):
-                            result_value = r.data
-                        elif hasattr(r, 'value'):
-                            result_value = r.value
-                        else:
-                            result_value = str(r)
-                        
-                        if result_value is not None:
-                            results_list.append(result_value)
-                            last_result = result_value
-                
-                # Try to parse numeric results from stdout if no explicit result
-                if last_result is None and stdout_str:
-                    # Try to extract numeric values from stdout (for test compatibility)
-                    import re
-                    # Look for numeric patterns in stdout
-                    numeric_match = re.search(r'(\d+(?:\.\d+)?)', stdout_str)
-                    if numeric_match:
-                        try:
-                            last_result = float(numeric_match.group(1))
-                            if last_result.is_integer():
-                                last_result = int(last_result)
-                        except (ValueError, AttributeError):
-                            pass
-                
-                error = None
-                if execution.error:
-                    error = execution.error.name if hasattr(execution.error, 'name') else str(execution.error)
-                
-                return {
-                    "stdout": stdout_str,
-                    "stderr": stderr_str,
-                    "result": last_result,  # Last result for test compatibility
-                    "results": results_list,
-                    "error": error,
-                }
+            return normalize_execution(execution)
         except Exception as e:
             logger.error(f"Sandbox execution failed: {e}")
-            return {
-                "stdout": "",
-                "stderr": str(e),
-                "result": None,
-                "results": [],
-                "error": str(e),
-            }
+            return error_execution(str(e))
+
+
+def normalize_execution(execution: Any) -> dict[str, Any]:
+    """Convert an E2B ``Execution`` into the sandbox result dict used by tools."""
+    # Extract stdout/stderr as strings
+    stdout_str = ""
+    stderr_str = ""
+    if execution.logs.stdout:
+        stdout_str = "".join(execution.logs.stdout) if isinstance(execution.logs.stdout, list) else str(execution.logs.stdout)
+    if execution.logs.stderr:
+        stderr_str = "".join(execution.logs.stderr) if isinstance(execution.logs.stderr, list) else str(execution.logs.stderr)
+
+    # Extract results
+    results_list = []
+    last_result = None
+    if execution.results:
+        for r in execution.results:
+            # Try to extract the actual value from result objects
+            result_value = None
+            if hasattr(r, 'text'):
+                result_value = r.text
+            elif hasattr(r, 'data'):
+                result_value = r.data
+            elif hasattr(r, 'value'):
+                result_value = r.value
+            else:
+                result_value = str(r)
+
+            if result_value is not None:
+                results_list.append(result_value)
+                last_result = result_value
+
+    # Try to parse numeric results from stdout if no explicit result
+    if last_result is None and stdout_str:
+        # Try to extract numeric values from stdout (for test compatibility)
+        numeric_match = re.search(r'(\d+(?:\.\d+)?)', stdout_str)
+        if numeric_match:
+            try:
+                last_result = float(numeric_match.group(1))
+                if last_result.is_integer():
+                    last_result = int(last_result)
+            except (ValueError, AttributeError):
+                pass
+
+    error = None
+    if execution.error:
+        error = execution.error.name if hasattr(execution.error, 'name') else str(execution.error)
+
+    return {
+        "stdout": stdout_str,
+        "stderr": stderr_str,
+        "result": last_result,  # Last result for test compatibility
+        "results": results_list,
+        "error": error,
+    }
+
+
+def error_execution(message: str, *, error: str | None = None, stdout: str = "") -> dict[str, Any]:
+    """Build a sandbox result dict describing a failed execution."""
+    return {
+        "stdout": stdout,
+        "stderr": message,
+        "result": None,
+        "results": [],
+        "error": error or message,
+    }
 
 
 def get_sandbox() -> EnhancedSandbox:
@@ -0,0 +1,793 @@
+"""Warm sandbox pool shared by code-execution tools.
+
+Creating an E2B sandbox takes seconds, so paying that cost on every
+``python_sandbox`` call dominates tool latency. :class:`SandboxPool` keeps a set
+of pre-created instances warm, leases them to callers, recycles them after a
+configurable number of executions and health-checks idle instances in the
+background. Two backends share the same interface: E2B for production and a
+local process pool that works without network access. Local workers are spawned
+ahead of time with ``SandboxSettings`` rlimits as hard ceilings, and each call
+runs under the calling tenant's ``TenantSandboxPolicy`` limits. A local worker
+serves a single call and is then replaced, because process-wide interpreter
+state cannot be reset between tenants.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import json
+import os
+import shutil
+import sys
+import tempfile
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Protocol
+
+from .config import TenantSandboxPolicy, settings
+from .instrumentation import TelemetryEvent, emit_event, get_logger
+from .sandbox import error_execution, normalize_execution
+from .tenant_policy import TenantPolicyManager, tenant_policy_manager
+
+logger = get_logger()
+
+WORKER_SCRIPT = Path(__file__).with_name("sandbox_worker.py")
+# asyncio 默认的 StreamReader 行长度上限为 64KB，输出较大时需要放宽
+WORKER_STREAM_LIMIT = 8 * 1024 * 1024
+# 传给 worker 的环境变量白名单；其余变量（API Key、数据库地址等）不会泄露给沙箱代码
+WORKER_ENV_PASSTHROUGH = ("PATH", "LANG", "LC_ALL", "TZ")
+# 在 E2B 持久 context 中读取解释器当前常驻内存（MB），只求值表达式，不在命名空间里留下变量
+E2B_MEMORY_PROBE = (
+    "int(open('/proc/self/statm').read().split()[1]) "
+    "* __import__('os').sysconf('SC_PAGE_SIZE') / 1048576"
+)
+
+
+class SandboxPoolError(RuntimeError):
+    """Raised when the pool cannot provide a sandbox."""
+
+
+class SandboxQuotaExceeded(SandboxPoolError):
+    """Raised when a tenant has no sandbox quota left."""
+
+
+@dataclass(slots=True)
+class SandboxLimits:
+    """Per-execution resource limits (``None`` means no limit)."""
+
+    memory_mb: int | None = None
+    cpu_seconds: int | None = None
+    file_size_mb: int | None = None
+
+    @classmethod
+    def from_policy(cls, policy: TenantSandboxPolicy) -> "SandboxLimits":
+        """Tenant limits, capped by the global ``SandboxSettings`` ceilings."""
+        cfg = settings.sandbox
+        return cls(
+            memory_mb=min(policy.max_memory_mb, cfg.max_memory_mb),
+            cpu_seconds=min(policy.max_cpu_seconds, cfg.max_cpu_seconds),
+            file_size_mb=min(policy.max_file_size_mb, cfg.max_file_size_mb),
+        )
+
+    def as_dict(self) -> dict[str, int]:
+        return {
+            key: value
+            for key, value in (
+                ("memory_mb", self.memory_mb),
+                ("cpu_seconds", self.cpu_seconds),
+                ("file_size_mb", self.file_size_mb),
+            )
+            if value
+        }
+
+
+class SandboxInstance(Protocol):
+    """A warm sandbox that can run code repeatedly."""
+
+    instance_id: str
+    executions: int
+
+    @property
+    def alive(self) -> bool:
+        """Cheap local liveness check used when an instance is returned."""
+        ...
+
+    async def run_code(
+        self,
+        code: str,
+        *,
+        timeout_seconds: float,
+        limits: SandboxLimits | None = None,
+        reset: bool = True,
+    ) -> dict[str, Any]:
+        """Execute code and return the normalized sandbox result dict.
+
+        With ``reset=False`` the interpreter state of previous non-reset calls
+        is kept, which is how session-bound kernels are implemented.
+        """
+        ...
+
+    async def memory_usage_mb(self) -> float | None:
+        """Resident memory of the interpreter, or None if unknown."""
+        ...
+
+    async def health_check(self) -> bool:
+        """Return True if the instance can accept more work."""
+        ...
+
+    async def close(self) -> None:
+        """Release all resources held by the instance."""
+        ...
+
+    async def close_detached(self) -> None:
+        """Release resources from a loop other than the one the instance was created on."""
+        ...
+
+
+class SandboxBackend(Protocol):
+    """Factory for sandbox instances."""
+
+    name: str
+    # False 表示实例内的解释器状态（sys.modules、builtins 等）在调用之间无法可靠清理，
+    # 池在每次租用后都会回收实例，绝不把同一个进程交给下一个调用方
+    reuse_instances: bool
+
+    async def create_instance(self) -> SandboxInstance:
+        """Create and warm up a new instance."""
+        ...
+
+
+# ============================================================================
+# E2B backend
+# ============================================================================
+
+
+class E2BSandboxInstance:
+    """Pooled E2B sandbox; each execution runs in a throwaway code context."""
+
+    def __init__(self, sandbox: Any) -> None:
+        self.instance_id = getattr(sandbox, "sandbox_id", None) or uuid.uuid4().hex
+        self.executions = 0
+        self._sandbox = sandbox
+        self._closed = False
+        self._persistent_context: Any = None
+
+    @property
+    def alive(self) -> bool:
+        return not self._closed
+
+    async def run_code(
+        self,
+        code: str,
+        *,
+        timeout_seconds: float,
+        limits: SandboxLimits | None = None,
+        reset: bool = True,
+    ) -> dict[str, Any]:
+        # 资源限制由 E2B 模板负责，这里只控制超时
+        if not reset:
+            if self._persistent_context is None:
+                self._persistent_context = await self._sandbox.create_code_context()
+            execution = await self._sandbox.run_code(
+                code, context=self._persistent_context, timeout=timeout_seconds
+            )
+            return normalize_execution(execution)
+
+        # 使用独立的 code context，避免不同调用（以及不同租户）之间共享解释器状态
+        context = await self._sandbox.create_code_context()
+        try:
+            execution = await self._sandbox.run_code(code, context=context, timeout=timeout_seconds)
+        finally:
+            try:
+                await self._sandbox.remove_code_context(context)
+            except Exception as exc:
+                logger.warning(f"Failed to remove E2B code context: {exc}")
+        return normalize_execution(execution)
+
+    async def memory_usage_mb(self) -> float | None:
+        # 只有会话内核（持久 context）才有长期驻留的解释器需要检查
+        if self._persistent_context is None:
+            return None
+        try:
+            execution = await self._sandbox.run_code(
+                E2B_MEMORY_PROBE, context=self._persistent_context, timeout=5
+            )
+            return float(normalize_execution(execution)["result"])
+        except Exception as exc:
+            logger.warning(f"Failed to read E2B kernel memory for {self.instance_id}: {exc}")
+            return None
+
+    async def health_check(self) -> bool:
+        try:
+            return bool(await self._sandbox.is_running())
+        except Exception:
+            return False
+
+    async def close(self) -> None:
+        self._closed = True
+        try:
+            result = self._sandbox.kill()
+            if inspect.isawaitable(result):
+                await result
+        except Exception as exc:
+            logger.warning(f"Failed to kill E2B sandbox {self.instance_id}: {exc}")
+
+    async def close_detached(self) -> None:
+        # kill 只是一次 API 调用，不依赖创建沙箱时的事件循环
+        await self.close()
+
+
+class E2BSandboxBackend:
+    """Creates E2B sandboxes through the async client."""
+
+    name = "e2b"
+    # 每次调用使用独立的 code context（独立内核进程），实例可以复用
+    reuse_instances = True
+
+    def __init__(self, api_key: str | None = None) -> None:
+        self.api_key = api_key or settings.e2b_api_key
+        if not self.api_key:
+            raise SandboxPoolError("E2B_API_KEY is required for the e2b sandbox backend.")
+
+    async def create_instance(self) -> SandboxInstance:
+        from e2b_code_interpreter import AsyncSandbox
+
+        sandbox = await AsyncSandbox.create(api_key=self.api_key)
+        return E2BSandboxInstance(sandbox)
+
+
+# ============================================================================
+# Local process-pool backend
+# ============================================================================
+
+
+def worker_environment(scratch_dir: Path) -> dict[str, str]:
+    """Minimal environment for a local worker: whitelisted variables plus a private home."""
+    env = {key: os.environ[key] for key in WORKER_ENV_PASSTHROUGH if key in os.environ}
+    env.setdefault("PATH", os.defpath)
+    env["HOME"] = env["TMPDIR"] = str(scratch_dir)
+    return env
+
+
+class LocalProcessInstance:
+    """A long-lived Python worker process speaking JSON lines over pipes.
+
+    Each worker gets a private scratch directory under
+    ``SandboxSettings.working_directory`` that is removed when it closes.
+    """
+
+    def __init__(self, process: asyncio.subprocess.Process, scratch_dir: Path | None = None) -> None:
+        self.instance_id = f"local-{process.pid}"
+        self.executions = 0
+        self.scratch_dir = scratch_dir
+        self._process = process
+        self._killed = False
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    async def spawn(cls, working_directory: Path | None = None) -> "LocalProcessInstance":
+        cfg = settings.sandbox
+        root = working_directory or cfg.working_directory
+        root.mkdir(parents=True, exist_ok=True)
+        scratch_dir = Path(tempfile.mkdtemp(prefix="worker-", dir=root))
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-I",
+            str(WORKER_SCRIPT),
+            "--max-memory-mb",
+            str(cfg.max_memory_mb),
+            "--max-file-size-mb",
+            str(cfg.max_file_size_mb),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            cwd=str(scratch_dir),
+            env=worker_environment(scratch_dir),
+            limit=WORKER_STREAM_LIMIT,
+        )
+        return cls(process, scratch_dir)
+
+    @property
+    def pid(self) -> int:
+        return self._process.pid
+
+    @property
+    def alive(self) -> bool:
+        return not self._killed and self._process.returncode is None
+
+    async def _request(self, payload: dict[str, Any], timeout_seconds: float) -> dict[str, Any]:
+        async with self._lock:
+            if not self.alive:
+                raise SandboxPoolError(f"Sandbox worker {self.instance_id} is not running")
+            assert self._process.stdin is not None and self._process.stdout is not None
+            self._process.stdin.write(json.dumps(payload).encode("utf-8") + b"\n")
+            try:
+                await self._process.stdin.drain()
+                line = await asyncio.wait_for(self._process.stdout.readline(), timeout_seconds)
+            except asyncio.TimeoutError:
+                # 超时的 worker 状态不可知，直接杀掉，由池负责补充
+                await self.close()
+                raise
+            except (ConnectionError, ValueError) as exc:
+                await self.close()
+                raise SandboxPoolError(f"Sandbox worker {self.instance_id} pipe failed: {exc}") from exc
+            except BaseException:
+                # 调用方被取消时请求已写出、响应未读，管道里会残留这次的输出，
+                # worker 不能再复用：杀掉（alive 变为 False，池归还时会丢弃）后继续抛出
+                self._kill()
+                raise
+            if not line:
+                await self.close()
+                raise SandboxPoolError(f"Sandbox worker {self.instance_id} exited unexpectedly")
+            return json.loads(line)
+
+    async def run_code(
+        self,
+        code: str,
+        *,
+        timeout_seconds: float,
+        limits: SandboxLimits | None = None,
+        reset: bool = True,
+    ) -> dict[str, Any]:
+        request = {
+            "op": "execute",
+            "code": code,
+            "reset": reset,
+            "limits": limits.as_dict() if limits else None,
+        }
+        try:
+            return await self._request(request, timeout_seconds)
+        except asyncio.TimeoutError:
+            return error_execution(
+                f"Execution exceeded {timeout_seconds:g}s timeout", error="TimeoutError"
+            )
+        except SandboxPoolError as exc:
+            return error_execution(str(exc), error="SandboxCrashed")
+
+    async def memory_usage_mb(self) -> float | None:
+        try:
+            response = await self._request({"op": "stats"}, timeout_seconds=5)
+        except (asyncio.TimeoutError, SandboxPoolError):
+            return None
+        return response.get("rss_mb")
+
+    async def health_check(self) -> bool:
+        if not self.alive:
+            return False
+        try:
+            response = await self._request({"op": "ping"}, timeout_seconds=5)
+        except (asyncio.TimeoutError, SandboxPoolError):
+            return False
+        return bool(response.get("ok"))
+
+    def _kill(self) -> None:
+        if self.alive:
+            self._killed = True
+            try:
+                self._process.kill()
+            except ProcessLookupError:
+                pass
+
+    async def close(self) -> None:
+        self._kill()
+        await self._process.wait()
+        if self.scratch_dir is not None:
+            shutil.rmtree(self.scratch_dir, ignore_errors=True)
+
+    async def close_detached(self) -> None:
+        # 子进程的传输绑定在原事件循环上，不能在这里等待；只发信号结束进程
+        try:
+            self._kill()
+        except Exception as exc:
+            logger.warning(f"Failed to kill sandbox worker {self.instance_id}: {exc}")
+        if self.scratch_dir is not None:
+            shutil.rmtree(self.scratch_dir, ignore_errors=True)
+
+
+class LocalSubprocessBackend:
+    """Runs code in pre-spawned local worker processes; no network or API key required."""
+
+    name = "local"
+    # reset 只换掉全局命名空间，sys.modules、builtins 和 worker 自身的模块都会留下来，
+    # 上一个租户可以借此篡改或读取下一个租户的输出，所以 worker 只用一次
+    reuse_instances = False
+
+    def __init__(self, working_directory: Path | None = None) -> None:
+        self.working_directory = working_directory
+
+    async def create_instance(self) -> SandboxInstance:
+        return await LocalProcessInstance.spawn(self.working_directory)
+
+
+def resolve_sandbox_backend_name(name: str | None = None) -> str:
+    """Resolve ``auto`` to ``e2b``; the local backend is only used when chosen explicitly.
+
+    Local workers run under rlimits but share the host kernel and filesystem, so
+    a missing E2B key must not silently downgrade isolation.
+    """
+    backend = name or settings.sandbox.backend
+    if backend == "auto":
+        if not settings.e2b_api_key:
+            raise SandboxPoolError(
+                "No sandbox backend configured: set E2B_API_KEY, or SANDBOX_BACKEND=local "
+                "to run code in local worker processes."
+            )
+        return "e2b"
+    return backend
+
+
+def build_sandbox_backend(name: str | None = None) -> SandboxBackend:
+    """Build the configured sandbox backend."""
+    backend = resolve_sandbox_backend_name(name)
+    if backend == "local":
+        return LocalSubprocessBackend()
+    if backend == "e2b":
+        return E2BSandboxBackend()
+    raise SandboxPoolError(f"Unknown sandbox backend '{backend}'")
+
+
+# ============================================================================
+# Pool
+# ============================================================================
+
+
+class SandboxPool:
+    """Keeps between ``min_size`` and ``max_size`` sandboxes warm and leases them out.
+
+    Backends whose ``reuse_instances`` is False get a fresh instance per lease:
+    the used one is closed on release and the pool refills in the background.
+    """
+
+    def __init__(
+        self,
+        backend: SandboxBackend,
+        *,
+        min_size: int | None = None,
+        max_size: int | None = None,
+        max_executions_per_instance: int | None = None,
+        health_check_interval_seconds: float | None = None,
+        policy_manager: TenantPolicyManager | None = None,
+    ) -> None:
+        cfg = settings.sandbox
+        self.backend = backend
+        self.max_size = max(max_size if max_size is not None else cfg.pool_max_size, 1)
+        self.min_size = min(max(min_size if min_size is not None else cfg.pool_min_size, 0), self.max_size)
+        self.max_executions_per_instance = max(
+            max_executions_per_instance or cfg.pool_max_executions_per_instance, 1
+        )
+        self.health_check_interval_seconds = (
+            health_check_interval_seconds
+            if health_check_interval_seconds is not None
+            else cfg.pool_health_check_interval_seconds
+        )
+        self.policy_manager = policy_manager or tenant_policy_manager
+
+        self._idle: deque[SandboxInstance] = deque()
+        self._size = 0  # 包含空闲、租出和正在创建中的实例
+        self._cond = asyncio.Condition()
+        self._maintenance_task: asyncio.Task[None] | None = None
+        self._replenish_task: asyncio.Task[None] | None = None
+        try:
+            self._loop: asyncio.AbstractEventLoop | None = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+        self._closed = False
+        self._stats = {
+            "created": 0,
+            "recycled": 0,
+            "unhealthy": 0,
+            "executions": 0,
+            "waits": 0,
+            "taken": 0,
+            "retired": 0,
+        }
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop | None:
+        """Event loop the pool's instances are bound to."""
+        return self._loop
+
+    async def start(self) -> None:
+        """Pre-warm ``min_size`` instances and start background health checks."""
+        self._loop = asyncio.get_running_loop()
+        await self._replenish()
+        if self.health_check_interval_seconds and self._maintenance_task is None:
+            self._maintenance_task = asyncio.create_task(self._maintenance_loop())
+        logger.info(
+            f"Sandbox pool started (backend={self.backend.name}, warm={len(self._idle)}, max={self.max_size})"
+        )
+
+    async def execute(
+        self,
+        code: str,
+        *,
+        tenant_id: str = "default",
+        timeout_seconds: float | None = None,
+    ) -> dict[str, Any]:
+        """Run code on a pooled instance under the tenant's quota and timeout."""
+        if not await self.policy_manager.acquire_execution_slot(tenant_id):
+            raise SandboxQuotaExceeded(f"Sandbox quota exceeded for tenant {tenant_id}")
+        try:
+            policy = self.policy_manager.get_policy(tenant_id)
+            timeout = timeout_seconds or policy.execution_timeout_seconds
+            async with self.lease() as instance:
+                return await instance.run_code(
+                    code,
+                    timeout_seconds=timeout,
+                    limits=SandboxLimits.from_policy(policy),
+                )
+        finally:
+            await self.policy_manager.release_execution_slot(tenant_id)
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[SandboxInstance]:
+        """Borrow an instance for the duration of the context."""
+        instance = await self._acquire()
+        try:
+            yield instance
+        finally:
+            instance.executions += 1
+            self._stats["executions"] += 1
+            await self._release(instance)
+
+    async def take(self) -> SandboxInstance | None:
+        """Hand a warm idle instance over to the caller for exclusive long-lived use.
+
+        The instance leaves the pool: the caller owns it and must close it. Used
+        by session kernels so they start warm. Returns ``None`` when nothing is
+        idle; the pool refills in the background either way.
+        """
+        instance: SandboxInstance | None = None
+        dead: list[SandboxInstance] = []
+        async with self._cond:
+            while self._idle and not self._closed:
+                candidate = self._idle.popleft()
+                self._size -= 1
+                self._cond.notify()
+                if candidate.alive:
+                    instance = candidate
+                    break
+                dead.append(candidate)
+        for candidate in dead:
+            self._stats["unhealthy"] += 1
+            await candidate.close()
+        if instance is not None:
+            self._stats["taken"] += 1
+        self._schedule_replenish()
+        return instance
+
+    def _schedule_replenish(self) -> None:
+        if not self._closed and (self._replenish_task is None or self._replenish_task.done()):
+            self._replenish_task = asyncio.create_task(self._replenish())
+
+    async def _acquire(self) -> SandboxInstance:
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+        while True:
+            dead: SandboxInstance | None = None
+            async with self._cond:
+                if self._closed:
+                    raise SandboxPoolError("Sandbox pool is closed")
+                if self._idle:
+                    instance = self._idle.popleft()
+                    if instance.alive:
+                        return instance
+                    dead = instance
+                elif self._size < self.max_size:
+                    self._size += 1
+                    break
+                else:
+                    self._stats["waits"] += 1
+                    await self._cond.wait()
+            if dead is not None:
+                # 空闲期间死掉的实例释放名额后重试，不交给调用方
+                self._stats["unhealthy"] += 1
+                await self._discard(dead)
+        return await self._create_reserved()
+
+    async def _create_reserved(self) -> SandboxInstance:
+        """Create an instance for a slot already counted in ``_size``."""
+        try:
+            instance = await self.backend.create_instance()
+        except Exception as exc:
+            async with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise SandboxPoolError(f"Failed to create {self.backend.name} sandbox: {exc}") from exc
+        self._stats["created"] += 1
+        return instance
+
+    async def _release(self, instance: SandboxInstance) -> None:
+        if self._closed:
+            await self._discard(instance)
+            return
+        if instance.executions >= self.max_executions_per_instance:
+            self._stats["recycled"] += 1
+            await self._discard(instance)
+            return
+        if not instance.alive:
+            self._stats["unhealthy"] += 1
+            await self._discard(instance)
+            return
+        if not getattr(self.backend, "reuse_instances", True):
+            self._stats["retired"] += 1
+            await self._discard(instance)
+            self._schedule_replenish()
+            return
+        async with self._cond:
+            self._idle.append(instance)
+            self._cond.notify()
+
+    async def _discard(self, instance: SandboxInstance) -> None:
+        try:
+            await instance.close()
+        finally:
+            async with self._cond:
+                self._size -= 1
+                self._cond.notify()
+
+    async def _replenish(self) -> None:
+        """Top the pool back up to ``min_size`` warm instances."""
+        while not self._closed:
+            async with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                instance = await self._create_reserved()
+            except SandboxPoolError as exc:
+                logger.warning(f"Sandbox pool warm-up failed: {exc}")
+                return
+            async with self._cond:
+                self._idle.append(instance)
+                self._cond.notify()
+
+    async def check_health(self) -> int:
+        """Health-check idle instances, drop broken ones and refill. Returns drops."""
+        async with self._cond:
+            candidates = list(self._idle)
+            self._idle.clear()
+        dropped = 0
+        for instance in candidates:
+            if await instance.health_check():
+                async with self._cond:
+                    self._idle.append(instance)
+                    self._cond.notify()
+            else:
+                dropped += 1
+                self._stats["unhealthy"] += 1
+                await self._discard(instance)
+        await self._replenish()
+        if dropped:
+            emit_event(
+                TelemetryEvent(
+                    name="sandbox_pool_unhealthy",
+                    attributes={"backend": self.backend.name, "dropped": dropped},
+                )
+            )
+        return dropped
+
+    async def _maintenance_loop(self) -> None:
+        while not self._closed:
+            await asyncio.sleep(self.health_check_interval_seconds)
+            try:
+                await self.check_health()
+            except Exception as exc:  # pragma: no cover - keep the loop alive
+                logger.error(f"Sandbox pool health check failed: {exc}")
+
+    def stats(self) -> dict[str, Any]:
+        """Return pool counters for monitoring."""
+        return {
+            "backend": self.backend.name,
+            "size": self._size,
+            "idle": len(self._idle),
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            **self._stats,
+        }
+
+    async def close(self) -> None:
+        """Stop maintenance and close every idle instance."""
+        self._closed = True
+        if self._maintenance_task:
+            self._maintenance_task.cancel()
+            try:
+                await self._maintenance_task
+            except asyncio.CancelledError:
+                pass
+            self._maintenance_task = None
+        if self._replenish_task:
+            self._replenish_task.cancel()
+            try:
+                await self._replenish_task
+            except asyncio.CancelledError:
+                pass
+            self._replenish_task = None
+        async with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for instance in idle:
+            await self._discard(instance)
+
+    async def close_detached(self) -> None:
+        """Close a pool whose event loop has stopped, from the current loop.
+
+        Nothing bound to the old loop (tasks, condition, subprocess transports)
+        is awaited; idle instances are released with ``close_detached``.
+        Instances still leased on the old loop are gone with it.
+        """
+        self._closed = True
+        idle = list(self._idle)
+        self._idle.clear()
+        self._size -= len(idle)
+        for instance in idle:
+            await instance.close_detached()
+
+
+# ============================================================================
+# Global pool
+# ============================================================================
+
+_sandbox_pools: dict[str, SandboxPool] = {}
+_default_backend_name: str | None = None
+
+
+async def _retire_pool(pool: SandboxPool) -> None:
+    """Close a pool that is being replaced, on the event loop it is bound to."""
+    loop = pool.loop
+    if loop is None or loop is asyncio.get_running_loop():
+        await pool.close()
+    elif loop.is_running():
+        # 旧循环仍在其他线程运行：把关闭交给它执行，不在这里等待
+        asyncio.run_coroutine_threadsafe(pool.close(), loop)
+    else:
+        await pool.close_detached()
+
+
+async def get_sandbox_pool(backend: str | None = None) -> SandboxPool:
+    """Return the process-wide pool for a backend, creating it on first use.
+
+    A pool is bound to the event loop it was started on, so a new one is built
+    if the caller runs on a different loop (e.g. per-test loops). The pool it
+    replaces is closed, as is the previous default pool when the configured
+    backend changes.
+    """
+    global _default_backend_name
+    name = resolve_sandbox_backend_name(backend)
+    if backend is None:
+        previous, _default_backend_name = _default_backend_name, name
+        if previous is not None and previous != name and previous in _sandbox_pools:
+            await _retire_pool(_sandbox_pools.pop(previous))
+    loop = asyncio.get_running_loop()
+    pool = _sandbox_pools.get(name)
+    if pool is None or pool.loop is not loop:
+        if pool is not None:
+            await _retire_pool(pool)
+        pool = SandboxPool(build_sandbox_backend(name))
+        _sandbox_pools[name] = pool
+        await pool.start()
+    return pool
+
+
+async def init_sandbox_pool() -> None:
+    """Warm the sandbox pool at application startup."""
+    if not settings.sandbox.enabled:
+        logger.info("Sandbox disabled; skipping pool warm-up")
+        return
+    try:
+        await get_sandbox_pool()
+    except SandboxPoolError as exc:
+        logger.warning(f"Sandbox pool not started: {exc}")
+
+
+async def shutdown_sandbox_pool(loop: asyncio.AbstractEventLoop | None = None) -> None:
+    """Close sandbox pools at application shutdown, or only those bound to ``loop``."""
+    names = [name for name, pool in _sandbox_pools.items() if loop is None or pool.loop is loop]
+    pools = [_sandbox_pools.pop(name) for name in names]
+    for pool in pools:
+        await _retire_pool(pool)
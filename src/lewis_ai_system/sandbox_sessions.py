@@ -0,0 +1,299 @@
+"""Stateful sandbox kernels bound to General Mode sessions.
+
+Pooled sandboxes start every call from an empty interpreter, so multi-step data
+work has to repeat imports and reload data on each ``python_sandbox`` call.
+:class:`SandboxSessionManager` gives each session its own long-lived kernel
+whose globals survive between calls. Kernels are closed after an idle TTL, when
+they grow past the memory cap, when too many are open (least recently used
+first) and when the owning session pauses or completes.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any
+
+from .config import settings
+from .instrumentation import TelemetryEvent, emit_event, get_logger
+from .sandbox_pool import (
+    SandboxBackend,
+    SandboxInstance,
+    SandboxLimits,
+    SandboxPool,
+    SandboxPoolError,
+    SandboxQuotaExceeded,
+    get_sandbox_pool,
+)
+from .tenant_policy import TenantPolicyManager, tenant_policy_manager
+
+logger = get_logger()
+
+
+@dataclass(slots=True)
+class SandboxKernel:
+    """A sandbox instance dedicated to one session."""
+
+    session_id: str
+    tenant_id: str
+    instance: SandboxInstance
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    last_used: float = field(default_factory=time.monotonic)
+    executions: int = 0
+
+
+class SandboxSessionManager:
+    """Creates, reuses and evicts per-session sandbox kernels.
+
+    With a ``pool``, new kernels take a warm instance from it and only fall back
+    to ``backend.create_instance()`` when the pool has nothing idle.
+    """
+
+    def __init__(
+        self,
+        backend: SandboxBackend,
+        *,
+        pool: SandboxPool | None = None,
+        idle_ttl_seconds: float | None = None,
+        memory_cap_mb: int | None = None,
+        max_kernels: int | None = None,
+        sweep_interval_seconds: float | None = None,
+        policy_manager: TenantPolicyManager | None = None,
+    ) -> None:
+        cfg = settings.sandbox
+        self.backend = backend
+        self.pool = pool
+        self.idle_ttl_seconds = idle_ttl_seconds if idle_ttl_seconds is not None else cfg.session_idle_ttl_seconds
+        self.memory_cap_mb = memory_cap_mb if memory_cap_mb is not None else cfg.session_memory_cap_mb
+        self.max_kernels = max(max_kernels or cfg.max_session_kernels, 1)
+        self.sweep_interval_seconds = (
+            sweep_interval_seconds
+            if sweep_interval_seconds is not None
+            else min(self.idle_ttl_seconds, cfg.pool_health_check_interval_seconds)
+        )
+        self.policy_manager = policy_manager or tenant_policy_manager
+
+        # 按最近使用顺序排列，便于超出上限时淘汰最久未用的内核
+        self._kernels: OrderedDict[str, SandboxKernel] = OrderedDict()
+        self._lock = asyncio.Lock()
+        self._sweeper: asyncio.Task[None] | None = None
+        self._loop = asyncio.get_running_loop()
+        self._stats = {"created": 0, "reused": 0, "expired": 0, "memory_evictions": 0, "released": 0, "warm_starts": 0}
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Event loop the kernels are bound to."""
+        return self._loop
+
+    def start(self) -> None:
+        """Start the idle-kernel sweeper."""
+        if self.sweep_interval_seconds and self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def execute(
+        self,
+        session_id: str,
+        code: str,
+        *,
+        tenant_id: str = "default",
+        timeout_seconds: float | None = None,
+    ) -> dict[str, Any]:
+        """Run code in the session's kernel, creating it on first use."""
+        if not await self.policy_manager.acquire_execution_slot(tenant_id):
+            raise SandboxQuotaExceeded(f"Sandbox quota exceeded for tenant {tenant_id}")
+        try:
+            policy = self.policy_manager.get_policy(tenant_id)
+            while True:
+                kernel = await self._get_or_create(session_id, tenant_id)
+                async with kernel.lock:
+                    if not kernel.instance.alive:
+                        # 等锁期间内核被淘汰或重置，重新获取
+                        continue
+                    result = await kernel.instance.run_code(
+                        code,
+                        timeout_seconds=timeout_seconds or policy.execution_timeout_seconds,
+                        limits=SandboxLimits.from_policy(policy),
+                        reset=False,
+                    )
+                    kernel.executions += 1
+                    kernel.last_used = time.monotonic()
+                    result["kernel_reset"] = await self._enforce_memory_cap(kernel)
+                return result
+        finally:
+            await self.policy_manager.release_execution_slot(tenant_id)
+
+    async def _get_or_create(self, session_id: str, tenant_id: str) -> SandboxKernel:
+        stale: list[SandboxKernel] = []
+        async with self._lock:
+            kernel = self._kernels.get(session_id)
+            if kernel is not None and kernel.instance.alive:
+                self._kernels.move_to_end(session_id)
+                self._stats["reused"] += 1
+                return kernel
+            if kernel is not None:
+                # 内核已崩溃或超时被杀，丢弃后重新创建
+                stale.append(self._kernels.pop(session_id))
+
+        # 优先从预热池取实例；创建内核可能需要数秒（E2B），不持有全局锁，避免阻塞其他会话
+        instance = await self.pool.take() if self.pool is not None else None
+        if instance is not None:
+            self._stats["warm_starts"] += 1
+        else:
+            try:
+                instance = await self.backend.create_instance()
+            except Exception as exc:
+                raise SandboxPoolError(f"Failed to create {self.backend.name} kernel: {exc}") from exc
+
+        async with self._lock:
+            existing = self._kernels.get(session_id)
+            if existing is not None and existing.instance.alive:
+                # 同一会话的并发调用已经创建了内核
+                stale_instance: SandboxInstance | None = instance
+                kernel = existing
+            else:
+                stale_instance = None
+                kernel = SandboxKernel(session_id=session_id, tenant_id=tenant_id, instance=instance)
+                self._kernels[session_id] = kernel
+                self._stats["created"] += 1
+                stale.extend(self._evict_over_limit(keep=session_id))
+
+        if stale_instance is not None:
+            await stale_instance.close()
+        for old in stale:
+            await self._close_kernel(old)
+        return kernel
+
+    def _evict_over_limit(self, keep: str) -> list[SandboxKernel]:
+        """Pop least recently used kernels beyond ``max_kernels``; caller holds ``_lock``.
+
+        Kernels that are executing (``lock`` held) are skipped, so the manager may
+        stay over the limit until they finish.
+        """
+        evicted: list[SandboxKernel] = []
+        for session_id, kernel in list(self._kernels.items()):
+            if len(self._kernels) <= self.max_kernels:
+                break
+            if session_id == keep or kernel.lock.locked():
+                continue
+            evicted.append(self._kernels.pop(session_id))
+        return evicted
+
+    @staticmethod
+    async def _close_kernel(kernel: SandboxKernel) -> None:
+        # 等正在排队的执行结束再关闭；之后拿到锁的调用会发现实例已关闭并重新获取内核
+        async with kernel.lock:
+            await kernel.instance.close()
+
+    async def _enforce_memory_cap(self, kernel: SandboxKernel) -> bool:
+        """Close the kernel if it grew past the cap. Returns True if it was reset."""
+        if not self.memory_cap_mb or not kernel.instance.alive:
+            return not kernel.instance.alive
+        usage = await kernel.instance.memory_usage_mb()
+        if usage is None or usage <= self.memory_cap_mb:
+            return False
+        logger.warning(
+            f"Sandbox kernel for session {kernel.session_id} uses {usage:.0f}MB "
+            f"(cap {self.memory_cap_mb}MB); resetting"
+        )
+        self._stats["memory_evictions"] += 1
+        await self._remove(kernel.session_id)
+        return True
+
+    async def _remove(self, session_id: str) -> bool:
+        async with self._lock:
+            kernel = self._kernels.pop(session_id, None)
+        if kernel is None:
+            return False
+        await kernel.instance.close()
+        return True
+
+    async def release(self, session_id: str) -> bool:
+        """Close the session's kernel, e.g. when the session pauses or completes."""
+        released = await self._remove(session_id)
+        if released:
+            self._stats["released"] += 1
+            emit_event(TelemetryEvent(name="sandbox_kernel_released", attributes={"session_id": session_id}))
+        return released
+
+    async def sweep_idle(self) -> int:
+        """Close kernels idle for longer than the TTL. Returns how many were closed."""
+        cutoff = time.monotonic() - self.idle_ttl_seconds
+        async with self._lock:
+            expired = [
+                session_id
+                for session_id, kernel in self._kernels.items()
+                if kernel.last_used < cutoff and not kernel.lock.locked()
+            ]
+            kernels = [self._kernels.pop(session_id) for session_id in expired]
+        for kernel in kernels:
+            await self._close_kernel(kernel)
+        self._stats["expired"] += len(kernels)
+        return len(kernels)
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval_seconds)
+            try:
+                await self.sweep_idle()
+            except Exception as exc:  # pragma: no cover - keep the sweeper alive
+                logger.error(f"Sandbox kernel sweep failed: {exc}")
+
+    def has_kernel(self, session_id: str) -> bool:
+        return session_id in self._kernels
+
+    def stats(self) -> dict[str, Any]:
+        """Return kernel counters for monitoring."""
+        return {"backend": self.backend.name, "active": len(self._kernels), **self._stats}
+
+    async def close(self) -> None:
+        """Stop the sweeper and close every kernel."""
+        if self._sweeper:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+        async with self._lock:
+            kernels = list(self._kernels.values())
+            self._kernels.clear()
+        for kernel in kernels:
+            await kernel.instance.close()
+
+
+# ============================================================================
+# Global manager
+# ============================================================================
+
+_session_manager: SandboxSessionManager | None = None
+
+
+async def get_sandbox_session_manager() -> SandboxSessionManager:
+    """Return the process-wide kernel manager for the running event loop."""
+    global _session_manager
+    loop = asyncio.get_running_loop()
+    if _session_manager is None or _session_manager.loop is not loop:
+        pool = await get_sandbox_pool()
+        manager = SandboxSessionManager(pool.backend, pool=pool)
+        manager.start()
+        _session_manager = manager
+    return _session_manager
+
+
+async def release_session_kernel(session_id: str) -> bool:
+    """Close a session's kernel if one exists; never creates the manager."""
+    manager = _session_manager
+    if manager is None or manager.loop is not asyncio.get_running_loop():
+        return False
+    return await manager.release(session_id)
+
+
+async def shutdown_sandbox_sessions(loop: asyncio.AbstractEventLoop | None = None) -> None:
+    """Close all session kernels at application shutdown, or only if bound to ``loop``."""
+    global _session_manager
+    if _session_manager is not None and (loop is None or _session_manager.loop is loop):
+        manager = _session_manager
+        _session_manager = None
+        await manager.close()
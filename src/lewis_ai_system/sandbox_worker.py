@@ -0,0 +1,193 @@
+"""Standalone worker loop for the local subprocess sandbox backend.
+
+The pool launches this file directly with ``python -I`` so it only depends on the
+standard library. Requests arrive as one JSON object per line on stdin and every
+request is answered with one JSON line on the original stdout. Both standard
+streams are re-pointed at ``/dev/null`` before any user code runs, so code that
+writes to the raw file descriptors cannot corrupt the protocol channel.
+
+Resource ceilings from ``SandboxSettings`` are passed on the command line and
+installed as hard rlimits at startup. Each execution may request tighter
+per-tenant limits, which are applied as soft limits and lifted afterwards.
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import contextlib
+import io
+import json
+import os
+import signal
+import sys
+import traceback
+from typing import Any, Iterator
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - non-POSIX platforms run without rlimits
+    resource = None
+
+MAX_OUTPUT_CHARS = 1_000_000
+MB = 1024 * 1024
+
+
+class CPUTimeLimitExceeded(Exception):
+    """Raised inside user code when the CPU-seconds soft limit is hit."""
+
+
+def _on_sigxcpu(signum: int, frame: Any) -> None:
+    raise CPUTimeLimitExceeded("CPU time limit exceeded")
+
+
+def _set_hard_limit(kind: int, value: int | None) -> None:
+    if value is None:
+        return
+    try:
+        resource.setrlimit(kind, (value, value))
+    except (ValueError, OSError):
+        pass
+
+
+def install_hard_limits(memory_mb: int | None, file_size_mb: int | None) -> None:
+    """Install process-wide ceilings; user code cannot raise them again."""
+    if resource is None:
+        return
+    _set_hard_limit(resource.RLIMIT_AS, memory_mb * MB if memory_mb else None)
+    _set_hard_limit(resource.RLIMIT_FSIZE, file_size_mb * MB if file_size_mb else None)
+    signal.signal(signal.SIGXCPU, _on_sigxcpu)
+    # 超出文件大小时让 write() 抛出 OSError，而不是直接杀死进程
+    signal.signal(signal.SIGXFSZ, signal.SIG_IGN)
+
+
+@contextlib.contextmanager
+def execution_limits(limits: dict[str, Any] | None) -> Iterator[None]:
+    """Apply per-execution soft limits, restoring the previous values afterwards."""
+    if resource is None or not limits:
+        yield
+        return
+
+    applied: list[tuple[int, tuple[int, int]]] = []
+
+    def lower(kind: int, value: int) -> None:
+        soft, hard = resource.getrlimit(kind)
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        resource.setrlimit(kind, (value, hard))
+        applied.append((kind, (soft, hard)))
+
+    try:
+        if limits.get("memory_mb"):
+            lower(resource.RLIMIT_AS, int(limits["memory_mb"]) * MB)
+        if limits.get("file_size_mb"):
+            lower(resource.RLIMIT_FSIZE, int(limits["file_size_mb"]) * MB)
+        if limits.get("cpu_seconds"):
+            # RLIMIT_CPU 是进程累计值，需要在已用 CPU 时间的基础上加上本次额度
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            used = int(usage.ru_utime + usage.ru_stime) + 1
+            lower(resource.RLIMIT_CPU, used + int(limits["cpu_seconds"]))
+        yield
+    finally:
+        for kind, previous in reversed(applied):
+            try:
+                resource.setrlimit(kind, previous)
+            except (ValueError, OSError):
+                pass
+
+
+def _truncate(text: str) -> str:
+    if len(text) <= MAX_OUTPUT_CHARS:
+        return text
+    return text[:MAX_OUTPUT_CHARS] + "\n...[output truncated]"
+
+
+def _execute(code: str, namespace: dict[str, Any], limits: dict[str, Any] | None = None) -> dict[str, Any]:
+    """Run ``code`` like a notebook cell: the trailing expression becomes the result."""
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    result: str | None = None
+    error: str | None = None
+
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            tree = ast.parse(code, mode="exec")
+            last_expr = None
+            if tree.body and isinstance(tree.body[-1], ast.Expr):
+                last_expr = ast.Expression(tree.body.pop().value)
+            with execution_limits(limits):
+                exec(compile(tree, "<sandbox>", "exec"), namespace)
+                if last_expr is not None:
+                    value = eval(compile(last_expr, "<sandbox>", "eval"), namespace)
+                    if value is not None:
+                        result = repr(value)
+        except BaseException as exc:  # user code may raise SystemExit etc.
+            error = type(exc).__name__
+            traceback.print_exc()
+
+    return {
+        "stdout": _truncate(stdout.getvalue()),
+        "stderr": _truncate(stderr.getvalue()),
+        "result": result,
+        "results": [result] if result is not None else [],
+        "error": error,
+    }
+
+
+def _memory_stats() -> dict[str, Any]:
+    """Current resident set size, used by the parent to enforce kernel memory caps."""
+    rss_mb: float | None = None
+    try:
+        with open("/proc/self/statm", encoding="ascii") as fh:
+            pages = int(fh.read().split()[1])
+        rss_mb = pages * os.sysconf("SC_PAGE_SIZE") / MB
+    except (OSError, ValueError, IndexError):
+        if resource is not None:
+            # ru_maxrss 为峰值（Linux 下单位 KB），作为近似值
+            rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"rss_mb": rss_mb}
+
+
+def _fresh_namespace() -> dict[str, Any]:
+    return {"__name__": "__main__", "__builtins__": __builtins__}
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Lewis local sandbox worker")
+    parser.add_argument("--max-memory-mb", type=int, default=None)
+    parser.add_argument("--max-file-size-mb", type=int, default=None)
+    args = parser.parse_args(argv)
+    install_hard_limits(args.max_memory_mb, args.max_file_size_mb)
+
+    requests = os.fdopen(os.dup(0), "r", encoding="utf-8")
+    channel = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    sys.stdin = io.StringIO("")
+
+    namespace = _fresh_namespace()
+    for line in requests:
+        line = line.strip()
+        if not line:
+            continue
+        request = json.loads(line)
+        op = request.get("op", "execute")
+        if op == "ping":
+            response: dict[str, Any] = {"ok": True, "pid": os.getpid()}
+        elif op == "stats":
+            response = _memory_stats()
+        elif op == "execute":
+            # reset 调用在一次性命名空间里执行，不会污染（也看不到）非 reset 调用累积的状态。
+            # 这只隔离全局变量：sys.modules、builtins 等进程级状态仍会保留，
+            # 所以池在每次无状态调用后都会回收 worker，不会把它交给下一个租户
+            scope = _fresh_namespace() if request.get("reset", True) else namespace
+            response = _execute(request.get("code", ""), scope, request.get("limits"))
+        else:
+            response = {"error": f"unknown op {op!r}"}
+        channel.write(json.dumps(response, default=str) + "\n")
+        channel.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""任务进度通道：worker 把结构化进度事件写入 Redis Stream，客户端订阅。
+
+每个任务一个 stream（``task:progress:<job_id>``），事件字段为 ``stage``、
+``progress``（0-1）、``message``、``detail``（JSON）和 ``ts``。阶段依次为
+submitted → started → provider_queued → rendering → uploading →
+completed/failed。
+
+选择 Stream 而不是 pub/sub：订阅前发生的事件不会丢失，SSE 客户端断线后可以
+用 ``Last-Event-ID`` 从上次的位置继续；最新状态用 ``XREVRANGE ... COUNT 1``
+一次读出，不需要阻塞等待任务结果。
+
+提供商代码不需要拿到 Redis 或任务 ID：worker 用 :func:`bind_progress` 绑定
+当前任务后，任何位置都可以调用 :func:`report_progress`，未绑定时是空操作。
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Iterator
+
+from .config import settings
+from .instrumentation import get_logger
+
+logger = get_logger()
+
+PROGRESS_KEY_PREFIX = "task:progress:"
+_STREAM_MAXLEN = 100
+
+
+class TaskStage:
+    SUBMITTED = "submitted"
+    STARTED = "started"
+    PROVIDER_QUEUED = "provider_queued"
+    RENDERING = "rendering"
+    UPLOADING = "uploading"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+TERMINAL_STAGES = frozenset({TaskStage.COMPLETED, TaskStage.FAILED})
+
+# 未给出进度时按阶段取默认的整体进度
+_STAGE_PROGRESS = {
+    TaskStage.SUBMITTED: 0.0,
+    TaskStage.STARTED: 0.05,
+    TaskStage.PROVIDER_QUEUED: 0.1,
+    TaskStage.RENDERING: 0.1,
+    TaskStage.UPLOADING: 0.9,
+    TaskStage.COMPLETED: 1.0,
+    TaskStage.FAILED: 1.0,
+}
+
+_current_task: ContextVar[tuple[Any, str] | None] = ContextVar("current_task_progress", default=None)
+
+
+def progress_key(job_id: str) -> str:
+    return PROGRESS_KEY_PREFIX + job_id
+
+
+def _text(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def add_progress(
+    pipe: Any,
+    job_id: str,
+    stage: str,
+    progress: float | None = None,
+    message: str | None = None,
+    **detail: Any,
+) -> None:
+    """Queue one progress event on a Redis pipeline (``XADD`` + ``EXPIRE``)."""
+    if progress is None:
+        progress = _STAGE_PROGRESS.get(stage, 0.0)
+    fields = {
+        "stage": stage,
+        "progress": f"{min(max(progress, 0.0), 1.0):.4f}",
+        "ts": f"{time.time():.3f}",
+    }
+    if message:
+        fields["message"] = message
+    if detail:
+        fields["detail"] = json.dumps(detail, default=str)
+    key = progress_key(job_id)
+    pipe.xadd(key, fields, maxlen=_STREAM_MAXLEN, approximate=True)
+    pipe.expire(key, settings.task_queue_job_expires_seconds)
+
+
+async def publish_progress(
+    redis: Any,
+    job_id: str,
+    stage: str,
+    progress: float | None = None,
+    message: str | None = None,
+    **detail: Any,
+) -> None:
+    """Append a progress event for ``job_id``; failures are logged, never raised."""
+    try:
+        pipe = redis.pipeline(transaction=False)
+        add_progress(pipe, job_id, stage, progress, message, **detail)
+        await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to publish progress for {job_id}: {e}")
+
+
+@contextmanager
+def bind_progress(redis: Any, job_id: str | None) -> Iterator[None]:
+    """Make :func:`report_progress` publish for ``job_id`` inside this block.
+
+    Binds nothing when ``redis`` or ``job_id`` is missing (e.g. direct calls).
+    """
+    token = _current_task.set((redis, job_id) if redis is not None and job_id else None)
+    try:
+        yield
+    finally:
+        _current_task.reset(token)
+
+
+async def report_progress(
+    stage: str,
+    progress: float | None = None,
+    message: str | None = None,
+    **detail: Any,
+) -> None:
+    """Publish progress for the task bound by :func:`bind_progress`, if any."""
+    bound = _current_task.get()
+    if bound is not None:
+        await publish_progress(bound[0], bound[1], stage, progress, message, **detail)
+
+
+def rendering_progress(fraction: float) -> float:
+    """Map a provider's 0-1 rendering fraction onto the overall 0.1-0.9 rendering span."""
+    return 0.1 + 0.8 * min(max(fraction, 0.0), 1.0)
+
+
+def parse_event(entry_id: Any, fields: dict[Any, Any]) -> dict[str, Any]:
+    data = {_text(k): _text(v) for k, v in fields.items()}
+    return {
+        "id": _text(entry_id),
+        "stage": data.get("stage"),
+        "progress": float(data.get("progress", 0.0)),
+        "message": data.get("message"),
+        "detail": json.loads(data["detail"]) if "detail" in data else {},
+        "ts": float(data.get("ts", 0.0)),
+    }
+
+
+async def latest_progress(redis: Any, job_id: str) -> dict[str, Any] | None:
+    entries = await redis.xrevrange(progress_key(job_id), count=1)
+    return parse_event(*entries[0]) if entries else None
+
+
+async def follow_progress(
+    redis: Any,
+    job_id: str,
+    last_id: str = "0-0",
+    block_ms: int = 15_000,
+) -> AsyncIterator[dict[str, Any] | None]:
+    """Yield events after ``last_id`` until a terminal stage.
+
+    Yields ``None`` whenever ``block_ms`` passes without events, so callers
+    can send keep-alives.
+    """
+    key = progress_key(job_id)
+    while True:
+        response = await redis.xread({key: last_id}, count=_STREAM_MAXLEN, block=block_ms)
+        streams = response.items() if isinstance(response, dict) else response or []
+        entries = [entry for _, stream_entries in streams for entry in stream_entries]
+        if not entries:
+            yield None
+            continue
+        for entry_id, fields in entries:
+            event = parse_event(entry_id, fields)
+            last_id = event["id"]
+            yield event
+            if event["stage"] in TERMINAL_STAGES:
+                return
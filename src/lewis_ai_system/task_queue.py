@@ -1,24 +1,91 @@
 """
 异步任务队列封装 - 使用 ARQ (Async Redis Queue)
 处理视频生成等耗时任务，避免阻塞 API 进程。
+
+任务按用途进入命名队列（``interactive``/``preview``/``final``/``batch``，见
+``TASK_QUEUE_WEIGHTS``）。:func:`run_weighted_workers` 为每个队列启动一个
+ARQ worker，并发数按队列权重分配 ``TASK_QUEUE_MAX_JOBS``。
+
+队列内部按租户加权公平调度（start-time fair queuing）：入队时 Lua 脚本为任务
+计算虚拟开始时间 ``max(V, 租户上一个任务的结束标签)``，租户结束标签再前进
+``1000 / 租户权重``。虚拟时间远小于真实毫秒时间戳，作为 ARQ 的 score 时任务
+立即可执行且按标签顺序出队，所以一个租户一次提交 50 个项目也只会与其他租户
+交替执行，而不会独占队列。
+
+任务 ID 即幂等键：默认由租户、函数与参数（项目/分镜/提示词）的指纹得出，
+也可以由客户端提供 ``idempotency_key``。重复提交时若同 ID 的任务仍在排队、
+正在执行或已成功完成（结果保留 ``keep_result`` 秒），直接返回原任务 ID，
+不会重复渲染；失败的结果会被清除以便重新提交。
+
+创作项目的各阶段（含逐镜头渲染）同样作为任务执行，见
+:mod:`lewis_ai_system.creative.jobs`。
+
+任务进度见 :mod:`lewis_ai_system.task_progress`：入队时写入 ``submitted``，
+worker 依次上报各阶段，:meth:`TaskQueue.get_task_status` 一次往返读出最新
+状态而不等待任务结果。
 """
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import json
+import pickle
+import time
+from datetime import datetime, timezone
 from typing import Any
 
 from arq import create_pool
 from arq.connections import RedisSettings, ArqRedis
+from arq.constants import job_key_prefix, result_key_prefix
+from arq.jobs import DeserializationError, deserialize_result
 
+from .codec import build_codec
 from .config import settings
 from .instrumentation import get_logger
+from .task_progress import (
+    TERMINAL_STAGES,
+    TaskStage,
+    add_progress,
+    bind_progress,
+    parse_event,
+    progress_key,
+    report_progress,
+)
 
 logger = get_logger()
 
 
+# ==================== 任务载荷编码 ====================
+# 任务参数（完整分镜）与结果不再 pickle：使用带版本字节的 JSON/msgpack 编码，
+# 升级前入队的 pickle 任务仍可读取
+job_codec = build_codec(legacy_dumps=pickle.dumps, legacy_loads=pickle.loads)
+
+
+class TaskExecutionError(RuntimeError):
+    """Failure raised by a worker, rebuilt from its encoded job result."""
+
+
+def serialize_job_payload(data: dict[str, Any]) -> bytes:
+    """ARQ ``job_serializer``: encode job definitions and results with :data:`job_codec`."""
+    result = data.get("r")
+    if isinstance(result, BaseException) and job_codec.format != "legacy":
+        data = {**data, "r": {"error_type": type(result).__name__, "error": str(result)}}
+    return job_codec.dumps(data)
+
+
+def deserialize_job_payload(payload: bytes) -> dict[str, Any]:
+    """ARQ ``job_deserializer``: inverse of :func:`serialize_job_payload`."""
+    data = job_codec.loads(payload)
+    result = data.get("r")
+    if data.get("s") is False and isinstance(result, dict) and "error_type" in result:
+        data["r"] = TaskExecutionError(f"{result['error_type']}: {result['error']}")
+    return data
+
+
 # ==================== Worker 配置 ====================
 class WorkerSettings:
-    """ARQ Worker 配置"""
+    """ARQ Worker 配置（消费未命名的默认队列，用于排空升级前入队的任务）"""
 
     redis_settings = RedisSettings(
         host=settings.redis_url.split("://")[-1].split(":")[0] if settings.redis_url else "localhost",
@@ -32,6 +99,114 @@ class WorkerSettings:
     max_jobs = 10
     job_timeout = 3600  # 1h
     keep_result = 3600  # 1h
+    max_tries = 5  # ARQ 默认值；被取消（如 worker 重启）的任务最多重跑到该次数
+
+
+# ==================== 命名队列与租户公平调度 ====================
+QUEUE_PREFIX = "arq:queue:"
+DEFAULT_TENANT = "default"
+# 公平调度标签低于该值（约 2001 年的毫秒时间戳）；重试等按真实时间入队的任务排在其后
+_FAIR_SCORE_CEILING = 10**12
+_FAIR_UNIT_MS = 1000
+_WAIT_SAMPLES = 1000
+
+# KEYS[1] = 队列 zset, KEYS[2] = 公平调度状态 hash; ARGV = 租户字段, 权重, 单位, 上限
+# 预留一个虚拟时间片并返回 {开始时间, 写入的完成标签, 原标签, 写入的 vclock, 原 vclock}
+# （毫秒，字符串以保留小数；未写入/原先不存在为空串），入队失败时交给 FAIR_RELEASE_SCRIPT 撤销
+FAIR_ENQUEUE_SCRIPT = """
+local head = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[4], 'WITHSCORES', 'LIMIT', 0, 1)
+local previous_vclock = redis.call('HGET', KEYS[2], 'vclock') or ''
+local vclock = tonumber(previous_vclock) or 0
+local virtual = vclock
+if head[2] then virtual = tonumber(head[2]) end
+local previous_tag = redis.call('HGET', KEYS[2], ARGV[1]) or ''
+local start = math.max(virtual, tonumber(previous_tag) or 0)
+local finish = string.format('%.3f', start + tonumber(ARGV[3]) / tonumber(ARGV[2]))
+redis.call('HSET', KEYS[2], ARGV[1], finish)
+local written_vclock = ''
+if start > vclock then
+  written_vclock = string.format('%.3f', start)
+  redis.call('HSET', KEYS[2], 'vclock', written_vclock)
+end
+return {string.format('%.3f', start), finish, previous_tag, written_vclock, previous_vclock}
+"""
+
+# KEYS[1] = 公平调度状态 hash; ARGV = 租户字段, 写入的标签, 原标签, 写入的 vclock, 原 vclock
+# 只在值仍是本次写入的情况下恢复，之后其他提交推进过的标签保持不变
+FAIR_RELEASE_SCRIPT = """
+local function restore(field, written, previous)
+  if written ~= '' and redis.call('HGET', KEYS[1], field) == written then
+    if previous == '' then
+      redis.call('HDEL', KEYS[1], field)
+    else
+      redis.call('HSET', KEYS[1], field, previous)
+    end
+  end
+end
+restore(ARGV[1], ARGV[2], ARGV[3])
+restore('vclock', ARGV[4], ARGV[5])
+return 1
+"""
+
+
+def queue_key(queue: str) -> str:
+    """Redis key of a named queue, e.g. ``arq:queue:preview``."""
+    if queue not in settings.task_queue_weights:
+        raise ValueError(f"Unknown task queue: {queue}")
+    return QUEUE_PREFIX + queue
+
+
+def tenant_weight(tenant_id: str) -> float:
+    return float(settings.task_queue_tenant_weights.get(tenant_id, 1.0))
+
+
+def queue_max_jobs(queue: str) -> int:
+    """Worker concurrency for ``queue``: its weighted share of ``TASK_QUEUE_MAX_JOBS``."""
+    weights = settings.task_queue_weights
+    share = weights[queue] / sum(weights.values())
+    return max(1, round(settings.task_queue_max_jobs * share))
+
+
+def job_fingerprint(
+    function: str,
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+    *,
+    tenant: str,
+    idempotency_key: str | None = None,
+) -> str:
+    """ARQ job ID for a submission: client key if given, else a hash of the call."""
+    material: list[Any] = [tenant, function]
+    material += [idempotency_key] if idempotency_key else [list(args), kwargs]
+    encoded = json.dumps(material, sort_keys=True, default=str, separators=(",", ":"))
+    return f"{function}:{hashlib.sha256(encoded.encode()).hexdigest()[:32]}"
+
+
+def _percentile(ordered: list[int], fraction: float) -> int:
+    if not ordered:
+        return 0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _job_start_hook(queue: str):
+    """on_job_start：记录排队等待时间，并把任务从租户积压计数中移除。"""
+    key = queue_key(queue)
+
+    async def on_job_start(ctx: dict[str, Any]) -> None:
+        if ctx.get("job_try", 1) > 1:
+            return
+        redis = ctx["redis"]
+        wait_ms = max(0, int(time.time() * 1000 - ctx["enqueue_time"].timestamp() * 1000))
+        tenant = await redis.hget(f"{key}:tenants", ctx["job_id"])
+        pipe = redis.pipeline(transaction=False)
+        pipe.lpush(f"{key}:wait_ms", wait_ms)
+        pipe.ltrim(f"{key}:wait_ms", 0, _WAIT_SAMPLES - 1)
+        if tenant is not None:
+            pipe.hdel(f"{key}:tenants", ctx["job_id"])
+            pipe.hincrby(f"{key}:pending", tenant, -1)
+        await pipe.execute()
+
+    return on_job_start
 
 
 # ==================== 任务状态枚举 ====================
@@ -49,10 +224,18 @@ class TaskQueue:
 
     def __init__(self):
         self.pool: ArqRedis | None = None
+        self._fair_script: Any = None
+        self._fair_release_script: Any = None
 
     async def connect(self):
         if not self.pool:
-            self.pool = await create_pool(WorkerSettings.redis_settings)
+            self.pool = await create_pool(
+                WorkerSettings.redis_settings,
+                job_serializer=serialize_job_payload,
+                job_deserializer=deserialize_job_payload,
+            )
+            self._fair_script = self.pool.register_script(FAIR_ENQUEUE_SCRIPT)
+            self._fair_release_script = self.pool.register_script(FAIR_RELEASE_SCRIPT)
             logger.info("Task queue connected to Redis")
 
     async def disconnect(self):
@@ -61,62 +244,218 @@ class TaskQueue:
             self.pool = None
             logger.info("Task queue disconnected")
 
+    async def enqueue(
+        self,
+        function: str,
+        *args: Any,
+        queue: str,
+        tenant_id: str | None = None,
+        idempotency_key: str | None = None,
+        **kwargs: Any,
+    ) -> str:
+        """Enqueue ``function`` on a named queue, ordered fairly among tenants.
+
+        Returns the existing job ID instead of enqueuing again when the same
+        submission is already queued, running or has completed successfully.
+        """
+        if not self.pool:
+            await self.connect()
+
+        key = queue_key(queue)
+        tenant = tenant_id or DEFAULT_TENANT
+        job_id = job_fingerprint(function, args, kwargs, tenant=tenant, idempotency_key=idempotency_key)
+        if await self._reuse_existing(job_id):
+            logger.info(f"Duplicate submission of {job_id} suppressed")
+            return job_id
+
+        field = f"tenant:{tenant}"
+        start, *reservation = await self._fair_script(
+            keys=[key, f"{key}:fair"],
+            args=[field, tenant_weight(tenant), _FAIR_UNIT_MS, _FAIR_SCORE_CEILING],
+        )
+        try:
+            job = await self.pool.enqueue_job(
+                function,
+                *args,
+                _job_id=job_id,
+                _queue_name=key,
+                # score 取虚拟开始时间，必须显式给出过期时间（ARQ 默认按 score 推算）
+                _defer_until=datetime.fromtimestamp(float(start) / 1000, tz=timezone.utc),
+                _expires=settings.task_queue_job_expires_seconds,
+                **kwargs,
+            )
+        except Exception:
+            await self._release_fair_share(key, field, reservation)
+            raise
+        if job is None:
+            # 并发的重复提交被 ARQ 入队事务拦下；没有入队就不占用租户的时间片
+            await self._release_fair_share(key, field, reservation)
+            logger.info(f"Duplicate submission of {job_id} suppressed")
+            return job_id
+
+        pipe = self.pool.pipeline(transaction=False)
+        pipe.hincrby(f"{key}:pending", tenant, 1)
+        pipe.hset(f"{key}:tenants", job_id, tenant)
+        add_progress(pipe, job_id, TaskStage.SUBMITTED, queue=queue)
+        await pipe.execute()
+        return job_id
+
+    async def _release_fair_share(self, key: str, field: str, reservation: list[Any]) -> None:
+        """Undo a fair-scheduling reservation whose job was not enqueued."""
+        try:
+            await self._fair_release_script(keys=[f"{key}:fair"], args=[field, *reservation])
+        except Exception as e:
+            logger.warning(f"Failed to release fair-scheduling slot of {field} on {key}: {e}")
+
+    async def _reuse_existing(self, job_id: str) -> bool:
+        """True if ``job_id`` is queued, running or succeeded; clears a failed result."""
+        pipe = self.pool.pipeline(transaction=False)
+        pipe.exists(job_key_prefix + job_id)
+        pipe.get(result_key_prefix + job_id)
+        queued, result = await pipe.execute()
+        if queued:
+            return True
+        if result is None:
+            return False
+        try:
+            if deserialize_result(result, deserializer=deserialize_job_payload).success:
+                return True
+        except DeserializationError:
+            logger.warning(f"Discarding unreadable result of {job_id}")
+        await self.pool.delete(result_key_prefix + job_id)
+        return False
+
     async def enqueue_video_generation(
         self,
         project_id: str,
         script: str,
         storyboard: list[dict[str, Any]],
+        *,
+        tenant_id: str | None = None,
+        quality: str = "preview",
+        queue: str | None = None,
+        idempotency_key: str | None = None,
         **kwargs,
     ) -> str:
-        """提交 Creative 项目视频生成任务"""
-        if not self.pool:
-            await self.connect()
+        """提交 Creative 项目视频生成任务（默认按画质进入 preview/final 队列）
 
-        job = await self.pool.enqueue_job(
+        相同项目、脚本与分镜的重复提交复用同一个任务。
+        """
+        queue = queue or ("final" if quality == "final" else "preview")
+        job_id = await self.enqueue(
             "generate_video_task",
             project_id,
             script,
             storyboard,
+            queue=queue,
+            tenant_id=tenant_id,
+            idempotency_key=idempotency_key,
+            quality=quality,
             **kwargs,
         )
 
-        logger.info(f"Enqueued video generation task: {job.job_id} for project {project_id}")
-        return job.job_id
+        logger.info(f"Enqueued video generation task: {job_id} for project {project_id} on {queue}")
+        return job_id
+
+    async def enqueue_generic_video(
+        self,
+        payload: dict[str, Any],
+        *,
+        tenant_id: str | None = None,
+        queue: str = "interactive",
+        idempotency_key: str | None = None,
+    ) -> str:
+        """提交通用视频生成任务（工具调用）；相同参数的重复提交复用同一个任务"""
+        return await self.enqueue(
+            "generate_video_task",
+            None,
+            None,
+            None,
+            payload,
+            queue=queue,
+            tenant_id=tenant_id,
+            idempotency_key=idempotency_key,
+        )
 
-    async def enqueue_generic_video(self, payload: dict[str, Any]) -> str:
-        """提交通用视频生成任务（工具调用）"""
+    async def queue_metrics(self) -> dict[str, Any]:
+        """Per-queue depth, per-tenant backlog and recent wait times, in one round trip."""
         if not self.pool:
             await self.connect()
-        job = await self.pool.enqueue_job("generate_video_task", None, None, None, payload)
-        return job.job_id
+
+        queues = list(settings.task_queue_weights)
+        pipe = self.pool.pipeline(transaction=False)
+        for queue in queues:
+            key = queue_key(queue)
+            pipe.zcard(key)
+            pipe.hgetall(f"{key}:pending")
+            pipe.lrange(f"{key}:wait_ms", 0, -1)
+        raw = await pipe.execute()
+
+        metrics: dict[str, Any] = {}
+        for i, queue in enumerate(queues):
+            depth, pending, waits = raw[3 * i : 3 * i + 3]
+            ordered = sorted(int(wait) for wait in waits)
+            tenants = {
+                (tenant.decode() if isinstance(tenant, bytes) else tenant): int(count)
+                for tenant, count in pending.items()
+                if int(count) > 0
+            }
+            metrics[queue] = {
+                "weight": settings.task_queue_weights[queue],
+                "max_jobs": queue_max_jobs(queue),
+                "depth": int(depth),
+                "tenants": tenants,
+                "wait_ms": {
+                    "samples": len(ordered),
+                    "p50": _percentile(ordered, 0.5),
+                    "p95": _percentile(ordered, 0.95),
+                    "max": ordered[-1] if ordered else 0,
+                },
+            }
+        return {"queues": metrics}
 
     async def get_task_status(self, task_id: str) -> dict[str, Any]:
+        """Current status from the latest progress event and stored result, without blocking."""
         if not self.pool:
             await self.connect()
 
-        job = await self.pool.get_job(task_id)
-
-        if not job:
-            return {"status": TaskStatus.CANCELLED, "progress": 0.0, "error": "Task not found"}
-
-        job_result = await job.result()
-        job_info = await job.info()
-
-        status = TaskStatus.PENDING
-        if job_info.job_try and job_info.job_try > 0:
-            status = TaskStatus.RUNNING
-        if job_result is not None:
-            status = TaskStatus.COMPLETED
-        if job_info.job_try and job_info.job_try >= 3:
-            status = TaskStatus.FAILED
-
-        return {
-            "status": status,
-            "progress": job_info.job_try / 3 if job_info.job_try else 0.0,
-            "result": job_result,
+        pipe = self.pool.pipeline(transaction=False)
+        pipe.xrevrange(progress_key(task_id), count=1)
+        pipe.get(result_key_prefix + task_id)
+        pipe.exists(job_key_prefix + task_id)
+        events, raw_result, queued = await pipe.execute()
+        event = parse_event(*events[0]) if events else None
+        status = {
+            "status": TaskStatus.PENDING,
+            "stage": event["stage"] if event else None,
+            "progress": event["progress"] if event else 0.0,
+            "message": event["message"] if event else None,
+            "result": None,
             "error": None,
         }
 
+        if raw_result is not None:
+            try:
+                info = deserialize_result(raw_result, deserializer=deserialize_job_payload)
+            except DeserializationError:
+                return {**status, "status": TaskStatus.FAILED, "error": "Unreadable task result"}
+            if info.success:
+                return {**status, "status": TaskStatus.COMPLETED, "progress": 1.0, "result": info.result}
+            return {**status, "status": TaskStatus.FAILED, "error": str(info.result)}
+
+        if event is None and not queued:
+            return {**status, "status": TaskStatus.CANCELLED, "error": "Task not found"}
+        if (
+            not queued
+            and event["stage"] not in TERMINAL_STAGES
+            and time.time() - event["ts"] > WorkerSettings.keep_result
+        ):
+            # 任务和结果都已过期，只剩进度 stream；没有任务的进度通道（如批次）仍在更新时不算过期
+            return {**status, "status": TaskStatus.CANCELLED, "error": "Task expired without a result"}
+        if event is not None and event["stage"] not in {TaskStage.SUBMITTED, TaskStage.COMPLETED}:
+            status["status"] = TaskStatus.FAILED if event["stage"] == TaskStage.FAILED else TaskStatus.RUNNING
+        return status
+
 
 # ==================== Worker 任务函数 ====================
 async def generate_video_task(
@@ -135,57 +474,156 @@ async def generate_video_task(
     """
     logger.info(f"Starting video generation task (project={project_id})")
 
-    try:
-        from .providers import get_video_provider
-        from .creative.repository import creative_repository
+    with bind_progress(ctx.get("redis"), ctx.get("job_id")):
+        try:
+            result = await _generate_video(project_id, script, payload, kwargs.get("quality", "preview"))
+        except Exception as e:
+            await report_progress(TaskStage.FAILED, message=str(e))
+            await _record_video_failure(project_id, e)
+            raise
+        await report_progress(TaskStage.COMPLETED, video_url=result.get("video_url"))
+        return result
+
+
+async def _generate_video(
+    project_id: str | None,
+    script: str | None,
+    payload: dict[str, Any] | None,
+    quality: str,
+) -> dict[str, Any]:
+    from .providers import get_video_provider
+    from .creative.repository import creative_repository
+
+    await report_progress(TaskStage.STARTED)
+    video_provider = get_video_provider(settings.video_provider_default)
+
+    if project_id:
+        project = await creative_repository.get(project_id)
+        await report_progress(TaskStage.PROVIDER_QUEUED, provider=settings.video_provider_default)
+        result = await video_provider.generate_video(
+            prompt=script or project.script or "",
+            duration_seconds=project.duration_seconds,
+            aspect_ratio=getattr(project, "aspect_ratio", "16:9"),
+            quality=quality,
+        )
 
-        video_provider = get_video_provider(settings.video_provider_default)
+        await report_progress(TaskStage.UPLOADING)
+        project.video_url = result.get("video_url")
+        project.cost_usd += float(result.get("cost_usd", 0.0))
+        project.state = "rendering_complete"
+        await creative_repository.upsert(project)
 
-        if project_id:
-            project = await creative_repository.get(project_id)
-            result = await video_provider.generate_video(
-                prompt=script or project.script or "",
-                duration_seconds=project.duration_seconds,
-                aspect_ratio=getattr(project, "aspect_ratio", "16:9"),
-                quality="preview",
-            )
+        logger.info(f"Video generation completed for project {project_id}: {result.get('video_url')}")
+        return {
+            "video_url": result.get("video_url"),
+            "cost_usd": result.get("cost_usd", 0.0),
+            "duration": result.get("duration"),
+        }
 
-            project.video_url = result.get("video_url")
-            project.cost_usd += float(result.get("cost_usd", 0.0))
-            project.state = "rendering_complete"
-            await creative_repository.upsert(project)
+    if payload:
+        await report_progress(TaskStage.PROVIDER_QUEUED, provider=settings.video_provider_default)
+        return await video_provider.generate_video(
+            prompt=payload.get("prompt", ""),
+            duration_seconds=payload.get("duration_seconds", 5),
+            aspect_ratio=payload.get("aspect_ratio", "16:9"),
+            quality=payload.get("quality", quality),
+        )
 
-            logger.info(f"Video generation completed for project {project_id}: {result.get('video_url')}")
-            return {
-                "video_url": result.get("video_url"),
-                "cost_usd": result.get("cost_usd", 0.0),
-                "duration": result.get("duration"),
-            }
+    raise ValueError("generate_video_task requires project_id or payload")
 
-        if payload:
-            result = await video_provider.generate_video(
-                prompt=payload.get("prompt", ""),
-                duration_seconds=payload.get("duration_seconds", 5),
-                aspect_ratio=payload.get("aspect_ratio", "16:9"),
-                quality=payload.get("quality", "preview"),
-            )
-            return result
 
-        raise ValueError("generate_video_task requires project_id or payload")
+async def _record_video_failure(project_id: str | None, e: Exception) -> None:
+    logger.error(f"Video generation failed (project={project_id}): {e}", exc_info=True)
+    if project_id:
+        try:
+            from .creative.repository import creative_repository
 
-    except Exception as e:
-        logger.error(f"Video generation failed (project={project_id}): {e}", exc_info=True)
-        if project_id:
-            try:
-                project = await creative_repository.get(project_id)
-                project.error_message = str(e)  # type: ignore[attr-defined]
-                await creative_repository.upsert(project)
-            except Exception:
-                pass
-        raise
+            project = await creative_repository.get(project_id)
+            project.error_message = str(e)  # type: ignore[attr-defined]
+            await creative_repository.upsert(project)
+        except Exception:
+            pass
 
 
 WorkerSettings.functions = [generate_video_task]
+WorkerSettings.job_serializer = serialize_job_payload
+WorkerSettings.job_deserializer = deserialize_job_payload
+
+
+def worker_functions() -> list[Any]:
+    """Job functions served by the named-queue workers, including creative stage jobs."""
+    # creative.jobs 依赖本模块的 task_queue，延迟导入避免循环
+    from .creative.jobs import CREATIVE_JOB_FUNCTIONS
+
+    return [*WorkerSettings.functions, *CREATIVE_JOB_FUNCTIONS]
+
+
+_worker_resources: asyncio.Task | None = None
+
+
+async def _connect_worker_resources() -> None:
+    if not settings.database_url:
+        logger.info("Worker running without DATABASE_URL; creative jobs use the in-memory repository")
+        return
+    from .creative.repository import DatabaseCreativeProjectRepository
+    from .creative.workflow import use_repository
+    from .database import init_database
+
+    await init_database()
+    use_repository(DatabaseCreativeProjectRepository())
+    logger.info("Worker creative repository switched to the database backend")
+
+
+async def worker_startup(ctx: dict[str, Any]) -> None:
+    """Worker 启动钩子：连接数据库，让创意任务读写 API 创建的项目。
+
+    同一进程里每个命名队列各有一个 worker，初始化只执行一次。失败时直接抛出，
+    不让 worker 带着空的内存存储库消费任务。
+    """
+    global _worker_resources
+    if _worker_resources is None or (_worker_resources.done() and _worker_resources.exception()):
+        _worker_resources = asyncio.ensure_future(_connect_worker_resources())
+    await asyncio.shield(_worker_resources)
+
+
+def worker_settings(queue: str) -> dict[str, Any]:
+    """ARQ worker settings consuming one named queue with its weighted concurrency."""
+    return {
+        "redis_settings": WorkerSettings.redis_settings,
+        "functions": worker_functions(),
+        "queue_name": queue_key(queue),
+        "max_jobs": queue_max_jobs(queue),
+        "job_timeout": WorkerSettings.job_timeout,
+        "keep_result": WorkerSettings.keep_result,
+        "max_tries": WorkerSettings.max_tries,
+        "job_serializer": serialize_job_payload,
+        "job_deserializer": deserialize_job_payload,
+        "on_job_start": _job_start_hook(queue),
+        "on_startup": worker_startup,
+    }
+
+
+async def run_weighted_workers(**overrides: Any) -> None:
+    """在一个进程内为每个命名队列运行一个 worker，直到被取消。"""
+    from arq.worker import Worker
+
+    extra_startup = overrides.pop("on_startup", None)
+
+    async def on_startup(ctx: dict[str, Any]) -> None:
+        await worker_startup(ctx)
+        if extra_startup is not None:
+            await extra_startup(ctx)
+
+    workers = [
+        Worker(**{**worker_settings(queue), "handle_signals": False, **overrides, "on_startup": on_startup})
+        for queue in settings.task_queue_weights
+    ]
+    for worker in workers:
+        logger.info(f"Worker consuming {worker.queue_name} with max_jobs={worker.max_jobs}")
+    try:
+        await asyncio.gather(*(worker.async_run() for worker in workers))
+    finally:
+        await asyncio.gather(*(worker.close() for worker in workers), return_exceptions=True)
 
 
 # ==================== 全局队列实例 ====================
@@ -204,3 +642,7 @@ async def init_task_queue():
 async def shutdown_task_queue():
     await task_queue.disconnect()
     logger.info("Task queue shut down")
+
+
+if __name__ == "__main__":
+    asyncio.run(run_weighted_workers())
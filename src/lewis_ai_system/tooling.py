@@ -5,10 +5,13 @@
 
 from __future__ import annotations
 
+import asyncio
 import textwrap
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
 from threading import Lock
-from typing import Any, Dict
+from typing import Any, Dict, Iterator
 
 from .config import settings
 from .instrumentation import TelemetryEvent, emit_event
@@ -41,6 +44,37 @@ class ToolResult:
     metadata: dict[str, Any] | None = None
 
 
+@dataclass(slots=True)
+class ToolContext:
+    """调用工具时的上下文（租户、会话），供需要按租户计量的工具读取。
+    
+    Attributes:
+        tenant_id: 租户 ID
+        session_id: 会话 ID，可选
+    """
+    tenant_id: str = "default"
+    session_id: str | None = None
+
+
+_current_tool_context: ContextVar[ToolContext] = ContextVar("lewis_tool_context", default=ToolContext())
+
+
+def current_tool_context() -> ToolContext:
+    """返回当前协程的工具上下文。"""
+    return _current_tool_context.get()
+
+
+@contextmanager
+def tool_context(tenant_id: str, session_id: str | None = None) -> Iterator[ToolContext]:
+    """在作用域内设置工具上下文。"""
+    context = ToolContext(tenant_id=tenant_id, session_id=session_id)
+    token = _current_tool_context.set(context)
+    try:
+        yield context
+    finally:
+        _current_tool_context.reset(token)
+
+
 class ToolExecutionError(RuntimeError):
     """工具执行错误异常。
     
@@ -48,6 +82,15 @@ class ToolExecutionError(RuntimeError):
     """
 
 
+def _has_running_loop() -> bool:
+    """同步 ``run`` 只能在没有事件循环的线程里用 ``asyncio.run`` 驱动异步实现。"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
 class Tool:
     """工具基类。
     
@@ -89,10 +132,10 @@ class Tool:
 
 
 class PythonSandboxTool(Tool):
-    """Execute Python securely via the E2B sandbox."""
+    """Execute Python securely via the E2B sandbox or the local worker pool."""
 
     name = "python_sandbox"
-    description = "Execute Python code in the E2B sandbox with isolation."
+    description = "Execute Python code in an isolated sandbox."
 
     def __init__(self) -> None:
         self._sandbox: EnhancedSandbox | None = None
@@ -117,29 +160,71 @@ class PythonSandboxTool(Tool):
             self._sandbox = EnhancedSandbox(api_key=settings.e2b_api_key)
         return self._sandbox
 
-    def run(self, payload: dict[str, Any]) -> ToolResult:
+    @staticmethod
+    def _prepare_code(payload: dict[str, Any]) -> str:
         code = payload.get("code")
         if not isinstance(code, str):
             raise ToolExecutionError("python_sandbox requires 'code' string input")
+        return textwrap.dedent(code).strip()
 
-        code = textwrap.dedent(code).strip()
+    @staticmethod
+    def _to_result(execution: dict[str, Any]) -> ToolResult:
+        if execution.get("error"):
+            raise ToolExecutionError(f"Sandbox execution failed: {execution['error']}")
+        return ToolResult(output=execution, cost_usd=0.01)
+
+    def run(self, payload: dict[str, Any]) -> ToolResult:
+        if self._sandbox is None and not settings.e2b_api_key:
+            # 未配置 E2B 时使用本地进程池（仅限非异步上下文）
+            if _has_running_loop():
+                raise ToolExecutionError("Use run_async in async context")
+            return asyncio.run(self._run_on_temporary_loop(payload))
+
+        code = self._prepare_code(payload)
 
         try:
             execution = self._get_sandbox().execute_python(code)
         except Exception as exc:  # pragma: no cover - defensive
             raise ToolExecutionError(f"Sandbox execution failed: {exc}") from exc
 
-        if execution.get("error"):
-            raise ToolExecutionError(f"Sandbox execution failed: {execution['error']}")
+        return self._to_result(execution)
 
-        return ToolResult(output=execution, cost_usd=0.01)
+    async def _run_on_temporary_loop(self, payload: dict[str, Any]) -> ToolResult:
+        """``asyncio.run`` 的事件循环结束后在其上创建的池和内核都不能再用，执行完立即关闭。"""
+        from .sandbox_pool import shutdown_sandbox_pool
+        from .sandbox_sessions import shutdown_sandbox_sessions
+
+        try:
+            return await self.run_async(payload)
+        finally:
+            loop = asyncio.get_running_loop()
+            await shutdown_sandbox_sessions(loop)
+            await shutdown_sandbox_pool(loop)
 
     async def run_async(self, payload: dict[str, Any]) -> ToolResult:
-        """异步执行 Python 代码（实际执行是同步的，但不会阻塞事件循环检查）。"""
-        import asyncio
-        # 在线程池中运行同步代码，避免阻塞事件循环
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.run, payload)
+        """异步执行 Python 代码，从预热沙箱池中租用实例，避免每次调用冷启动。"""
+        if self._sandbox is not None:
+            # 显式注入的沙箱（测试或旧代码）仍走同步路径，放到线程池中避免阻塞事件循环
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.run, payload)
+
+        from .sandbox_pool import SandboxPoolError, get_sandbox_pool
+        from .sandbox_sessions import get_sandbox_session_manager
+
+        code = self._prepare_code(payload)
+        context = current_tool_context()
+        try:
+            if context.session_id:
+                # 绑定到会话的内核会保留解释器状态，后续调用可复用导入和已加载的数据
+                manager = await get_sandbox_session_manager()
+                execution = await manager.execute(context.session_id, code, tenant_id=context.tenant_id)
+            else:
+                pool = await get_sandbox_pool()
+                execution = await pool.execute(code, tenant_id=context.tenant_id)
+        except SandboxPoolError as exc:
+            raise ToolExecutionError(f"Sandbox execution failed: {exc}") from exc
+
+        return self._to_result(execution)
 
 
 class WebSearchTool(Tool):
@@ -176,13 +261,9 @@ class WebSearchTool(Tool):
 
     def run(self, payload: dict[str, Any]) -> ToolResult:
         """同步执行（仅用于非异步上下文）。"""
-        import asyncio
-        try:
-            # 尝试在新事件循环中运行
-            return asyncio.run(self.run_async(payload))
-        except RuntimeError:
-            # 如果已有循环在运行，返回错误
+        if _has_running_loop():
             return ToolResult(output={"error": "Use run_async in async context"}, cost_usd=0.0)
+        return asyncio.run(self.run_async(payload))
 
     async def run_async(self, payload: dict[str, Any]) -> ToolResult:
         """异步执行网页搜索。"""
@@ -232,11 +313,9 @@ class WebScrapeTool(Tool):
         
     def run(self, payload: dict[str, Any]) -> ToolResult:
         """同步执行（仅用于非异步上下文）。"""
-        import asyncio
-        try:
-            return asyncio.run(self.run_async(payload))
-        except RuntimeError:
+        if _has_running_loop():
             return ToolResult(output={"error": "Use run_async in async context"}, cost_usd=0.0)
+        return asyncio.run(self.run_async(payload))
 
     async def run_async(self, payload: dict[str, Any]) -> ToolResult:
         """异步执行网页抓取。"""
@@ -295,11 +374,9 @@ class VideoGenerationTool(Tool):
 
     def run(self, payload: dict[str, Any]) -> ToolResult:
         """同步执行（仅用于非异步上下文）。"""
-        import asyncio
-        try:
-            return asyncio.run(self.run_async(payload))
-        except RuntimeError:
+        if _has_running_loop():
             return ToolResult(output={"error": "Use run_async in async context"}, cost_usd=0.0)
+        return asyncio.run(self.run_async(payload))
 
     async def run_async(self, payload: dict[str, Any]) -> ToolResult:
         """异步执行视频生成任务入队。"""
@@ -321,7 +398,9 @@ class VideoGenerationTool(Tool):
                     "duration_seconds": duration,
                     "aspect_ratio": aspect_ratio,
                     "quality": quality,
-                }
+                },
+                tenant_id=payload.get("tenant_id"),
+                idempotency_key=payload.get("idempotency_key"),
             )
             return ToolResult(output={"task_id": job_id, "status": "pending"})
         except Exception as e:
@@ -360,11 +439,9 @@ class TTSTool(Tool):
 
     def run(self, payload: dict[str, Any]) -> ToolResult:
         """同步执行（仅用于非异步上下文）。"""
-        import asyncio
-        try:
-            return asyncio.run(self.run_async(payload))
-        except RuntimeError:
+        if _has_running_loop():
             return ToolResult(output={"error": "Use run_async in async context"}, cost_usd=0.0)
+        return asyncio.run(self.run_async(payload))
 
     async def run_async(self, payload: dict[str, Any]) -> ToolResult:
         """异步执行文本转语音。"""
@@ -2,15 +2,32 @@
 
 from __future__ import annotations
 
+import asyncio
 import hashlib
+import heapq
+import json
+import re
+import time
+from collections import defaultdict
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Any, Protocol
+from typing import Any, Callable, Protocol
 
 import httpx
+import numpy as np
 
 from .config import settings
+from .embeddings import get_embedding_service
 from .instrumentation import get_logger
+from .vector_index import (
+    IVFTrainingResult,
+    QuantizationResult,
+    ScalarQuantizer,
+    VectorIndex,
+    build_vector_index,
+    build_vector_quantizer,
+    record_index_maintenance,
+)
 
 logger = get_logger()
 
@@ -57,44 +74,140 @@ class VectorDBProvider(Protocol):
         ...
 
 
+_WEAVIATE_CLASS_RE = re.compile(r"^[A-Z][_0-9A-Za-z]*$")
+
+MEMORY_COLLECTION = "ConversationMemory"
+
+# Weaviate 不能按 object 类型属性的内部字段过滤，这些元数据键另存为顶层 text 属性
+WEAVIATE_FILTER_PROPERTIES = ("tenant_id", "user_id", "session_id")
+
+
+class GraphQLEnum(str):
+    """A GraphQL enum value (e.g. a filter operator); emitted without quotes."""
+
+
+def _graphql_value(value: Any) -> str:
+    """Encode a Python value as a GraphQL input literal.
+
+    Strings are JSON-escaped, so no user-controlled text can break out of the
+    argument; dict keys must be plain GraphQL names.
+    """
+    if isinstance(value, GraphQLEnum):
+        return str(value)
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if value is None:
+        return "null"
+    if isinstance(value, (int, float)):
+        return repr(float(value)) if isinstance(value, float) else str(value)
+    if isinstance(value, str):
+        return json.dumps(value)
+    if isinstance(value, dict):
+        fields = []
+        for key, item in value.items():
+            if not re.fullmatch(r"[_A-Za-z][_0-9A-Za-z]*", key):
+                raise ValueError(f"Invalid GraphQL argument name: {key!r}")
+            fields.append(f"{key}: {_graphql_value(item)}")
+        return "{" + ", ".join(fields) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(_graphql_value(item) for item in value) + "]"
+    raise TypeError(f"Cannot encode {type(value).__name__} as GraphQL")
+
+
 class WeaviateProvider:
-    """Weaviate vector database integration."""
+    """Weaviate vector database integration.
+
+    One pooled ``httpx.AsyncClient`` serves all calls. Inserts are split into
+    batches of ``insert_batch_size`` objects sent ``insert_concurrency`` at a
+    time; deletes and expiry cleanup use ``DELETE /v1/batch/objects`` with a
+    ``where`` filter, repeated until the server reports no more matches.
+
+    Metadata keys in :data:`WEAVIATE_FILTER_PROPERTIES` are also written as
+    top-level text properties; search filters may only use those keys.
+    """
     
-    def __init__(self, url: str, api_key: str | None = None):
+    def __init__(
+        self,
+        url: str,
+        api_key: str | None = None,
+        *,
+        insert_batch_size: int = 200,
+        insert_concurrency: int = 4,
+        delete_batch_size: int = 1000,
+        max_connections: int = 20,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
         self.url = url.rstrip("/")
         self.api_key = api_key
-        self.client = httpx.AsyncClient(timeout=30.0)
+        self.insert_batch_size = max(insert_batch_size, 1)
+        self.insert_concurrency = max(insert_concurrency, 1)
+        self.delete_batch_size = max(delete_batch_size, 1)
+        self.client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
         if api_key:
             self.client.headers["Authorization"] = f"Bearer {api_key}"
+
+    @staticmethod
+    def _class_name(collection: str) -> str:
+        if not _WEAVIATE_CLASS_RE.match(collection):
+            raise ValueError(f"Invalid Weaviate class name: {collection!r}")
+        return collection
     
     async def insert(self, collection: str, vectors: list[EmbeddingVector]) -> bool:
-        """Insert vectors into Weaviate."""
+        """Insert vectors into Weaviate in concurrent, size-capped batches."""
         try:
-            objects = []
-            for vec in vectors:
-                obj = {
-                    "class": collection,
-                    "id": vec.id,
-                    "properties": {
-                        "text": vec.text,
-                        "metadata": vec.metadata,
-                        "created_at": vec.created_at.isoformat(),
-                        "expires_at": vec.expires_at.isoformat() if vec.expires_at else None,
-                    },
-                    "vector": vec.vector,
-                }
-                objects.append(obj)
-            
-            response = await self.client.post(
-                f"{self.url}/v1/batch/objects",
-                json={"objects": objects}
-            )
-            response.raise_for_status()
+            self._class_name(collection)
+            semaphore = asyncio.Semaphore(self.insert_concurrency)
+            chunks = [
+                vectors[start:start + self.insert_batch_size]
+                for start in range(0, len(vectors), self.insert_batch_size)
+            ]
+
+            async def send(chunk: list[EmbeddingVector]) -> int:
+                async with semaphore:
+                    response = await self.client.post(
+                        f"{self.url}/v1/batch/objects",
+                        json={"objects": [self._to_object(collection, vec) for vec in chunk]},
+                    )
+                    response.raise_for_status()
+                    return sum(1 for item in response.json() or [] if self._object_errors(item))
+
+            failed = sum(await asyncio.gather(*(send(chunk) for chunk in chunks)))
+            if failed:
+                logger.error(f"Failed to insert {failed} of {len(vectors)} vectors into {collection}")
+                return False
             logger.info(f"Inserted {len(vectors)} vectors into {collection}")
             return True
         except Exception as e:
             logger.error(f"Failed to insert vectors: {e}")
             return False
+
+    @staticmethod
+    def _to_object(collection: str, vec: EmbeddingVector) -> dict[str, Any]:
+        properties = {
+            "text": vec.text,
+            "metadata": vec.metadata,
+            "created_at": vec.created_at.isoformat(),
+            "expires_at": vec.expires_at.isoformat() if vec.expires_at else None,
+        }
+        for key in WEAVIATE_FILTER_PROPERTIES:
+            if vec.metadata.get(key) is not None:
+                properties[key] = str(vec.metadata[key])
+        return {
+            "class": collection,
+            "id": vec.id,
+            "properties": properties,
+            "vector": list(vec.vector),
+        }
+
+    @staticmethod
+    def _object_errors(item: Any) -> list[Any]:
+        if not isinstance(item, dict):
+            return []
+        return ((item.get("result") or {}).get("errors") or {}).get("error") or []
     
     async def search(
         self, 
@@ -105,44 +218,30 @@ class WeaviateProvider:
     ) -> list[tuple[EmbeddingVector, float]]:
         """Search Weaviate for similar vectors."""
         try:
-            query = {
-                "vector": query_vector,
-                "limit": limit,
+            arguments: dict[str, Any] = {
+                "nearVector": {"vector": [float(x) for x in query_vector]},
+                "limit": int(limit),
             }
-            
             if filters:
-                query["where"] = self._build_where_filter(filters)
-            
-            response = await self.client.post(
-                f"{self.url}/v1/graphql",
-                json={
-                    "query": f"""
-                    {{
-                        Get {{
-                            {collection}(nearVector: {query}) {{
-                                text
-                                metadata
-                                created_at
-                                expires_at
-                                _additional {{
-                                    id
-                                    distance
-                                }}
-                            }}
-                        }}
-                    }}
-                    """
-                }
+                arguments["where"] = self._build_where_filter(filters)
+            # 参数整体编码为 GraphQL 字面量，不再拼接 Python dict 的 repr
+            args = _graphql_value(arguments)[1:-1]
+            query = (
+                f"{{ Get {{ {self._class_name(collection)}({args}) {{ "
+                "text metadata created_at expires_at _additional { id distance } } } }"
             )
+            response = await self.client.post(f"{self.url}/v1/graphql", json={"query": query})
             response.raise_for_status()
             data = response.json()
+            if data.get("errors"):
+                raise RuntimeError(data["errors"])
             
             results = []
-            for item in data.get("data", {}).get("Get", {}).get(collection, []):
+            for item in (data.get("data") or {}).get("Get", {}).get(collection) or []:
                 vec = EmbeddingVector(
                     id=item["_additional"]["id"],
                     vector=[],  # Not returned in search
-                    metadata=item.get("metadata", {}),
+                    metadata=item.get("metadata") or {},
                     text=item["text"],
                     created_at=datetime.fromisoformat(item["created_at"]),
                     expires_at=datetime.fromisoformat(item["expires_at"]) if item.get("expires_at") else None,
@@ -155,16 +254,42 @@ class WeaviateProvider:
         except Exception as e:
             logger.error(f"Search failed: {e}")
             return []
+
+    async def delete_where(self, collection: str, where: dict[str, Any]) -> int:
+        """Delete every object matching ``where``. Returns how many were deleted.
+
+        Weaviate caps one batch delete at ``QUERY_MAXIMUM_RESULTS`` matches, so
+        the call is repeated until a round deletes fewer objects than the cap.
+        """
+        payload = {
+            "match": {"class": self._class_name(collection), "where": where},
+            "output": "minimal",
+            "dryRun": False,
+        }
+        deleted = 0
+        while True:
+            response = await self.client.request("DELETE", f"{self.url}/v1/batch/objects", json=payload)
+            response.raise_for_status()
+            results = response.json().get("results") or {}
+            successful = int(results.get("successful") or 0)
+            deleted += successful
+            if results.get("failed"):
+                raise RuntimeError(f"{results['failed']} objects failed to delete from {collection}")
+            limit = results.get("limit")
+            if not successful or limit is None or successful < int(limit):
+                return deleted
     
     async def delete(self, collection: str, vector_ids: list[str]) -> bool:
-        """Delete vectors from Weaviate."""
+        """Delete vectors from Weaviate with one batch request per ``delete_batch_size`` ids."""
         try:
-            for vid in vector_ids:
-                response = await self.client.delete(
-                    f"{self.url}/v1/objects/{collection}/{vid}"
+            deleted = 0
+            for start in range(0, len(vector_ids), self.delete_batch_size):
+                chunk = vector_ids[start:start + self.delete_batch_size]
+                deleted += await self.delete_where(
+                    collection,
+                    {"path": ["id"], "operator": "ContainsAny", "valueTextArray": chunk},
                 )
-                response.raise_for_status()
-            logger.info(f"Deleted {len(vector_ids)} vectors from {collection}")
+            logger.info(f"Deleted {deleted} vectors from {collection}")
             return True
         except Exception as e:
             logger.error(f"Delete failed: {e}")
@@ -174,7 +299,7 @@ class WeaviateProvider:
         """Create a Weaviate class (collection)."""
         try:
             schema = {
-                "class": collection,
+                "class": self._class_name(collection),
                 "vectorizer": "none",
                 "vectorIndexConfig": {
                     "distance": "cosine",
@@ -184,6 +309,7 @@ class WeaviateProvider:
                     {"name": "metadata", "dataType": ["object"]},
                     {"name": "created_at", "dataType": ["date"]},
                     {"name": "expires_at", "dataType": ["date"]},
+                    *({"name": key, "dataType": ["text"]} for key in WEAVIATE_FILTER_PROPERTIES),
                 ]
             }
             
@@ -199,58 +325,34 @@ class WeaviateProvider:
             return False
     
     async def cleanup_expired(self, collection: str) -> int:
-        """Remove expired vectors."""
+        """Remove expired vectors server-side, one capped batch delete at a time."""
         try:
             now = datetime.now(timezone.utc)
-            # Query for expired items
-            response = await self.client.post(
-                f"{self.url}/v1/graphql",
-                json={
-                    "query": f"""
-                    {{
-                        Get {{
-                            {collection}(where: {{
-                                path: ["expires_at"],
-                                operator: LessThan,
-                                valueDate: "{now.isoformat()}"
-                            }}) {{
-                                _additional {{
-                                    id
-                                }}
-                            }}
-                        }}
-                    }}
-                    """
-                }
+            return await self.delete_where(
+                collection,
+                {"path": ["expires_at"], "operator": "LessThan", "valueDate": now.isoformat()},
             )
-            data = response.json()
-            items = data.get("data", {}).get("Get", {}).get(collection, [])
-            
-            if items:
-                ids = [item["_additional"]["id"] for item in items]
-                await self.delete(collection, ids)
-                return len(ids)
-            return 0
         except Exception as e:
             logger.error(f"Cleanup failed: {e}")
             return 0
     
     def _build_where_filter(self, filters: dict[str, Any]) -> dict:
-        """Build Weaviate where filter from dict."""
-        # Simplified filter builder
+        """Build Weaviate where filter from dict; keys must be top-level filter properties."""
         conditions = []
         for key, value in filters.items():
+            if key not in WEAVIATE_FILTER_PROPERTIES:
+                raise ValueError(f"Cannot filter Weaviate objects on {key!r}")
             conditions.append({
                 "path": [key],
-                "operator": "Equal",
-                "valueString": str(value)
+                "operator": GraphQLEnum("Equal"),
+                "valueText": str(value),
             })
         
         if len(conditions) == 1:
             return conditions[0]
         
         return {
-            "operator": "And",
+            "operator": GraphQLEnum("And"),
             "operands": conditions
         }
     
@@ -259,18 +361,411 @@ class WeaviateProvider:
         await self.client.aclose()
 
 
+class ExpiryIndex:
+    """Min-heap of ``(expires_at, row)`` so expiry only touches expired rows.
+
+    Entries are not removed when a row is deleted or replaced; the collection
+    skips popped rows that are no longer live. :meth:`compact` drops those
+    stale entries and renumbers the rest.
+    """
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[float, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, row: int, expires_at: datetime) -> None:
+        heapq.heappush(self._heap, (expires_at.timestamp(), row))
+
+    def pop_expired(self, now: datetime) -> list[int]:
+        """Remove and return rows whose expiry is at or before ``now``."""
+        cutoff = now.timestamp()
+        rows: list[int] = []
+        while self._heap and self._heap[0][0] <= cutoff:
+            rows.append(heapq.heappop(self._heap)[1])
+        return rows
+
+    def compact(self, keep: np.ndarray) -> None:
+        """Renumber after the collection kept only rows ``keep`` (sorted)."""
+        if not self._heap or not len(keep):
+            self._heap = []
+            return
+        expiries = np.fromiter((entry[0] for entry in self._heap), dtype=np.float64, count=len(self._heap))
+        rows = np.fromiter((entry[1] for entry in self._heap), dtype=np.intp, count=len(self._heap))
+        positions = np.minimum(np.searchsorted(keep, rows), len(keep) - 1)
+        kept = keep[positions] == rows
+        self._heap = list(zip(expiries[kept].tolist(), positions[kept].tolist()))
+        heapq.heapify(self._heap)
+
+
+class VectorCollection:
+    """One in-memory collection stored as a contiguous float32 matrix.
+
+    Rows are L2-normalised on insert so cosine similarity is a single matrix
+    product. Deleted rows are tombstoned and reclaimed by :meth:`compact` once
+    they make up ``compaction_ratio`` of the matrix. Hashable metadata values
+    are kept in an inverted index ``{key: {value: {row, ...}}}`` so equality
+    filters become a boolean row mask instead of a Python scan.
+
+    With an ANN ``index`` (see :mod:`lewis_ai_system.vector_index`) a query only
+    scores the index's candidate rows once the index has been trained. With a
+    trained ``quantizer`` the candidates are first ranked on int8 codes and
+    only the best ``limit * rerank_factor`` are re-scored against the rows,
+    which are then held as float16 (``rerank_dtype``): codes plus rows take
+    three bytes per dimension instead of the four of a float32 matrix. Rows
+    with an ``expires_at`` are tracked in an :class:`ExpiryIndex`, so
+    :meth:`expire` never scans the collection.
+    """
+
+    rerank_dtype = np.float16
+
+    def __init__(
+        self,
+        dimension: int | None = None,
+        *,
+        initial_capacity: int = 1024,
+        compaction_ratio: float = 0.25,
+        compaction_min_rows: int = 256,
+        index: VectorIndex | None = None,
+        quantizer: ScalarQuantizer | None = None,
+    ):
+        self.dimension = dimension
+        self.index = index
+        self.quantizer = quantizer
+        # 每次压缩都会重新编号行，后台重建索引据此判断训练结果是否仍然有效
+        self.generation = 0
+        self.compaction_ratio = compaction_ratio
+        self.compaction_min_rows = compaction_min_rows
+        self._initial_capacity = max(initial_capacity, 1)
+        self._matrix = np.empty((0, dimension or 0), dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._vectors: list[EmbeddingVector | None] = []
+        self._rows: dict[str, int] = {}
+        self._metadata_index: dict[str, dict[Any, set[int]]] = defaultdict(lambda: defaultdict(set))
+        self._expiry = ExpiryIndex()
+        self._size = 0
+        self._tombstones = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def tombstones(self) -> int:
+        return self._tombstones
+
+    def __contains__(self, vector_id: str) -> bool:
+        return vector_id in self._rows
+
+    def get(self, vector_id: str) -> EmbeddingVector | None:
+        row = self._rows.get(vector_id)
+        return self._vectors[row] if row is not None else None
+
+    def vectors(self) -> list[EmbeddingVector]:
+        """Live vectors in row order."""
+        return [vec for vec in self._vectors if vec is not None]
+
+    def _prepare_block(self, vectors: list[EmbeddingVector]) -> np.ndarray:
+        """Stack vectors into a normalised float32 block, fixing the dimension on first use."""
+        block = np.array([vec.vector for vec in vectors], dtype=np.float32)
+        if block.ndim != 2:
+            raise ValueError("Vectors in one batch must share a dimension")
+        if self.dimension is None or (not len(self) and self._size == 0):
+            self.dimension = block.shape[1]
+        if block.shape[1] != self.dimension:
+            raise ValueError(f"Expected dimension {self.dimension}, got {block.shape[1]}")
+
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        block /= norms
+        return block
+
+    def add(self, vectors: list[EmbeddingVector]) -> None:
+        """Append vectors, replacing any existing rows with the same id."""
+        if not vectors:
+            return
+        block = self._prepare_block(vectors)
+
+        self._reserve(self._size + len(vectors))
+        start = self._size
+        self._matrix[start:start + len(vectors)] = block
+        self._alive[start:start + len(vectors)] = True
+        if self.index is not None:
+            self.index.add(start, block)
+        if self.quantizer is not None:
+            self.quantizer.add(start, block)
+        for offset, vec in enumerate(vectors):
+            previous = self._rows.get(vec.id)
+            if previous is not None:
+                self._tombstone(previous)
+            row = start + offset
+            self._vectors.append(vec)
+            self._rows[vec.id] = row
+            self._index_row(row, vec.metadata)
+            if vec.expires_at is not None:
+                self._expiry.push(row, vec.expires_at)
+        self._size += len(vectors)
+
+    def remove(self, vector_ids: list[str]) -> int:
+        """Tombstone vectors by id. Returns how many were live."""
+        removed = 0
+        for vid in vector_ids:
+            row = self._rows.pop(vid, None)
+            if row is not None:
+                self._tombstone(row)
+                removed += 1
+        return removed
+
+    def expire(self, now: datetime) -> int:
+        """Tombstone vectors that expired at or before ``now``. Returns how many."""
+        ids = [
+            self._vectors[row].id
+            for row in self._expiry.pop_expired(now)
+            if self._vectors[row] is not None
+        ]
+        return self.remove(ids)
+
+    def search(
+        self,
+        query_vector: list[float],
+        limit: int,
+        filters: dict[str, Any] | None = None,
+    ) -> list[tuple[EmbeddingVector, float]]:
+        """Return the ``limit`` most similar live vectors, best first."""
+        if limit <= 0 or not len(self):
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        if query.shape != (self.dimension,):
+            return []
+        norm = float(np.linalg.norm(query))
+        if norm:
+            query = query / norm
+
+        matrix = self._matrix[:self._size]
+        rows = self._filter_rows(filters) if filters else None
+        if rows is not None and rows.size == 0:
+            return []
+        if self.index is not None and self.index.ready:
+            rows = self._index_candidates(query, rows, limit)
+        elif rows is None and self._tombstones:
+            rows = np.flatnonzero(self._alive[:self._size])
+        if self.quantizer is not None and self.quantizer.ready:
+            rows = self._rerank_candidates(query, rows, limit)
+
+        if rows is None:
+            scores = matrix @ query
+        else:
+            if rows.size == 0:
+                return []
+            scores = matrix[rows] @ query
+
+        k = min(limit, scores.shape[0])
+        if k < scores.shape[0]:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(scores.shape[0])
+        top = top[np.argsort(-scores[top], kind="stable")]
+        hits = top if rows is None else rows[top]
+        return self._materialize(hits.tolist(), [float(scores[i]) for i in top.tolist()])
+
+    def _materialize(self, rows: list[int], scores: list[float]) -> list[tuple[EmbeddingVector, float]]:
+        return [(self._vectors[row], score) for row, score in zip(rows, scores)]
+
+    def _rerank_candidates(self, query: np.ndarray, rows: np.ndarray | None, limit: int) -> np.ndarray | None:
+        keep = limit * self.quantizer.rerank_factor
+        if (self._size if rows is None else rows.size) <= keep:
+            return rows
+        approximate = self.quantizer.scores(query, rows)
+        best = np.argpartition(-approximate, keep - 1)[:keep]
+        # 按行号排序，精确打分时顺序读取原始矩阵
+        return np.sort(best if rows is None else rows[best])
+
+    def _index_candidates(self, query: np.ndarray, rows: np.ndarray | None, limit: int) -> np.ndarray:
+        candidates = self.index.candidates(query)
+        candidates = candidates[self._alive[candidates]]
+        if rows is None:
+            return candidates if candidates.size >= limit else np.flatnonzero(self._alive[:self._size])
+        if rows.size <= candidates.size:
+            # 过滤条件已经比探测的簇更窄，直接精确计算过滤后的行
+            return rows
+        narrowed = np.intersect1d(candidates, rows, assume_unique=True)
+        return narrowed if narrowed.size >= limit else rows
+
+    def matrix_view(self) -> np.ndarray:
+        """Normalised rows ``0 .. size``; rows are never rewritten in place."""
+        return self._matrix[:self._size]
+
+    def install_index(self, trained: IVFTrainingResult) -> None:
+        """Swap in an index training result computed from :meth:`matrix_view`."""
+        self.index.install(trained, self.matrix_view())
+
+    def install_quantizer(self, trained: QuantizationResult) -> None:
+        """Swap in quantization codes computed from :meth:`matrix_view`, then narrow the rows."""
+        self.quantizer.install(trained, self.matrix_view())
+        if self._matrix.dtype != self.rerank_dtype:
+            # 只复制已用的行（预留容量未初始化）；后台训练线程持有的旧矩阵视图不受影响
+            matrix = np.empty(self._matrix.shape, dtype=self.rerank_dtype)
+            matrix[:self._size] = self._matrix[:self._size]
+            self._matrix = matrix
+
+    def should_compact(self) -> bool:
+        return (
+            self._tombstones >= self.compaction_min_rows
+            and self._tombstones >= self._size * self.compaction_ratio
+        )
+
+    def compact(self) -> int:
+        """Drop tombstoned rows and rebuild the id map and metadata index."""
+        if not self._tombstones:
+            return 0
+        reclaimed = self._tombstones
+        keep = np.flatnonzero(self._alive[:self._size])
+        capacity = max(self._initial_capacity, len(keep))
+        matrix = np.empty((capacity, self.dimension or 0), dtype=self._matrix.dtype)
+        matrix[:len(keep)] = self._matrix[keep]
+        vectors = [self._vectors[row] for row in keep.tolist()]
+
+        self._matrix = matrix
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._alive[:len(keep)] = True
+        self._vectors = vectors
+        self._rows = {vec.id: row for row, vec in enumerate(vectors)}
+        self._metadata_index = defaultdict(lambda: defaultdict(set))
+        for row, vec in enumerate(vectors):
+            self._index_row(row, vec.metadata)
+        self._expiry.compact(keep)
+        self._size = len(keep)
+        self._tombstones = 0
+        self.generation += 1
+        if self.index is not None:
+            self.index.compact(keep)
+        if self.quantizer is not None:
+            self.quantizer.compact(keep)
+        return reclaimed
+
+    def _reserve(self, rows: int) -> None:
+        capacity = self._matrix.shape[0]
+        if rows <= capacity and self._matrix.shape[1] == self.dimension:
+            return
+        new_capacity = max(self._initial_capacity, capacity)
+        while new_capacity < rows:
+            new_capacity *= 2
+        matrix = np.empty((new_capacity, self.dimension), dtype=self._matrix.dtype)
+        alive = np.zeros(new_capacity, dtype=bool)
+        if self._size:
+            matrix[:self._size] = self._matrix[:self._size]
+            alive[:self._size] = self._alive[:self._size]
+        self._matrix = matrix
+        self._alive = alive
+
+    def _tombstone(self, row: int) -> None:
+        vec = self._vectors[row]
+        if vec is None:
+            return
+        self._alive[row] = False
+        self._vectors[row] = None
+        self._tombstones += 1
+        for key, value in vec.metadata.items():
+            if _is_indexable(value):
+                rows = self._metadata_index[key].get(value)
+                if rows is not None:
+                    rows.discard(row)
+                    if not rows:
+                        del self._metadata_index[key][value]
+
+    def _index_row(self, row: int, metadata: dict[str, Any]) -> None:
+        for key, value in metadata.items():
+            if _is_indexable(value):
+                self._metadata_index[key][value].add(row)
+
+    def _filter_rows(self, filters: dict[str, Any]) -> np.ndarray:
+        """Row numbers of live vectors whose metadata equals every filter value."""
+        mask = self._alive[:self._size].copy()
+        for key, value in filters.items():
+            if _is_indexable(value):
+                rows = self._metadata_index.get(key, {}).get(value)
+                if not rows:
+                    return np.empty(0, dtype=np.intp)
+                key_mask = np.zeros(self._size, dtype=bool)
+                key_mask[np.fromiter(rows, dtype=np.intp, count=len(rows))] = True
+                mask &= key_mask
+            else:
+                # None 和不可哈希的值（列表、字典）不进索引，退回逐行比较
+                for row in np.flatnonzero(mask).tolist():
+                    if self._vectors[row].metadata.get(key) != value:
+                        mask[row] = False
+        return np.flatnonzero(mask)
+
+
+def _is_indexable(value: Any) -> bool:
+    if value is None:
+        return False
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
 class InMemoryVectorDB:
-    """In-memory vector database for development/testing."""
+    """In-memory vector database for development/testing.
+
+    Each collection is a :class:`VectorCollection`, so search is one matrix
+    product plus ``argpartition`` rather than a Python loop over every vector.
+    Large collections additionally get an ANN index (``settings.vector_index_type``)
+    and optionally int8 quantization (``settings.vector_quantization``), both
+    trained in the background once they reach their training threshold.
+    """
     
-    def __init__(self):
-        self.collections: dict[str, list[EmbeddingVector]] = {}
+    def __init__(
+        self,
+        *,
+        index_type: str | None = None,
+        index_options: dict[str, Any] | None = None,
+        quantization: str | None = None,
+        quantization_options: dict[str, Any] | None = None,
+        compaction_ratio: float = 0.25,
+        compaction_min_rows: int = 256,
+    ):
+        self.collections: dict[str, VectorCollection] = {}
+        self.index_type = index_type or settings.vector_index_type
+        self.index_options = index_options or {}
+        self.quantization = quantization or settings.vector_quantization
+        self.quantization_options = quantization_options or {}
+        self.compaction_ratio = compaction_ratio
+        self.compaction_min_rows = compaction_min_rows
+        self._rebuilds: dict[str, asyncio.Task[bool]] = {}
+        self._quantizations: dict[str, asyncio.Task[bool]] = {}
+
+    def _collection(self, collection: str, dimension: int | None = None) -> VectorCollection:
+        if collection not in self.collections:
+            self.collections[collection] = VectorCollection(
+                dimension,
+                compaction_ratio=self.compaction_ratio,
+                compaction_min_rows=self.compaction_min_rows,
+                index=build_vector_index(self.index_type, **self.index_options),
+                quantizer=build_vector_quantizer(self.quantization, **self.quantization_options),
+            )
+        return self.collections[collection]
+
+    async def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run a collection operation; in-memory collections run inline.
+
+        Subclasses whose collections do blocking I/O override this to move the
+        call off the event loop.
+        """
+        return fn(*args)
     
     async def insert(self, collection: str, vectors: list[EmbeddingVector]) -> bool:
         """Insert vectors into memory."""
-        if collection not in self.collections:
-            self.collections[collection] = []
-        self.collections[collection].extend(vectors)
+        store = self._collection(collection)
+        try:
+            await self._call(store.add, vectors)
+        except ValueError as e:
+            logger.error(f"Failed to insert vectors into {collection}: {e}")
+            return False
         logger.debug(f"Inserted {len(vectors)} vectors into {collection} (in-memory)")
+        await self._after_write(collection)
         return True
     
     async def search(
@@ -283,77 +778,149 @@ class InMemoryVectorDB:
         """Search using cosine similarity."""
         if collection not in self.collections:
             return []
-        
-        results = []
-        for vec in self.collections[collection]:
-            # Apply filters
-            if filters:
-                match = all(vec.metadata.get(k) == v for k, v in filters.items())
-                if not match:
-                    continue
-            
-            # Calculate cosine similarity
-            similarity = self._cosine_similarity(query_vector, vec.vector)
-            results.append((vec, similarity))
-        
-        # Sort by similarity and return top-k
-        results.sort(key=lambda x: x[1], reverse=True)
-        return results[:limit]
+        return await self._call(self.collections[collection].search, query_vector, limit, filters)
     
     async def delete(self, collection: str, vector_ids: list[str]) -> bool:
         """Delete vectors from memory."""
         if collection not in self.collections:
             return False
-        
-        self.collections[collection] = [
-            v for v in self.collections[collection] if v.id not in vector_ids
-        ]
+        await self._call(self.collections[collection].remove, vector_ids)
+        await self._after_write(collection)
         return True
     
     async def create_collection(self, collection: str, dimension: int) -> bool:
         """Create collection in memory."""
-        if collection not in self.collections:
-            self.collections[collection] = []
+        self._collection(collection, dimension)
         return True
     
     async def cleanup_expired(self, collection: str) -> int:
-        """Remove expired vectors."""
+        """Remove expired vectors; only expired rows are visited."""
         if collection not in self.collections:
             return 0
-        
-        now = datetime.now(timezone.utc)
-        before = len(self.collections[collection])
-        self.collections[collection] = [
-            v for v in self.collections[collection]
-            if not v.expires_at or v.expires_at > now
-        ]
-        return before - len(self.collections[collection])
-    
-    def _cosine_similarity(self, a: list[float], b: list[float]) -> float:
-        """Calculate cosine similarity between two vectors."""
-        if len(a) != len(b):
-            return 0.0
-        
-        dot_product = sum(x * y for x, y in zip(a, b))
-        mag_a = sum(x * x for x in a) ** 0.5
-        mag_b = sum(x * x for x in b) ** 0.5
-        
-        if mag_a == 0 or mag_b == 0:
-            return 0.0
-        
-        return dot_product / (mag_a * mag_b)
+        removed = await self._call(self.collections[collection].expire, datetime.now(timezone.utc))
+        if removed:
+            await self._after_write(collection)
+        return removed
+
+    async def compact(self, collection: str) -> int:
+        """Reclaim tombstoned rows now. Returns how many rows were dropped."""
+        if collection not in self.collections:
+            return 0
+        started = time.perf_counter()
+        reclaimed = await self._call(self.collections[collection].compact)
+        if reclaimed:
+            await record_index_maintenance(
+                "compact",
+                collection,
+                records_affected=reclaimed,
+                duration_seconds=time.perf_counter() - started,
+            )
+        return reclaimed
+
+    async def rebuild_index(self, collection: str) -> bool:
+        """Train the collection's ANN index off the event loop and swap it in."""
+        store = self.collections.get(collection)
+        if store is None or store.index is None:
+            return False
+        return await self._train(collection, "rebuild", store.index.train, store.install_index)
+
+    async def quantize(self, collection: str) -> bool:
+        """Re-fit the collection's int8 quantizer off the event loop and re-encode every row."""
+        store = self.collections.get(collection)
+        if store is None or store.quantizer is None:
+            return False
+        return await self._train(collection, "quantize", store.quantizer.train, store.install_quantizer)
+
+    async def _train(
+        self,
+        collection: str,
+        operation: str,
+        train: Callable[[np.ndarray], Any],
+        install: Callable[[Any], None],
+    ) -> bool:
+        store = self.collections[collection]
+        started = time.perf_counter()
+        generation = store.generation
+        matrix = store.matrix_view()
+
+        def install_if_current(trained: Any) -> None:
+            if store.generation != generation:
+                raise RuntimeError(f"collection was compacted during {operation}")
+            install(trained)
+
+        try:
+            trained = await asyncio.to_thread(train, matrix)
+            await self._call(install_if_current, trained)
+        except Exception as e:
+            logger.error(f"Vector {operation} failed for {collection}: {e}")
+            await record_index_maintenance(
+                operation,
+                collection,
+                records_affected=matrix.shape[0],
+                duration_seconds=time.perf_counter() - started,
+                status="failed",
+                error_message=str(e),
+            )
+            return False
+        await record_index_maintenance(
+            operation,
+            collection,
+            records_affected=matrix.shape[0],
+            duration_seconds=time.perf_counter() - started,
+        )
+        return True
+
+    async def wait_for_maintenance(self) -> None:
+        """Wait for background index rebuilds and quantizations to finish."""
+        tasks = [*self._rebuilds.values(), *self._quantizations.values()]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _after_write(self, collection: str) -> None:
+        store = self.collections[collection]
+        if store.should_compact():
+            await self.compact(collection)
+        self._maybe_schedule_rebuild(collection)
+
+    def _maybe_schedule_rebuild(self, collection: str) -> None:
+        store = self.collections[collection]
+        if store.index is not None and store.index.needs_rebuild(len(store)):
+            running = self._rebuilds.get(collection)
+            if running is None or running.done():
+                # 训练在后台进行，训练完成前查询继续走精确检索
+                self._rebuilds[collection] = asyncio.create_task(self.rebuild_index(collection))
+        if store.quantizer is not None and store.quantizer.needs_rebuild(len(store)):
+            running = self._quantizations.get(collection)
+            if running is None or running.done():
+                self._quantizations[collection] = asyncio.create_task(self.quantize(collection))
     
     async def close(self):
-        """No-op for in-memory."""
-        pass
+        """Cancel any background index rebuilds and quantizations."""
+        tasks = [*self._rebuilds.values(), *self._quantizations.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._rebuilds.clear()
+        self._quantizations.clear()
 
 
 class VectorDBManager:
-    """Manages vector database connections and operations."""
+    """Manages vector database connections and operations.
+
+    :meth:`start_expiry_sweeper` runs :meth:`cleanup_old_memories` on an
+    interval from the application lifespan; each sweep is recorded in
+    ``VectorIndexMaintenance``.
+
+    Memories live in a collection named after the embedding provider
+    (``provider:model:dimension``, see :attr:`memory_collection`), so changing
+    ``EMBEDDING_PROVIDER`` or the model never mixes vectors from different
+    embedding spaces; older collections are only swept for expiry.
+    """
     
     def __init__(self):
         self.provider: VectorDBProvider | None = None
         self._initialized = False
+        self._sweeper: asyncio.Task[None] | None = None
     
     def initialize(self):
         """Initialize vector DB based on settings."""
@@ -370,11 +937,29 @@ class VectorDBManager:
                     settings.vector_db_api_key
                 )
                 logger.info("Initialized Weaviate vector database")
+        elif settings.vector_db_type == "local":
+            from .local_vector_store import PersistentVectorDB
+
+            self.provider = PersistentVectorDB(settings.vector_store_path)
+            logger.info(f"Using persistent local vector store at {settings.vector_store_path}")
         else:
             self.provider = InMemoryVectorDB()
             logger.info("Using in-memory vector database")
         
         self._initialized = True
+
+    @property
+    def memory_collection(self) -> str:
+        """Collection holding memories embedded by the current embedding provider."""
+        name = re.sub(r"[^0-9A-Za-z]+", "_", get_embedding_service().provider.name).strip("_")
+        return f"{MEMORY_COLLECTION}_{name}"
+
+    def _memory_collections(self) -> list[str]:
+        known = getattr(self.provider, "collections", None)
+        if known is None:
+            return [self.memory_collection]
+        # 换过嵌入模型的旧集合不再写入和检索，但其中的记忆照常过期
+        return sorted(name for name in known if name == MEMORY_COLLECTION or name.startswith(f"{MEMORY_COLLECTION}_"))
     
     async def store_conversation_memory(
         self,
@@ -385,33 +970,53 @@ class VectorDBManager:
         ttl_days: int = 30
     ) -> bool:
         """Store conversation memory with TTL."""
+        return await self.store_conversation_memories([(session_id, text, embedding, metadata)], ttl_days)
+
+    async def store_conversation_memories(
+        self,
+        memories: list[tuple[str, str, list[float], dict[str, Any]]],
+        ttl_days: int = 30
+    ) -> bool:
+        """Store many ``(session_id, text, embedding, metadata)`` memories in one insert."""
         if not self.provider:
             self.initialize()
+        if not memories:
+            return True
         
-        vec = EmbeddingVector(
-            id=hashlib.sha256(f"{session_id}:{text}".encode()).hexdigest(),
-            vector=embedding,
-            metadata={**metadata, "session_id": session_id},
-            text=text,
-            created_at=datetime.now(timezone.utc),
-            expires_at=datetime.now(timezone.utc) + timedelta(days=ttl_days)
-        )
+        now = datetime.now(timezone.utc)
+        vectors = [
+            EmbeddingVector(
+                id=hashlib.sha256(f"{session_id}:{text}".encode()).hexdigest(),
+                vector=embedding,
+                metadata={**metadata, "session_id": session_id},
+                text=text,
+                created_at=now,
+                expires_at=now + timedelta(days=ttl_days)
+            )
+            for session_id, text, embedding, metadata in memories
+        ]
         
-        return await self.provider.insert("ConversationMemory", [vec])
+        return await self.provider.insert(self.memory_collection, vectors)
     
     async def search_memories(
         self,
         query_embedding: list[float],
         user_id: str | None = None,
-        limit: int = 5
+        limit: int = 5,
+        tenant_id: str | None = None
     ) -> list[tuple[str, float, dict]]:
-        """Search for relevant conversation memories."""
+        """Search for relevant conversation memories, optionally scoped to a user or tenant."""
         if not self.provider:
             self.initialize()
         
-        filters = {"user_id": user_id} if user_id else None
+        filters: dict[str, Any] = {}
+        if user_id:
+            filters["user_id"] = user_id
+        if tenant_id:
+            filters["tenant_id"] = tenant_id
+        filters = filters or None
         results = await self.provider.search(
-            "ConversationMemory",
+            self.memory_collection,
             query_embedding,
             limit=limit,
             filters=filters
@@ -420,16 +1025,61 @@ class VectorDBManager:
         return [(vec.text, score, vec.metadata) for vec, score in results]
     
     async def cleanup_old_memories(self) -> int:
-        """Remove expired memories."""
+        """Remove expired memories from every memory collection and record each sweep."""
         if not self.provider:
             return 0
         
-        count = await self.provider.cleanup_expired("ConversationMemory")
-        logger.info(f"Cleaned up {count} expired memories")
-        return count
+        total = 0
+        for collection in self._memory_collections():
+            started = time.perf_counter()
+            try:
+                count = await self.provider.cleanup_expired(collection)
+            except Exception as e:
+                logger.error(f"Expired memory cleanup failed for {collection}: {e}")
+                await record_index_maintenance(
+                    "expire",
+                    collection,
+                    duration_seconds=time.perf_counter() - started,
+                    status="failed",
+                    error_message=str(e),
+                )
+                continue
+            await record_index_maintenance(
+                "expire",
+                collection,
+                records_affected=count,
+                duration_seconds=time.perf_counter() - started,
+            )
+            total += count
+        return total
+
+    def start_expiry_sweeper(self, interval_seconds: float | None = None) -> None:
+        """Start the background expiry sweep on the running event loop."""
+        interval = (
+            interval_seconds if interval_seconds is not None else settings.vector_expiry_sweep_interval_seconds
+        )
+        if interval <= 0 or (self._sweeper is not None and not self._sweeper.done()):
+            return
+        self._sweeper = asyncio.create_task(self._sweep_loop(interval))
+
+    async def _sweep_loop(self, interval_seconds: float) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            await self.cleanup_old_memories()
+
+    async def stop_expiry_sweeper(self) -> None:
+        sweeper, self._sweeper = self._sweeper, None
+        if sweeper is None or sweeper.get_loop() is not asyncio.get_running_loop():
+            return
+        sweeper.cancel()
+        try:
+            await sweeper
+        except asyncio.CancelledError:
+            pass
     
     async def close(self):
-        """Close vector DB connections."""
+        """Stop the expiry sweeper and close vector DB connections."""
+        await self.stop_expiry_sweeper()
         if self.provider:
             await self.provider.close()
 
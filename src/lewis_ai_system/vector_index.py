@@ -0,0 +1,394 @@
+"""Approximate nearest neighbour indexes for the in-memory vector store.
+
+:class:`~lewis_ai_system.vector_db.VectorCollection` scores every live row on
+each query, which stops being interactive past a few hundred thousand rows. An
+index narrows a query down to a candidate subset of rows; the collection still
+does the exact scoring on those candidates.
+
+:class:`IVFIndex` is an inverted-file index: a spherical k-means coarse
+quantizer splits the rows into ``nlist`` cells and a query only scores the rows
+in its ``nprobe`` closest cells. ``nprobe`` is the recall/speed knob and can be
+changed at any time. Training runs off the event loop and index rebuilds and
+compactions are recorded in ``VectorIndexMaintenance``.
+
+:class:`ScalarQuantizer` keeps an int8 copy of the rows. Queries scan the
+codes (a quarter of the float32 bytes) and only the best
+``limit * rerank_factor`` candidates are re-scored against the rows. The
+in-memory store narrows its rows to float16 once the codes are installed; the
+persistent store re-ranks from the float32 rows it maps from disk.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Protocol
+
+import numpy as np
+
+from .config import settings
+from .instrumentation import get_logger
+
+logger = get_logger()
+
+# 分块分配行到聚类中心，避免一次性构造 N x nlist 的得分矩阵
+_ASSIGN_CHUNK_ROWS = 65536
+# 量化码按小块解码到复用的 float32 缓冲里打分，缓冲能留在 CPU 缓存中
+_SCORE_CHUNK_ROWS = 2048
+
+
+@dataclass(slots=True)
+class IVFTrainingResult:
+    """Centroids and cell assignments for the first ``len(assignments)`` rows."""
+
+    centroids: np.ndarray
+    assignments: np.ndarray
+
+
+class VectorIndex(Protocol):
+    """Candidate-generation index over the rows of one collection.
+
+    Row numbers are those of the collection matrix. The collection filters out
+    tombstoned rows itself, so an index never has to forget deleted rows until
+    :meth:`compact` renumbers them.
+    """
+
+    name: str
+
+    @property
+    def ready(self) -> bool:
+        """Whether :meth:`candidates` can be used yet."""
+        ...
+
+    def needs_rebuild(self, rows: int) -> bool:
+        """Whether the index should be (re)trained for a matrix of ``rows`` rows."""
+        ...
+
+    def train(self, matrix: np.ndarray) -> IVFTrainingResult:
+        """Train on a read-only matrix view. Must not mutate the index; runs in a thread."""
+        ...
+
+    def install(self, trained: IVFTrainingResult, matrix: np.ndarray) -> None:
+        """Swap in a training result, assigning rows added since training started."""
+        ...
+
+    def add(self, start: int, block: np.ndarray) -> None:
+        """Index normalised rows ``start .. start + len(block)``."""
+        ...
+
+    def compact(self, keep: np.ndarray) -> None:
+        """Renumber after the collection kept only rows ``keep`` (in order)."""
+        ...
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        """Row numbers worth scoring exactly for a normalised query."""
+        ...
+
+
+class IVFIndex:
+    """Inverted-file index with a spherical k-means coarse quantizer."""
+
+    name = "ivf"
+
+    def __init__(
+        self,
+        *,
+        nlist: int = 0,
+        nprobe: int = 8,
+        min_train_size: int = 100_000,
+        retrain_growth: float = 2.0,
+        kmeans_iterations: int = 10,
+        sample_per_list: int = 64,
+        seed: int = 0,
+    ):
+        self.nlist = nlist
+        self.nprobe = max(nprobe, 1)
+        self.min_train_size = min_train_size
+        self.retrain_growth = retrain_growth
+        self.kmeans_iterations = kmeans_iterations
+        self.sample_per_list = sample_per_list
+        self.seed = seed
+
+        self._centroids: np.ndarray | None = None
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._lists: list[np.ndarray] = []
+        # 增量插入先追加到 Python 列表，查询时再合并进对应的 numpy 数组
+        self._pending: list[list[int]] = []
+        self._trained_rows = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._centroids is not None
+
+    @property
+    def cells(self) -> int:
+        return 0 if self._centroids is None else self._centroids.shape[0]
+
+    def needs_rebuild(self, rows: int) -> bool:
+        if rows < self.min_train_size:
+            return False
+        return not self.ready or rows >= self._trained_rows * self.retrain_growth
+
+    def train(self, matrix: np.ndarray) -> IVFTrainingResult:
+        rows = matrix.shape[0]
+        rng = np.random.default_rng(self.seed)
+        nlist = min(self.nlist or max(int(np.sqrt(rows)), 1), rows)
+        sample_size = min(rows, nlist * self.sample_per_list)
+        sample = matrix[np.sort(rng.choice(rows, sample_size, replace=False))]
+
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(self.kmeans_iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            empty = np.flatnonzero(counts == 0)
+            if empty.size:
+                # 空簇用随机样本重新播种，避免中心点塌缩
+                sums[empty] = sample[rng.choice(sample_size, empty.size, replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        return IVFTrainingResult(centroids=centroids, assignments=self._assign(matrix, centroids))
+
+    def install(self, trained: IVFTrainingResult, matrix: np.ndarray) -> None:
+        self._centroids = trained.centroids
+        assignments = np.empty(matrix.shape[0], dtype=np.int32)
+        known = len(trained.assignments)
+        assignments[:known] = trained.assignments
+        if matrix.shape[0] > known:
+            assignments[known:] = self._assign(matrix[known:], trained.centroids)
+        self._set_assignments(assignments)
+        self._trained_rows = matrix.shape[0]
+
+    def add(self, start: int, block: np.ndarray) -> None:
+        if self._centroids is None or not len(block):
+            return
+        labels = self._assign(block, self._centroids)
+        end = start + len(block)
+        if end > len(self._assignments):
+            grown = np.empty(max(end, 2 * len(self._assignments)), dtype=np.int32)
+            grown[:len(self._assignments)] = self._assignments
+            self._assignments = grown
+        self._assignments[start:end] = labels
+        for row, label in enumerate(labels.tolist(), start):
+            self._pending[label].append(row)
+
+    def compact(self, keep: np.ndarray) -> None:
+        if self._centroids is None:
+            return
+        self._set_assignments(self._assignments[keep])
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        if self._centroids is None:
+            raise RuntimeError("IVF index is not trained")
+        nprobe = min(self.nprobe, self.cells)
+        scores = self._centroids @ query
+        if nprobe < self.cells:
+            probes = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        else:
+            probes = np.arange(self.cells)
+        for cell in probes.tolist():
+            if self._pending[cell]:
+                self._lists[cell] = np.concatenate(
+                    [self._lists[cell], np.asarray(self._pending[cell], dtype=np.intp)]
+                )
+                self._pending[cell] = []
+        return np.concatenate([self._lists[cell] for cell in probes.tolist()])
+
+    def _set_assignments(self, assignments: np.ndarray) -> None:
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(self.cells + 1))
+        self._assignments = assignments
+        self._lists = [order[bounds[i]:bounds[i + 1]].astype(np.intp) for i in range(self.cells)]
+        self._pending = [[] for _ in range(self.cells)]
+
+    @staticmethod
+    def _assign(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        labels = np.empty(matrix.shape[0], dtype=np.int32)
+        for start in range(0, matrix.shape[0], _ASSIGN_CHUNK_ROWS):
+            chunk = matrix[start:start + _ASSIGN_CHUNK_ROWS]
+            labels[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        return labels
+
+
+@dataclass(slots=True)
+class QuantizationResult:
+    """Per-dimension offset/scale and codes for the first ``len(codes)`` rows."""
+
+    offset: np.ndarray
+    scale: np.ndarray
+    codes: np.ndarray
+
+
+class ScalarQuantizer:
+    """int8 scalar quantization of collection rows with exact re-ranking.
+
+    Each dimension is mapped linearly from its trained ``[min, max]`` range
+    onto 256 levels. For a code ``c`` the row is approximated by
+    ``offset + (c + 128) * scale``, so an approximate score is one matrix
+    product of the codes with ``query * scale`` plus a constant.
+    """
+
+    name = "int8"
+
+    def __init__(
+        self,
+        *,
+        min_train_size: int = 10_000,
+        rerank_factor: int = 4,
+        sample_size: int = 100_000,
+        seed: int = 0,
+    ):
+        self.min_train_size = min_train_size
+        self.rerank_factor = max(rerank_factor, 1)
+        self.sample_size = sample_size
+        self.seed = seed
+
+        self._offset: np.ndarray | None = None
+        self._scale: np.ndarray | None = None
+        self._codes = np.empty((0, 0), dtype=np.int8)
+        self._rows = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._offset is not None
+
+    @property
+    def nbytes(self) -> int:
+        return self._codes[:self._rows].nbytes
+
+    def needs_rebuild(self, rows: int) -> bool:
+        return not self.ready and rows >= self.min_train_size
+
+    def train(self, matrix: np.ndarray) -> QuantizationResult:
+        rows = matrix.shape[0]
+        if rows > self.sample_size:
+            rng = np.random.default_rng(self.seed)
+            sample = matrix[np.sort(rng.choice(rows, self.sample_size, replace=False))]
+        else:
+            sample = np.asarray(matrix)
+        low = sample.min(axis=0).astype(np.float32)
+        high = sample.max(axis=0).astype(np.float32)
+        scale = (high - low) / 255.0
+        scale[scale == 0] = 1.0
+        return QuantizationResult(offset=low, scale=scale, codes=self._encode(matrix, low, scale))
+
+    def install(self, trained: QuantizationResult, matrix: np.ndarray) -> None:
+        codes = np.empty((matrix.shape[0], matrix.shape[1]), dtype=np.int8)
+        known = len(trained.codes)
+        codes[:known] = trained.codes
+        if matrix.shape[0] > known:
+            codes[known:] = self._encode(matrix[known:], trained.offset, trained.scale)
+        self._offset, self._scale = trained.offset, trained.scale
+        self._codes = codes
+        self._rows = matrix.shape[0]
+
+    def add(self, start: int, block: np.ndarray) -> None:
+        if self._offset is None or not len(block):
+            return
+        end = start + len(block)
+        if end > len(self._codes):
+            grown = np.empty((max(end, 2 * len(self._codes)), self._codes.shape[1]), dtype=np.int8)
+            grown[:self._rows] = self._codes[:self._rows]
+            self._codes = grown
+        self._codes[start:end] = self._encode(block, self._offset, self._scale)
+        self._rows = end
+
+    def compact(self, keep: np.ndarray) -> None:
+        if self._offset is None:
+            return
+        self._codes = self._codes[keep]
+        self._rows = len(keep)
+
+    def scores(self, query: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        """Approximate scores of ``rows`` (default: all rows) for a normalised query."""
+        if self._offset is None:
+            raise RuntimeError("Quantizer is not trained")
+        weights = (query * self._scale).astype(np.float32)
+        bias = float(query @ self._offset) + 128.0 * float(weights.sum())
+        count = self._rows if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        buffer = np.empty((min(count, _SCORE_CHUNK_ROWS), self._codes.shape[1]), dtype=np.float32)
+        for start in range(0, count, _SCORE_CHUNK_ROWS):
+            if rows is None:
+                chunk = self._codes[start:start + _SCORE_CHUNK_ROWS]
+            else:
+                chunk = self._codes[rows[start:start + _SCORE_CHUNK_ROWS]]
+            decoded = buffer[:len(chunk)]
+            decoded[...] = chunk
+            np.matmul(decoded, weights, out=scores[start:start + len(chunk)])
+        scores += bias
+        return scores
+
+    @staticmethod
+    def _encode(matrix: np.ndarray, offset: np.ndarray, scale: np.ndarray) -> np.ndarray:
+        codes = np.empty(matrix.shape, dtype=np.int8)
+        for start in range(0, matrix.shape[0], _SCORE_CHUNK_ROWS):
+            chunk = np.asarray(matrix[start:start + _SCORE_CHUNK_ROWS], dtype=np.float32)
+            levels = np.clip(np.rint((chunk - offset) / scale), 0, 255)
+            codes[start:start + len(chunk)] = (levels - 128).astype(np.int8)
+        return codes
+
+
+def build_vector_quantizer(kind: str | None = None, **options) -> ScalarQuantizer | None:
+    """Create the configured quantizer; ``none`` keeps float32 scoring only."""
+    kind = kind or settings.vector_quantization
+    if kind == "none":
+        return None
+    if kind == "int8":
+        return ScalarQuantizer(
+            min_train_size=options.get("min_train_size", settings.vector_quantization_min_rows),
+            rerank_factor=options.get("rerank_factor", settings.vector_quantization_rerank_factor),
+            **{k: v for k, v in options.items() if k not in {"min_train_size", "rerank_factor"}},
+        )
+    raise ValueError(f"Unknown vector quantization: {kind}")
+
+
+def build_vector_index(kind: str | None = None, **options) -> VectorIndex | None:
+    """Create the configured index; ``flat`` means exact search without an index."""
+    kind = kind or settings.vector_index_type
+    if kind == "flat":
+        return None
+    if kind == "ivf":
+        return IVFIndex(
+            nlist=options.get("nlist", settings.vector_index_nlist),
+            nprobe=options.get("nprobe", settings.vector_index_nprobe),
+            min_train_size=options.get("min_train_size", settings.vector_index_min_train_size),
+            **{k: v for k, v in options.items() if k not in {"nlist", "nprobe", "min_train_size"}},
+        )
+    raise ValueError(f"Unknown vector index type: {kind}")
+
+
+async def record_index_maintenance(
+    operation: str,
+    collection: str,
+    *,
+    records_affected: int = 0,
+    duration_seconds: float | None = None,
+    status: str = "success",
+    error_message: str | None = None,
+) -> None:
+    """Write a ``VectorIndexMaintenance`` row when a database is configured."""
+    logger.info(
+        f"Vector index {operation} on {collection}: {records_affected} records, "
+        f"{duration_seconds or 0:.3f}s, {status}"
+    )
+    from .database import VectorIndexMaintenance, db_manager
+
+    if not db_manager.session_factory:
+        return
+    try:
+        async with db_manager.get_session() as db:
+            db.add(
+                VectorIndexMaintenance(
+                    operation=operation,
+                    collection=collection,
+                    records_affected=records_affected,
+                    duration_seconds=duration_seconds,
+                    status=status,
+                    error_message=error_message,
+                )
+            )
+    except Exception as exc:
+        logger.error(f"Failed to record vector index maintenance: {exc}")
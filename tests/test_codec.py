@@ -0,0 +1,84 @@
+"""Tests for the versioned payload codec used by the cache and task queue."""
+
+import pickle
+
+import pytest
+from arq.jobs import deserialize_job, deserialize_result, serialize_job, serialize_result
+
+from lewis_ai_system import codec as codec_module
+from lewis_ai_system.codec import CODEC_VERSION, Codec, CodecError
+from lewis_ai_system.task_queue import TaskExecutionError, deserialize_job_payload, serialize_job_payload
+
+
+def test_json_round_trip_has_version_header():
+    codec = Codec("json")
+    encoded = codec.dumps({"shots": [{"id": 1, "prompt": "sunrise"}], 3: None})
+
+    assert encoded[0] == CODEC_VERSION and encoded[1] == 0x00
+    assert codec.loads(encoded) == {"shots": [{"id": 1, "prompt": "sunrise"}], "3": None}
+
+
+def test_legacy_payloads_without_header_are_decoded():
+    codec = Codec("json")
+
+    assert codec.loads(b'{"a": [1, 2]}') == {"a": [1, 2]}
+    assert codec.loads('"text"') == "text"
+    assert Codec("legacy").dumps({"a": 1}) == b'{"a": 1}'
+
+
+def test_compression_only_above_threshold():
+    codec = Codec("json", compression="zlib", compress_threshold=256)
+    small, large = {"k": "v"}, {"storyboard": ["the same shot description"] * 200}
+
+    assert codec.dumps(small)[1] == 0x00
+    encoded = codec.dumps(large)
+    assert encoded[1] >> 4 == 0x1
+    assert len(encoded) < len(Codec("json").dumps(large)) / 5
+    assert codec.loads(encoded) == large
+
+
+def test_missing_optional_backends_fall_back(monkeypatch):
+    monkeypatch.setattr(codec_module, "MSGPACK_AVAILABLE", False)
+    monkeypatch.setattr(codec_module, "ZSTD_AVAILABLE", False)
+    codec = Codec("msgpack", compression="zstd")
+
+    assert (codec.format, codec.compression) == ("json", "zlib")
+    with pytest.raises(CodecError):
+        codec.loads(bytes((CODEC_VERSION, 0x01)) + b"\x81")
+    with pytest.raises(CodecError):
+        codec.loads(bytes((CODEC_VERSION, 0x20)) + b"{}")
+
+
+@pytest.mark.skipif(not codec_module.MSGPACK_AVAILABLE, reason="msgpack not installed")
+def test_msgpack_round_trip():
+    codec = Codec("msgpack")
+    encoded = codec.dumps({"a": [1, 2.5, "x"], "b": b"raw"})
+
+    assert encoded[1] & 0x0F == 0x1
+    assert codec.loads(encoded) == {"a": [1, 2.5, "x"], "b": b"raw"}
+
+
+def test_arq_jobs_round_trip_and_read_pickled_jobs():
+    storyboard = [{"shot": i, "prompt": f"shot {i}"} for i in range(3)]
+    encoded = serialize_job(
+        "generate_video_task", ("p1", "script", storyboard), {}, 1, 123, serializer=serialize_job_payload
+    )
+    job = deserialize_job(encoded, deserializer=deserialize_job_payload)
+    legacy = serialize_job("generate_video_task", ("p1",), {"x": 1}, 1, 123)
+
+    assert encoded[0] == CODEC_VERSION
+    assert job.function == "generate_video_task" and list(job.args) == ["p1", "script", storyboard]
+    assert deserialize_job(legacy, deserializer=deserialize_job_payload).kwargs == {"x": 1}
+    assert pickle.loads(legacy)["f"] == "generate_video_task"
+
+
+def test_arq_failed_result_is_rebuilt_as_exception():
+    encoded = serialize_result(
+        "generate_video_task", (), {}, 1, 0, False, ValueError("no project"), 0, 1, "ref", "arq:queue", "job1",
+        serializer=serialize_job_payload,
+    )
+    result = deserialize_result(encoded, deserializer=deserialize_job_payload)
+
+    assert not result.success
+    assert isinstance(result.result, TaskExecutionError)
+    assert str(result.result) == "ValueError: no project"
@@ -2,6 +2,9 @@
 
 from __future__ import annotations
 
+import asyncio
+import json
+
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 
@@ -189,7 +192,7 @@ class TestBatchProcessingService:
                     project.storyboard = [panel]
                 mock_projects.append(project)
 
-            mock_repo.get = AsyncMock(side_effect=mock_projects)
+            mock_repo.get_many = AsyncMock(return_value={p.id: p for p in mock_projects})
 
             # Mock consistency evaluation
             mock_result = {
@@ -200,7 +203,7 @@ class TestBatchProcessingService:
                 "recommendations": ["Test recommendation"]
             }
             mock_manager.evaluate_consistency = AsyncMock(return_value=mock_result)
-            mock_repo.upsert = AsyncMock()
+            mock_repo.upsert_many = AsyncMock()
 
             result = await batch_service.batch_evaluate_consistency(project_ids)
 
@@ -218,14 +221,118 @@ class TestBatchProcessingService:
                 assert project_result["status"] == "skipped"
 
 
+    @pytest.mark.asyncio
+    async def test_stream_results_yields_as_completed_with_resumable_cursor(self, batch_service):
+        """结果按完成顺序产出，cursor 只在之前的项目全部完成后前进。"""
+        delays = {"p0": 0.1, "p1": 0.0, "p2": 0.01, "p3": 0.0}
+
+        async def handler(project_id, index, projects):
+            await asyncio.sleep(delays[project_id])
+            return {"status": "success"}
+
+        results = [r async for r in batch_service.stream_results(handler, list(delays), concurrency=2)]
+        assert [r["project_id"] for r in results] == ["p1", "p2", "p3", "p0"]
+        assert [r["cursor"] for r in results] == [0, 0, 0, 4]
+
+        resumed = [r["project_id"] async for r in batch_service.stream_results(handler, list(delays), cursor=3)]
+        assert resumed == ["p3"]
+
+    @pytest.mark.asyncio
+    async def test_stream_results_bounds_concurrency_and_cancels_on_close(self, batch_service):
+        """并发受限；关闭生成器时取消仍在执行的项目。"""
+        running, peak, cancelled = 0, 0, []
+
+        async def handler(project_id, index, projects):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            try:
+                await asyncio.sleep(0 if project_id == "p0" else 10)
+                return {"status": "success"}
+            except asyncio.CancelledError:
+                cancelled.append(project_id)
+                raise
+            finally:
+                running -= 1
+
+        stream = batch_service.stream_results(handler, [f"p{i}" for i in range(100)], concurrency=3)
+        first = await stream.__anext__()
+        await stream.aclose()
+
+        assert first["project_id"] == "p0" and peak == 3
+        assert sorted(cancelled) == ["p1", "p2"] and running == 0
+
+    def test_stream_endpoint_emits_ndjson_and_sse(self):
+        """流式接口逐行返回结果，最后一行为汇总；SSE 的事件 ID 即 cursor。"""
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+
+        from lewis_ai_system.routers.creative import router
+
+        app = FastAPI()
+        app.include_router(router, prefix="/creative")
+        client = TestClient(app)
+        body = {"project_ids": ["a", "b"], "config_updates": {"style": "comic"}}
+
+        with patch("lewis_ai_system.creative.batch_processing.creative_repository") as mock_repo:
+            mock_repo.get_many = AsyncMock(side_effect=lambda ids: {pid: MagicMock(id=pid) for pid in ids})
+            mock_repo.upsert_many = AsyncMock()
+            ndjson = client.post("/creative/consistency/batch/update-config/stream", json=body)
+            sse = client.post(
+                "/creative/consistency/batch/update-config/stream",
+                json=body,
+                headers={"Accept": "text/event-stream", "Last-Event-ID": "1"},
+            )
+
+        lines = [json.loads(line) for line in ndjson.text.splitlines()]
+        assert ndjson.headers["content-type"].startswith("application/x-ndjson")
+        assert [line["type"] for line in lines] == ["result", "result", "summary"]
+        assert lines[-1]["statuses"] == {"success": 2} and lines[-1]["cursor"] == 2
+        assert sse.text.count("event: result") == 1 and "id: 2" in sse.text
+
+    @pytest.mark.asyncio
+    async def test_batch_reads_by_chunk_and_writes_once_per_round(self, batch_service):
+        """每个块只读一次存储库；每轮完成的项目合并为一次写入。"""
+        from lewis_ai_system.creative.repository import InMemoryCreativeProjectRepository
+
+        repository = InMemoryCreativeProjectRepository()
+        projects = [CreativeProject(id=f"p{i}", tenant_id="t", title=f"P{i}", brief="brief") for i in range(10)]
+        await repository.upsert_many(projects)
+        repository.get_many = AsyncMock(wraps=repository.get_many)
+        repository.upsert_many = AsyncMock(wraps=repository.upsert_many)
+        batch_service.chunk_size = 4
+
+        with patch("lewis_ai_system.creative.batch_processing.creative_repository", repository):
+            result = await batch_service.batch_update_consistency_config(
+                [p.id for p in projects] + ["missing"], {"consistency_level": "high"}, concurrency=10
+            )
+
+        assert result["successful_updates"] == 10 and result["results"]["missing"]["status"] == "error"
+        assert repository.get_many.await_count == 3
+        assert repository.upsert_many.await_count == 1
+        assert all(p.consistency_level == "high" for p in (await repository.get_many([p.id for p in projects])).values())
+
+    @pytest.mark.asyncio
+    async def test_failed_write_marks_round_as_error(self, batch_service):
+        """批量写入失败时，本轮保存过的项目结果标为错误。"""
+        with patch("lewis_ai_system.creative.batch_processing.creative_repository") as mock_repo:
+            mock_repo.get_many = AsyncMock(side_effect=lambda ids: {pid: MagicMock(id=pid) for pid in ids})
+            mock_repo.upsert_many = AsyncMock(side_effect=RuntimeError("db down"))
+            result = await batch_service.batch_update_consistency_config(["a", "b"], {"style": "comic"})
+
+        assert result["successful_updates"] == 0
+        assert all("db down" in r["error"] for r in result["results"].values())
+
+
 class TestMonitoringAnalyticsService:
     """测试监控和分析服务。"""
 
     @pytest.fixture
     def monitoring_service(self):
         """创建监控服务实例。"""
+        from lewis_ai_system.creative.metrics import TenantMetrics
         from lewis_ai_system.creative.monitoring import MonitoringAnalyticsService
-        return MonitoringAnalyticsService()
+        return MonitoringAnalyticsService(metrics=TenantMetrics())
 
     @pytest.mark.asyncio
     async def test_get_consistency_stats(self, monitoring_service):
@@ -309,6 +416,192 @@ class TestMonitoringAnalyticsService:
             assert len(consistency_recs) > 0
 
 
+    @pytest.mark.asyncio
+    async def test_stats_follow_repository_writes_without_rescanning(self, monitoring_service, monkeypatch):
+        """补录一次之后，项目写入增量更新汇总，查询不再遍历项目。"""
+        from lewis_ai_system.creative import metrics
+        from lewis_ai_system.creative.repository import InMemoryCreativeProjectRepository
+
+        monkeypatch.setattr(metrics, "tenant_metrics", monitoring_service.metrics)
+        repository = InMemoryCreativeProjectRepository()
+        project = CreativeProject(id="p1", tenant_id="acme", title="P1", brief="brief", cost_usd=2.0)
+        await repository.upsert(project)
+        await repository.upsert(CreativeProject(id="p2", tenant_id="acme", title="P2", brief="brief"))
+
+        with patch("lewis_ai_system.creative.monitoring.creative_repository", repository):
+            repository.list_for_tenant = AsyncMock(wraps=repository.list_for_tenant)
+            assert (await monitoring_service.get_consistency_stats("acme"))["total_projects"] == 2
+
+            project.overall_consistency_score = 0.95
+            project.mark_state("completed")
+            await repository.upsert(project)
+            await repository.upsert(project)  # 重复写入不重复计数
+
+            stats = await monitoring_service.get_consistency_stats("acme")
+            metrics_ = await monitoring_service.get_performance_metrics("acme")
+            trends = await monitoring_service.get_consistency_trends("acme", days=1)
+
+        assert repository.list_for_tenant.await_count == 1  # 只有第一次查询时补录
+        assert stats["total_projects"] == 2 and stats["projects_with_consistency_score"] == 1
+        assert stats["average_consistency_score"] == pytest.approx(0.95)
+        assert stats["score_ranges"]["excellent"] == 1
+        assert metrics_["completion_rate"] == 0.5 and metrics_["cost_efficiency"] == 0.5
+        assert [(t["total_projects"], t["scored_projects"]) for t in trends["trends"]] == [(2, 1)]
+
+    @pytest.mark.asyncio
+    async def test_redis_updates_for_many_projects_share_one_pipeline(self, monkeypatch):
+        """多个项目的汇总脚本调用通过一个管道一次发送。"""
+        from lewis_ai_system.creative.metrics import TenantMetrics
+
+        class FakePipeline:
+            def __init__(self):
+                self.queued = []
+                self.executed = 0
+
+            async def execute(self):
+                self.executed += 1
+                return [1] * len(self.queued)
+
+        class FakeClient:
+            def __init__(self):
+                self.pipelines = []
+                self.direct_calls = 0
+
+            def pipeline(self, transaction=True):
+                pipe = FakePipeline()
+                self.pipelines.append(pipe)
+                return pipe
+
+            def register_script(self, script):
+                async def call(keys, args, client=None):
+                    if client is None:
+                        self.direct_calls += 1
+                    else:
+                        client.queued.append((keys, args))
+
+                return call
+
+        client = FakeClient()
+        metrics = TenantMetrics()
+
+        async def redis_client():
+            return client
+
+        monkeypatch.setattr(metrics, "_redis_client", redis_client)
+        projects = [CreativeProject(id=f"p{i}", tenant_id="acme", title="P", brief="brief") for i in range(5)]
+        await metrics.record(projects)
+
+        assert client.direct_calls == 0
+        assert len(client.pipelines) == 1
+        assert client.pipelines[0].executed == 1
+        assert [args[0] for _, args in client.pipelines[0].queued] == [f"p{i}" for i in range(5)]
+
+    def test_local_aggregates_evict_whole_tenants_when_full(self):
+        """进程内贡献超出上限时淘汰最久未用的整个租户，留下的租户汇总不受影响。"""
+        from lewis_ai_system.creative.metrics import LocalTenantMetrics, TRACKED_FIELD
+
+        local = LocalTenantMetrics(max_projects=3)
+        contribution = json.dumps({"totals": {"projects": 1}, "daily": {}})
+        local.apply("old", "o1", contribution)
+        local.mark_tracked("old")
+        local.apply("new", "n1", contribution)
+        local.apply("new", "n2", contribution)
+        local.apply("new", "n3", contribution)
+
+        assert len(local) == 3
+        assert local.totals("old") == {}  # 需要重新补录
+        assert local.totals("new") == {"projects": 3}
+
+        local.apply("new", "n4", contribution)  # 当前租户自身不被淘汰
+        assert local.totals("new") == {"projects": 4}
+        local.mark_tracked("new")
+        assert local.totals("new")[TRACKED_FIELD] == 1
+
+
+    @pytest.mark.asyncio
+    async def test_database_repository_aggregates_in_sql(self, monitoring_service, tmp_path, monkeypatch):
+        """数据库存储库用 SQL 分组查询得到与 Python 路径相同的统计。"""
+        from lewis_ai_system import database
+        from lewis_ai_system.config import settings
+        from lewis_ai_system.creative import repository as repository_module
+
+        manager = database.DatabaseManager()
+        manager.initialize(f"sqlite+aiosqlite:///{tmp_path / 'analytics.db'}")
+        await manager.create_tables()
+        monkeypatch.setattr(repository_module, "db_manager", manager)
+        monkeypatch.setattr(settings, "database_url", "sqlite+aiosqlite://")
+
+        projects = [
+            CreativeProject(
+                id=f"p{i}", tenant_id="acme", title=f"P{i}", brief="brief",
+                consistency_level=("low", "medium", "high")[i % 3],
+                overall_consistency_score=(None, 0.95, 0.75, 0.55, 0.3)[i % 5],
+                state=("completed", "failed", "render_pending")[i % 3],
+                cost_usd=float(i),
+            )
+            for i in range(12)
+        ]
+        sql_repo = repository_module.DatabaseCreativeProjectRepository()
+        python_repo = repository_module.InMemoryCreativeProjectRepository()
+        try:
+            await sql_repo.upsert_many(projects)
+            await python_repo.upsert_many(projects)
+            await sql_repo.upsert(CreativeProject(id="other", tenant_id="other", title="O", brief="b"))
+
+            sql_totals = await sql_repo.summarize_tenant("acme")
+            sql_daily = await sql_repo.summarize_daily("acme", projects[0].created_at.date())
+            with patch("lewis_ai_system.creative.monitoring.creative_repository", sql_repo):
+                stats = await monitoring_service.get_consistency_stats("acme")
+                trends = await monitoring_service.get_consistency_trends("acme", days=1)
+        finally:
+            await manager.close()
+
+        timing = {"processing_seconds", "long_running"}
+        python_totals = await python_repo.summarize_tenant("acme")
+        assert {k: v for k, v in sql_totals.items() if k not in timing} == pytest.approx(
+            {k: v for k, v in python_totals.items() if k not in timing}
+        )
+        python_daily = await python_repo.summarize_daily("acme", projects[0].created_at.date())
+        assert sql_daily.keys() == python_daily.keys()
+        assert all(sql_daily[day] == pytest.approx(python_daily[day]) for day in sql_daily)
+        assert stats["total_projects"] == 12 and stats["score_ranges"]["excellent"] == 3
+        assert trends["trends"][-1]["scored_projects"] == 9
+
+
+    @pytest.mark.asyncio
+    async def test_db_loaded_project_state_changes_update_totals(self, monitoring_service, tmp_path, monkeypatch):
+        """数据库读出的项目（naive 时间）推进状态后（aware 时间），汇总仍随之更新。"""
+        from lewis_ai_system import database
+        from lewis_ai_system.config import settings
+        from lewis_ai_system.creative import metrics
+        from lewis_ai_system.creative import repository as repository_module
+        from lewis_ai_system.creative.models import CreativeProjectState
+
+        manager = database.DatabaseManager()
+        manager.initialize(f"sqlite+aiosqlite:///{tmp_path / 'state.db'}")
+        await manager.create_tables()
+        monkeypatch.setattr(repository_module, "db_manager", manager)
+        monkeypatch.setattr(settings, "database_url", "sqlite+aiosqlite://")
+        monkeypatch.setattr(metrics, "tenant_metrics", monitoring_service.metrics)
+        repo = repository_module.DatabaseCreativeProjectRepository()
+        try:
+            await repo.upsert(CreativeProject(id="p1", tenant_id="acme", title="P1", brief="brief"))
+            await monitoring_service.metrics.backfill("acme", [])
+            before = await monitoring_service.metrics.totals("acme")
+
+            project = await repo.get("p1")
+            assert project.created_at.tzinfo is None
+            project.overall_consistency_score = 0.95
+            project.mark_state(CreativeProjectState.COMPLETED)
+            await repo.upsert(project)
+            after = await monitoring_service.metrics.totals("acme")
+        finally:
+            await manager.close()
+
+        assert before["projects"] == 1 and "completed" not in before
+        assert after["projects"] == 1 and after["completed"] == 1
+        assert after["scored"] == 1 and after["processing_seconds"] >= 0
+
 class TestIntegration:
     """集成测试。"""
 
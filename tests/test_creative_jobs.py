@@ -0,0 +1,402 @@
+"""Tests for creative stages and per-shot fan-out running as worker jobs."""
+
+import asyncio
+
+import pytest
+
+from lewis_ai_system.config import settings
+from lewis_ai_system.creative import jobs
+from lewis_ai_system.creative.models import (
+    CreativeBatchCreateRequest,
+    CreativeProjectCreateRequest,
+    CreativeProjectState,
+    StoryboardPanel,
+)
+from lewis_ai_system.creative.repository import InMemoryCreativeProjectRepository
+from lewis_ai_system.creative.workflow import CreativeOrchestrator
+from lewis_ai_system.storage import ArtifactStorage
+from lewis_ai_system import task_queue as task_queue_module
+from lewis_ai_system.task_queue import worker_functions, worker_settings
+
+
+class RedisStore:
+    """Synchronous implementations of the Redis commands the creative jobs use."""
+
+    def __init__(self):
+        self.data: dict[str, object] = {}
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        table = self.data.setdefault(key, {})
+        table.update(mapping or {field: value})
+
+    def hsetnx(self, key, field, value):
+        table = self.data.setdefault(key, {})
+        if field in table:
+            return 0
+        table[field] = value
+        return 1
+
+    def hincrby(self, key, field, amount):
+        table = self.data.setdefault(key, {})
+        table[field] = int(table.get(field, 0)) + amount
+
+    def hlen(self, key):
+        return len(self.data.get(key, {}))
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def hmget(self, key, *fields):
+        return [self.data.get(key, {}).get(field) for field in fields]
+
+    def rpush(self, key, *values):
+        self.data.setdefault(key, []).extend(values)
+
+    def lpop(self, key):
+        items = self.data.get(key) or []
+        return items.pop(0) if items else None
+
+    def lrange(self, key, start, end):
+        return list(self.data.get(key, []))
+
+    def llen(self, key):
+        return len(self.data.get(key, []))
+
+    def xadd(self, key, fields, maxlen=None, approximate=True):
+        self.data.setdefault(key, []).append(fields)
+
+    def expire(self, key, seconds):
+        pass
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+
+class FakeRedis:
+    """Async facade over :class:`RedisStore` with a MULTI-style pipeline."""
+
+    def __init__(self):
+        self.store = RedisStore()
+
+    def __getattr__(self, name):
+        command = getattr(self.store, name)
+
+        async def call(*args, **kwargs):
+            return command(*args, **kwargs)
+
+        return call
+
+    def register_script(self, script):
+        """Python mirror of :data:`jobs.FINISH_BATCH_ITEM_SCRIPT` (runs atomically like the Lua)."""
+        assert script == jobs.FINISH_BATCH_ITEM_SCRIPT
+        store = self.store
+
+        async def call(keys, args):
+            batch, results, pending, handoff = keys
+            project_id, outcome, counter, _ttl = args
+            first = store.hsetnx(results, project_id, outcome)
+            if first:
+                store.hincrby(batch, counter, 1)
+                next_project = store.lpop(pending)
+                if next_project is not None:
+                    store.hset(handoff, project_id, next_project)
+            else:
+                next_project = store.data.get(handoff, {}).get(project_id)
+            return [*store.hmget(batch, "completed", "failed", "total", "tenant_id"), next_project, first]
+
+        return call
+
+    def pipeline(self, transaction=True):
+        store = self.store
+
+        class Pipeline:
+            def __init__(self):
+                self.commands = []
+
+            def __getattr__(self, name):
+                def queue(*args, **kwargs):
+                    self.commands.append((getattr(store, name), args, kwargs))
+
+                return queue
+
+            async def execute(self):
+                return [command(*args, **kwargs) for command, args, kwargs in self.commands]
+
+        return Pipeline()
+
+
+class FakeVideoProvider:
+    name = "fake"
+
+    async def generate_video(self, prompt, **kwargs):
+        if "scene 2" in prompt:
+            raise RuntimeError("provider timeout")
+        return {"status": "completed", "video_url": f"https://cdn/{len(prompt)}.mp4"}
+
+
+@pytest.fixture
+def orchestrator(tmp_path, monkeypatch):
+    orchestrator = CreativeOrchestrator(
+        repository=InMemoryCreativeProjectRepository(),
+        storage=ArtifactStorage(tmp_path),
+    )
+    orchestrator._video_provider_factory = lambda name: FakeVideoProvider()
+    monkeypatch.setattr(jobs.workflow, "creative_orchestrator", orchestrator)
+    monkeypatch.setattr(settings, "redis_enabled", True)
+    monkeypatch.setattr(settings, "redis_url", "redis://unused")
+    return orchestrator
+
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    calls = []
+
+    async def enqueue(function, *args, queue, tenant_id=None, **kwargs):
+        calls.append((function, args, queue))
+        return f"{function}:{len(calls)}"
+
+    monkeypatch.setattr(jobs.task_queue, "enqueue", enqueue)
+    return calls
+
+
+def test_named_queue_workers_serve_creative_jobs():
+    names = {function.__name__ for function in worker_functions()}
+    assert {"generate_video_task", "creative_stage_task", "creative_shot_task"} <= names
+
+
+@pytest.mark.asyncio
+async def test_worker_startup_runs_jobs_against_the_shared_database(orchestrator, enqueued, tmp_path, monkeypatch):
+    """worker 进程自己的内存存储库是空的；启动钩子切换到数据库后能读到 API 创建的项目。"""
+    from lewis_ai_system import database
+    from lewis_ai_system.creative import repository as repository_module
+
+    monkeypatch.setattr(settings, "database_url", f"sqlite+aiosqlite:///{tmp_path / 'shared.db'}")
+    monkeypatch.setattr(database.db_manager, "engine", None)
+    monkeypatch.setattr(database.db_manager, "session_factory", None)
+    monkeypatch.setattr(repository_module, "creative_repository", repository_module.creative_repository)
+    monkeypatch.setattr(task_queue_module, "_worker_resources", None)
+    assert worker_settings("interactive")["on_startup"] is task_queue_module.worker_startup
+
+    try:
+        await task_queue_module.worker_startup({})
+        # API 进程：独立的数据库存储库实例
+        api = CreativeOrchestrator(
+            repository=repository_module.DatabaseCreativeProjectRepository(), storage=orchestrator.storage
+        )
+        request = CreativeProjectCreateRequest(title="Lighthouse", brief="A keeper finds a bottle.")
+        project, _ = await jobs.create_project(request, api)
+
+        worker = jobs.workflow.creative_orchestrator
+        assert worker is not orchestrator and worker.repository is not api.repository
+        result = await jobs.creative_stage_task({}, *enqueued[0][1])
+        assert result["state"] == CreativeProjectState.SCRIPT_REVIEW.value
+        assert (await api.repository.get(project.id)).script
+    finally:
+        await database.db_manager.close()
+
+
+@pytest.mark.asyncio
+async def test_project_creation_returns_before_brief_and_script(orchestrator, enqueued):
+    request = CreativeProjectCreateRequest(title="Lighthouse", brief="A keeper finds a bottle.")
+    project, task_id = await jobs.create_project(request, orchestrator)
+
+    assert project.state == CreativeProjectState.BRIEF_PENDING and task_id == "creative_stage_task:1"
+    function, args, queue = enqueued[0]
+    assert queue == jobs.STAGE_QUEUE and args[1] == ["brief_pending", "script_pending"]
+
+    result = await jobs.creative_stage_task({}, *args)
+    assert result["state"] == CreativeProjectState.SCRIPT_REVIEW.value
+    project = await orchestrator.repository.get(project.id)
+    assert project.summary and project.script
+
+    # 等待人工审核时不提交任务；过期的阶段任务直接跳过
+    assert (await jobs.advance(project.id, orchestrator))[1] is None
+    assert (await jobs.creative_stage_task({}, *args))["state"] == CreativeProjectState.SCRIPT_REVIEW.value
+
+
+@pytest.mark.asyncio
+async def test_shots_fan_out_and_last_shot_joins(orchestrator, enqueued):
+    request = CreativeProjectCreateRequest(title="Lighthouse", brief="A keeper finds a bottle.")
+    project = await orchestrator.repository.create(request)
+    project.storyboard = [
+        StoryboardPanel(scene_number=n, description=f"beat {n}", duration_seconds=4) for n in (1, 2, 3)
+    ]
+    project.mark_state(CreativeProjectState.STORYBOARD_READY)
+    redis = FakeRedis()
+
+    _, task_id = await jobs.advance(project.id, orchestrator)
+    stage_result = await jobs.creative_stage_task({"redis": redis}, *enqueued[0][1])
+
+    shot_calls = enqueued[1:]
+    assert task_id and len(stage_result["shot_jobs"]) == 3
+    assert [(call[0], call[1][1], call[2]) for call in shot_calls] == [
+        ("creative_shot_task", n, jobs.SHOT_QUEUE) for n in (1, 2, 3)
+    ]
+
+    results = [await jobs.creative_shot_task({"redis": redis}, *shot_calls[i][1]) for i in (2, 0, 1)]
+    assert [r["joined"] for r in results] == [False, False, True]
+    # 重试的镜头任务不会再次汇总
+    assert (await jobs.creative_shot_task({"redis": redis}, *shot_calls[0][1]))["joined"] is False
+
+    project = await orchestrator.repository.get(project.id)
+    assert project.state == CreativeProjectState.RENDER_PENDING
+    assert [shot.scene_number for shot in project.shots] == [1, 2, 3]
+    assert [shot.status for shot in project.shots] == ["completed", "failed", "completed"]
+    assert project.shots[1].error_message == "provider timeout"
+
+
+@pytest.mark.asyncio
+async def test_rerun_stage_job_keeps_shots_already_finished(orchestrator, enqueued):
+    request = CreativeProjectCreateRequest(title="Lighthouse", brief="A keeper finds a bottle.")
+    project = await orchestrator.repository.create(request)
+    project.storyboard = [
+        StoryboardPanel(scene_number=n, description=f"beat {n}", duration_seconds=4) for n in (1, 2, 3)
+    ]
+    project.mark_state(CreativeProjectState.STORYBOARD_READY)
+    redis = FakeRedis()
+
+    await jobs.advance(project.id, orchestrator)
+    stage_args = enqueued[0][1]
+    await jobs.creative_stage_task({"redis": redis}, *stage_args)
+    first_shots = enqueued[1:]
+    assert (await jobs.creative_shot_task({"redis": redis}, *first_shots[0][1]))["joined"] is False
+
+    # worker 重启后阶段任务重跑；分镜 1 的任务 ID 相同，被去重而不会再执行
+    await jobs.creative_stage_task({"redis": redis}, *stage_args)
+    rerun_shots = enqueued[len(first_shots) + 1:]
+    assert [call[1] for call in rerun_shots] == [call[1] for call in first_shots]
+    results = [await jobs.creative_shot_task({"redis": redis}, *call[1]) for call in rerun_shots[1:]]
+
+    assert [r["joined"] for r in results] == [False, True]
+    project = await orchestrator.repository.get(project.id)
+    assert project.state == CreativeProjectState.RENDER_PENDING
+    assert [shot.scene_number for shot in project.shots] == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_batch_runs_in_a_bounded_window_and_reports_results(orchestrator, enqueued, monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(jobs.task_queue, "pool", redis)
+    briefs = [CreativeProjectCreateRequest(title=f"Spot {i}", brief=f"Campaign brief {i}") for i in range(5)]
+    request = CreativeBatchCreateRequest(tenant_id="acme", projects=briefs, max_concurrency=2)
+
+    batch = await jobs.submit_batch(request, orchestrator)
+
+    assert (batch.total, batch.running, batch.pending, batch.progress) == (5, 2, 3, 0.0)
+    assert all(p.tenant_id == "acme" for p in await orchestrator.repository.list_for_tenant("acme"))
+    assert [call[0] for call in enqueued] == ["creative_batch_item_task"] * 2
+
+    # 每完成一个项目才提交下一个，直到全部完成
+    done = 0
+    while done < len(enqueued):
+        _, args, queue = enqueued[done]
+        assert queue == jobs.BATCH_QUEUE
+        await jobs.creative_batch_item_task({"redis": redis}, *args)
+        done += 1
+        assert len(enqueued) - done <= 2
+
+    batch = await jobs.batch_status(batch.batch_id)
+    assert (batch.completed, batch.failed, batch.running, batch.pending, batch.progress) == (5, 0, 0, 0, 1.0)
+    assert set(batch.results) == set(batch.project_ids)
+    assert {result["state"] for result in batch.results.values()} == {"script_review"}
+
+    events = redis.store.data[f"task:progress:{batch.batch_id}"]
+    assert [event["stage"] for event in events] == ["submitted"] + ["rendering"] * 4 + ["completed"]
+
+    # 重试的任务不重复计数
+    await jobs.creative_batch_item_task({"redis": redis}, *enqueued[0][1])
+    assert (await jobs.batch_status(batch.batch_id)).completed == 5
+
+
+@pytest.fixture
+async def serial_batch(orchestrator, enqueued, monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(jobs.task_queue, "pool", redis)
+    briefs = [CreativeProjectCreateRequest(title=f"Spot {i}", brief=f"Campaign brief {i}") for i in range(3)]
+    batch = await jobs.submit_batch(CreativeBatchCreateRequest(projects=briefs, max_concurrency=1), orchestrator)
+    return redis, batch
+
+
+@pytest.mark.asyncio
+async def test_batch_retry_resubmits_next_project_after_crash(serial_batch, enqueued, monkeypatch):
+    redis, batch = serial_batch
+    submit = jobs._submit_batch_item
+
+    async def crash(*args):
+        raise ConnectionError("worker lost redis")
+
+    monkeypatch.setattr(jobs, "_submit_batch_item", crash)
+    with pytest.raises(ConnectionError):
+        await jobs.creative_batch_item_task({"redis": redis}, *enqueued[0][1])
+    assert len(enqueued) == 1
+
+    # ARQ 重跑同一任务：结果已记录，不重复计数，但补交记下的下一个项目
+    monkeypatch.setattr(jobs, "_submit_batch_item", submit)
+    await jobs.creative_batch_item_task({"redis": redis}, *enqueued[0][1])
+
+    status = await jobs.batch_status(batch.batch_id)
+    assert (status.completed, status.pending, status.running) == (1, 1, 1)
+    assert enqueued[1][1] == (batch.batch_id, batch.project_ids[1])
+
+
+@pytest.mark.asyncio
+async def test_batch_item_timeout_is_recorded_and_batch_continues(serial_batch, enqueued, monkeypatch):
+    redis, batch = serial_batch
+
+    async def hang(*args):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(jobs, "_BATCH_ITEM_TIMEOUT_SECONDS", 0.01)
+    monkeypatch.setattr(jobs, "_run_stages", hang)
+    result = await jobs.creative_batch_item_task({"redis": redis}, *enqueued[0][1])
+
+    assert result["status"] == "failed"
+    status = await jobs.batch_status(batch.batch_id)
+    assert (status.failed, status.pending) == (1, 1)
+    assert len(enqueued) == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_item_cancelled_on_final_try_is_recorded(serial_batch, enqueued, monkeypatch):
+    redis, batch = serial_batch
+    started = asyncio.Event()
+
+    async def hang(*args):
+        started.set()
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(jobs, "_run_stages", hang)
+
+    async def cancel_on_try(job_try):
+        task = asyncio.create_task(
+            jobs.creative_batch_item_task({"redis": redis, "job_try": job_try}, *enqueued[0][1])
+        )
+        await started.wait()
+        started.clear()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    # 还会重跑的尝试不记录结果
+    await cancel_on_try(1)
+    assert (await jobs.batch_status(batch.batch_id)).failed == 0
+
+    await cancel_on_try(jobs.WorkerSettings.max_tries)
+    status = await jobs.batch_status(batch.batch_id)
+    assert (status.failed, status.pending) == (1, 1)
+    assert len(enqueued) == 2
+
+
+@pytest.mark.asyncio
+async def test_batch_rejects_oversized_submissions(orchestrator, monkeypatch):
+    monkeypatch.setattr(settings, "creative_batch_max_size", 1)
+    briefs = [CreativeProjectCreateRequest(title="Spot", brief="brief")] * 2
+    with pytest.raises(ValueError):
+        await jobs.submit_batch(CreativeBatchCreateRequest(projects=briefs), orchestrator)
@@ -0,0 +1,155 @@
+"""Tests for embedding providers, the embedding cache and the background encoder."""
+
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import numpy as np
+import pytest
+
+from lewis_ai_system import embeddings
+from lewis_ai_system.embeddings import (
+    EmbeddingQueue,
+    EmbeddingService,
+    HashingEmbeddingProvider,
+    OpenAIEmbeddingProvider,
+)
+
+
+class CountingProvider:
+    name = "counting"
+    dimension = 2
+    max_batch_size = 2
+
+    def __init__(self) -> None:
+        self.batches: list[list[str]] = []
+
+    async def embed_batch(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+@pytest.mark.asyncio
+async def test_hashing_embeddings_reflect_shared_vocabulary():
+    provider = HashingEmbeddingProvider(dimension=256)
+    a, b, c = np.array(
+        await provider.embed_batch(
+            ["render the product video in 4k", "product video render at 4k", "查询明天北京的天气"]
+        )
+    )
+
+    assert a.shape == (256,)
+    assert np.isclose(np.linalg.norm(a), 1.0)
+    assert a @ b > 0.6
+    assert abs(a @ c) < 0.2
+
+
+@pytest.mark.asyncio
+async def test_service_caches_by_text_and_batches_misses():
+    provider = CountingProvider()
+    service = EmbeddingService(provider, cache_size=10)
+
+    first = await service.embed(["a", "bb", "a", "ccc"])
+    second = await service.embed(["bb", "dddd"])
+
+    assert first[0] == first[2] == [1.0, 1.0]
+    assert second[0] == [2.0, 1.0]
+    assert provider.batches == [["a", "bb"], ["ccc"], ["dddd"]]
+    assert service.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_queue_coalesces_submissions_into_one_batch():
+    provider = CountingProvider()
+    provider.max_batch_size = 10
+    queue = EmbeddingQueue(EmbeddingService(provider), batch_size=10, flush_interval_seconds=0.05)
+    received: dict[str, list[float]] = {}
+
+    def collect(text):
+        async def callback(vector):
+            received[text] = vector
+
+        return callback
+
+    for text in ["x", "yy", "zzz"]:
+        assert queue.submit(text, collect(text))
+    await queue.drain()
+    await queue.close()
+
+    assert received == {"x": [1.0, 1.0], "yy": [2.0, 1.0], "zzz": [3.0, 1.0]}
+    assert provider.batches == [["x", "yy", "zzz"]]
+
+
+@pytest.mark.asyncio
+async def test_openai_provider_posts_batch_and_orders_by_index(monkeypatch):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(
+            200,
+            json={"data": [{"index": 1, "embedding": [0.0, 1.0]}, {"index": 0, "embedding": [1.0, 0.0]}]},
+        )
+
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(
+        embeddings.httpx,
+        "AsyncClient",
+        lambda **kwargs: real_client(transport=httpx.MockTransport(handler), **kwargs),
+    )
+    provider = OpenAIEmbeddingProvider(api_key="sk-test", dimension=2, base_url="http://embeddings.local/v1")
+
+    vectors = await provider.embed_batch(["first", "second"])
+
+    assert vectors == [[1.0, 0.0], [0.0, 1.0]]
+    assert requests[0].url.path == "/v1/embeddings"
+    assert requests[0].headers["Authorization"] == "Bearer sk-test"
+
+
+@pytest.mark.asyncio
+async def test_openai_provider_reuses_one_client_until_closed(monkeypatch):
+    created = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"data": [{"index": 0, "embedding": [1.0, 0.0]}]})
+
+    real_client = httpx.AsyncClient
+
+    def make_client(**kwargs):
+        client = real_client(transport=httpx.MockTransport(handler), **kwargs)
+        created.append(client)
+        return client
+
+    monkeypatch.setattr(embeddings.httpx, "AsyncClient", make_client)
+    provider = OpenAIEmbeddingProvider(api_key="sk-test", dimension=2, base_url="http://embeddings.local/v1")
+
+    await provider.embed_batch(["first"])
+    await provider.embed_batch(["second"])
+    assert len(created) == 1
+
+    await provider.aclose()
+    assert created[0].is_closed
+    await provider.embed_batch(["third"])
+    assert len(created) == 2
+    await provider.aclose()
+
+
+@pytest.mark.asyncio
+async def test_orchestrator_stores_memory_in_background():
+    from lewis_ai_system.general.models import GeneralSessionCreateRequest
+    from lewis_ai_system.general.repository import InMemoryGeneralSessionRepository
+    from lewis_ai_system.general.session import GeneralModeOrchestrator
+
+    orchestrator = GeneralModeOrchestrator(repository=InMemoryGeneralSessionRepository())
+    session = await orchestrator.create_session(GeneralSessionCreateRequest(goal="summarise the launch plan"))
+
+    with patch("lewis_ai_system.agents.agent_pool.general.react_loop", AsyncMock(return_value="done")):
+        with patch("lewis_ai_system.vector_db.vector_db.store_conversation_memories", AsyncMock()) as mock_store:
+            await orchestrator.run_iteration(session.id)
+            await orchestrator.flush_background_writes()
+    await embeddings.shutdown_embedding_queue()
+
+    mock_store.assert_awaited_once()
+    [(session_id, snippet, embedding, metadata)] = mock_store.await_args.args[0]
+    assert session_id == session.id
+    assert "Assistant: done" in snippet
+    assert len(embedding) == embeddings.get_embedding_service().dimension
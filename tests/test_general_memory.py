@@ -30,10 +30,215 @@ async def test_general_session_records_memory_and_compresses_history():
     orchestrator.tool_runtime = dummy_runtime
 
     with patch("lewis_ai_system.agents.agent_pool.general.react_loop", AsyncMock(return_value="done")):
-        with patch("lewis_ai_system.vector_db.vector_db.store_conversation_memory", AsyncMock()) as mock_store:
+        with patch("lewis_ai_system.vector_db.vector_db.store_conversation_memories", AsyncMock()) as mock_store:
             with patch("lewis_ai_system.agents.agent_pool.formatter.summarize", AsyncMock(return_value="summary")):
                 updated = await orchestrator.run_iteration(session.id)
+                # 记忆写入和历史压缩在后台完成
+                await orchestrator.flush_background_writes()
+                updated = await repo.get(session.id)
 
     assert updated.state == GeneralSessionState.COMPLETED
     assert any(msg.startswith("[历史摘要]") for msg in updated.messages)
     mock_store.assert_called_once()
+
+
+async def _seed_memory(session_id: str, tenant_id: str, text: str) -> None:
+    from lewis_ai_system.embeddings import get_embedding_service
+    from lewis_ai_system.vector_db import vector_db
+
+    embedding = await get_embedding_service().embed_one(text)
+    await vector_db.store_conversation_memory(session_id, text, embedding, {"tenant_id": tenant_id})
+
+
+@pytest.fixture
+def memory_store(monkeypatch):
+    from lewis_ai_system.vector_db import InMemoryVectorDB, vector_db
+
+    monkeypatch.setattr(vector_db, "provider", InMemoryVectorDB(index_type="flat"))
+    return vector_db
+
+
+@pytest.mark.asyncio
+async def test_context_query_includes_deduplicated_tenant_memories(memory_store):
+    orchestrator = GeneralModeOrchestrator(repository=InMemoryGeneralSessionRepository())
+    session = await orchestrator.create_session(
+        GeneralSessionCreateRequest(goal="what budget did we set for the launch video", tenant_id="acme")
+    )
+    session.messages += ["User: what budget did we set for the launch video"]
+    await _seed_memory("old-1", "acme", "User: launch video budget\nAssistant: the launch video budget is $500")
+    await _seed_memory("old-2", "acme", "User: launch video budget\nAssistant: the launch video budget is $500")
+    await _seed_memory("other", "globex", "Assistant: the launch video budget is $9000")
+
+    query = await orchestrator._build_context_query(session)
+
+    assert "Relevant memories" in query
+    assert query.count("the launch video budget is $500") == 1
+    assert "$9000" not in query
+
+
+@pytest.mark.asyncio
+async def test_memory_retrieval_respects_token_budget(memory_store):
+    orchestrator = GeneralModeOrchestrator(
+        repository=InMemoryGeneralSessionRepository(), memory_token_budget=12, memory_min_score=0.0
+    )
+    session = await orchestrator.create_session(GeneralSessionCreateRequest(goal="storyboard style", tenant_id="acme"))
+    await _seed_memory("s1", "acme", "Assistant: storyboard style is watercolor")
+    await _seed_memory("s2", "acme", "Assistant: storyboard style notes " + "very long detail " * 20)
+
+    memories = await orchestrator._retrieve_memories(session, set())
+
+    assert memories == ["Assistant: storyboard style is watercolor"]
+
+
+@pytest.mark.asyncio
+async def test_slow_vector_store_is_skipped(monkeypatch):
+    import asyncio
+
+    from lewis_ai_system.vector_db import vector_db
+
+    async def slow_search(*args, **kwargs):
+        await asyncio.sleep(5)
+        return [("Assistant: never used", 1.0, {})]
+
+    monkeypatch.setattr(vector_db, "search_memories", slow_search)
+    orchestrator = GeneralModeOrchestrator(
+        repository=InMemoryGeneralSessionRepository(), memory_timeout_seconds=0.05
+    )
+    session = await orchestrator.create_session(GeneralSessionCreateRequest(goal="hello"))
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    query = await orchestrator._build_context_query(session)
+
+    assert query == "hello"
+    assert loop.time() - started < 1
+
+
+def test_memory_timeout_follows_embedding_provider(monkeypatch):
+    from lewis_ai_system import embeddings
+    from lewis_ai_system.config import settings
+
+    orchestrator = GeneralModeOrchestrator(repository=InMemoryGeneralSessionRepository())
+    monkeypatch.setattr(settings, "memory_retrieval_timeout_seconds", None)
+
+    monkeypatch.setattr(
+        embeddings, "_embedding_service", embeddings.EmbeddingService(embeddings.HashingEmbeddingProvider(8))
+    )
+    assert orchestrator._memory_timeout() == 0.3
+
+    remote = embeddings.OpenAIEmbeddingProvider(api_key="sk-test")
+    monkeypatch.setattr(embeddings, "_embedding_service", embeddings.EmbeddingService(remote))
+    assert orchestrator._memory_timeout() == remote.query_timeout_seconds > 1
+
+    monkeypatch.setattr(settings, "memory_retrieval_timeout_seconds", 5.0)
+    assert orchestrator._memory_timeout() == 5.0
+    assert GeneralModeOrchestrator(memory_timeout_seconds=0.05)._memory_timeout() == 0.05
+
+
+@pytest.mark.asyncio
+async def test_compression_runs_after_response_and_rebases_onto_new_messages():
+    import asyncio
+
+    repo = InMemoryGeneralSessionRepository()
+    orchestrator = GeneralModeOrchestrator(repository=repo, memory_window=2, compression_threshold=4)
+    session = await orchestrator.create_session(GeneralSessionCreateRequest(goal="test"))
+    session.messages = [f"msg-{i}" for i in range(6)]
+    await repo.upsert(session)
+
+    release = asyncio.Event()
+
+    async def slow_summary(text: str) -> str:
+        await release.wait()
+        return "summary"
+
+    with patch("lewis_ai_system.agents.agent_pool.general.react_loop", AsyncMock(return_value="done")), \
+            patch("lewis_ai_system.agents.agent_pool.formatter.summarize", slow_summary):
+        returned = await orchestrator.run_iteration(session.id)
+        # 响应返回时摘要尚未完成
+        assert not any(msg.startswith("[历史摘要]") for msg in returned.messages)
+        preserved = returned.messages[-2:]
+
+        # 摘要期间会话继续前进
+        current = await repo.get(session.id)
+        current.messages.append("User: follow-up")
+        await repo.upsert(current)
+
+        release.set()
+        await orchestrator.flush_background_writes()
+
+    updated = await repo.get(session.id)
+    assert updated.messages == ["[历史摘要]\nsummary", *preserved, "User: follow-up"]
+    assert orchestrator._get_write_behind().stats()["compression_rebases"] == 1
+
+
+@pytest.mark.asyncio
+async def test_iteration_does_not_overwrite_compression_saved_meanwhile():
+    from lewis_ai_system.general.repository import SessionVersionConflict
+
+    repo = InMemoryGeneralSessionRepository()
+    orchestrator = GeneralModeOrchestrator(repository=repo)
+    session = await orchestrator.create_session(GeneralSessionCreateRequest(goal="test"))
+    session.messages = [f"msg-{i}" for i in range(6)]
+    await repo.upsert(session)
+
+    async def react_loop(*args, **kwargs):
+        # 本轮执行期间，后台压缩写入了新版本
+        current = await repo.get(session.id)
+        compressed = current.model_copy(update={"messages": ["[历史摘要]\nsummary", *current.messages[4:]]})
+        assert await repo.compare_and_set(compressed, current.version)
+        return "done"
+
+    with patch("lewis_ai_system.agents.agent_pool.general.react_loop", react_loop):
+        returned = await orchestrator.run_iteration(session.id, prompt_text="next")
+
+    stored = await repo.get(session.id)
+    assert stored.messages == ["[历史摘要]\nsummary", "msg-4", "msg-5", "User: next", "Assistant: done"]
+    assert returned.version == stored.version
+
+    stale = stored.model_copy(update={"version": stored.version - 1})
+    with pytest.raises(SessionVersionConflict):
+        await repo.upsert(stale)
+
+
+@pytest.mark.asyncio
+async def test_compression_is_dropped_when_summarised_prefix_changed():
+    from lewis_ai_system.general.write_behind import SessionWriteBehind
+
+    repo = InMemoryGeneralSessionRepository()
+    session = await repo.create(GeneralSessionCreateRequest(goal="test"))
+    session.messages = [f"msg-{i}" for i in range(6)]
+    await repo.upsert(session)
+
+    async def summarize(text: str) -> str:
+        current = await repo.get(session.id)
+        replaced = current.model_copy(update={"messages": ["[历史摘要]\nother", "msg-5"]})
+        await repo.upsert(replaced)
+        return "stale summary"
+
+    pipeline = SessionWriteBehind(repo, summarize, memory_window=2)
+    pipeline.schedule_compression(session)
+    await pipeline.drain()
+
+    assert (await repo.get(session.id)).messages == ["[历史摘要]\nother", "msg-5"]
+    assert pipeline.stats()["compressions"] == 0
+
+
+@pytest.mark.asyncio
+async def test_memory_writes_are_batched_across_sessions(memory_store):
+    orchestrator = GeneralModeOrchestrator(repository=InMemoryGeneralSessionRepository())
+    provider = memory_store.provider
+    inserts: list[int] = []
+    original_insert = provider.insert
+
+    async def counting_insert(collection, vectors):
+        inserts.append(len(vectors))
+        return await original_insert(collection, vectors)
+
+    provider.insert = counting_insert
+    for goal in ["alpha", "beta", "gamma"]:
+        session = await orchestrator.create_session(GeneralSessionCreateRequest(goal=goal))
+        await orchestrator._maybe_store_memory(session)
+    await orchestrator.flush_background_writes()
+
+    assert inserts == [3]
+    assert len(provider.collections[memory_store.memory_collection]) == 3
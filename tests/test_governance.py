@@ -20,6 +20,32 @@ async def test_governance_cost_summary_tracks_budget():
     assert summary.remaining_budget == pytest.approx(17.5)
 
 
+@pytest.mark.asyncio
+async def test_list_cost_summaries_resolves_budgets_in_one_lookup():
+    from unittest.mock import AsyncMock
+
+    from lewis_ai_system.creative.models import CreativeProject
+    from lewis_ai_system.creative.repository import InMemoryCreativeProjectRepository
+
+    cost_monitor.reset()
+    repo = InMemoryCreativeProjectRepository()
+    await repo.upsert_many(
+        [CreativeProject(id=f"proj-{i}", tenant_id="t", title="P", brief="b", budget_limit_usd=40.0) for i in range(3)]
+    )
+    repo.get = AsyncMock(wraps=repo.get)
+    repo.get_many = AsyncMock(wraps=repo.get_many)
+    service = GovernanceAnalyticsService(creative_repo=repo)
+    for i in range(3):
+        cost_monitor.record_snapshot(f"proj-{i}", "project", 10.0, phase="script")
+    cost_monitor.record_snapshot("proj-budgeted", "project", 5.0, phase="script", budget_limit=8.0)
+
+    summaries = {s.entity_id: s for s in await service.list_cost_summaries(GovernanceEntityType.PROJECT)}
+
+    assert summaries["proj-0"].remaining_budget == pytest.approx(30.0)
+    assert summaries["proj-budgeted"].budget_limit == pytest.approx(8.0)
+    assert repo.get_many.await_count == 1 and repo.get.await_count == 0
+
+
 @pytest.mark.asyncio
 async def test_governance_audit_events_and_usage():
     telemetry_store.reset()
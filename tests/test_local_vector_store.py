@@ -0,0 +1,238 @@
+"""Tests for the persistent memory-mapped local vector store."""
+
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from lewis_ai_system import vector_db as vector_db_module
+from lewis_ai_system.local_vector_store import PersistentVectorDB
+from lewis_ai_system.vector_db import EmbeddingVector
+
+
+def make_vector(vid: str, vector, expires_in: timedelta | None = None, **metadata) -> EmbeddingVector:
+    now = datetime.now(timezone.utc)
+    return EmbeddingVector(
+        id=vid,
+        vector=list(vector),
+        metadata=metadata,
+        text=f"text {vid}",
+        created_at=now,
+        expires_at=now + expires_in if expires_in is not None else None,
+    )
+
+
+def open_store(path, **kwargs) -> PersistentVectorDB:
+    return PersistentVectorDB(path, index_type="flat", sync_writes=False, **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def quiet_maintenance(monkeypatch):
+    async def record(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(vector_db_module, "record_index_maintenance", record)
+
+
+@pytest.mark.asyncio
+async def test_reopen_restores_vectors_metadata_and_ranking(tmp_path):
+    rng = np.random.default_rng(3)
+    data = rng.normal(size=(200, 8)).astype(np.float32)
+    db = open_store(tmp_path)
+    await db.insert("c", [make_vector(f"v{i}", row, tenant_id=f"t{i % 2}") for i, row in enumerate(data)])
+    query = rng.normal(size=8).tolist()
+    before = await db.search("c", query, limit=5)
+    await db.close()
+
+    reopened = open_store(tmp_path)
+    after = await reopened.search("c", query, limit=5)
+
+    assert [(vec.id, round(score, 5)) for vec, score in after] == [(vec.id, round(score, 5)) for vec, score in before]
+    assert after[0][0].metadata["tenant_id"] in {"t0", "t1"}
+    assert after[0][0].text == f"text {after[0][0].id}"
+    assert len(reopened.collections["c"]) == 200
+    await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_deletes_and_upserts_survive_restart(tmp_path):
+    db = open_store(tmp_path)
+    await db.insert("c", [make_vector("a", [1, 0], user_id="u1"), make_vector("b", [0, 1], user_id="u1")])
+    await db.insert("c", [make_vector("a", [0, 1], user_id="u2")])
+    await db.delete("c", ["b"])
+    await db.close()
+
+    reopened = open_store(tmp_path)
+    store = reopened.collections["c"]
+    results = await reopened.search("c", [0, 1])
+
+    assert [vec.id for vec, _ in results] == ["a"]
+    assert results[0][0].metadata == {"user_id": "u2"}
+    assert len(store) == 1 and store.tombstones == 2
+    assert await reopened.search("c", [0, 1], filters={"user_id": "u1"}) == []
+    await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_filters_use_tags_and_fall_back_for_unindexed_values(tmp_path):
+    db = open_store(tmp_path)
+    await db.insert(
+        "c",
+        [
+            make_vector("a", [1, 0], user_id="u1", tags=["x"]),
+            make_vector("b", [1, 0.1], user_id="u2", tags=["x"]),
+            make_vector("c", [0, 1], user_id="u1", tags=["y"], archived=None),
+        ],
+    )
+
+    assert [v.id for v, _ in await db.search("c", [1, 0], filters={"user_id": "u1"})] == ["a", "c"]
+    assert [v.id for v, _ in await db.search("c", [1, 0], filters={"user_id": "u1", "tags": ["y"]})] == ["c"]
+    assert [v.id for v, _ in await db.search("c", [1, 0], filters={"archived": None})] == ["a", "b", "c"]
+    assert await db.search("c", [1, 0], filters={"user_id": "missing"}) == []
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_compaction_rewrites_generation_and_reopens(tmp_path):
+    db = open_store(tmp_path, compaction_min_rows=4, compaction_ratio=0.5)
+    await db.insert("c", [make_vector(f"v{i}", [1, i], group=str(i % 2)) for i in range(10)])
+    await db.delete("c", [f"v{i}" for i in range(6)])
+    store = db.collections["c"]
+    assert store.generation == 1 and store.tombstones == 0
+    await db.close()
+
+    files = sorted(path.name for path in tmp_path.glob("*.f32"))
+    assert len(files) == 1 and files[0].endswith(".1.f32")
+
+    reopened = open_store(tmp_path)
+    results = await reopened.search("c", [1, 9], limit=10, filters={"group": "1"})
+    assert [vec.id for vec, _ in results] == ["v9", "v7"]
+    await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_uncommitted_tail_and_missing_delete_log_are_recovered(tmp_path):
+    db = open_store(tmp_path)
+    await db.insert("c", [make_vector("a", [1, 0]), make_vector("b", [0, 1])])
+    await db.delete("c", ["b"])
+    store = db.collections["c"]
+    vector_path, deleted_path = store._vector_path(), store._deleted_path()
+    await db.close()
+
+    # 模拟崩溃：向量已追加但事务未提交，删除已提交但删除日志未写入
+    with vector_path.open("ab") as fh:
+        fh.write(np.ones(2, dtype=np.float32).tobytes())
+    deleted_path.unlink()
+
+    reopened = open_store(tmp_path)
+    store = reopened.collections["c"]
+    assert vector_path.stat().st_size == 2 * 2 * 4
+    assert len(store) == 1 and store.tombstones == 1
+    assert [vec.id for vec, _ in await reopened.search("c", [0, 1], limit=5)] == ["a"]
+    assert deleted_path.exists()
+    await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_cleanup_expired_uses_expiry_index(tmp_path):
+    db = open_store(tmp_path)
+    await db.insert(
+        "c",
+        [
+            make_vector("old", [1, 0], expires_in=timedelta(seconds=-1)),
+            make_vector("new", [1, 0], expires_in=timedelta(days=1)),
+            make_vector("forever", [0, 1]),
+        ],
+    )
+
+    assert await db.cleanup_expired("c") == 1
+    assert {vec.id for vec in db.collections["c"].vectors()} == {"new", "forever"}
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_ivf_index_is_retrained_after_restart(tmp_path):
+    rng = np.random.default_rng(5)
+    data = rng.normal(size=(400, 8)).astype(np.float32)
+    options = {"nlist": 8, "nprobe": 8, "min_train_size": 300}
+    db = PersistentVectorDB(tmp_path, index_type="ivf", index_options=options, sync_writes=False)
+    await db.insert("c", [make_vector(f"v{i}", row) for i, row in enumerate(data)])
+    await db.wait_for_maintenance()
+    assert db.collections["c"].index.ready
+    await db.close()
+
+    reopened = PersistentVectorDB(tmp_path, index_type="ivf", index_options=options, sync_writes=False)
+    assert not reopened.collections["c"].index.ready
+    exact = await reopened.search("c", data[0].tolist(), limit=1)
+    await reopened.wait_for_maintenance()
+
+    assert reopened.collections["c"].index.ready
+    assert [vec.id for vec, _ in exact] == ["v0"]
+    assert [vec.id for vec, _ in await reopened.search("c", data[0].tolist(), limit=1)] == ["v0"]
+    await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_quantization_is_rebuilt_after_restart(tmp_path):
+    rng = np.random.default_rng(8)
+    data = rng.normal(size=(300, 8)).astype(np.float32)
+    options = {"min_train_size": 200, "rerank_factor": 2}
+    db = PersistentVectorDB(
+        tmp_path, index_type="flat", quantization="int8", quantization_options=options, sync_writes=False
+    )
+    await db.insert("c", [make_vector(f"v{i}", row) for i, row in enumerate(data)])
+    await db.wait_for_maintenance()
+    assert db.collections["c"].quantizer.ready
+    await db.close()
+
+    reopened = PersistentVectorDB(
+        tmp_path, index_type="flat", quantization="int8", quantization_options=options, sync_writes=False
+    )
+    await reopened.search("c", data[0].tolist(), limit=1)
+    await reopened.wait_for_maintenance()
+
+    store = reopened.collections["c"]
+    assert store.quantizer.ready and store.quantizer.nbytes == data.size
+    assert isinstance(store.matrix_view(), np.memmap) and store.matrix_view().dtype == np.float32
+    assert [vec.id for vec, _ in await reopened.search("c", data[42].tolist(), limit=1)] == ["v42"]
+    await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_writes_and_searches_run_off_the_event_loop(tmp_path):
+    db = open_store(tmp_path)
+    await db.create_collection("c", 2)
+    store = db.collections["c"]
+    loop_thread = threading.get_ident()
+    threads: list[int] = []
+    original_sync = store._sync
+
+    def slow_sync(fh):
+        threads.append(threading.get_ident())
+        threading.Event().wait(0.2)
+        original_sync(fh)
+
+    store._sync = slow_sync
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    try:
+        inserts = [db.insert("c", [make_vector(f"v{i}", [1, i])]) for i in range(3)]
+        assert all(await asyncio.gather(*inserts))
+        results = await db.search("c", [1, 0], limit=5)
+    finally:
+        task.cancel()
+
+    assert len(results) == 3
+    assert threads and loop_thread not in threads
+    # 三次写入各自阻塞 0.2s，期间事件循环仍在调度其他任务
+    assert ticks >= 20
+    await db.close()
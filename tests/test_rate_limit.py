@@ -0,0 +1,151 @@
+"""Tests for the shared GCRA / sliding-window rate limiter."""
+
+import os
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from lewis_ai_system import auth, rate_limit
+from lewis_ai_system.config import settings
+from lewis_ai_system.rate_limit import LocalRateLimiter, RateLimiter, rate_limit_middleware
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_gcra_allows_burst_then_spaces_requests():
+    clock = FakeClock()
+    limiter = LocalRateLimiter("gcra", clock=clock)
+
+    results = [limiter.hit("u", 3, 60) for _ in range(4)]
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert [r.remaining for r in results[:3]] == [2, 1, 0]
+    assert results[3].retry_after == pytest.approx(20)
+
+    clock.now += 20
+    assert limiter.hit("u", 3, 60).allowed
+    assert not limiter.hit("u", 3, 60).allowed
+    assert limiter.hit("other", 3, 60).remaining == 2
+
+
+def test_sliding_window_weights_previous_window():
+    clock = FakeClock(0.0)
+    limiter = LocalRateLimiter("sliding_window", clock=clock)
+
+    assert all(limiter.hit("u", 4, 60).allowed for _ in range(4))
+    assert not limiter.hit("u", 4, 60).allowed
+
+    # 下一个窗口过了一半：上一窗口的 4 次按 50% 计入
+    clock.now = 90.0
+    assert [limiter.hit("u", 4, 60).allowed for _ in range(3)] == [True, True, False]
+
+    clock.now = 200.0
+    assert limiter.hit("u", 4, 60).remaining == 3
+
+
+def test_local_state_is_pruned_and_bounded():
+    clock = FakeClock()
+    limiter = LocalRateLimiter("gcra", max_keys=3, clock=clock)
+
+    for i in range(5):
+        limiter.hit(f"k{i}", 10, 1)
+    assert len(limiter) == 3
+
+    clock.now += 10
+    limiter.hit("fresh", 10, 1)
+    limiter.hit("fresh", 10, 1)
+    assert len(limiter) == 1
+
+
+class BrokenRedis:
+    def register_script(self, script):
+        async def call(keys, args):
+            raise ConnectionError("down")
+
+        return call
+
+
+@pytest.mark.asyncio
+async def test_redis_failure_falls_back_to_local_limiter():
+    limiter = RateLimiter("gcra", local=LocalRateLimiter("gcra", clock=FakeClock()))
+
+    async def client():
+        return BrokenRedis()
+
+    limiter._redis_client = client
+    results = [await limiter.hit("u", 2, 60) for _ in range(3)]
+
+    assert [r.allowed for r in results] == [True, True, False]
+
+
+@pytest.fixture
+def local_limiter(monkeypatch):
+    limiter = RateLimiter("gcra", local=LocalRateLimiter("gcra", clock=FakeClock()))
+
+    async def no_redis():
+        return None
+
+    limiter._redis_client = no_redis
+    monkeypatch.setattr(rate_limit, "rate_limiter", limiter)
+    monkeypatch.setattr(auth, "rate_limiter", limiter)
+    monkeypatch.setattr(settings, "rate_limit_enabled", True)
+    return limiter
+
+
+def test_middleware_limits_per_client(local_limiter, monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_middleware_per_minute", 2)
+    app = FastAPI()
+    app.middleware("http")(rate_limit_middleware)
+    app.get("/ping")(lambda: {"ok": True})
+    app.get("/health")(lambda: {"ok": True})
+    client = TestClient(app)
+
+    first, second, third = (client.get("/ping") for _ in range(3))
+    other = client.get("/ping", headers={"Authorization": "Bearer another-key"})
+
+    assert first.headers["X-RateLimit-Remaining"] == "1"
+    assert second.status_code == 200
+    assert third.status_code == 429 and third.headers["Retry-After"] == "30"
+    assert other.status_code == 200
+    assert client.get("/health").status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_check_rate_limit_dependency_uses_shared_limiter(local_limiter, monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_per_minute", 1)
+    user = {"user_id": "u1"}
+
+    assert await auth.check_rate_limit(user) is user
+    with pytest.raises(HTTPException) as excinfo:
+        await auth.check_rate_limit(user)
+    assert excinfo.value.status_code == 429
+    assert excinfo.value.headers["Retry-After"] == "60"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("algorithm", ["gcra", "sliding_window"])
+async def test_lua_scripts_against_redis_server(algorithm):
+    redis = pytest.importorskip("redis.asyncio")
+    client = redis.from_url(os.environ.get("REDIS_TEST_URL", "redis://localhost:6379/15"))
+    try:
+        await client.ping()
+    except Exception:
+        await client.aclose()
+        pytest.skip("redis-server not reachable")
+
+    limiter = RateLimiter(algorithm)
+    key = f"test:{algorithm}:{os.getpid()}"
+    try:
+        results = [await limiter._redis_hit(client, key, 3, 60, 1) for _ in range(4)]
+        assert [r.allowed for r in results] == [True, True, True, False]
+        assert [r.remaining for r in results] == [2, 1, 0, 0]
+        assert results[3].retry_after > 0
+    finally:
+        await client.delete(f"ratelimit:{algorithm}:{key}")
+        await client.aclose()
@@ -0,0 +1,381 @@
+"""Tests for cache batch APIs and pipelining."""
+
+import asyncio
+
+import pytest
+
+from lewis_ai_system.redis_cache import (
+    RATE_LIMIT_SCRIPT,
+    InMemoryCache,
+    InvalidatingRedisCache,
+    NearCache,
+    RedisCache,
+)
+
+
+class FakeRedis:
+    """In-process stand-in for ``redis.asyncio.Redis`` that counts round trips.
+
+    Like a client created with ``decode_responses=False``, values come back as bytes.
+    """
+
+    def __init__(self):
+        self.data: dict[str, bytes] = {}
+        self.ttls: dict[str, int] = {}
+        self.round_trips = 0
+        self.subscribers: dict[str, list[asyncio.Queue]] = {}
+
+    # 单条命令：同步实现供管道复用，异步包装计一次往返
+    def _set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value if isinstance(value, bytes) else str(value).encode()
+        if ex:
+            self.ttls[key] = ex
+        return True
+
+    def _setex(self, key, ttl, value):
+        return self._set(key, value, ex=ttl)
+
+    def _get(self, key):
+        return self.data.get(key)
+
+    def _mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def _mset(self, mapping):
+        for key, value in mapping.items():
+            self._set(key, value)
+        return True
+
+    def _delete(self, *keys):
+        return sum(1 for key in keys if self.data.pop(key, None) is not None)
+
+    def _incrby(self, key, amount=1):
+        self.data[key] = str(int(self.data.get(key, 0)) + amount).encode()
+        return int(self.data[key])
+
+    def _incr(self, key):
+        return self._incrby(key, 1)
+
+    def _expire(self, key, seconds):
+        if key not in self.data:
+            return False
+        self.ttls[key] = seconds
+        return True
+
+    def _ttl(self, key):
+        if key not in self.data:
+            return -2
+        return self.ttls.get(key, -1)
+
+    def _publish(self, channel, message):
+        subscribers = self.subscribers.get(channel, [])
+        for queue in subscribers:
+            queue.put_nowait({"type": "message", "channel": channel, "data": message})
+        return len(subscribers)
+
+    def _close(self):
+        return None
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self)
+
+    def register_script(self, script):
+        """Python mirror of :data:`RATE_LIMIT_SCRIPT` (runs atomically like the Lua)."""
+        assert script == RATE_LIMIT_SCRIPT
+
+        async def call(keys, args):
+            self.round_trips += 1
+            results = []
+            for i, key in enumerate(keys):
+                limit, window = int(args[2 * i]), int(args[2 * i + 1])
+                count = int(self.data.get(key, 0))
+                if count < limit:
+                    count = self._incr(key)
+                    if count == 1:
+                        self.ttls[key] = window
+                    results.append(limit - count)
+                else:
+                    results.append(-1)
+            return results
+
+        return call
+
+    def __getattr__(self, name):
+        command = object.__getattribute__(self, f"_{name}")
+
+        async def call(*args, **kwargs):
+            self.round_trips += 1
+            return command(*args, **kwargs)
+
+        return call
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePubSub:
+    def __init__(self, redis):
+        self.redis = redis
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.channels: list[str] = []
+
+    async def subscribe(self, channel):
+        self.channels.append(channel)
+        self.redis.subscribers.setdefault(channel, []).append(self.queue)
+
+    async def listen(self):
+        while True:
+            yield await self.queue.get()
+
+    async def unsubscribe(self, channel):
+        self.redis.subscribers[channel].remove(self.queue)
+
+    async def aclose(self):
+        pass
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.queued = []
+
+    def __getattr__(self, name):
+        command = getattr(self.redis, f"_{name}")
+
+        def queue(*args, **kwargs):
+            self.queued.append((command, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self, raise_on_error=True):
+        self.redis.round_trips += 1
+        return [command(*args, **kwargs) for command, args, kwargs in self.queued]
+
+
+@pytest.fixture
+def redis_cache():
+    cache = RedisCache("redis://unused")
+    cache.client = FakeRedis()
+    return cache
+
+
+@pytest.mark.asyncio
+async def test_redis_batch_operations_use_one_round_trip_each(redis_cache):
+    client = redis_cache.client
+
+    assert await redis_cache.mset({"a": {"n": 1}, "b": [2]}, ttl_seconds=30)
+    assert await redis_cache.mget(["a", "missing", "b"]) == [{"n": 1}, None, [2]]
+    assert await redis_cache.delete_many(["a", "b", "missing"]) == 2
+
+    assert client.round_trips == 3
+    assert client.ttls == {"a": 30, "b": 30}
+
+
+@pytest.mark.asyncio
+async def test_redis_pipeline_decodes_results(redis_cache):
+    async with redis_cache.pipeline() as pipe:
+        pipe.set("k", {"v": True}, ttl_seconds=10)
+        pipe.get("k")
+        pipe.increment("hits", 3)
+        pipe.expire("hits", 60)
+        pipe.delete("k")
+
+    assert pipe.results == [True, {"v": True}, 3, True, True]
+    assert redis_cache.client.round_trips == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_rate_limit_is_one_atomic_round_trip(redis_cache):
+    results = [await redis_cache.rate_limit_check("user1", 2, 60) for _ in range(3)]
+
+    assert results == [(True, 1), (True, 0), (False, 0)]
+    assert redis_cache.client.round_trips == 3
+    assert redis_cache.client.ttls["ratelimit:user1"] == 60
+
+    both = await redis_cache.rate_limit_check_many([("user2", 5, 60), ("tenant:t1", 1, 60)])
+    assert both == [(True, 4), (True, 0)]
+    assert redis_cache.client.round_trips == 4
+
+
+@pytest.mark.asyncio
+async def test_rejected_rate_limit_checks_are_not_counted(redis_cache):
+    for _ in range(2):
+        await redis_cache.rate_limit_check("retrier", 2, 60)
+    rejected = [await redis_cache.rate_limit_check("retrier", 2, 60) for _ in range(5)]
+
+    assert rejected == [(False, 0)] * 5
+    assert redis_cache.client.data["ratelimit:retrier"] == b"2"
+
+    # 窗口过期后重试的客户端立刻恢复，而不是被累积的拒绝次数继续锁住
+    del redis_cache.client.data["ratelimit:retrier"]
+    assert await redis_cache.rate_limit_check("retrier", 2, 60) == (True, 1)
+
+
+@pytest.mark.asyncio
+async def test_tool_and_session_helpers_batch_keys(redis_cache):
+    await redis_cache.cache_tool_results("search", {"h1": ["r1"], "h2": ["r2"]})
+    await redis_cache.store_session_states({"s1": {"step": 1}, "s2": {"step": 2}})
+    redis_cache.client.round_trips = 0
+
+    assert await redis_cache.get_cached_tool_results("search", ["h1", "h3", "h2"]) == {"h1": ["r1"], "h2": ["r2"]}
+    assert await redis_cache.get_session_states(["s1", "s2", "s3"]) == {"s1": {"step": 1}, "s2": {"step": 2}}
+    assert await redis_cache.delete_session_states(["s1", "s2"]) == 2
+    assert redis_cache.client.round_trips == 3
+    assert await redis_cache.get_session_state("s1") is None
+
+
+@pytest.mark.asyncio
+async def test_in_memory_cache_matches_batch_semantics():
+    cache = InMemoryCache()
+
+    assert await cache.mset({"a": 1, "b": 2}, ttl_seconds=60)
+    assert await cache.mget(["a", "x", "b"]) == [1, None, 2]
+    async with cache.pipeline() as pipe:
+        pipe.increment("a", 2).get("a").delete("b").get("b")
+    assert pipe.results == [3, 3, True, None]
+    assert await cache.delete_many(["a", "b"]) == 1
+
+    await cache.store_session_states({"s1": {"x": 1}})
+    assert await cache.get_session_states(["s1", "s2"]) == {"s1": {"x": 1}}
+    assert await cache.rate_limit_check_many([("u", 1, 60), ("u", 1, 60)]) == [(True, 0), (False, 0)]
+
+
+async def make_near_cache(client: FakeRedis, **kwargs) -> NearCache:
+    remote = RedisCache("redis://unused")
+    remote.client = client
+    near = NearCache(remote, ttl_seconds=60, **kwargs)
+    near.start_listener()
+    await asyncio.sleep(0)  # 让监听任务完成订阅
+    return near
+
+
+@pytest.mark.asyncio
+async def test_near_cache_serves_hot_reads_from_process_memory():
+    client = FakeRedis()
+    near = await make_near_cache(client)
+    await near.set("policy:t1", {"max_jobs": 5})
+    client.round_trips = 0
+
+    first = await near.get("policy:t1")
+    first["max_jobs"] = 99  # 调用方修改返回值不能影响缓存
+    second = await near.get("policy:t1")
+    assert await near.mget(["policy:t1", "policy:missing"]) == [{"max_jobs": 5}, None]
+
+    assert second == {"max_jobs": 5}
+    assert client.round_trips == 2  # 首次读取和缺失 key 各一次
+    stats = near.stats()
+    assert stats["l1_hits"] == 2 and stats["l1_misses"] == 2
+    assert stats["l2_hits"] == 1 and stats["l2_misses"] == 1
+    assert stats["l1_hit_ratio"] == 0.5
+    await near.close()
+
+
+@pytest.mark.asyncio
+async def test_near_cache_respects_remote_ttl_and_lru_bound():
+    client = FakeRedis()
+    near = await make_near_cache(client, max_entries=2)
+    await near.set("short", 1, ttl_seconds=0)  # 远端立即过期的 key 不进入 L1
+    await near.mset({"a": 1, "b": 2, "c": 3})
+
+    await near.mget(["a", "b", "c"])
+
+    assert list(near._entries) == ["b", "c"]
+    assert near.stats()["evictions"] == 1
+    await near.close()
+
+
+@pytest.mark.asyncio
+async def test_writes_invalidate_other_replicas_over_pubsub():
+    client = FakeRedis()
+    replica_a = await make_near_cache(client)
+    replica_b = await make_near_cache(client)
+    await replica_a.set("schema:search", {"v": 1})
+    assert await replica_b.get("schema:search") == {"v": 1}
+
+    await replica_a.set("schema:search", {"v": 2})
+    await asyncio.sleep(0)
+
+    assert await replica_b.get("schema:search") == {"v": 2}
+    assert replica_b.stats()["invalidations_received"] == 2
+    assert replica_a.stats()["invalidations_received"] == 0
+    await replica_a.close()
+    await replica_b.close()
+
+
+@pytest.mark.asyncio
+async def test_replica_without_near_cache_still_invalidates_pipelined_writes():
+    client = FakeRedis()
+    near = await make_near_cache(client)
+    plain = InvalidatingRedisCache("redis://unused")
+    plain.client = client
+    await plain.set("schema:search", {"v": 1})
+    assert await near.get("schema:search") == {"v": 1}
+
+    async with plain.pipeline() as pipe:
+        pipe.set("schema:search", {"v": 2}).get("schema:search")
+    await asyncio.sleep(0)
+
+    assert await near.get("schema:search") == {"v": 2}
+    assert near.stats()["invalidations_received"] == 2
+    await near.close()
+
+
+@pytest.mark.asyncio
+async def test_counter_and_lock_writes_are_not_announced():
+    client = FakeRedis()
+    near = await make_near_cache(client)
+    plain = InvalidatingRedisCache("redis://unused")
+    plain.client = client
+    await plain.increment("ratelimit:u")
+    await plain.expire("ratelimit:u", 60)
+    async with plain.pipeline() as pipe:
+        pipe.set("lock:job", "owner").expire("lock:job", 5)
+    await near.set("metrics:creative:t1", 1)
+    assert await near.get("metrics:creative:t1") == 1
+    await asyncio.sleep(0)
+
+    assert near.stats()["invalidations_received"] == 0
+    assert near.stats()["invalidations_sent"] == 0
+    assert "metrics:creative:t1" not in near._entries
+
+    # 需要广播时 PUBLISH 和写命令同一次往返发出
+    client.round_trips = 0
+    async with plain.pipeline() as pipe:
+        pipe.set("schema:search", {"v": 2}).increment("ratelimit:u")
+    await asyncio.sleep(0)
+
+    assert client.round_trips == 1
+    assert pipe.results == [True, 2]
+    assert near.stats()["invalidations_received"] == 1
+    await near.close()
+
+
+@pytest.mark.asyncio
+async def test_fill_racing_an_invalidation_is_not_cached():
+    client = FakeRedis()
+    near = await make_near_cache(client)
+    await near.set("k", "old")
+    original = near.remote._execute_pipeline
+
+    async def slow_pipeline(commands):
+        results = await original(commands)
+        near.handle_invalidation('{"origin": "other", "keys": ["k"]}')
+        return results
+
+    near.remote._execute_pipeline = slow_pipeline
+    assert await near.get("k") == "old"
+    assert "k" not in near._entries
+    await near.close()
+
+
+@pytest.mark.asyncio
+async def test_redis_values_are_versioned_and_legacy_json_still_reads(redis_cache):
+    redis_cache.client.data["old"] = b'{"legacy": true}'
+    await redis_cache.store_session_state("s1", {"step": 2})
+
+    assert redis_cache.client.data["session:s1"][0] == 0x01
+    assert await redis_cache.get_session_state("s1") == {"step": 2}
+    assert await redis_cache.mget(["old"]) == [{"legacy": True}]
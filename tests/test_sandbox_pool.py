@@ -0,0 +1,349 @@
+"""Tests for the warm sandbox pool using the local subprocess backend."""
+
+import asyncio
+
+import pytest
+
+from lewis_ai_system.config import TenantSandboxPolicy
+from lewis_ai_system.sandbox_pool import (
+    LocalProcessInstance,
+    LocalSubprocessBackend,
+    SandboxPool,
+    SandboxPoolError,
+    SandboxQuotaExceeded,
+    resolve_sandbox_backend_name,
+)
+from lewis_ai_system.tenant_policy import TenantPolicyManager
+
+
+@pytest.fixture
+async def pool(tmp_path):
+    pool = SandboxPool(
+        LocalSubprocessBackend(working_directory=tmp_path),
+        min_size=1,
+        max_size=2,
+        max_executions_per_instance=3,
+        health_check_interval_seconds=0,
+        policy_manager=TenantPolicyManager(),
+    )
+    await pool.start()
+    yield pool
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_prewarms_and_executes(pool):
+    assert pool.stats()["idle"] == 1
+
+    result = await pool.execute("print('hello')\n1 + 1")
+
+    assert result["error"] is None
+    assert result["stdout"] == "hello\n"
+    assert result["result"] == "2"
+    assert pool.stats()["created"] == 1
+
+
+@pytest.mark.asyncio
+async def test_pool_isolates_state_between_executions(pool):
+    await pool.execute("secret = 42")
+    result = await pool.execute("secret")
+
+    assert result["error"] == "NameError"
+    assert "NameError" in result["stderr"]
+
+
+class ReusableInstance:
+    def __init__(self):
+        self.instance_id = f"fake-{id(self)}"
+        self.executions = 0
+        self.alive = True
+
+    async def run_code(self, code, *, timeout_seconds, limits=None, reset=True):
+        return {"stdout": "", "stderr": "", "result": None, "results": [], "error": None}
+
+    async def health_check(self):
+        return self.alive
+
+    async def close(self):
+        self.alive = False
+
+    async def close_detached(self):
+        self.alive = False
+
+
+class ReusableBackend:
+    name = "fake"
+    reuse_instances = True
+
+    async def create_instance(self):
+        return ReusableInstance()
+
+
+@pytest.mark.asyncio
+async def test_pool_recycles_after_max_executions():
+    pool = SandboxPool(
+        ReusableBackend(),
+        min_size=1,
+        max_size=2,
+        max_executions_per_instance=3,
+        health_check_interval_seconds=0,
+        policy_manager=TenantPolicyManager(),
+    )
+    await pool.start()
+    for _ in range(3):
+        await pool.execute("1")
+
+    stats = pool.stats()
+    assert stats["recycled"] == 1
+    assert stats["executions"] == 3
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_lease_skips_idle_instances_that_died():
+    pool = SandboxPool(
+        ReusableBackend(),
+        min_size=1,
+        max_size=1,
+        health_check_interval_seconds=0,
+        policy_manager=TenantPolicyManager(),
+    )
+    await pool.start()
+    dead = pool._idle[0]
+    dead.alive = False
+
+    async with pool.lease() as instance:
+        assert instance is not dead and instance.alive
+
+    assert pool.stats()["unhealthy"] == 1
+    assert pool.stats()["size"] == 1
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_get_sandbox_pool_closes_the_pools_it_replaces(monkeypatch):
+    from lewis_ai_system import sandbox_pool as sandbox_pool_module
+    from lewis_ai_system.config import settings
+
+    monkeypatch.setattr(sandbox_pool_module, "build_sandbox_backend", lambda name: ReusableBackend())
+    monkeypatch.setattr(sandbox_pool_module, "_sandbox_pools", {})
+    monkeypatch.setattr(sandbox_pool_module, "_default_backend_name", None)
+    monkeypatch.setattr(settings.sandbox, "backend", "local")
+    monkeypatch.setattr(settings.sandbox, "pool_min_size", 1)
+
+    def start_on_other_loop():
+        async def start():
+            return await sandbox_pool_module.get_sandbox_pool()
+
+        return asyncio.run(start())
+
+    # 旧池绑定的事件循环已经结束（例如上一个测试的循环）
+    stale = await asyncio.to_thread(start_on_other_loop)
+    stale_instances = list(stale._idle)
+    current = await sandbox_pool_module.get_sandbox_pool()
+
+    assert current is not stale
+    assert stale._closed and not any(instance.alive for instance in stale_instances)
+
+    # 配置的后端切换后，旧的默认池同样被关闭
+    current_instances = list(current._idle)
+    monkeypatch.setattr(settings, "e2b_api_key", "e2b-key")
+    monkeypatch.setattr(settings.sandbox, "backend", "e2b")
+    replacement = await sandbox_pool_module.get_sandbox_pool()
+
+    assert current._closed and not any(instance.alive for instance in current_instances)
+    assert list(sandbox_pool_module._sandbox_pools.values()) == [replacement]
+    await sandbox_pool_module.shutdown_sandbox_pool()
+
+
+@pytest.mark.asyncio
+async def test_local_workers_are_never_reused_across_tenants(pool):
+    tenant_a = (
+        "import builtins, sys, json\n"
+        "builtins.print = lambda *a, **k: None\n"
+        "sys.modules['json'] = type(sys)('json')\n"
+        "leak = 'tenant-a'"
+    )
+    await pool.execute(tenant_a, tenant_id="a")
+    result = await pool.execute(
+        "import json\nprint('clean')\njson.dumps({'ok': True})", tenant_id="b"
+    )
+
+    assert result["error"] is None
+    assert result["stdout"] == "clean\n"
+    assert result["result"] == "'{\"ok\": true}'"
+    assert pool.stats()["retired"] == 2
+
+
+@pytest.mark.asyncio
+async def test_pool_replaces_dead_instances(pool):
+    instance = pool._idle[0]
+    first_id = instance.instance_id
+    await instance.close()
+
+    dropped = await pool.check_health()
+
+    assert dropped == 1
+    async with pool.lease() as instance:
+        assert instance.instance_id != first_id
+
+
+@pytest.mark.asyncio
+async def test_pool_timeout_kills_worker(pool):
+    result = await pool.execute("while True: pass", timeout_seconds=0.5)
+
+    assert result["error"] == "TimeoutError"
+    assert pool.stats()["unhealthy"] == 1
+    assert (await pool.execute("3"))["result"] == "3"
+
+
+@pytest.mark.asyncio
+async def test_pool_bounds_concurrency(pool):
+    results = await asyncio.gather(*(pool.execute("import time; time.sleep(0.2)") for _ in range(3)))
+
+    assert all(r["error"] is None for r in results)
+    assert pool.stats()["size"] <= 2
+    assert pool.stats()["waits"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_pool_enforces_tenant_quota(pool):
+    pool.policy_manager.set_policy(TenantSandboxPolicy(tenant_id="t1", daily_execution_limit=1))
+
+    await pool.execute("1", tenant_id="t1")
+    with pytest.raises(SandboxQuotaExceeded):
+        await pool.execute("1", tenant_id="t1")
+
+
+@pytest.mark.asyncio
+async def test_local_worker_enforces_memory_limit(pool):
+    pool.policy_manager.set_policy(TenantSandboxPolicy(tenant_id="small", max_memory_mb=128))
+
+    result = await pool.execute("blob = bytearray(512 * 1024 * 1024)", tenant_id="small")
+
+    assert result["error"] == "MemoryError"
+    # 软限制在执行结束后恢复，worker 仍可继续使用
+    assert (await pool.execute("len(bytearray(1024))"))["result"] == "1024"
+
+
+@pytest.mark.asyncio
+async def test_local_worker_enforces_file_size_limit(pool):
+    pool.policy_manager.set_policy(TenantSandboxPolicy(tenant_id="files", max_file_size_mb=1))
+
+    code = "with open('big.bin', 'wb') as fh:\n    fh.write(b'x' * (2 * 1024 * 1024))"
+    result = await pool.execute(code, tenant_id="files")
+
+    assert result["error"] == "OSError"
+
+
+@pytest.mark.asyncio
+async def test_local_worker_enforces_cpu_limit(pool):
+    pool.policy_manager.set_policy(TenantSandboxPolicy(tenant_id="cpu", max_cpu_seconds=1))
+
+    result = await pool.execute("while True: pass", tenant_id="cpu", timeout_seconds=10)
+
+    assert result["error"] == "CPUTimeLimitExceeded"
+
+
+@pytest.mark.asyncio
+async def test_local_sandbox_provider_runs_code(monkeypatch):
+    from lewis_ai_system.config import settings
+    from lewis_ai_system.providers import LocalSandboxProvider
+    from lewis_ai_system.sandbox_pool import shutdown_sandbox_pool
+
+    monkeypatch.setattr(settings.sandbox, "backend", "local")
+    try:
+        result = await LocalSandboxProvider().run_code("print('from provider')")
+    finally:
+        await shutdown_sandbox_pool()
+
+    assert result["error"] is None
+    assert result["stdout"] == "from provider\n"
+
+
+@pytest.mark.asyncio
+async def test_python_sandbox_tool_falls_back_to_local_pool(monkeypatch):
+    from lewis_ai_system.config import settings
+    from lewis_ai_system.sandbox_pool import shutdown_sandbox_pool
+    from lewis_ai_system.tooling import PythonSandboxTool, ToolExecutionError
+
+    monkeypatch.setattr(settings, "e2b_api_key", None)
+    monkeypatch.setattr(settings.sandbox, "backend", "local")
+    tool = PythonSandboxTool()
+    try:
+        result = await tool.run_async({"code": "sum([1, 2, 3])"})
+        with pytest.raises(ToolExecutionError):
+            await tool.run_async({"code": "1 / 0"})
+    finally:
+        await shutdown_sandbox_pool()
+
+    assert result.output["result"] == "6"
+
+
+@pytest.mark.asyncio
+async def test_pool_discards_worker_when_caller_is_cancelled(pool):
+    task = asyncio.create_task(pool.execute("import time; time.sleep(5); print('late')"))
+    await asyncio.sleep(0.3)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert pool.stats()["unhealthy"] == 1
+    result = await pool.execute("print('fresh')")
+    assert result["stdout"] == "fresh\n"
+
+
+@pytest.mark.asyncio
+async def test_local_worker_does_not_inherit_secrets(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENROUTER_API_KEY", "sk-secret")
+    instance = await LocalProcessInstance.spawn(tmp_path)
+    try:
+        result = await instance.run_code("import os\nprint(sorted(os.environ))", timeout_seconds=10)
+    finally:
+        await instance.close()
+
+    assert "OPENROUTER_API_KEY" not in result["stdout"]
+    assert "HOME" in result["stdout"]
+
+
+def test_auto_backend_requires_e2b_key_or_explicit_local(monkeypatch):
+    from lewis_ai_system.config import settings
+
+    monkeypatch.setattr(settings, "e2b_api_key", None)
+    monkeypatch.setattr(settings.sandbox, "backend", "auto")
+    with pytest.raises(SandboxPoolError):
+        resolve_sandbox_backend_name()
+
+    monkeypatch.setattr(settings.sandbox, "backend", "local")
+    assert resolve_sandbox_backend_name() == "local"
+    monkeypatch.setattr(settings, "e2b_api_key", "e2b-key")
+    assert resolve_sandbox_backend_name("auto") == "e2b"
+
+
+def test_python_sandbox_tool_sync_run_closes_its_temporary_pool(monkeypatch):
+    from lewis_ai_system import sandbox_pool as sandbox_pool_module
+    from lewis_ai_system.config import settings
+    from lewis_ai_system.tooling import PythonSandboxTool, ToolExecutionError
+
+    monkeypatch.setattr(settings, "e2b_api_key", None)
+    monkeypatch.setattr(settings.sandbox, "backend", "local")
+    tool = PythonSandboxTool()
+
+    assert tool.run({"code": "6 * 7"}).output["result"] == "42"
+    assert sandbox_pool_module._sandbox_pools == {}
+    # 代码自身的错误原样抛出，而不是被当作“已有事件循环”
+    with pytest.raises(ToolExecutionError, match="ZeroDivisionError"):
+        tool.run({"code": "1 / 0"})
+    assert sandbox_pool_module._sandbox_pools == {}
+
+
+@pytest.mark.asyncio
+async def test_python_sandbox_tool_sync_run_rejects_running_loop(monkeypatch):
+    from lewis_ai_system.config import settings
+    from lewis_ai_system.tooling import PythonSandboxTool, ToolExecutionError
+
+    monkeypatch.setattr(settings, "e2b_api_key", None)
+    monkeypatch.setattr(settings.sandbox, "backend", "local")
+
+    with pytest.raises(ToolExecutionError, match="run_async"):
+        PythonSandboxTool().run({"code": "1"})
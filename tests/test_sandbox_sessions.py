@@ -0,0 +1,163 @@
+"""Tests for session-bound stateful sandbox kernels."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from lewis_ai_system.sandbox_pool import E2BSandboxInstance, LocalSubprocessBackend, SandboxPool
+from lewis_ai_system.sandbox_sessions import SandboxSessionManager
+from lewis_ai_system.tenant_policy import TenantPolicyManager
+
+
+@pytest.fixture
+async def manager(tmp_path):
+    manager = SandboxSessionManager(
+        LocalSubprocessBackend(working_directory=tmp_path),
+        idle_ttl_seconds=60,
+        memory_cap_mb=0,
+        max_kernels=2,
+        sweep_interval_seconds=0,
+        policy_manager=TenantPolicyManager(),
+    )
+    yield manager
+    await manager.close()
+
+
+@pytest.mark.asyncio
+async def test_kernel_keeps_state_between_calls(manager):
+    await manager.execute("s1", "import math\nvalues = [1, 4, 9]")
+    result = await manager.execute("s1", "[math.sqrt(v) for v in values]")
+
+    assert result["error"] is None
+    assert result["result"] == "[1.0, 2.0, 3.0]"
+    assert manager.stats()["created"] == 1
+    assert manager.stats()["reused"] == 1
+
+
+@pytest.mark.asyncio
+async def test_kernels_are_isolated_per_session(manager):
+    await manager.execute("s1", "token = 'a'")
+    result = await manager.execute("s2", "token")
+
+    assert result["error"] == "NameError"
+
+
+@pytest.mark.asyncio
+async def test_release_and_lru_eviction(manager):
+    await manager.execute("s1", "x = 1")
+    await manager.execute("s2", "x = 2")
+    await manager.execute("s3", "x = 3")
+
+    assert not manager.has_kernel("s1")
+    assert await manager.release("s2") is True
+    assert await manager.release("s2") is False
+    assert manager.stats()["active"] == 1
+
+
+@pytest.mark.asyncio
+async def test_idle_kernels_are_swept(manager):
+    await manager.execute("s1", "x = 1")
+    manager.idle_ttl_seconds = 0
+
+    assert await manager.sweep_idle() == 1
+    assert (await manager.execute("s1", "x"))["error"] == "NameError"
+
+
+@pytest.mark.asyncio
+async def test_kernel_reset_when_over_memory_cap(manager):
+    manager.memory_cap_mb = 1
+
+    result = await manager.execute("s1", "x = 1")
+
+    assert result["kernel_reset"] is True
+    assert not manager.has_kernel("s1")
+    assert manager.stats()["memory_evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_kernels_start_from_warm_pool_without_inheriting_state(tmp_path):
+    backend = LocalSubprocessBackend(working_directory=tmp_path)
+    pool = SandboxPool(backend, min_size=1, max_size=2, health_check_interval_seconds=0)
+    await pool.start()
+    manager = SandboxSessionManager(
+        backend, pool=pool, memory_cap_mb=0, sweep_interval_seconds=0, policy_manager=TenantPolicyManager()
+    )
+    try:
+        await pool.execute("leak = 'other tenant'")
+        # 用过的 worker 已被回收，等待池在后台补充新的 worker
+        for _ in range(50):
+            if pool.stats()["idle"]:
+                break
+            await asyncio.sleep(0.05)
+        result = await manager.execute("s1", "leak")
+
+        assert result["error"] == "NameError"
+        assert manager.stats()["warm_starts"] == 1
+        assert pool.stats()["taken"] == 1
+        await asyncio.sleep(0.5)
+        assert pool.stats()["idle"] == 1
+    finally:
+        await manager.close()
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_skips_executing_kernels(manager):
+    await manager.execute("s1", "x = 1")
+    await manager.execute("s2", "x = 2")
+    busy = manager._kernels["s1"]
+
+    async with busy.lock:
+        await manager.execute("s3", "x = 3")
+
+    assert manager.has_kernel("s1")
+    assert not manager.has_kernel("s2")
+    assert busy.instance.alive
+
+
+@pytest.mark.asyncio
+async def test_e2b_kernel_reports_memory_usage():
+    calls: list[str] = []
+
+    class FakeSandbox:
+        async def create_code_context(self):
+            return "ctx"
+
+        async def run_code(self, code, context=None, timeout=None):
+            calls.append(code)
+            return SimpleNamespace(
+                logs=SimpleNamespace(stdout=[], stderr=[]), results=[SimpleNamespace(text="300.5")], error=None
+            )
+
+    instance = E2BSandboxInstance(FakeSandbox())
+    assert await instance.memory_usage_mb() is None
+
+    await instance.run_code("x = 1", timeout_seconds=5, reset=False)
+
+    assert await instance.memory_usage_mb() == 300.5
+    assert "/proc/self/statm" in calls[-1]
+
+
+@pytest.mark.asyncio
+async def test_orchestrator_releases_kernel_when_session_pauses(monkeypatch):
+    from lewis_ai_system.general import session as session_module
+    from lewis_ai_system.general.models import GeneralSessionCreateRequest, GeneralSessionState
+    from lewis_ai_system.general.repository import InMemoryGeneralSessionRepository
+
+    released: list[str] = []
+
+    async def fake_release(session_id: str) -> bool:
+        released.append(session_id)
+        return True
+
+    monkeypatch.setattr(session_module, "release_session_kernel", fake_release)
+    orchestrator = session_module.GeneralModeOrchestrator(repository=InMemoryGeneralSessionRepository())
+    session = await orchestrator.create_session(GeneralSessionCreateRequest(goal="analyse", max_iterations=1))
+    session.iteration = 1
+    await orchestrator.repository.upsert(session)
+
+    updated = await orchestrator.run_iteration(session.id)
+
+    assert updated.state == GeneralSessionState.PAUSED
+    assert released == [session.id]
@@ -0,0 +1,215 @@
+"""Tests for task progress events, non-blocking status and the SSE endpoint."""
+
+import asyncio
+import time
+
+import pytest
+from arq.jobs import serialize_result
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from lewis_ai_system import task_queue as task_queue_module
+from lewis_ai_system.config import settings
+from lewis_ai_system.routers.tasks import router as tasks_router
+from lewis_ai_system.task_progress import (
+    TaskStage,
+    bind_progress,
+    follow_progress,
+    latest_progress,
+    publish_progress,
+    report_progress,
+)
+from lewis_ai_system.task_queue import TaskQueue, TaskStatus, serialize_job_payload
+
+
+class FakeStreamRedis:
+    """Just enough of Redis streams (and GET/EXISTS) for the progress channel."""
+
+    def __init__(self):
+        self.streams: dict[str, list[tuple[bytes, dict[bytes, bytes]]]] = {}
+        self.keys: dict[str, bytes] = {}
+        self.expiries: dict[str, int] = {}
+        self._seq = 0
+
+    def xadd(self, key, fields, maxlen=None, approximate=True):
+        self._seq += 1
+        entry_id = f"{self._seq}-0".encode()
+        encoded = {k.encode(): str(v).encode() for k, v in fields.items()}
+        self.streams.setdefault(key, []).append((entry_id, encoded))
+        return entry_id
+
+    def expire(self, key, seconds):
+        self.expiries[key] = seconds
+        return True
+
+    def get(self, key):
+        return self.keys.get(key)
+
+    def exists(self, key):
+        return int(key in self.keys)
+
+    def _xrevrange(self, key, count=None):
+        return list(reversed(self.streams.get(key, [])))[:count]
+
+    def pipeline(self, transaction=True):
+        redis = self
+
+        class Pipeline:
+            def __init__(self):
+                self.commands = []
+
+            def __getattr__(self, name):
+                method = getattr(redis, "_xrevrange" if name == "xrevrange" else name)
+
+                def queue(*args, **kwargs):
+                    self.commands.append((method, args, kwargs))
+                    return self
+
+                return queue
+
+            async def execute(self):
+                return [method(*args, **kwargs) for method, args, kwargs in self.commands]
+
+        return Pipeline()
+
+    async def xrevrange(self, key, count=None):
+        return self._xrevrange(key, count)
+
+    async def xread(self, streams, count=None, block=None):
+        ((key, last_id),) = streams.items()
+        last = int(str(last_id).split("-")[0])
+        entries = [e for e in self.streams.get(key, []) if int(e[0].split(b"-")[0]) > last][:count]
+        if not entries:
+            await asyncio.sleep(0)
+            return []
+        return [[key.encode(), entries]]
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeStreamRedis()
+
+
+@pytest.fixture
+def queue(fake_redis):
+    queue = TaskQueue()
+    queue.pool = fake_redis
+    return queue
+
+
+@pytest.mark.asyncio
+async def test_report_progress_publishes_only_when_bound(fake_redis):
+    await report_progress(TaskStage.STARTED)
+    assert fake_redis.streams == {}
+
+    with bind_progress(fake_redis, "job1"):
+        await report_progress(TaskStage.RENDERING, 0.5, "halfway", provider="doubao")
+    event = await latest_progress(fake_redis, "job1")
+
+    assert event["stage"] == TaskStage.RENDERING and event["progress"] == 0.5
+    assert event["message"] == "halfway" and event["detail"] == {"provider": "doubao"}
+    assert fake_redis.expiries["task:progress:job1"] == settings.task_queue_job_expires_seconds
+
+
+@pytest.mark.asyncio
+async def test_status_is_read_from_latest_event_and_result(queue, fake_redis):
+    assert (await queue.get_task_status("missing"))["status"] == TaskStatus.CANCELLED
+
+    fake_redis.keys["arq:job:job1"] = b"job"
+    assert (await queue.get_task_status("job1"))["status"] == TaskStatus.PENDING
+
+    await publish_progress(fake_redis, "job1", TaskStage.RENDERING, 0.4)
+    running = await queue.get_task_status("job1")
+    assert (running["status"], running["stage"], running["progress"]) == (TaskStatus.RUNNING, "rendering", 0.4)
+
+    del fake_redis.keys["arq:job:job1"]
+    fake_redis.keys["arq:result:job1"] = serialize_result(
+        "generate_video_task", (), {}, 1, 0, True, {"video_url": "v.mp4"}, 0, 1, "ref", "q", "job1",
+        serializer=serialize_job_payload,
+    )
+    done = await queue.get_task_status("job1")
+    assert done["status"] == TaskStatus.COMPLETED and done["result"] == {"video_url": "v.mp4"}
+
+
+@pytest.mark.asyncio
+async def test_follow_progress_resumes_and_stops_at_terminal_stage(fake_redis):
+    for stage in (TaskStage.SUBMITTED, TaskStage.STARTED, TaskStage.COMPLETED):
+        await publish_progress(fake_redis, "job1", stage)
+
+    events = [event async for event in follow_progress(fake_redis, "job1")]
+    resumed = [event async for event in follow_progress(fake_redis, "job1", last_id=events[0]["id"])]
+
+    assert [e["stage"] for e in events] == ["submitted", "started", "completed"]
+    assert [e["stage"] for e in resumed] == ["started", "completed"]
+
+
+@pytest.mark.asyncio
+async def test_worker_reports_failure(fake_redis, monkeypatch):
+    ctx = {"redis": fake_redis, "job_id": "job1"}
+    with pytest.raises(ValueError):
+        await task_queue_module.generate_video_task(ctx)
+
+    stages = [fields[b"stage"] for _, fields in fake_redis.streams["task:progress:job1"]]
+    assert stages == [b"started", b"failed"]
+
+
+def test_sse_endpoint_streams_until_completion(fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "redis_enabled", True)
+    monkeypatch.setattr(settings, "redis_url", "redis://unused")
+    monkeypatch.setattr(task_queue_module.task_queue, "pool", fake_redis)
+    for stage in (TaskStage.SUBMITTED, TaskStage.RENDERING, TaskStage.COMPLETED):
+        fake_redis.xadd("task:progress:job1", {"stage": stage, "progress": "0.5", "ts": "1"})
+
+    app = FastAPI()
+    app.include_router(tasks_router, prefix="/tasks")
+    client = TestClient(app)
+    response = client.get("/tasks/job1/events", headers={"Last-Event-ID": "1-0"})
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.count("event: progress") == 2
+    assert "id: 3-0" in response.text and '"stage": "completed"' in response.text
+    assert client.get("/tasks/job1").json()["stage"] == "completed"
+    assert client.get("/tasks/unknown").status_code == 404
+
+
+def _sse_client(fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "redis_enabled", True)
+    monkeypatch.setattr(settings, "redis_url", "redis://unused")
+    monkeypatch.setattr(task_queue_module.task_queue, "pool", fake_redis)
+    app = FastAPI()
+    app.include_router(tasks_router, prefix="/tasks")
+    return TestClient(app)
+
+
+def test_sse_endpoint_rejects_unknown_tasks(fake_redis, monkeypatch):
+    client = _sse_client(fake_redis, monkeypatch)
+
+    assert client.get("/tasks/unknown/events").status_code == 404
+
+
+def test_sse_endpoint_ends_when_job_finished_without_terminal_event(fake_redis, monkeypatch):
+    client = _sse_client(fake_redis, monkeypatch)
+    fake_redis.xadd("task:progress:job1", {"stage": TaskStage.RENDERING, "progress": "0.5", "ts": "1"})
+    # 例如任务超时：ARQ 写入了失败结果，但任务没来得及发布 failed 事件
+    fake_redis.keys["arq:result:job1"] = serialize_result(
+        "generate_video_task", (), {}, 1, 0, False, TimeoutError("job timed out"), 0, 1, "ref", "q", "job1",
+        serializer=serialize_job_payload,
+    )
+
+    response = client.get("/tasks/job1/events")
+
+    assert response.text.count("event: progress") == 1
+    assert "event: status" in response.text and '"status": "failed"' in response.text
+
+
+def test_expired_task_is_not_found_and_stream_ends(fake_redis, monkeypatch):
+    client = _sse_client(fake_redis, monkeypatch)
+    stale = time.time() - task_queue_module.WorkerSettings.keep_result - 60
+    fake_redis.xadd("task:progress:job1", {"stage": TaskStage.RENDERING, "progress": "0.5", "ts": f"{stale}"})
+
+    assert client.get("/tasks/job1").status_code == 404
+    assert client.get("/tasks/job1/events").status_code == 404
+
+    # 没有任务的进度通道（如批次）只要仍在更新就不算过期
+    fake_redis.xadd("task:progress:batch1", {"stage": TaskStage.RENDERING, "progress": "0.5", "ts": f"{time.time()}"})
+    assert client.get("/tasks/batch1").json()["status"] == TaskStatus.RUNNING
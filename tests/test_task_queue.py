@@ -0,0 +1,291 @@
+"""Tests for named ARQ queues, tenant fair scheduling and queue metrics."""
+
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from arq.jobs import serialize_result
+
+from lewis_ai_system import task_queue as task_queue_module
+from lewis_ai_system.config import settings
+from lewis_ai_system.task_queue import (
+    FAIR_ENQUEUE_SCRIPT,
+    FAIR_RELEASE_SCRIPT,
+    TaskQueue,
+    _job_start_hook,
+    queue_key,
+    queue_max_jobs,
+    serialize_job_payload,
+)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self):
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakeArqPool:
+    """Records enqueue_job calls and keeps the hashes/lists the queue touches."""
+
+    def __init__(self, starts):
+        self.starts = list(starts)
+        self.script_calls = []
+        self.release_calls = []
+        self.enqueued = []
+        self.hashes: dict[str, dict] = {}
+        self.lists: dict[str, list] = {}
+        self.zsets: dict[str, int] = {}
+        self.keys: dict[str, bytes] = {}
+        self.streams: dict[str, list] = {}
+
+    def register_script(self, script):
+        if script == FAIR_RELEASE_SCRIPT:
+
+            async def release(keys, args):
+                self.release_calls.append((keys, args))
+                return 1
+
+            return release
+
+        async def call(keys, args):
+            self.script_calls.append((keys, args))
+            start = self.starts.pop(0)
+            return [start, f"{float(start) + 1000:.3f}", "", "", ""]
+
+        return call
+
+    async def enqueue_job(self, function, *args, **kwargs):
+        if "arq:job:" + kwargs["_job_id"] in self.keys:
+            return None
+        self.keys["arq:job:" + kwargs["_job_id"]] = b"job"
+        self.enqueued.append((function, args, kwargs))
+        self.zsets[kwargs["_queue_name"]] = self.zsets.get(kwargs["_queue_name"], 0) + 1
+        return type("Job", (), {"job_id": kwargs["_job_id"]})()
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    # 同步命令供 FakePipeline 调用
+    def hincrby(self, key, field, amount):
+        table = self.hashes.setdefault(key, {})
+        table[field] = table.get(field, 0) + amount
+        return table[field]
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+        return 1
+
+    def hdel(self, key, field):
+        return int(self.hashes.get(key, {}).pop(field, None) is not None)
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def lpush(self, key, value):
+        self.lists.setdefault(key, []).insert(0, value)
+        return len(self.lists[key])
+
+    def ltrim(self, key, start, end):
+        self.lists[key] = self.lists.get(key, [])[start : end + 1]
+        return True
+
+    def lrange(self, key, start, end):
+        return list(self.lists.get(key, []))
+
+    def xadd(self, key, fields, maxlen=None, approximate=True):
+        self.streams.setdefault(key, []).append(fields)
+        return f"{len(self.streams[key])}-0"
+
+    def expire(self, key, seconds):
+        return True
+
+    def zcard(self, key):
+        return self.zsets.get(key, 0)
+
+    def exists(self, key):
+        return int(key in self.keys)
+
+    def get(self, key):
+        return self.keys.get(key)
+
+    async def delete(self, *keys):
+        return sum(self.keys.pop(key, None) is not None for key in keys)
+
+    async def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+
+@pytest.fixture
+def fake_queue():
+    queue = TaskQueue()
+    queue.pool = FakeArqPool(["0.000", "1000.000", "500.000", "1500.000"])
+    queue._fair_script = queue.pool.register_script(FAIR_ENQUEUE_SCRIPT)
+    queue._fair_release_script = queue.pool.register_script(FAIR_RELEASE_SCRIPT)
+    return queue
+
+
+def test_worker_concurrency_is_split_by_queue_weight():
+    assert {queue: queue_max_jobs(queue) for queue in settings.task_queue_weights} == {
+        "interactive": 4,
+        "preview": 3,
+        "final": 2,
+        "batch": 1,
+    }
+    with pytest.raises(ValueError):
+        queue_key("unknown")
+
+
+@pytest.mark.asyncio
+async def test_enqueue_routes_by_quality_and_scores_by_virtual_time(fake_queue, monkeypatch):
+    monkeypatch.setitem(settings.task_queue_tenant_weights, "gold", 4.0)
+    pool = fake_queue.pool
+
+    await fake_queue.enqueue_video_generation("p1", "script", [], tenant_id="gold")
+    await fake_queue.enqueue_video_generation("p2", "script", [], tenant_id="gold", quality="final")
+    await fake_queue.enqueue_generic_video({"prompt": "cat"})
+
+    queues = [kwargs["_queue_name"] for _, _, kwargs in pool.enqueued]
+    assert queues == ["arq:queue:preview", "arq:queue:final", "arq:queue:interactive"]
+    assert pool.script_calls[0] == (
+        ["arq:queue:preview", "arq:queue:preview:fair"],
+        ["tenant:gold", 4.0, 1000, 10**12],
+    )
+    first = pool.enqueued[1][2]
+    assert first["_defer_until"] == datetime.fromtimestamp(1, tz=timezone.utc)
+    assert first["_expires"] == settings.task_queue_job_expires_seconds
+    assert pool.hashes["arq:queue:interactive:pending"] == {"default": 1}
+    assert all(events[0]["stage"] == "submitted" for events in pool.streams.values())
+
+
+@pytest.mark.asyncio
+async def test_job_start_records_wait_and_clears_backlog(fake_queue):
+    job_id = await fake_queue.enqueue_generic_video({"prompt": "cat"}, tenant_id="t1", queue="batch")
+    pool = fake_queue.pool
+    hook = _job_start_hook("batch")
+    enqueued = datetime.now(timezone.utc) - timedelta(seconds=2)
+
+    await hook({"redis": pool, "job_id": job_id, "job_try": 1, "enqueue_time": enqueued})
+    await hook({"redis": pool, "job_id": job_id, "job_try": 2, "enqueue_time": enqueued})
+    metrics = (await fake_queue.queue_metrics())["queues"]["batch"]
+
+    assert metrics["depth"] == 1 and metrics["tenants"] == {}
+    assert metrics["wait_ms"]["samples"] == 1
+    assert 2000 <= metrics["wait_ms"]["p95"] < 5000
+    assert metrics["max_jobs"] == 1
+
+
+@pytest.mark.asyncio
+async def test_duplicate_submissions_reuse_the_same_job(fake_queue):
+    storyboard = [{"shot": 1, "prompt": "sunrise"}]
+    first = await fake_queue.enqueue_video_generation("p1", "script", storyboard, tenant_id="t1")
+    again = await fake_queue.enqueue_video_generation("p1", "script", list(storyboard), tenant_id="t1")
+    other_tenant = await fake_queue.enqueue_video_generation("p1", "script", storyboard, tenant_id="t2")
+    keyed = await fake_queue.enqueue_generic_video({"prompt": "a"}, idempotency_key="click-1")
+    keyed_again = await fake_queue.enqueue_generic_video({"prompt": "b"}, idempotency_key="click-1")
+
+    assert first == again != other_tenant
+    assert keyed == keyed_again
+    assert len(fake_queue.pool.enqueued) == 3
+    assert fake_queue.pool.hashes["arq:queue:preview:pending"] == {"t1": 1, "t2": 1}
+
+
+@pytest.mark.asyncio
+async def test_fair_share_is_released_when_enqueue_does_not_happen(fake_queue, monkeypatch):
+    pool = fake_queue.pool
+
+    async def not_queued(job_id):
+        return False
+
+    # 并发的重复提交在 ARQ 入队事务里才被发现
+    await fake_queue.enqueue_generic_video({"prompt": "cat"}, tenant_id="t1")
+    monkeypatch.setattr(fake_queue, "_reuse_existing", not_queued)
+    await fake_queue.enqueue_generic_video({"prompt": "cat"}, tenant_id="t1")
+
+    assert len(pool.enqueued) == 1
+    assert pool.release_calls == [
+        (["arq:queue:interactive:fair"], ["tenant:t1", "2000.000", "", "", ""]),
+    ]
+
+    async def broken_enqueue(*args, **kwargs):
+        raise ConnectionError("redis went away")
+
+    monkeypatch.setattr(pool, "enqueue_job", broken_enqueue)
+    with pytest.raises(ConnectionError):
+        await fake_queue.enqueue_generic_video({"prompt": "dog"}, tenant_id="t1")
+
+    assert len(pool.release_calls) == 2
+    assert pool.release_calls[1][1][:2] == ["tenant:t1", "1500.000"]
+
+
+def stored_result(job_id: str, success: bool, result) -> bytes:
+    return serialize_result(
+        "generate_video_task", (), {}, 1, 0, success, result, 0, 1, "ref", "q", job_id,
+        serializer=serialize_job_payload,
+    )
+
+
+@pytest.mark.asyncio
+async def test_completed_results_are_reused_and_failed_ones_resubmitted(fake_queue):
+    pool = fake_queue.pool
+    job_id = await fake_queue.enqueue_generic_video({"prompt": "cat"})
+    # 模拟 worker 完成：任务键删除，结果键写入
+    del pool.keys["arq:job:" + job_id]
+    pool.keys["arq:result:" + job_id] = stored_result(job_id, True, {"video_url": "v.mp4"})
+
+    assert await fake_queue.enqueue_generic_video({"prompt": "cat"}) == job_id
+    assert len(pool.enqueued) == 1
+
+    pool.keys["arq:result:" + job_id] = stored_result(job_id, False, RuntimeError("provider down"))
+
+    assert await fake_queue.enqueue_generic_video({"prompt": "cat"}) == job_id
+    assert len(pool.enqueued) == 2
+    assert "arq:result:" + job_id not in pool.keys
+
+
+@pytest.mark.asyncio
+async def test_tenants_are_interleaved_on_redis_server(monkeypatch):
+    redis = pytest.importorskip("redis.asyncio")
+    url = os.environ.get("REDIS_TEST_URL", "redis://localhost:6379/15")
+    probe = redis.from_url(url)
+    try:
+        await probe.ping()
+    except Exception:
+        pytest.skip("redis-server not reachable")
+    finally:
+        await probe.aclose()
+
+    from arq.connections import RedisSettings
+
+    monkeypatch.setattr(task_queue_module.WorkerSettings, "redis_settings", RedisSettings.from_dsn(url))
+    queue = TaskQueue()
+    await queue.connect()
+    key = queue_key("batch")
+    await queue.pool.delete(key, f"{key}:fair", f"{key}:pending", f"{key}:tenants", f"{key}:wait_ms")
+    noisy: list[str] = []
+    quiet: list[str] = []
+    try:
+        noisy += [await queue.enqueue_generic_video({"n": i}, tenant_id="noisy", queue="batch") for i in range(10)]
+        quiet += [await queue.enqueue_generic_video({"n": i}, tenant_id="quiet", queue="batch") for i in range(2)]
+
+        order = [job_id.decode() for job_id in await queue.pool.zrange(key, 0, -1)]
+        # 同一虚拟时间的任务按 job_id 排序，所以只断言安静租户落在哪一对位置
+        first, second = sorted(order.index(job_id) for job_id in quiet)
+        assert first in {0, 1} and second in {2, 3}
+        assert order[-1] == noisy[-1]
+        metrics = (await queue.queue_metrics())["queues"]["batch"]
+        assert metrics["depth"] == 12 and metrics["tenants"] == {"noisy": 10, "quiet": 2}
+    finally:
+        await queue.pool.delete(key, f"{key}:fair", f"{key}:pending", f"{key}:tenants", f"{key}:wait_ms")
+        await queue.pool.delete(*(f"arq:job:{job_id}" for job_id in noisy + quiet), "unused")
+        await queue.disconnect()
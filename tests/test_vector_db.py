@@ -0,0 +1,330 @@
+"""Tests for the NumPy-backed in-memory vector store."""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from lewis_ai_system.vector_db import EmbeddingVector, InMemoryVectorDB
+
+
+def make_vector(vid: str, vector, **metadata) -> EmbeddingVector:
+    return EmbeddingVector(
+        id=vid,
+        vector=list(vector),
+        metadata=metadata,
+        text=f"text {vid}",
+        created_at=datetime.now(timezone.utc),
+    )
+
+
+@pytest.mark.asyncio
+async def test_search_matches_brute_force_ranking():
+    rng = np.random.default_rng(7)
+    data = rng.normal(size=(500, 16)).astype(np.float32)
+    db = InMemoryVectorDB()
+    await db.insert("c", [make_vector(f"v{i}", row) for i, row in enumerate(data)])
+
+    query = rng.normal(size=16)
+    results = await db.search("c", query.tolist(), limit=5)
+
+    normalized = data / np.linalg.norm(data, axis=1, keepdims=True)
+    expected = np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:5]
+    assert [vec.id for vec, _ in results] == [f"v{i}" for i in expected]
+    assert all(a[1] >= b[1] for a, b in zip(results, results[1:]))
+
+
+@pytest.mark.asyncio
+async def test_metadata_filters_use_index_and_fallback():
+    db = InMemoryVectorDB()
+    await db.insert(
+        "c",
+        [
+            make_vector("a", [1, 0], user_id="u1", tags=["x"]),
+            make_vector("b", [1, 0.1], user_id="u2", tags=["x"]),
+            make_vector("c", [0, 1], user_id="u1", tags=["y"]),
+        ],
+    )
+
+    assert [v.id for v, _ in await db.search("c", [1, 0], filters={"user_id": "u1"})] == ["a", "c"]
+    assert [v.id for v, _ in await db.search("c", [1, 0], filters={"user_id": "u1", "tags": ["y"]})] == ["c"]
+    assert await db.search("c", [1, 0], filters={"user_id": "missing"}) == []
+
+
+@pytest.mark.asyncio
+async def test_insert_replaces_existing_id_and_rejects_wrong_dimension():
+    db = InMemoryVectorDB()
+    await db.insert("c", [make_vector("a", [1, 0], user_id="u1")])
+    await db.insert("c", [make_vector("a", [0, 1], user_id="u2")])
+
+    results = await db.search("c", [0, 1])
+    assert len(results) == 1
+    assert results[0][0].metadata["user_id"] == "u2"
+    assert await db.search("c", [1, 0], filters={"user_id": "u1"}) == []
+    assert await db.insert("c", [make_vector("b", [1, 0, 0])]) is False
+    assert await db.search("c", [1, 0, 0]) == []
+
+
+@pytest.mark.asyncio
+async def test_deletes_tombstone_then_compact():
+    db = InMemoryVectorDB(compaction_ratio=0.5, compaction_min_rows=4)
+    await db.insert("c", [make_vector(f"v{i}", [1, i]) for i in range(10)])
+
+    await db.delete("c", ["v0", "v1", "v2"])
+    store = db.collections["c"]
+    assert store.tombstones == 3
+    assert len(store) == 7
+
+    await db.delete("c", ["v3", "v4"])
+    assert store.tombstones == 0
+    assert sorted(v.id for v, _ in await db.search("c", [1, 0], limit=10)) == [f"v{i}" for i in range(5, 10)]
+
+
+@pytest.mark.asyncio
+async def test_cleanup_expired_removes_only_expired_rows():
+    db = InMemoryVectorDB()
+    now = datetime.now(timezone.utc)
+    expired = make_vector("old", [1, 0])
+    expired.expires_at = now - timedelta(seconds=1)
+    fresh = make_vector("new", [1, 0])
+    fresh.expires_at = now + timedelta(days=1)
+    await db.insert("c", [expired, fresh])
+
+    assert await db.cleanup_expired("c") == 1
+    assert [v.id for v, _ in await db.search("c", [1, 0])] == ["new"]
+
+
+@pytest.mark.asyncio
+async def test_expiry_index_only_visits_expired_rows(monkeypatch):
+    db = InMemoryVectorDB()
+    now = datetime.now(timezone.utc)
+    vectors = [make_vector(f"v{i}", [1, i]) for i in range(100)]
+    for i, vec in enumerate(vectors):
+        vec.expires_at = now + (timedelta(seconds=-1) if i < 3 else timedelta(days=30))
+    await db.insert("c", vectors)
+    store = db.collections["c"]
+    monkeypatch.setattr(store, "vectors", lambda: pytest.fail("cleanup must not scan the collection"))
+
+    assert await db.cleanup_expired("c") == 3
+    assert len(store._expiry) == 97
+    assert await db.cleanup_expired("c") == 0
+    assert "v3" in store and "v0" not in store
+
+
+@pytest.mark.asyncio
+async def test_expiry_index_survives_upsert_and_compaction():
+    db = InMemoryVectorDB(compaction_ratio=0.5, compaction_min_rows=4)
+    past = datetime.now(timezone.utc) - timedelta(seconds=1)
+    expiring = [make_vector(f"v{i}", [1, i]) for i in range(10)]
+    for vec in expiring:
+        vec.expires_at = past
+    await db.insert("c", expiring)
+    # 重新写入 v9 且不设过期时间，旧行的过期条目不应再删除它
+    await db.insert("c", [make_vector("v9", [1, 9])])
+    await db.delete("c", [f"v{i}" for i in range(6)])
+    store = db.collections["c"]
+    assert store.generation == 1
+    assert len(store._expiry) == 3
+
+    assert await db.cleanup_expired("c") == 3
+    assert [vec.id for vec in store.vectors()] == ["v9"]
+
+
+def clustered(rng, rows: int, dim: int = 16, clusters: int = 8) -> np.ndarray:
+    centers = rng.normal(size=(clusters, dim))
+    return (centers[rng.integers(clusters, size=rows)] + 0.1 * rng.normal(size=(rows, dim))).astype(np.float32)
+
+
+@pytest.fixture
+def maintenance_log(monkeypatch):
+    from lewis_ai_system import vector_db as vector_db_module
+
+    calls: list[tuple[str, str, str]] = []
+
+    async def fake_record(operation, collection, **kwargs):
+        calls.append((operation, collection, kwargs.get("status", "success")))
+
+    monkeypatch.setattr(vector_db_module, "record_index_maintenance", fake_record)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_ivf_index_trains_in_background_and_handles_updates(maintenance_log):
+    rng = np.random.default_rng(3)
+    data = clustered(rng, 1000)
+    db = InMemoryVectorDB(index_type="ivf", index_options={"nlist": 8, "nprobe": 8, "min_train_size": 500})
+    await db.insert("c", [make_vector(f"v{i}", row) for i, row in enumerate(data)])
+    await db.wait_for_maintenance()
+
+    store = db.collections["c"]
+    assert store.index.ready
+    assert maintenance_log == [("rebuild", "c", "success")]
+
+    # 探测全部簇时结果与精确检索一致
+    query = data[10]
+    assert (await db.search("c", query.tolist(), limit=1))[0][0].id == "v10"
+
+    await db.insert("c", [make_vector("fresh", query * 2)])
+    await db.delete("c", ["v10"])
+    top = [v.id for v, _ in await db.search("c", query.tolist(), limit=3)]
+    assert top[0] == "fresh"
+    assert "v10" not in top
+
+
+@pytest.mark.asyncio
+async def test_ivf_nprobe_trades_recall_for_fewer_candidates(maintenance_log):
+    rng = np.random.default_rng(5)
+    data = clustered(rng, 2000, clusters=16)
+    db = InMemoryVectorDB(index_type="ivf", index_options={"nlist": 16, "nprobe": 1, "min_train_size": 100})
+    await db.insert("c", [make_vector(f"v{i}", row) for i, row in enumerate(data)])
+    await db.wait_for_maintenance()
+    index = db.collections["c"].index
+    query = data[0] / np.linalg.norm(data[0])
+
+    narrow = index.candidates(query).size
+    index.nprobe = 16
+    assert index.candidates(query).size == 2000 > narrow
+
+
+@pytest.mark.asyncio
+async def test_compaction_remaps_index_and_is_logged(maintenance_log):
+    rng = np.random.default_rng(9)
+    data = clustered(rng, 400)
+    db = InMemoryVectorDB(
+        index_type="ivf",
+        index_options={"nlist": 4, "nprobe": 4, "min_train_size": 100},
+        compaction_ratio=0.25,
+        compaction_min_rows=50,
+    )
+    await db.insert("c", [make_vector(f"v{i}", row) for i, row in enumerate(data)])
+    await db.wait_for_maintenance()
+
+    await db.delete("c", [f"v{i}" for i in range(200)])
+
+    assert ("compact", "c", "success") in maintenance_log
+    assert db.collections["c"].tombstones == 0
+    result = await db.search("c", data[300].tolist(), limit=1)
+    assert result[0][0].id == "v300"
+
+
+@pytest.mark.asyncio
+async def test_record_index_maintenance_writes_log_row(tmp_path, monkeypatch):
+    from sqlalchemy import select
+
+    from lewis_ai_system import database
+    from lewis_ai_system.vector_index import record_index_maintenance
+
+    manager = database.DatabaseManager()
+    manager.initialize(f"sqlite+aiosqlite:///{tmp_path / 'maintenance.db'}")
+    await manager.create_tables()
+    monkeypatch.setattr(database, "db_manager", manager)
+    try:
+        await record_index_maintenance("rebuild", "ConversationMemory", records_affected=12, duration_seconds=0.5)
+        async with manager.get_session() as db:
+            rows = (await db.execute(select(database.VectorIndexMaintenance))).scalars().all()
+    finally:
+        await manager.close()
+
+    assert [(r.operation, r.collection, r.records_affected, r.status) for r in rows] == [
+        ("rebuild", "ConversationMemory", 12, "success")
+    ]
+
+
+@pytest.mark.asyncio
+async def test_expiry_sweeper_records_each_sweep(maintenance_log):
+    from lewis_ai_system.vector_db import VectorDBManager
+
+    manager = VectorDBManager()
+    manager.provider = InMemoryVectorDB()
+    expired = make_vector("old", [1, 0])
+    expired.expires_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    await manager.provider.insert("ConversationMemory", [expired])
+
+    manager.start_expiry_sweeper(0.01)
+    await asyncio.sleep(0.05)
+    await manager.close()
+
+    assert maintenance_log[0] == ("expire", "ConversationMemory", "success")
+    assert len(maintenance_log) >= 2
+    assert len(manager.provider.collections["ConversationMemory"]) == 0
+
+
+@pytest.mark.asyncio
+async def test_memories_are_namespaced_by_embedding_provider(monkeypatch, maintenance_log):
+    from lewis_ai_system import embeddings
+    from lewis_ai_system.embeddings import EmbeddingService, HashingEmbeddingProvider, OpenAIEmbeddingProvider
+    from lewis_ai_system.vector_db import VectorDBManager
+
+    manager = VectorDBManager()
+    manager.provider = InMemoryVectorDB()
+    monkeypatch.setattr(embeddings, "_embedding_service", EmbeddingService(HashingEmbeddingProvider(2)))
+    hashing_collection = manager.memory_collection
+    await manager.store_conversation_memory("s1", "hashed", [1.0, 0.0], {"tenant_id": "acme"}, ttl_days=-1)
+
+    openai = OpenAIEmbeddingProvider(api_key="sk-test", model="text-embedding-3-small", dimension=2)
+    monkeypatch.setattr(embeddings, "_embedding_service", EmbeddingService(openai))
+    await manager.store_conversation_memory("s2", "openai", [1.0, 0.0], {"tenant_id": "acme"})
+
+    assert hashing_collection == "ConversationMemory_hashing_2"
+    assert manager.memory_collection == "ConversationMemory_openai_text_embedding_3_small_2"
+    # 同维度的向量也不会跨嵌入模型混在一起检索
+    assert [text for text, _, _ in await manager.search_memories([1.0, 0.0], tenant_id="acme")] == ["openai"]
+    # 旧模型的集合仍然参与过期清理
+    assert await manager.cleanup_old_memories() == 1
+    assert [collection for _, collection, _ in maintenance_log] == sorted([hashing_collection, manager.memory_collection])
+
+
+@pytest.mark.asyncio
+async def test_int8_quantization_reranks_with_full_precision(maintenance_log):
+    rng = np.random.default_rng(11)
+    data = clustered(rng, 2000, dim=32)
+    options = {"min_train_size": 1000, "rerank_factor": 4}
+    db = InMemoryVectorDB(index_type="flat", quantization="int8", quantization_options=options)
+    exact_db = InMemoryVectorDB(index_type="flat", quantization="none")
+    vectors = [make_vector(f"v{i}", row) for i, row in enumerate(data)]
+    await db.insert("c", vectors)
+    await exact_db.insert("c", vectors)
+    await db.wait_for_maintenance()
+
+    store = db.collections["c"]
+    assert store.quantizer.ready
+    assert store.quantizer.nbytes == data.size
+    # 量化后原始行降为 float16：量化码加重排行共 3 字节/维，少于单独的 float32 矩阵
+    assert store.matrix_view().dtype == np.float16
+    assert store.quantizer.nbytes + store.matrix_view().nbytes < data.size * 4
+    assert maintenance_log == [("quantize", "c", "success")]
+
+    hits = 0
+    for query in rng.normal(size=(20, 32)):
+        got = await db.search("c", query.tolist(), limit=10)
+        expected = await exact_db.search("c", query.tolist(), limit=10)
+        hits += len({v.id for v, _ in got} & {v.id for v, _ in expected})
+        # 重排分数来自 float16 行，与精确分数只差半精度舍入
+        exact_scores = {v.id: score for v, score in expected}
+        assert all(score == pytest.approx(exact_scores[v.id], abs=1e-3) for v, score in got if v.id in exact_scores)
+    assert hits / 200 >= 0.95
+
+
+@pytest.mark.asyncio
+async def test_quantizer_follows_inserts_and_compaction(maintenance_log):
+    rng = np.random.default_rng(12)
+    data = clustered(rng, 600)
+    db = InMemoryVectorDB(
+        index_type="flat",
+        quantization="int8",
+        quantization_options={"min_train_size": 500, "rerank_factor": 2},
+        compaction_ratio=0.25,
+        compaction_min_rows=100,
+    )
+    await db.insert("c", [make_vector(f"v{i}", row) for i, row in enumerate(data[:500])])
+    await db.wait_for_maintenance()
+    await db.insert("c", [make_vector(f"v{i}", row) for i, row in enumerate(data[500:], 500)])
+    await db.delete("c", [f"v{i}" for i in range(0, 300)])
+
+    store = db.collections["c"]
+    assert store.generation == 1
+    assert store.quantizer.nbytes == len(store) * 16
+    assert (await db.search("c", data[550].tolist(), limit=1))[0][0].id == "v550"
+    assert await db.quantize("c")
+    assert [op for op, _, _ in maintenance_log] == ["quantize", "compact", "quantize"]
@@ -0,0 +1,198 @@
+"""Tests for WeaviateProvider against an in-process HTTP stub."""
+
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+import re
+
+import httpx
+import pytest
+
+from lewis_ai_system.vector_db import EmbeddingVector, WeaviateProvider, vector_db
+
+
+class WeaviateStub:
+    """Just enough of the Weaviate REST/GraphQL API to exercise the provider."""
+
+    def __init__(self, delete_limit: int = 10_000) -> None:
+        self.objects: dict[str, dict] = {}
+        self.delete_limit = delete_limit
+        self.requests: list[tuple[str, str]] = []
+        self.queries: list[str] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.reject_ids: set[str] = set()
+        self.schemas: list[dict] = []
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append((request.method, request.url.path))
+        body = json.loads(request.content) if request.content else {}
+        if request.url.path == "/v1/batch/objects" and request.method == "POST":
+            return await self._batch_insert(body)
+        if request.url.path == "/v1/batch/objects" and request.method == "DELETE":
+            return self._batch_delete(body)
+        if request.url.path == "/v1/schema":
+            self.schemas.append(body)
+            return httpx.Response(200, json=body)
+        if request.url.path == "/v1/graphql":
+            self.queries.append(body["query"])
+            hits = [
+                {**obj["properties"], "_additional": {"id": obj["id"], "distance": 0.2}}
+                for obj in self.objects.values()
+            ]
+            return httpx.Response(200, json={"data": {"Get": {"Memory": hits}}})
+        return httpx.Response(404)
+
+    async def _batch_insert(self, body: dict) -> httpx.Response:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        results = []
+        for obj in body["objects"]:
+            if obj["id"] in self.reject_ids:
+                results.append({"id": obj["id"], "result": {"errors": {"error": [{"message": "rejected"}]}}})
+            else:
+                self.objects[obj["id"]] = obj
+                results.append({"id": obj["id"], "result": {}})
+        return httpx.Response(200, json=results)
+
+    def _batch_delete(self, body: dict) -> httpx.Response:
+        where = body["match"]["where"]
+        if where["operator"] == "ContainsAny":
+            matches = [oid for oid in self.objects if oid in set(where["valueTextArray"])]
+        else:
+            cutoff = datetime.fromisoformat(where["valueDate"])
+            matches = [
+                oid for oid, obj in self.objects.items()
+                if obj["properties"]["expires_at"] and datetime.fromisoformat(obj["properties"]["expires_at"]) < cutoff
+            ]
+        deleted = matches[: self.delete_limit]
+        for oid in deleted:
+            del self.objects[oid]
+        results = {"matches": len(deleted), "limit": self.delete_limit, "successful": len(deleted), "failed": 0}
+        return httpx.Response(200, json={"results": results})
+
+
+def make_vector(vid: str, expires_in: timedelta | None = None) -> EmbeddingVector:
+    now = datetime.now(timezone.utc)
+    return EmbeddingVector(
+        id=vid,
+        vector=[0.1, 0.2],
+        metadata={"tenant_id": "acme"},
+        text=f"text {vid}",
+        created_at=now,
+        expires_at=now + expires_in if expires_in is not None else None,
+    )
+
+
+@pytest.fixture
+async def stub_provider():
+    stub = WeaviateStub(delete_limit=2)
+    provider = WeaviateProvider(
+        "http://weaviate.local",
+        insert_batch_size=3,
+        insert_concurrency=2,
+        delete_batch_size=4,
+        transport=httpx.MockTransport(stub),
+    )
+    yield stub, provider
+    await provider.close()
+
+
+@pytest.mark.asyncio
+async def test_insert_is_split_into_capped_concurrent_batches(stub_provider):
+    stub, provider = stub_provider
+
+    assert await provider.insert("Memory", [make_vector(f"v{i}") for i in range(10)])
+
+    assert len(stub.objects) == 10
+    assert stub.requests.count(("POST", "/v1/batch/objects")) == 4
+    assert stub.max_in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_insert_reports_per_object_errors(stub_provider):
+    stub, provider = stub_provider
+    stub.reject_ids = {"v1"}
+
+    assert await provider.insert("Memory", [make_vector("v0"), make_vector("v1")]) is False
+
+
+@pytest.mark.asyncio
+async def test_delete_uses_batch_delete_by_id_filter(stub_provider):
+    stub, provider = stub_provider
+    await provider.insert("Memory", [make_vector(f"v{i}") for i in range(6)])
+    stub.requests.clear()
+
+    assert await provider.delete("Memory", ["v0", "v1", "v2", "v3", "v4"])
+
+    assert sorted(stub.objects) == ["v5"]
+    assert all(method == "DELETE" and path == "/v1/batch/objects" for method, path in stub.requests)
+    assert len(stub.requests) < 5
+
+
+@pytest.mark.asyncio
+async def test_cleanup_expired_pages_through_server_limit(stub_provider):
+    stub, provider = stub_provider
+    expired = [make_vector(f"old{i}", timedelta(days=-1)) for i in range(5)]
+    await provider.insert("Memory", expired + [make_vector("fresh", timedelta(days=1))])
+    stub.requests.clear()
+
+    assert await provider.cleanup_expired("Memory") == 5
+
+    assert sorted(stub.objects) == ["fresh"]
+    assert len(stub.requests) == 3
+
+
+@pytest.mark.asyncio
+async def test_search_encodes_arguments_as_graphql_literals(stub_provider):
+    stub, provider = stub_provider
+    await provider.insert("Memory", [make_vector("v0")])
+
+    results = await provider.search("Memory", [0.5, 0.25], limit=3, filters={"tenant_id": 'acme") { id } #'})
+
+    query = stub.queries[-1]
+    assert "nearVector: {vector: [0.5, 0.25]}" in query
+    assert "limit: 3" in query
+    assert "operator: Equal" in query
+    assert 'valueText: "acme\\") { id } #"' in query
+    assert "'" not in query
+    assert [vec.id for vec, _ in results] == ["v0"]
+    assert results[0][1] == pytest.approx(0.9)
+
+
+@pytest.mark.asyncio
+async def test_invalid_class_names_are_rejected(stub_provider):
+    stub, provider = stub_provider
+
+    assert await provider.search("Memory) { x }", [0.1]) == []
+    assert stub.queries == []
+
+
+@pytest.mark.asyncio
+async def test_memory_tenant_filter_targets_top_level_schema_properties(stub_provider, monkeypatch):
+    stub, provider = stub_provider
+    monkeypatch.setattr(vector_db, "provider", provider)
+    assert await provider.create_collection(vector_db.memory_collection, 2)
+    await vector_db.store_conversation_memory(
+        "s1", "hello", [0.1, 0.2], {"tenant_id": "acme", "user_id": "u1"}
+    )
+
+    await vector_db.search_memories([0.1, 0.2], user_id="u1", tenant_id="acme")
+
+    properties = {prop["name"]: prop["dataType"] for prop in stub.schemas[-1]["properties"]}
+    paths = re.findall(r'path: \["(\w+)"\]', stub.queries[-1])
+    assert sorted(paths) == ["tenant_id", "user_id"]
+    assert all(properties[path] == ["text"] for path in paths)
+    stored = next(iter(stub.objects.values()))["properties"]
+    assert (stored["tenant_id"], stored["user_id"], stored["session_id"]) == ("acme", "u1", "s1")
+
+
+@pytest.mark.asyncio
+async def test_search_refuses_filters_on_nested_metadata(stub_provider):
+    stub, provider = stub_provider
+
+    assert await provider.search("Memory", [0.1], filters={"project": "x"}) == []
+    assert stub.queries == []
@@ -6,9 +6,9 @@ ARQ Worker 启动脚本
 
 import asyncio
 import logging
-from arq import run_worker
 
-from lewis_ai_system.task_queue import WorkerSettings
+from lewis_ai_system.config import settings
+from lewis_ai_system.task_queue import WorkerSettings, queue_max_jobs, run_weighted_workers
 from lewis_ai_system.instrumentation import get_logger
 
 logger = get_logger()
@@ -17,15 +17,11 @@ async def startup(ctx):
     """Worker 启动时执行"""
     logger.info("🚀 Lewis AI Worker 启动中...")
     logger.info(f"Redis: {WorkerSettings.redis_settings.host}:{WorkerSettings.redis_settings.port}")
-    logger.info(f"最大并发任务数: {WorkerSettings.max_jobs}")
 
 async def shutdown(ctx):
     """Worker 关闭时执行"""
     logger.info("👋 Lewis AI Worker 正在关闭...")
 
-# 添加生命周期钩子
-WorkerSettings.on_startup = startup
-WorkerSettings.on_shutdown = shutdown
 
 if __name__ == "__main__":
     # 设置日志级别
@@ -38,5 +34,7 @@ if __name__ == "__main__":
     logger.info("Lewis AI System - Async Task Worker")
     logger.info("=" * 60)
     
-    # 运行 Worker
-    run_worker(WorkerSettings)
+    # 每个命名队列一个 Worker，并发按权重分配
+    for queue in settings.task_queue_weights:
+        logger.info(f"队列 {queue}: 最大并发任务数 {queue_max_jobs(queue)}")
+    asyncio.run(run_weighted_workers(on_startup=startup, on_shutdown=shutdown))